@@ -13,6 +13,8 @@ from routes.agent import agent_bp
 from routes.events import events_bp
 from routes.settings import settings_bp
 from routes.url_blacklist import url_blacklist_bp
+from routes.vectorstore import vectorstore_bp
+from routes.metrics import metrics_bp
 
 logger = get_logger(__name__)
 
@@ -33,7 +35,36 @@ def create_app():
     
     # 初始化数据库
     init_db()
-    
+
+    # 首次启用 URL 索引时，从向量库已有数据回填
+    if config.ENABLE_VECTOR_STORAGE:
+        try:
+            from utils.db import count_url_index
+            if count_url_index() == 0:
+                from utils.vectorstore import rebuild_url_index
+                rebuild_url_index()
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to backfill URL index: {e}")
+
+        # 续跑中断的重建索引任务，并检测 embedding 模型变化
+        from utils.reindex import init_reindex
+        init_reindex()
+
+    # 清理旧版上传流程遗留的临时文件（只执行一次）
+    try:
+        from utils.ingestion import cleanup_orphaned_temp_files
+        cleanup_orphaned_temp_files()
+    except Exception as e:
+        logger.warning(f"⚠️ Failed to clean up orphaned temp files: {e}")
+
+    # 启动网页数据摄取 worker，续跑上次未完成的任务
+    if config.ENABLE_ASYNC_INGESTION:
+        try:
+            from utils.ingestion import start_ingestion_workers
+            start_ingestion_workers()
+        except Exception as e:
+            logger.error(f"⚠️ Failed to start ingestion workers: {e}")
+
     # 初始化定时任务（如果启用）
     if config.ENABLE_SCHEDULER:
         try:
@@ -53,6 +84,8 @@ def create_app():
     app.register_blueprint(events_bp)
     app.register_blueprint(settings_bp)
     app.register_blueprint(url_blacklist_bp)
+    app.register_blueprint(vectorstore_bp)
+    app.register_blueprint(metrics_bp)
     
     # 健康检查端点
     @app.route('/health', methods=['GET'])
@@ -97,6 +130,8 @@ def create_app():
             "endpoints": {
                 "upload": [
                     "POST /api/upload_web_data",
+                    "POST /api/upload_web_data/batch",
+                    "GET /api/upload_web_data/jobs/<job_id>",
                     "POST /api/upload_screenshot"
                 ],
                 "generation": [
@@ -130,6 +165,17 @@ def create_app():
                     "GET /api/url-blacklist",
                     "POST /api/url-blacklist",
                     "DELETE /api/url-blacklist/{id}"
+                ],
+                "vectorstore": [
+                    "GET /api/vectorstore/reconcile",
+                    "POST /api/vectorstore/reconcile",
+                    "GET /api/vectorstore/reindex",
+                    "POST /api/vectorstore/reindex",
+                    "DELETE /api/vectorstore/reindex"
+                ],
+                "metrics": [
+                    "GET /api/metrics",
+                    "GET /api/metrics/summary"
                 ]
             }
         })
@@ -44,7 +44,7 @@ def main():
         print(f"\n{'='*60}")
         print(f"向量数据库当前状态")
         print(f"{'='*60}")
-        print(f"集合名称: {config.CHROMA_COLLECTION_NAME}")
+        print(f"集合名称: {collection.name}")
         print(f"存储路径: {config.CHROMA_PERSIST_DIR}")
         print(f"当前文档数: {count}")
         print(f"{'='*60}\n")
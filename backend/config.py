@@ -4,6 +4,7 @@
 """
 
 from pathlib import Path
+import json
 import os
 
 # 尝试加载 .env 文件（如果存在）
@@ -23,6 +24,15 @@ LLM_API_KEY = os.getenv("LLM_API_KEY", "")
 LLM_BASE_URL = os.getenv("LLM_BASE_URL")
 LLM_MODEL = os.getenv("LLM_MODEL")
 
+# 备用 LLM 端点（按顺序排在主端点之后，OpenAI 兼容接口），JSON 数组，例如：
+# [{"base_url": "https://backup.example.com/v1", "api_key": "...", "model": "gpt-4o-mini"}]
+# 未填写的 api_key / model 沿用主端点的配置
+try:
+    LLM_FALLBACK_ENDPOINTS = json.loads(os.getenv("LLM_FALLBACK_ENDPOINTS") or "[]")
+except ValueError:
+    print("⚠️ LLM_FALLBACK_ENDPOINTS 不是合法的 JSON，已忽略")
+    LLM_FALLBACK_ENDPOINTS = []
+
 # 向量化 Embedding API 配置（用于向量数据库）
 EMBEDDING_API_KEY = os.getenv("EMBEDDING_API_KEY", "")
 EMBEDDING_BASE_URL = os.getenv("EMBEDDING_BASE_URL")
@@ -71,6 +81,63 @@ LLM_MAX_TOKENS = 4096  # LLM 输出的最大 token 数
 LLM_MAX_INPUT_TOKENS = 8192  # LLM 输入的最大 token 数（包括 system prompt + user prompt）
 PROMPT_LANGUAGE = os.getenv("PROMPT_LANGUAGE", "en")
 
+# LLM / Embedding HTTP 客户端（进程内共享连接池，凭据或地址变化时重建）
+LLM_HTTP_TIMEOUT_SECONDS = 60            # 单次请求超时
+LLM_HTTP_CONNECT_TIMEOUT_SECONDS = 10    # 建立连接超时
+LLM_HTTP_MAX_CONNECTIONS = 20            # 连接池最大连接数
+LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS = 10  # 保持空闲的最大连接数
+LLM_HTTP_KEEPALIVE_EXPIRY_SECONDS = 60   # 空闲连接保持时间
+LLM_PARALLEL_CALLS = 4                   # 同一流程内并行发起的 LLM 调用上限（如分段报告）
+
+# 录制 LLM / Embedding 请求与响应（供 llm_stub_server.py --replay 离线回放），留空表示不录制
+LLM_RECORD_DIR = os.getenv("LLM_RECORD_DIR", "")
+
+# LLM 调用调度（进程内按端点共享：并发上限、RPM/TPM 令牌桶、交互式请求优先、失败重试）
+LLM_MAX_CONCURRENCY = 4                  # LLM 端点同时进行的请求数
+LLM_RATE_LIMIT_RPM = 0                   # 每分钟请求数上限（0 表示不限制，按服务商配额填写）
+LLM_RATE_LIMIT_TPM = 0                   # 每分钟 token 上限（0 表示不限制）
+EMBEDDING_MAX_CONCURRENCY = 4            # Embedding 端点同时进行的请求数
+EMBEDDING_RATE_LIMIT_RPM = 0
+EMBEDDING_RATE_LIMIT_TPM = 0
+LLM_INTERACTIVE_RESERVED_SLOTS = 1       # 为交互式请求（对话、提示词优化）保留的并发槽位
+LLM_MAX_RETRIES = 2                      # 重试次数（连接错误、408/409/429、5xx）
+LLM_RETRY_BASE_DELAY_SECONDS = 1.0       # 指数退避的初始等待（带随机抖动）
+LLM_RETRY_MAX_DELAY_SECONDS = 30         # 单次退避的最长等待（Retry-After 优先）
+
+# 多端点故障转移与对冲请求（配置了 LLM_FALLBACK_ENDPOINTS 时生效）
+LLM_CIRCUIT_FAILURE_THRESHOLD = 3        # 连续失败多少次后熔断该端点
+LLM_CIRCUIT_OPEN_SECONDS = 30            # 熔断持续时间，之后放行一次试探请求
+LLM_ENDPOINT_LATENCY_WINDOW = 100        # 统计延迟分位数使用的最近成功请求数
+ENABLE_LLM_HEDGING = False               # 交互式请求超过主端点 p95 延迟仍未返回时，向下一个端点发出对冲请求
+LLM_HEDGE_MIN_SAMPLES = 20               # 样本不足时使用默认对冲延迟
+LLM_HEDGE_DEFAULT_DELAY_SECONDS = 3.0    # 默认对冲延迟
+LLM_HEDGE_MIN_DELAY_SECONDS = 0.5        # 对冲延迟下限（避免过早加倍请求量）
+
+# Embedding 微批处理（并发的小请求在时间窗口内合并为一次 embeddings.create）
+ENABLE_EMBEDDING_BATCHING = True
+EMBEDDING_BATCH_WINDOW_MS = 10           # 收集请求的时间窗口
+EMBEDDING_BATCH_MAX_INPUTS = 64          # 单次请求的最大文本数（达到后立即发送）
+EMBEDDING_BATCH_MAX_TOKENS = 100000      # 单次请求的最大 token 数（服务商单请求上限以内）
+
+# LLM / Embedding 调用监控（/api/metrics 与 /api/metrics/summary）
+ENABLE_LLM_METRICS = True
+LLM_METRICS_RETENTION_DAYS = 7           # 调用明细保留天数
+LLM_METRICS_MAX_ROWS = 200000            # 调用明细最多保留条数
+LLM_METRICS_FLUSH_SIZE = 50              # 缓冲多少条后写入数据库
+LLM_METRICS_FLUSH_INTERVAL_SECONDS = 5   # 最长缓冲时间
+# 估算费用用的价格（每百万 token），如 {"gpt-4o-mini": {"input": 0.15, "output": 0.6}}
+LLM_PRICING = {}
+
+# LLM 响应缓存（相同 prompt 的确定性调用只请求一次，调用方通过 use_cache 开启/绕过）
+ENABLE_LLM_CACHE = True
+LLM_CACHE_TTL_HOURS = 24        # 缓存有效期
+LLM_CACHE_MAX_ENTRIES = 5000    # 最多缓存条数
+LLM_CACHE_MAX_SIZE_MB = 50      # 缓存响应总大小上限
+LLM_CACHE_MAX_TEMPERATURE = 0.3 # 只缓存不高于该温度的调用（JSON 模式不受限制）
+
+# 流式生成：提示/待办以 stream=True 调用 LLM，每条解析完成后立即保存并推送事件
+ENABLE_STREAMING_GENERATION = True
+
 # 各类提示词的预估 token 数（用于动态计算）
 # 这些数值是根据实际 prompt 长度估算的
 SYSTEM_PROMPT_TOKENS = {
@@ -78,11 +145,21 @@ SYSTEM_PROMPT_TOKENS = {
     'todo': 2000,     # todo_gen_new.py 的 system prompt 约 2000 tokens
     'activity': 2000, # activity_gen_new.py 的 system prompt 约 2000 tokens
     'report': 3000,   # report_gen_new.py 的 system prompt 约 3000 tokens
+    'news': 2000,     # daily_feed_gen.py 新闻推荐的 system prompt
+    'knowledge': 2000,  # daily_feed_gen.py 知识推荐的 system prompt
+    'agent': 500,     # 智能对话最终回答的 system prompt
 }
 
 # 为用户消息保留的 token 空间（用于问题描述等）
 USER_MESSAGE_RESERVE_TOKENS = 500
 
+# Token 计数与上下文装填
+TOKENIZER_FALLBACK_ENCODING = "cl100k_base"  # 无法识别模型名时使用的 tiktoken 编码
+TOKEN_COUNT_CACHE_SIZE = 4096                 # 缓存的文本 token 计数条数
+CONTEXT_RECENCY_HALF_LIFE_HOURS = 24          # 时效性半衰期：越新的内容价值越高
+CONTEXT_RECENCY_FLOOR = 0.2                   # 时效性下限（旧但相关的内容仍可入选）
+CONTEXT_PACK_MAX_ITEM_SHARE = 0.25            # 单条内容最多占用上下文预算的比例
+
 # ============================================================================
 # 🔍 向量数据库配置
 # ============================================================================
@@ -90,6 +167,67 @@ CHROMA_COLLECTION_NAME = "web_data"
 CHUNK_SIZE = 1000  # 文本分块大小
 CHUNK_OVERLAP = 200  # 分块重叠大小
 
+# 向量存储后端：chroma（ChromaDB 持久化）或 numpy（内存映射的平铺精确索引，适合小规模个人数据）
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+FLAT_INDEX_DIR = DATA_DIR / "flat_index"
+
+# 检索结果 MMR 重排（最大边际相关性）与近重复抑制
+ENABLE_MMR_RERANK = True        # 设置为 False 则直接返回原始相似度排序
+MMR_LAMBDA = 0.7                # 相关性权重（1.0 = 只看相关性，0.0 = 只看多样性）
+MMR_DUPLICATE_THRESHOLD = 0.95  # 与已选结果的余弦相似度超过该值视为近重复，直接丢弃
+MMR_FETCH_MULTIPLIER = 3        # 候选集大小 = limit * 该倍数
+
+# SQLite 与向量库一致性校验（缺失/过期/孤立文档的增量修复）
+VECTOR_RECONCILE_INTERVAL_MINUTES = 30     # 校验间隔
+VECTOR_RECONCILE_MAX_REPAIRS = 50          # 每轮最多重新 embedding 的行数
+VECTOR_RECONCILE_BATCH_SIZE = 10           # 每批修复的行数
+VECTOR_RECONCILE_GRACE_SECONDS = 120       # 跳过最近创建的行（可能仍在写入）
+VECTOR_RECONCILE_MAX_BACKOFF_SECONDS = 60  # 失败退避的最大等待时间
+VECTOR_RECONCILE_MAX_CONSECUTIVE_FAILURES = 5  # 连续失败次数上限，超过则中止本轮
+
+# 更换 EMBEDDING_MODEL 后的重建索引（写入影子集合，记录断点，完成后原子切换）
+REINDEX_BATCH_SIZE = 64             # 每次 embedding 请求的文本数
+REINDEX_CONCURRENCY = 4             # 并发 embedding 请求数
+REINDEX_MAX_RETRIES = 3             # 单批 embedding 失败的重试次数
+REINDEX_AUTO_START = False          # 启动时检测到模型变化是否自动开始重建（否则只告警）
+REINDEX_DROP_OLD_COLLECTION = True  # 切换完成后删除旧集合
+
+# 会话记忆管理（内容哈希去重、单会话上限、过期清理、旧轮次压缩为摘要）
+SESSION_MEMORY_MAX_PER_SESSION = 200           # 单个会话最多保留的记忆数，超过时淘汰最久未出现的
+SESSION_MEMORY_TTL_HOURS = 24 * 7              # 超过该时长未再出现的记忆过期删除
+SESSION_MEMORY_COMPACT_MIN_TURNS = 10          # 可压缩的旧轮次达到该数量才压缩
+SESSION_MEMORY_COMPACT_AFTER_MINUTES = 60      # 只压缩该时长之前的轮次（保留最近轮次原文）
+SESSION_MEMORY_COMPACT_BATCH = 20              # 每次最多合并的轮次数
+SESSION_MEMORY_SUMMARY_MAX_LENGTH = 500        # 压缩摘要的最大长度
+SESSION_MEMORY_MAINTENANCE_INTERVAL_MINUTES = 30  # 维护任务间隔
+
+# 网页数据异步摄取（上传接口持久化后立即返回 202，由后台 worker 完成分析、入库与向量化）
+ENABLE_ASYNC_INGESTION = True       # 设置为 False 则在请求内同步处理（与 ?sync=1 相同）
+INGESTION_WORKERS = 2               # 后台 worker 数量（同时处理的网页数）
+INGESTION_MAX_ATTEMPTS = 3          # 单个任务的最大尝试次数
+INGESTION_RETRY_DELAY_SECONDS = 5   # 重试退避的初始等待时间（按次数翻倍）
+INGESTION_JOB_RETENTION_DAYS = 7    # 已结束任务的保留天数
+INGESTION_BATCH_MAX_ITEMS = 1000    # 批量上传单次最多条数
+INGESTION_BATCH_MAX_BYTES = 64 * 1024 * 1024  # 批量上传 gzip 解压后的大小上限
+INGESTION_COALESCE_SECONDS = 5      # 同一页面（URL + 会话）的上传在静默期内合并，只处理最终版本（0 表示不合并）
+INGESTION_COALESCE_MAX_WAIT_SECONDS = 60  # 页面持续有新上传时，从第一次上传起最多推迟的时间
+
+# 网页正文提取（去除导航、页脚、Cookie 提示与重复块，清理后的文本用于 LLM 分析与 embedding）
+ENABLE_CONTENT_CLEANING = True
+ENABLE_BOILERPLATE_LEARNING = True  # 按站点学习样板（多数页面都出现的菜单、页脚、侧栏）
+BOILERPLATE_MIN_PAGES = 5           # 同一站点至少见过多少页面后才开始删除样板
+BOILERPLATE_MIN_RATIO = 0.5         # 出现在该比例以上页面中的文本块视为样板
+BOILERPLATE_MAX_BLOCK_CHARS = 300   # 参与样板统计的文本块最大长度（更长的段落视为正文）
+BOILERPLATE_RETENTION_DAYS = 30     # 只出现过一次的文本块统计的保留天数
+
+# 网页版本链（同一 URL 的 dom-diff 应用到当前版本上，向量库中每个页面只保留当前版本，只对变化的分块重新 embedding）
+ENABLE_PAGE_VERSIONING = True
+PAGE_VERSION_RETENTION_DAYS = 30    # 超过该天数未更新的页面不再保留当前文本（已写入的向量保留）
+
+# URL 黑名单（命中的页面不分析、不入库，检索与生成时也会过滤已存储的数据）
+ENABLE_URL_BLACKLIST = True
+URL_BLACKLIST_RELOAD_SECONDS = 60   # 定期从数据库重新加载的间隔（本进程内增删会立即生效）
+
 # ============================================================================
 # ⚙️ 功能开关（根据 API Key 自动判断）
 # ============================================================================
@@ -108,6 +246,8 @@ ENABLE_SCHEDULER_TODO = True       # 每30分钟生成待办任务
 ENABLE_SCHEDULER_TIP = True        # 每小时整生成智能提示
 ENABLE_SCHEDULER_REPORT = True     # 每天早上8点生成日报
 ENABLE_SCHEDULER_DAILY_FEED = True # 每天早上8点生成每日Feed
+ENABLE_SCHEDULER_VECTOR_RECONCILE = True  # 定期校验并修复 SQLite 与向量库的一致性
+ENABLE_SCHEDULER_SESSION_MEMORY = True     # 定期清理过期会话记忆并压缩旧轮次
 
 # ============================================================================
 # 📡 事件推送配置
@@ -132,6 +272,9 @@ ENABLE_EVENT_FEED = True
 # 系统状态事件推送
 ENABLE_EVENT_SYSTEM_STATUS = False
 
+# 网页数据摄取完成/失败事件推送（插件每次浏览都会上传，默认关闭以免刷屏，可通过任务状态接口查询）
+ENABLE_EVENT_INGESTION = False
+
 # ============================================================================
 # 📊 启动提示
 # ============================================================================
@@ -0,0 +1,348 @@
+"""
+本地 OpenAI 兼容桩服务（用于离线压测与回归）
+
+实现 /v1/chat/completions（流式与非流式）、/v1/embeddings 与 /v1/models，可配置延迟与错误注入。
+配合 LLM_RECORD_DIR 录制的真实请求/响应，--replay 按请求键回放，使上传、生成与智能对话流水线可以离线、可复现地运行。
+
+用法：
+    python llm_stub_server.py --port 8090 --latency-ms 300 --error-rate 0.05
+    python llm_stub_server.py --replay data/llm_fixtures --strict
+
+然后把 LLM_BASE_URL / EMBEDDING_BASE_URL 设置为 http://127.0.0.1:8090/v1（API Key 任意非空值）。
+运行中可通过 POST /stub/config 调整延迟与错误注入参数，GET /stub/stats 查看请求统计
+"""
+
+import sys
+from pathlib import Path
+
+# 添加项目路径
+_backend_dir = Path(__file__).parent
+if str(_backend_dir) not in sys.path:
+    sys.path.insert(0, str(_backend_dir))
+
+import base64
+import hashlib
+import json
+import random
+import re
+import struct
+import threading
+import time
+import uuid
+from typing import Dict, Any, List, Optional
+from flask import Flask, Response, jsonify, request
+from utils.llm_recorder import fixture_key, load_fixtures
+
+app = Flask(__name__)
+
+# 运行参数（可通过 /stub/config 修改）
+settings: Dict[str, Any] = {
+    "latency_ms": 0,           # 响应前的固定延迟（流式为首个片段前的延迟）
+    "jitter_ms": 0,            # 在固定延迟上叠加的随机延迟
+    "chunk_delay_ms": 20,      # 流式片段之间的间隔
+    "chunk_chars": 8,          # 每个流式片段的字符数
+    "error_rate": 0.0,         # 注入错误的概率
+    "error_statuses": [500, 429],
+    "retry_after": 1,          # 注入 429 时返回的 Retry-After 秒数
+    "embedding_dims": 1536,
+    "strict": False,           # 回放模式下找不到录制时返回 404，而不是合成响应
+}
+
+fixtures: Dict[str, Dict[str, Any]] = {}
+_rng = random.Random()
+_rng_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stats = {"chat": 0, "embedding": 0, "replayed": 0, "synthetic": 0, "injected_errors": 0, "fixture_misses": 0}
+
+
+def _count(name: str) -> None:
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def _random() -> float:
+    with _rng_lock:
+        return _rng.random()
+
+
+def _sleep_latency() -> None:
+    delay = settings["latency_ms"]
+    if settings["jitter_ms"]:
+        delay += _random() * settings["jitter_ms"]
+    if delay > 0:
+        time.sleep(delay / 1000.0)
+
+
+def _error_response(status: int, message: str, error_type: str, headers: Dict[str, str] = None) -> Response:
+    response = jsonify({"error": {"message": message, "type": error_type, "code": status}})
+    response.status_code = status
+    for name, value in (headers or {}).items():
+        response.headers[name] = value
+    return response
+
+
+def _injected_error() -> Optional[Response]:
+    """按 error_rate 注入错误（429 附带 Retry-After）"""
+    if settings["error_rate"] <= 0 or _random() >= settings["error_rate"]:
+        return None
+    _count("injected_errors")
+    with _rng_lock:
+        status = int(_rng.choice(settings["error_statuses"]))
+    headers = {"retry-after": str(settings["retry_after"])} if status == 429 else None
+    return _error_response(status, f"Injected error {status}", "stub_injected_error", headers)
+
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+# ==================== 合成响应 ====================
+# 未命中录制时按提示词中出现的输出格式生成结构正确的占位内容，使各生成器能走完解析与入库流程
+
+def _synthetic_json(text: str, seed: str) -> Any:
+    tag = seed[:8]
+    if '"tips"' in text:
+        return {"tips": [{"title": f"Stub tip {tag}", "content": "Synthetic tip content.", "type": "smart", "source_urls": []}]}
+    if '"recommendations"' in text:
+        return {"recommendations": [{
+            "title": f"Stub recommendation {tag}",
+            "content": "Synthetic recommendation content.",
+            "source_url": "https://example.com/",
+            "category": "stub",
+            "learning_value": "Synthetic learning value."
+        }]}
+    if '"keywords"' in text or "keyword" in text.lower():
+        return {"keywords": ["stub", tag]}
+    if "has_conflict" in text:
+        return {"has_conflict": False, "conflict_todos": [], "query_time": {}, "conflict_reason": ""}
+    return {"title": f"Stub {tag}", "summary": "Synthetic summary.", "description": "Synthetic description.", "keywords": ["stub"]}
+
+
+def _synthetic_chat_content(body: Dict[str, Any], key: str) -> str:
+    messages = body.get("messages") or []
+    text = "\n".join(str(message.get("content", "")) for message in messages if isinstance(message, dict))
+    wants_json = (body.get("response_format") or {}).get("type") == "json_object" or "json" in text.lower()
+    if not wants_json:
+        return f"Stub response {key[:8]}."
+
+    # 待办生成要求顶层数组（提示、推荐的提示词中也会提到待办，先排除）
+    if not re.search(r'"tips"|"recommendations"', text) and re.search(r"task insight|待办|todo", text, re.IGNORECASE):
+        return json.dumps([{"title": f"Stub todo {key[:8]}", "description": "Synthetic todo.", "priority": 1}])
+    return json.dumps(_synthetic_json(text, key), ensure_ascii=False)
+
+
+def _synthetic_embedding(text: str) -> List[float]:
+    """由文本哈希生成确定性的单位向量（相同文本得到相同向量）"""
+    seed = int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:16], 16)
+    rng = random.Random(seed)
+    vector = [rng.gauss(0, 1) for _ in range(settings["embedding_dims"])]
+    norm = sum(value * value for value in vector) ** 0.5 or 1.0
+    return [value / norm for value in vector]
+
+
+def _lookup(kind: str, body: Dict[str, Any]) -> tuple:
+    """返回 (请求键, 录制)；回放模式下未命中时录制为 None"""
+    key = fixture_key(kind, body)
+    fixture = fixtures.get(key)
+    if fixture is not None:
+        _count("replayed")
+    elif fixtures:
+        _count("fixture_misses")
+    return key, fixture
+
+
+# ==================== 接口 ====================
+
+@app.route('/v1/models', methods=['GET'])
+def list_models():
+    return jsonify({"object": "list", "data": [{"id": "stub-model", "object": "model", "owned_by": "stub"}]})
+
+
+@app.route('/v1/chat/completions', methods=['POST'])
+def chat_completions():
+    body = request.get_json(silent=True) or {}
+    _count("chat")
+
+    error = _injected_error()
+    if error is not None:
+        _sleep_latency()
+        return error
+
+    key, fixture = _lookup("chat", body)
+    if fixture is None and settings["strict"]:
+        return _error_response(404, f"No recorded fixture for request {key}", "fixture_not_found")
+
+    model = body.get("model") or "stub-model"
+    if fixture is not None:
+        recorded = fixture["response"]
+        choice = (recorded.get("choices") or [{}])[0]
+        content = (choice.get("message") or {}).get("content") or ""
+        finish_reason = choice.get("finish_reason") or "stop"
+        usage = recorded.get("usage")
+    else:
+        _count("synthetic")
+        content = _synthetic_chat_content(body, key)
+        finish_reason = "stop"
+        usage = None
+
+    prompt_text = json.dumps(body.get("messages") or [], ensure_ascii=False)
+    usage = usage or {
+        "prompt_tokens": _estimate_tokens(prompt_text),
+        "completion_tokens": _estimate_tokens(content),
+        "total_tokens": _estimate_tokens(prompt_text) + _estimate_tokens(content),
+    }
+    completion_id = f"chatcmpl-stub-{uuid.uuid4().hex[:12]}"
+    created = int(time.time())
+
+    if not body.get("stream"):
+        _sleep_latency()
+        return jsonify({
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": finish_reason
+            }],
+            "usage": usage
+        })
+
+    include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+
+    def _chunk(delta: Dict[str, Any], finish: Optional[str] = None, chunk_usage: Dict[str, Any] = None) -> str:
+        payload = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [] if chunk_usage else [{"index": 0, "delta": delta, "finish_reason": finish}],
+        }
+        if chunk_usage:
+            payload["usage"] = chunk_usage
+        return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+    def _generate():
+        _sleep_latency()
+        yield _chunk({"role": "assistant", "content": ""})
+        size = max(1, int(settings["chunk_chars"]))
+        for start in range(0, len(content), size):
+            if start and settings["chunk_delay_ms"] > 0:
+                time.sleep(settings["chunk_delay_ms"] / 1000.0)
+            yield _chunk({"content": content[start:start + size]})
+        yield _chunk({}, finish=finish_reason)
+        if include_usage:
+            yield _chunk({}, chunk_usage=usage)
+        yield "data: [DONE]\n\n"
+
+    return Response(_generate(), mimetype='text/event-stream')
+
+
+@app.route('/v1/embeddings', methods=['POST'])
+def embeddings():
+    body = request.get_json(silent=True) or {}
+    _count("embedding")
+
+    error = _injected_error()
+    if error is not None:
+        _sleep_latency()
+        return error
+
+    inputs = body.get("input")
+    texts = [inputs] if isinstance(inputs, str) else list(inputs or [])
+
+    key, fixture = _lookup("embedding", body)
+    if fixture is None and settings["strict"]:
+        return _error_response(404, f"No recorded fixture for request {key}", "fixture_not_found")
+
+    if fixture is not None:
+        recorded = sorted(fixture["response"].get("data") or [], key=lambda item: item.get("index", 0))
+        vectors = [item["embedding"] for item in recorded]
+    else:
+        _count("synthetic")
+        vectors = [_synthetic_embedding(str(text)) for text in texts]
+
+    # OpenAI SDK 默认请求 base64 编码（float32 小端序）
+    encode_base64 = body.get("encoding_format") == "base64"
+    data = []
+    for index, vector in enumerate(vectors):
+        if encode_base64 and isinstance(vector, list):
+            vector = base64.b64encode(struct.pack(f"<{len(vector)}f", *vector)).decode("ascii")
+        data.append({"object": "embedding", "index": index, "embedding": vector})
+
+    prompt_tokens = sum(_estimate_tokens(str(text)) for text in texts)
+    _sleep_latency()
+    return jsonify({
+        "object": "list",
+        "data": data,
+        "model": body.get("model") or "stub-embedding",
+        "usage": {"prompt_tokens": prompt_tokens, "total_tokens": prompt_tokens}
+    })
+
+
+@app.route('/stub/config', methods=['GET', 'POST'])
+def stub_config():
+    """查看或修改运行参数（只接受已有的参数名）"""
+    if request.method == 'POST':
+        updates = request.get_json(silent=True) or {}
+        unknown = [name for name in updates if name not in settings]
+        if unknown:
+            return _error_response(400, f"Unknown settings: {', '.join(unknown)}", "invalid_request_error")
+        settings.update(updates)
+    return jsonify(settings)
+
+
+@app.route('/stub/stats', methods=['GET'])
+def stub_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["fixtures"] = len(fixtures)
+    return jsonify(stats)
+
+
+def main():
+    """主函数"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="本地 OpenAI 兼容桩服务（延迟/错误注入、按请求键回放录制）")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency-ms", type=float, default=0, help="响应前的固定延迟")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="叠加的随机延迟上限")
+    parser.add_argument("--chunk-delay-ms", type=float, default=20, help="流式片段间隔")
+    parser.add_argument("--chunk-chars", type=int, default=8, help="每个流式片段的字符数")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="注入错误的概率（0-1）")
+    parser.add_argument("--error-statuses", default="500,429", help="注入的状态码，逗号分隔")
+    parser.add_argument("--retry-after", type=float, default=1, help="注入 429 时的 Retry-After 秒数")
+    parser.add_argument("--embedding-dims", type=int, default=1536, help="合成向量的维度")
+    parser.add_argument("--replay", default=None, help="回放 LLM_RECORD_DIR 录制的目录")
+    parser.add_argument("--strict", action="store_true", help="回放未命中时返回 404，而不是合成响应")
+    parser.add_argument("--seed", type=int, default=None, help="错误注入与随机延迟的随机种子")
+
+    args = parser.parse_args()
+
+    settings.update({
+        "latency_ms": args.latency_ms,
+        "jitter_ms": args.jitter_ms,
+        "chunk_delay_ms": args.chunk_delay_ms,
+        "chunk_chars": args.chunk_chars,
+        "error_rate": args.error_rate,
+        "error_statuses": [int(code) for code in args.error_statuses.split(",") if code.strip()],
+        "retry_after": args.retry_after,
+        "embedding_dims": args.embedding_dims,
+        "strict": args.strict,
+    })
+    if args.seed is not None:
+        _rng.seed(args.seed)
+
+    if args.replay:
+        fixtures.update(load_fixtures(args.replay))
+        print(f"已加载 {len(fixtures)} 条录制: {args.replay}")
+
+    print(f"桩服务地址: http://{args.host}:{args.port}/v1")
+    app.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+重建向量索引的工具脚本（更换 EMBEDDING_MODEL 后使用）
+"""
+
+import sys
+from pathlib import Path
+
+# 添加项目路径
+_backend_dir = Path(__file__).parent
+if str(_backend_dir) not in sys.path:
+    sys.path.insert(0, str(_backend_dir))
+
+from utils.db import init_db
+from utils.reindex import start_reindex, cancel_reindex, get_reindex_status
+from utils.helpers import get_logger
+import config
+
+logger = get_logger(__name__)
+
+
+def print_status(status):
+    """打印重建状态"""
+    job = status.get("job")
+    print(f"\n{'='*60}")
+    print(f"向量索引状态")
+    print(f"{'='*60}")
+    print(f"当前集合: {status['active_collection']}")
+    print(f"索引模型: {status['indexed_model']}")
+    print(f"配置模型: {status['configured_model']}")
+    print(f"模型已变化: {'是' if status['model_changed'] else '否'}")
+    if job:
+        print(f"最近任务: #{job['id']} {job['status']} ({job['source_collection']} -> {job['target_collection']})")
+        print(f"进度: {job['processed']}/{job['total']}")
+        if job.get('error'):
+            print(f"错误: {job['error']}")
+    print(f"{'='*60}\n")
+
+
+def main():
+    """主函数"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="使用当前 EMBEDDING_MODEL 重建向量索引（写入影子集合，完成后切换）")
+    parser.add_argument("--status", action="store_true", help="只查看状态")
+    parser.add_argument("--cancel", action="store_true", help="取消未完成的任务")
+    parser.add_argument("--restart", action="store_true", help="放弃未完成的任务，从头开始")
+    parser.add_argument("--batch-size", type=int, default=None, help=f"每次 embedding 请求的文本数（默认 {config.REINDEX_BATCH_SIZE}）")
+    parser.add_argument("--concurrency", type=int, default=None, help=f"并发 embedding 请求数（默认 {config.REINDEX_CONCURRENCY}）")
+
+    args = parser.parse_args()
+
+    try:
+        init_db()
+
+        if args.status:
+            print_status(get_reindex_status())
+            return
+
+        if args.cancel:
+            result = cancel_reindex()
+            print(("✅ " if result["success"] else "❌ ") + result["message"])
+            return
+
+        print_status(get_reindex_status())
+        print("开始重建向量索引（可随时中断，再次运行将从断点续跑）...")
+
+        result = start_reindex(
+            batch_size=args.batch_size,
+            concurrency=args.concurrency,
+            restart=args.restart,
+            background=False
+        )
+
+        if not result["success"]:
+            print(f"❌ {result['message']}")
+            return
+
+        job = result["job"]
+        if job and job["status"] == "completed":
+            print(f"✅ 重建完成！当前集合: {job['target_collection']}（{job['processed']} 条）")
+        else:
+            print(f"❌ 重建未完成（状态: {job['status'] if job else 'unknown'}），请查看日志获取详细信息。")
+
+    except Exception as e:
+        logger.exception(f"重建向量索引时出错: {e}")
+        print(f"\n❌ 错误: {e}")
+
+
+if __name__ == "__main__":
+    main()
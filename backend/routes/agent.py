@@ -11,11 +11,28 @@ if str(_backend_dir) not in sys.path:
 import uuid
 import json
 import asyncio
+from dataclasses import replace
 from datetime import datetime, timedelta
-from flask import Blueprint, request, Response, stream_with_context
+from flask import Blueprint, request, Response, stream_with_context, g
 import config
-from utils.helpers import convert_resp, auth_required, get_logger
-from utils.llm import get_openai_client
+from utils.helpers import (
+    convert_resp,
+    auth_required,
+    get_logger,
+    estimate_tokens,
+    truncate_text_to_tokens,
+    calculate_available_context_tokens,
+    pack_context_items,
+    score_context_item
+)
+from utils.llm import (
+    get_openai_client,
+    get_async_openai_client,
+    set_llm_priority,
+    reset_llm_priority,
+    PRIORITY_INTERACTIVE
+)
+from utils.llm_cache import cached_chat_completion_async
 from typing import Dict, Any, List, Optional
 
 # 导入 llm_strategy 相关类
@@ -34,6 +51,23 @@ logger = get_logger(__name__)
 
 agent_bp = Blueprint('agent', __name__, url_prefix='/api/agent')
 
+
+@agent_bp.before_request
+def _mark_interactive():
+    """对话类请求的 LLM 调用优先于后台生成任务"""
+    g.llm_priority_token = set_llm_priority(PRIORITY_INTERACTIVE)
+
+
+@agent_bp.teardown_request
+def _reset_priority(exc=None):
+    token = g.pop('llm_priority_token', None)
+    if token is not None:
+        try:
+            reset_llm_priority(token)
+        except ValueError:
+            # 流式响应可能在其他上下文中结束，此时无需恢复
+            pass
+
 # 工作流状态存储（简化实现，实际应该使用数据库或 Redis）
 workflows = {}
 
@@ -103,8 +137,9 @@ async def process_query_with_strategy(
             strategy.current_page_url = current_page_url
             logger.info(f"Current page URL set: {current_page_url}")
             
-            # 如果提供了页面内容，存储到向量数据库
-            if page_content and page_content.strip() and config.ENABLE_VECTOR_STORAGE:
+            # 如果提供了页面内容，存储到向量数据库（黑名单中的页面不存储）
+            from utils.url_blacklist import is_url_blacklisted
+            if page_content and page_content.strip() and config.ENABLE_VECTOR_STORAGE and not is_url_blacklisted(page_url):
                 try:
                     from utils.db import insert_web_data
                     from utils.vectorstore import add_web_data_to_vectorstore
@@ -247,19 +282,32 @@ async def process_query_with_strategy(
             logger.info(f"Exiting loop: use_tools={use_tools}, iteration={iteration}")
             break
     
-    # ========== 步骤 6: 将关键信息存储到会话记忆（补充） ==========
+    # ========== 步骤 6 / 6.3 / 6.5 互不依赖，并行执行 ==========
+    async def _skip():
+        return None
+    
+    # 步骤 6: 将关键信息存储到会话记忆（补充）
     if use_tools and context.items:
         logger.info(f"Storing context to session memory for session: {session_id}")
-        await strategy.store_to_session_memory(session_id, context, query)
-    
-    # ========== 步骤 6.3: 优化用户提示词（新增） ==========
-    optimized_query = query  # 默认使用原查询
-    optimization_result = None
+        store_task = strategy.store_to_session_memory(session_id, context, query)
+    else:
+        store_task = _skip()
     
+    # 步骤 6.3: 优化用户提示词（新增）
     if optimize_prompt:
         logger.info(f"Optimizing user prompt (context items: {len(context.items)})")
-        optimization_result = await optimize_user_prompt(query, context, session_id)
-        
+        optimize_task = optimize_user_prompt(query, context, session_id)
+    else:
+        optimize_task = _skip()
+    
+    # 步骤 6.5: 检查时间冲突（新增）：从上下文中提取todo信息，检查是否有时间冲突（同步调用，放到线程池）
+    loop = asyncio.get_running_loop()
+    conflict_task = loop.run_in_executor(None, check_schedule_conflict, context, query)
+    
+    _, optimization_result, conflict_check_result = await asyncio.gather(store_task, optimize_task, conflict_task)
+    
+    optimized_query = query  # 默认使用原查询
+    if optimization_result:
         if optimization_result.get("success"):
             optimized_query = optimization_result.get("optimized_query", query)
             optimization_reason = optimization_result.get("optimization_reason", "")
@@ -270,9 +318,6 @@ async def process_query_with_strategy(
         else:
             logger.warning(f"Prompt optimization failed: {optimization_result.get('error', 'unknown error')}")
     
-    # ========== 步骤 6.5: 检查时间冲突（新增） ==========
-    # 从上下文中提取todo信息，检查是否有时间冲突
-    conflict_check_result = check_schedule_conflict(context, query)
     if conflict_check_result.get("has_conflict"):
         # 发现冲突，直接返回提醒，不生成回答
         return {
@@ -294,12 +339,12 @@ async def process_query_with_strategy(
     # 7. 构建最终响应
     # 构建上下文摘要
     if context.items:
-        context_summary = "\n\n".join([
-            f"[{item.source}] {item.content[:500]}"
-            for item in context.items[:10]  # 最多10个上下文项
-        ])
         # 使用优化后的查询（如果启用了优化）
         final_query = optimized_query if optimize_prompt else query
+        context_summary = "\n\n".join(
+            _render_context_item(item)
+            for item in _pack_answer_context(context.items, messages, final_query)
+        )
         if optimize_prompt and final_query != query:
             logger.info(f"Final query using optimized prompt: {final_query}")
         user_message = f"""用户问题: {final_query}
@@ -314,7 +359,7 @@ async def process_query_with_strategy(
     messages.append({"role": "user", "content": user_message})
     
     # 8. 调用 LLM 生成最终回答
-    client = get_openai_client()
+    client = get_async_openai_client()
     if not client:
         return {
             "success": False,
@@ -324,7 +369,7 @@ async def process_query_with_strategy(
     # 根据 stream_final_response 参数决定是否使用流式
     if stream_final_response:
         # 使用流式 API
-        stream = client.chat.completions.create(
+        stream = await client.chat.completions.create(
             model=config.LLM_MODEL,
             messages=messages,
             temperature=0.7,
@@ -334,14 +379,14 @@ async def process_query_with_strategy(
         
         # 收集流式响应
         final_response = ""
-        for chunk in stream:
+        async for chunk in stream:
             if chunk.choices[0].delta.content:
                 final_response += chunk.choices[0].delta.content
         
         final_response = final_response.strip()
     else:
         # 非流式 API
-        response = client.chat.completions.create(
+        response = await client.chat.completions.create(
             model=config.LLM_MODEL,
             messages=messages,
             temperature=0.7,
@@ -386,6 +431,36 @@ async def process_query_with_strategy(
 
 
 # ========== 新增：存储迭代上下文到向量数据库 ==========
+def _render_context_item(item: ContextItem) -> str:
+    return f"[{item.source}] {item.content}"
+
+
+def _pack_answer_context(
+    items: List[ContextItem],
+    messages: List[Dict[str, Any]],
+    query: str
+) -> List[ContextItem]:
+    """按相关度与时效性把上下文项装入最终回答的 token 预算"""
+    used_tokens = estimate_tokens(json.dumps(messages, ensure_ascii=False)) + estimate_tokens(query)
+    budget = calculate_available_context_tokens('agent', used_tokens)
+
+    def _shrink(item: ContextItem, target_tokens: int) -> Optional[ContextItem]:
+        content_budget = target_tokens - estimate_tokens(f"[{item.source}] ")
+        if content_budget < 20:
+            return None
+        return replace(item, content=truncate_text_to_tokens(item.content, content_budget))
+
+    packed = pack_context_items(
+        items,
+        budget,
+        render=_render_context_item,
+        value=lambda item: score_context_item({**item.metadata, "relevance_score": item.relevance_score}),
+        shrink=_shrink
+    )
+    logger.info(f"Packed {len(packed)}/{len(items)} context items into {budget} tokens")
+    return packed
+
+
 async def store_iteration_context_to_vectorstore(
     session_id: str,
     iteration: int,
@@ -409,7 +484,6 @@ async def store_iteration_context_to_vectorstore(
             return
         
         from utils.vectorstore import add_session_memory_to_vectorstore
-        from utils.llm import generate_embedding
         
         # 将本轮上下文合并为一个文本
         context_texts = []
@@ -429,7 +503,8 @@ async def store_iteration_context_to_vectorstore(
         combined_context = "\n\n".join(context_texts)
         
         # 构建记忆内容：用户查询 + 检索到的上下文
-        memory_content = f"用户查询: {query}\n\n检索到的上下文（第{iteration}轮）:\n{combined_context}"
+        # 轮次只记录在元数据中，相同查询与上下文在不同轮次重复出现时按内容去重
+        memory_content = f"用户查询: {query}\n\n检索到的上下文:\n{combined_context}"
         
         # 存储到向量数据库
         success = add_session_memory_to_vectorstore(
@@ -544,7 +619,8 @@ async def store_conversation_to_vectorstore(
 async def optimize_user_prompt(
     original_query: str,
     context: ContextCollection,
-    session_id: str
+    session_id: str,
+    use_cache: bool = True
 ) -> Dict[str, Any]:
     """
     基于上下文和大模型优化用户提示词
@@ -553,6 +629,7 @@ async def optimize_user_prompt(
         original_query: 用户原始查询
         context: 已收集的上下文信息
         session_id: 会话ID
+        use_cache: 是否使用响应缓存（相同查询与上下文只请求一次）
     
     Returns:
         {
@@ -563,7 +640,7 @@ async def optimize_user_prompt(
         }
     """
     try:
-        client = get_openai_client()
+        client = get_async_openai_client()
         if not client:
             logger.warning("LLM unavailable for prompt optimization")
             return {
@@ -621,7 +698,9 @@ async def optimize_user_prompt(
         )
         
         # 调用 LLM 优化
-        response = client.chat.completions.create(
+        result_text = await cached_chat_completion_async(
+            client,
+            use_cache=use_cache,
             model=config.LLM_MODEL,
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -633,7 +712,7 @@ async def optimize_user_prompt(
         )
         
         # 解析结果
-        result_text = response.choices[0].message.content.strip()
+        result_text = result_text.strip()
         
         # 打印模型的原始输出（用于调试）
         logger.info(f"LLM raw response for prompt optimization:")
@@ -1346,6 +1425,7 @@ def optimize_prompt_api():
     请求参数：
     - prompt (必填): 原始提示词
     - url (必填): 当前页面 URL（用于检索已爬取的页面数据）
+    - use_cache (可选): 是否使用响应缓存，默认 true
     
     返回：
     {
@@ -1376,8 +1456,11 @@ def optimize_prompt_api():
         
         logger.info(f"Optimizing prompt for URL: {url}, prompt: '{prompt[:50]}...'")
         
+        # JSON 中的 use_cache 可能是布尔值、数字或字符串（"false"、"0"）
+        use_cache = str(data.get('use_cache', 'true')).lower() in ('1', 'true', 'yes')
+        
         # 执行优化
-        result = run_async(optimize_prompt_simple(prompt, url))
+        result = run_async(optimize_prompt_simple(prompt, url, use_cache=use_cache))
         
         return convert_resp(data=result)
         
@@ -1386,13 +1469,14 @@ def optimize_prompt_api():
         return convert_resp(code=500, status=500, message=f"优化失败: {str(e)}")
 
 
-async def optimize_prompt_simple(prompt: str, url: str) -> Dict[str, Any]:
+async def optimize_prompt_simple(prompt: str, url: str, use_cache: bool = True) -> Dict[str, Any]:
     """
     简化版提示词优化（基于页面上下文）
     
     Args:
         prompt: 原始提示词
         url: 当前页面 URL（用于检索已爬取的页面内容）
+        use_cache: 是否使用响应缓存
     
     Returns:
         {
@@ -1402,7 +1486,7 @@ async def optimize_prompt_simple(prompt: str, url: str) -> Dict[str, Any]:
         }
     """
     try:
-        client = get_openai_client()
+        client = get_async_openai_client()
         if not client:
             return {"success": False, "error": "LLM服务不可用"}
         
@@ -1487,7 +1571,9 @@ async def optimize_prompt_simple(prompt: str, url: str) -> Dict[str, Any]:
 如果提示词已经很清晰，可以进行微调使其更专业、更结构化。"""
         
         # ========== 步骤 3: 调用 LLM 优化 ==========
-        response = client.chat.completions.create(
+        result_text = await cached_chat_completion_async(
+            client,
+            use_cache=use_cache,
             model=config.LLM_MODEL,
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -1499,7 +1585,7 @@ async def optimize_prompt_simple(prompt: str, url: str) -> Dict[str, Any]:
         )
         
         # 解析结果
-        result_text = response.choices[0].message.content.strip()
+        result_text = result_text.strip()
         
         # 打印模型的原始输出（用于调试）
         logger.info(f"LLM raw response for prompt optimization:")
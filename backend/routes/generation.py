@@ -491,8 +491,8 @@ def manual_generate_tips():
             tip_count = len(tip_ids)
             logger.info(f"Generated {tip_count} tips")
             
-            # 发布事件
-            if tip_count > 0:
+            # 发布事件（流式生成时已逐条发布）
+            if tip_count > 0 and not result.get('published'):
                 # 使用第一个 tip 的 title
                 first_tip_title = tips[0].get('title', '智能提示') if tips else '智能提示'
                 
@@ -541,8 +541,8 @@ def manual_generate_todos():
             todo_count = len(todo_ids)
             logger.info(f"Generated {todo_count} todos")
             
-            # 发布事件
-            if todo_count > 0:
+            # 发布事件（流式生成时已逐条发布）
+            if todo_count > 0 and not result.get('published'):
                 # 使用第一个 todo 的 title
                 first_todo_title = todos[0].get('title', '待办任务') if todos else '待办任务'
                 
@@ -678,6 +678,7 @@ def manual_generate_daily_feed():
     try:
         # 获取查询参数
         lookback_hours = request.args.get('lookback_hours', 24, type=int)
+        use_cache = request.args.get('use_cache', 'true').lower() != 'false'
         date_param = request.args.get('date')  # 可选的日期参数，格式：YYYY-MM-DD
         
         # 如果指定了日期，计算该日期的时间范围
@@ -702,7 +703,7 @@ def manual_generate_daily_feed():
         from utils.generation.daily_feed_gen import generate_daily_feed
         
         # 生成每日Feed（会自动存储到数据库）
-        result = asyncio.run(generate_daily_feed(lookback_hours))
+        result = asyncio.run(generate_daily_feed(lookback_hours, use_cache=use_cache))
         
         if result.get('success'):
             cards = result.get('cards', [])
@@ -12,7 +12,7 @@ from datetime import datetime
 _backend_dir = Path(__file__).parent.parent
 if str(_backend_dir) not in sys.path:
     sys.path.insert(0, str(_backend_dir))
-from utils.llm import get_openai_client
+from utils.llm import get_async_openai_client
 from utils.helpers import get_logger
 import config
 from tools.base import ToolsExecutor
@@ -128,7 +128,7 @@ class LLMContextStrategy:
         核心功能：分析用户意图，决定需要调用哪些工具
         """
         try:
-            client = get_openai_client()
+            client = get_async_openai_client()
             if not client:
                 logger.error("OpenAI client not available")
                 return [], {"error": "LLM服务不可用"}
@@ -169,7 +169,7 @@ class LLMContextStrategy:
             if not self.all_tools:
                 logger.warning("No tools available for LLM to call!")
             
-            response = client.chat.completions.create(
+            response = await client.chat.completions.create(
                 model=config.LLM_MODEL,
                 messages=messages,
                 tools=self.all_tools if self.all_tools else None,  # 如果没有工具，传 None
@@ -222,7 +222,7 @@ class LLMContextStrategy:
         核心功能：评估已有上下文是否足够回答问题
         """
         try:
-            client = get_openai_client()
+            client = get_async_openai_client()
             if not client:
                 logger.warning("LLM unavailable, defaulting to INSUFFICIENT")
                 return ContextSufficiency.UNKNOWN
@@ -248,7 +248,7 @@ class LLMContextStrategy:
 评估结果:"""
             
             # 3. 调用 LLM
-            response = client.chat.completions.create(
+            response = await client.chat.completions.create(
                 model=config.LLM_MODEL,
                 messages=[
                     {"role": "system", "content": system_prompt},
@@ -529,7 +529,7 @@ class LLMContextStrategy:
             return tool_results, {"message": "结果数量较少，跳过验证"}
         
         try:
-            client = get_openai_client()
+            client = get_async_openai_client()
             if not client:
                 logger.warning("LLM unavailable, returning all results")
                 return tool_results, {"message": "验证服务不可用，返回所有结果"}
@@ -561,7 +561,7 @@ class LLMContextStrategy:
 请评估每个结果的相关性，返回相关结果ID列表。"""
             
             # 3. 调用 LLM 验证
-            response = client.chat.completions.create(
+            response = await client.chat.completions.create(
                 model=config.LLM_MODEL,
                 messages=[
                     {"role": "system", "content": system_prompt},
@@ -619,8 +619,8 @@ class LLMContextStrategy:
                 logger.debug("Session memory tool not available")
                 return []
             
-            # 检索会话记忆
-            result = memory_tool.execute(
+            # 检索会话记忆（同步工具在线程池中执行，不阻塞事件循环）
+            result = await memory_tool.execute_async(
                 action="retrieve",
                 session_id=session_id,
                 query=query,
@@ -689,8 +689,8 @@ class LLMContextStrategy:
             for item in user_profile_items:
                 content = item.content.strip()
                 if content and len(content) > 0:
-                    # 存储到会话记忆
-                    result = memory_tool.execute(
+                    # 存储到会话记忆（同步工具在线程池中执行，不阻塞事件循环）
+                    result = await memory_tool.execute_async(
                         action="store",
                         session_id=session_id,
                         content=content,
@@ -0,0 +1,62 @@
+"""
+LLM / Embedding 调用监控接口路由
+"""
+
+from flask import Blueprint, request, Response
+from utils.helpers import convert_resp, auth_required, get_logger
+
+logger = get_logger(__name__)
+
+metrics_bp = Blueprint('metrics', __name__, url_prefix='/api/metrics')
+
+
+@metrics_bp.route('', methods=['GET'])
+@auth_required
+def get_metrics():
+    """进程启动以来的累计指标（Prometheus 文本格式）"""
+    try:
+        from utils.llm_metrics import render_prometheus
+
+        return Response(render_prometheus(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+    except Exception as e:
+        logger.exception(f"Error rendering metrics: {e}")
+        return convert_resp(code=500, status=500, message=f"获取监控指标失败: {str(e)}")
+
+
+@metrics_bp.route('/summary', methods=['GET'])
+@auth_required
+def get_metrics_summary():
+    """
+    按调用点汇总最近一段时间的调用情况
+
+    查询参数：
+    - hours (可选): 统计窗口（小时），默认 24
+    - call_site (可选): 只看指定调用点
+
+    返回：延迟分位数与直方图、token 用量、估算费用、错误、重试与缓存命中，
+    以及调度器、LLM 端点健康状况、Embedding 批处理与响应缓存的当前状态
+    """
+    try:
+        from utils.llm_metrics import get_metrics_summary as build_summary
+        from utils.llm import get_llm_governor_stats
+        from utils.embedding_batcher import get_embedding_batcher_stats
+        from utils.llm_router import get_llm_endpoint_stats
+        from utils.db import get_llm_cache_stats
+
+        hours = request.args.get('hours', 24, type=float)
+        if hours is None or hours <= 0:
+            return convert_resp(code=400, status=400, message="hours 必须是正数")
+
+        summary = build_summary(hours=hours, call_site=request.args.get('call_site'))
+        summary.update({
+            "governors": get_llm_governor_stats(),
+            "endpoints": get_llm_endpoint_stats(),
+            "embedding_batcher": get_embedding_batcher_stats(),
+            "response_cache": get_llm_cache_stats(),
+        })
+        return convert_resp(data=summary)
+
+    except Exception as e:
+        logger.exception(f"Error building metrics summary: {e}")
+        return convert_resp(code=500, status=500, message=f"获取监控汇总失败: {str(e)}")
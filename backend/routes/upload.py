@@ -2,18 +2,17 @@
 上传接口路由
 """
 
-import os
 import json
-import tempfile
+import zlib
 from datetime import datetime
 from pathlib import Path
 from flask import Blueprint, request
 from werkzeug.utils import secure_filename
 import config
 from utils.helpers import convert_resp, auth_required, allowed_file, get_logger
-from utils.db import insert_screenshot, insert_web_data
-from utils.llm import analyze_web_content, summarize_content, extract_keywords, generate_embeddings
-from utils.vectorstore import add_web_data_to_vectorstore, chunk_text
+from utils.db import insert_screenshot, get_ingestion_job
+from utils.ingestion import process_web_data, process_web_data_batch, submit_ingestion_job
+from utils.url_blacklist import get_url_blacklist_matcher, is_url_blacklisted
 
 logger = get_logger(__name__)
 
@@ -86,13 +85,13 @@ def upload_web_data():
     
     处理流程：
     1. 验证数据
-    2. 创建临时文件
-    3. LLM 分析内容（可选）
-    4. 存入 SQLite 数据库
-    5. 存入向量数据库（可选）
-    """
-    temp_file_path = None
+    2. 持久化为摄取任务并立即返回 202（后台 worker 完成 LLM 分析、入库与向量化）
+       页面抓取的上传在静默期（INGESTION_COALESCE_SECONDS）后才处理，期间同一页面（URL + 会话）的后续上传
+       合并到同一个任务，返回相同的 job_id
     
+    查询参数：
+    - sync (可选): 为 1 时在请求内同步处理并直接返回处理结果（ENABLE_ASYNC_INGESTION 关闭时总是同步）
+    """
     try:
         # 获取 JSON 数据
         data = request.get_json()
@@ -102,7 +101,6 @@ def upload_web_data():
         
         # 验证必需字段
         title = data.get('title')
-        url = data.get('url')
         content = data.get('content')
         
         if not title:
@@ -111,216 +109,186 @@ def upload_web_data():
         if not content:
             return convert_resp(code=400, status=400, message="内容不能为空")
         
-        # 获取可选字段
-        source = data.get('source', 'web_crawler')
-        tags = data.get('tags', [])
-        metadata = data.get('metadata', {})
-        session_id = data.get('session_id')  # 新增：获取session_id
-        
-        logger.info(f"[upload_web_data] Processing: title={title}, url={url}")
-        
-        # 1. 将内容转换为字符串（用于 LLM/向量 处理）
-        # 如果为增量 diff，仅线性化 diff，而非全量文本，保持处理流程不变
-        def _linearize_diff(diff_dict):
-            try:
-                ops = (diff_dict or {}).get('ops') or []
-                lines = []
-                for op in ops:
-                    t = op.get('type')
-                    if t == 'added':
-                        for ln in str(op.get('text','')).split('\n'):
-                            if ln:
-                                lines.append(f"+ {ln}")
-                    elif t == 'removed':
-                        for ln in str(op.get('text','')).split('\n'):
-                            if ln:
-                                lines.append(f"- {ln}")
-                    elif t == 'modified':
-                        for ln in str(op.get('oldText','')).split('\n'):
-                            if ln:
-                                lines.append(f"- {ln}")
-                        for ln in str(op.get('newText','')).split('\n'):
-                            if ln:
-                                lines.append(f"+ {ln}")
-                    # equal 默认跳过，避免噪音
-                # 附带简要摘要
-                summary = (diff_dict or {}).get('summary') or {}
-                header = [
-                    f"[DOM DIFF] version={(diff_dict or {}).get('version')}",
-                    f"oldHash={(diff_dict or {}).get('oldHash')} newHash={(diff_dict or {}).get('newHash')}",
-                    f"added={summary.get('added',0)} removed={summary.get('removed',0)} modifiedOld={summary.get('modifiedOld',0)} modifiedNew={summary.get('modifiedNew',0)}",
-                    "---"
-                ]
-                return "\n".join(header + lines) or "[EMPTY DIFF]"
-            except Exception as _:
-                return json.dumps(diff_dict or {}, ensure_ascii=False)
-
-        is_dom_diff = (data.get('changeType') == 'dom-diff') or (isinstance(content, dict) and content.get('diffOnly'))
-        logger.info(f"[upload_web_data] is_dom_diff={is_dom_diff}")
-        if is_dom_diff:
-            # diff 优先从顶层 diff 字段获取，其次从 content.diff
-            diff_dict = data.get('diff') or (content.get('diff') if isinstance(content, dict) else None)
-            content_str = _linearize_diff(diff_dict)
-            logger.info(f"[upload_web_data] diff linearized length={len(content_str)}")
-        else:
-            if isinstance(content, dict):
-                content_str = json.dumps(content, ensure_ascii=False, indent=2)
-            else:
-                content_str = str(content)
-        logger.info(f"[upload_web_data] content_str length used for LLM/vector={len(content_str)}")
-        try:
-            preview = content_str[:200].replace('\n', ' ')
-            logger.info(f"[upload_web_data] input preview: {preview}")
-        except Exception:
-            pass
+        # 命中黑名单的页面直接忽略，不产生任何 LLM / embedding 调用
+        if is_url_blacklisted(data.get('url')):
+            logger.info(f"[upload_web_data] Skipped blacklisted URL: {data.get('url')}")
+            return convert_resp(code=403, status=403, message="该 URL 在黑名单中，已忽略")
         
-        # 2. 创建临时文件保存内容
-        with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.txt', encoding='utf-8') as temp_file:
-            temp_file.write(content_str)
-            temp_file_path = temp_file.name
+        sync = request.args.get('sync', '').lower() in ('1', 'true', 'yes')
+        if config.ENABLE_ASYNC_INGESTION and not sync:
+            job_id = submit_ingestion_job(data)
+            logger.info(f"[upload_web_data] Queued ingestion job #{job_id}: title={title}")
+            return convert_resp(
+                code=202,
+                status=202,
+                message=f"网页数据已接收，正在后台处理: {title}",
+                data={
+                    "job_id": job_id,
+                    "status": "pending",
+                    "status_url": f"/api/upload_web_data/jobs/{job_id}"
+                }
+            )
         
-        logger.info(f"[upload_web_data] Created temp file: {temp_file_path}")
+        response_data = process_web_data(data)
         
-        # 3. LLM 分析内容（如果启用）
-        llm_analysis = None
-        if config.ENABLE_LLM_PROCESSING:
-            try:
-                logger.info("[upload_web_data] Starting LLM analysis...")
-                llm_analysis = analyze_web_content(
-                    title=title,
-                    url=url or "",
-                    content=content_str
-                )
-                
-                if llm_analysis:
-                    logger.info(f"[upload_web_data] LLM analysis completed: {llm_analysis}")
-                    
-                    # 将 LLM 分析结果添加到元数据
-                    metadata['llm_analysis'] = llm_analysis
-                    
-                    # 从分析结果中提取标签（如果没有提供标签）
-                    # 新的JSON结构中，keywords在metadata_analysis下
-                    metadata_analysis = llm_analysis.get('metadata_analysis', {})
-                    if not tags and metadata_analysis.get('keywords'):
-                        tags = metadata_analysis['keywords']
-                else:
-                    logger.info("[upload_web_data] LLM analysis returned no results")
-                    
-            except Exception as e:
-                logger.warning(f"[upload_web_data] LLM analysis failed: {e}, continuing without it")
+        return convert_resp(
+            message=f"网页数据上传并处理成功: {title}",
+            data=response_data
+        )
         
-        # 4. 构建完整的元数据
-        full_metadata = {
-            "url": url,
-            "source": source,
-            "tags": tags,
-            "content_type": "web_data",
-            "crawled_at": datetime.now().isoformat(),
-            "temp_file_path": temp_file_path,
-        }
-        # 标记输入模式与预览
-        full_metadata["llm_input_mode"] = "diff" if is_dom_diff else "full"
+    except Exception as e:
+        logger.exception(f"Error uploading web data: {e}")
+        return convert_resp(code=500, status=500, message=f"上传失败: {str(e)}")
+
+
+def _read_batch_items():
+    """
+    读取批量上传的请求体：JSON 数组（或 {"items": [...]}），或每行一个 JSON 对象的 NDJSON，
+    可用 gzip 压缩（Content-Encoding: gzip）。解压后大小受 INGESTION_BATCH_MAX_BYTES 限制
+    """
+    raw = request.get_data()
+    if request.headers.get('Content-Encoding', '').lower() == 'gzip' or raw[:2] == b'\x1f\x8b':
+        try:
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            raw = decompressor.decompress(raw, config.INGESTION_BATCH_MAX_BYTES)
+        except zlib.error as e:
+            raise ValueError(f"gzip 解压失败: {e}")
+        if decompressor.unconsumed_tail:
+            raise ValueError(f"解压后的请求体超过 {config.INGESTION_BATCH_MAX_BYTES} 字节")
+
+    text = raw.decode('utf-8-sig').strip()
+    if not text:
+        return []
+
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        pass
+    else:
+        if isinstance(data, dict):
+            data = data['items'] if 'items' in data else [data]
+        if not isinstance(data, list):
+            raise ValueError("请求体应为 JSON 数组或包含 items 数组的对象")
+        return data
+
+    # 不是单个 JSON 文档时按 NDJSON 逐行解析
+    items = []
+    for line_no, line in enumerate(text.splitlines(), start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            items.append(json.loads(line))
+        except json.JSONDecodeError as e:
+            raise ValueError(f"第 {line_no} 行不是合法的 JSON: {e}")
+    return items
+
+
+@upload_bp.route('/upload_web_data/batch', methods=['POST'])
+@auth_required
+def upload_web_data_batch():
+    """
+    批量上传网页数据（离线补传、数据集回放等场景，一次请求代替逐条上传）
+    
+    请求体：JSON 数组，或 NDJSON（可 gzip 压缩），每项字段与 /upload_web_data 相同
+    
+    处理流程：
+    1. 逐项校验（含 URL 黑名单），不合法的项在 rejected 中返回下标与原因
+    2. 合法项作为一个摄取任务：并行 LLM 分析、单事务入库、分块合并后按服务商单次上限批量 embedding
+    
+    查询参数：
+    - sync (可选): 为 1 时在请求内同步处理并返回逐项结果（ENABLE_ASYNC_INGESTION 关闭时总是同步）
+    """
+    try:
         try:
-            full_metadata["llm_input_preview"] = content_str[:500]
-        except Exception:
-            pass
-        # 若为 dom-diff，将 diff 元数据纳入 metadata，便于检索/回放
-        if is_dom_diff:
-            try:
-                full_metadata.update({
-                    "change_type": data.get('changeType'),
-                    "diff_meta": {
-                        "old_hash": (data.get('diff') or {}).get('oldHash'),
-                        "new_hash": (data.get('diff') or {}).get('newHash'),
-                        "version": (data.get('diff') or {}).get('version'),
-                        "summary": (data.get('diff') or {}).get('summary'),
-                    }
-                })
-            except Exception:
-                pass
-        full_metadata.update(metadata)
+            items = _read_batch_items()
+        except (ValueError, UnicodeDecodeError) as e:
+            return convert_resp(code=400, status=400, message=f"请求体格式错误: {str(e)}")
         
-        # 5. 存入 SQLite 数据库
-        web_data_id = insert_web_data(
-            title=title,
-            url=url,
-            content=content,
-            source=source,
-            tags=tags,
-            metadata=full_metadata
-        )
+        if not items:
+            return convert_resp(code=400, status=400, message="请求体不能为空")
         
-        logger.info(f"[upload_web_data] Saved to database: web_data_id={web_data_id}")
+        if len(items) > config.INGESTION_BATCH_MAX_ITEMS:
+            return convert_resp(code=400, status=400, message=f"单次最多上传 {config.INGESTION_BATCH_MAX_ITEMS} 条")
         
-        # 6. 存入向量数据库（如果启用）
-        vector_success = False
-        if config.ENABLE_VECTOR_STORAGE:
-            try:
-                # 检查是否配置了 EMBEDDING_API_KEY
-                if not config.EMBEDDING_API_KEY:
-                    logger.warning("[upload_web_data] Vector storage is enabled but EMBEDDING_API_KEY is not configured. Skipping vector storage.")
-                else:
-                    logger.info("[upload_web_data] Adding to vector store...")
-                    
-                    # 准备嵌入函数（使用配置的向量模型）
-                    def embedding_function(texts):
-                        embeddings = generate_embeddings(texts)
-                        return embeddings if embeddings else None
-                    
-                    logger.info(f"[upload_web_data] Using configured embedding model: {config.EMBEDDING_MODEL}")
-                    
-                    vector_success = add_web_data_to_vectorstore(
-                        web_data_id=web_data_id,
-                        title=title,
-                        url=url or "",
-                        content=content_str,
-                        source=source,
-                        tags=tags,
-                        metadata=metadata,
-                        embedding_function=embedding_function,
-                        session_id=session_id  # 新增：传递session_id
-                    )
-                    
-                    if vector_success:
-                        logger.info(f"[upload_web_data] Added to vector store successfully")
-                    else:
-                        logger.warning(f"[upload_web_data] Failed to add to vector store")
-                    
-            except Exception as e:
-                logger.warning(f"[upload_web_data] Vector storage failed: {e}, continuing without it")
+        # 逐项校验必需字段
+        blacklist = get_url_blacklist_matcher() if config.ENABLE_URL_BLACKLIST else None
+        accepted, accepted_indices, rejected = [], [], []
+        for index, item in enumerate(items):
+            if not isinstance(item, dict):
+                rejected.append({"index": index, "error": "每项必须是 JSON 对象"})
+            elif not item.get('title'):
+                rejected.append({"index": index, "error": "标题不能为空"})
+            elif not item.get('content'):
+                rejected.append({"index": index, "error": "内容不能为空"})
+            elif blacklist and blacklist.is_blocked(item.get('url')):
+                rejected.append({"index": index, "error": "URL 在黑名单中"})
+            else:
+                accepted.append(item)
+                accepted_indices.append(index)
         
-        # 7. 构建响应数据
-        response_data = {
-            "web_data_id": web_data_id,
-            "title": title,
-            "url": url,
-            "processed": {
-                "llm_analysis": llm_analysis is not None,
-                "vector_storage": vector_success,
-                "temp_file": temp_file_path
-            }
-        }
+        if not accepted:
+            return convert_resp(code=400, status=400, message="没有可处理的数据", data={"rejected": rejected})
+        
+        sync = request.args.get('sync', '').lower() in ('1', 'true', 'yes')
+        if config.ENABLE_ASYNC_INGESTION and not sync:
+            job_id = submit_ingestion_job({
+                "title": f"批量上传 {len(accepted)} 条",
+                "items": accepted,
+                "indices": accepted_indices
+            })
+            logger.info(f"[upload_web_data_batch] Queued ingestion job #{job_id}: {len(accepted)} items, {len(rejected)} rejected")
+            return convert_resp(
+                code=202,
+                status=202,
+                message=f"已接收 {len(accepted)} 条网页数据，正在后台处理",
+                data={
+                    "job_id": job_id,
+                    "status": "pending",
+                    "status_url": f"/api/upload_web_data/jobs/{job_id}",
+                    "accepted": len(accepted),
+                    "rejected": rejected
+                }
+            )
         
-        # 如果有 LLM 分析结果，也返回
-        if llm_analysis:
-            response_data["analysis"] = llm_analysis
+        batch_result = process_web_data_batch(accepted)
         
-        logger.info(f"[upload_web_data] Processing completed for: {title}")
+        # 按原始下标返回逐项结果（校验失败的项也占位）
+        results = [None] * len(items)
+        for index, result in zip(accepted_indices, batch_result["items"]):
+            results[index] = result
+        for entry in rejected:
+            results[entry["index"]] = {"error": entry["error"]}
         
         return convert_resp(
-            message=f"网页数据上传并处理成功: {title}",
-            data=response_data
+            message=f"批量上传完成: 成功 {batch_result['succeeded']} 条，失败 {batch_result['failed'] + len(rejected)} 条",
+            data={
+                "items": results,
+                "succeeded": batch_result["succeeded"],
+                "failed": batch_result["failed"] + len(rejected)
+            }
         )
         
     except Exception as e:
-        logger.exception(f"Error uploading web data: {e}")
+        logger.exception(f"Error uploading web data batch: {e}")
+        return convert_resp(code=500, status=500, message=f"批量上传失败: {str(e)}")
+
+
+@upload_bp.route('/upload_web_data/jobs/<int:job_id>', methods=['GET'])
+@auth_required
+def get_upload_job(job_id):
+    """
+    查询网页数据摄取任务状态
+    
+    返回：status 为 pending / running / completed / failed / skipped（URL 在排队期间被加入黑名单），完成后附带处理结果
+    """
+    try:
+        job = get_ingestion_job(job_id)
+        if job is None:
+            return convert_resp(code=404, status=404, message=f"任务不存在: {job_id}")
         
-        # 清理临时文件
-        if temp_file_path:
-            try:
-                os.unlink(temp_file_path)
-                logger.info(f"Cleaned up temp file: {temp_file_path}")
-            except Exception as cleanup_error:
-                logger.warning(f"Failed to clean up temp file: {cleanup_error}")
+        return convert_resp(data=job)
         
-        return convert_resp(code=500, status=500, message=f"上传失败: {str(e)}")
+    except Exception as e:
+        logger.exception(f"Error getting ingestion job {job_id}: {e}")
+        return convert_resp(code=500, status=500, message=f"查询任务失败: {str(e)}")
@@ -1,6 +1,6 @@
 """
 URL 黑名单管理路由
-仅供前端配置界面使用，与其他后端业务解耦
+供前端配置界面使用；条目变更后重新编译内存匹配器（摄取与检索时据此过滤）
 """
 
 from flask import Blueprint, jsonify, request
@@ -10,6 +10,7 @@ from utils.db import (
     delete_url_from_blacklist,
 )
 from utils.helpers import get_logger
+from utils.url_blacklist import reload_url_blacklist
 
 logger = get_logger(__name__)
 
@@ -47,6 +48,7 @@ def create_blacklist_entry():
             return jsonify({"error": "url 为必填字段，且必须是字符串"}), 400
         
         entry_id = add_url_to_blacklist(url=url)
+        reload_url_blacklist()
         return jsonify({
             "id": entry_id,
             "url": url.strip()
@@ -70,6 +72,7 @@ def delete_blacklist_entry(entry_id: int):
         deleted = delete_url_from_blacklist(entry_id)
         if not deleted:
             return jsonify({"error": "未找到对应的黑名单记录"}), 404
+        reload_url_blacklist()
         
         return jsonify({"success": True})
     except Exception as exc:
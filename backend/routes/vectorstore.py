@@ -0,0 +1,120 @@
+"""
+向量库维护接口路由
+"""
+
+from flask import Blueprint, request
+from utils.helpers import convert_resp, auth_required, get_logger
+
+logger = get_logger(__name__)
+
+vectorstore_bp = Blueprint('vectorstore', __name__, url_prefix='/api/vectorstore')
+
+
+@vectorstore_bp.route('/reconcile', methods=['GET'])
+@auth_required
+def get_reconcile_report():
+    """获取最近一次一致性校验报告（漂移指标）"""
+    try:
+        from utils.vector_sync import get_last_reconcile_report
+
+        report = get_last_reconcile_report()
+        if report is None:
+            return convert_resp(message="尚未执行过一致性校验", data={"report": None})
+
+        return convert_resp(data={"report": report})
+
+    except Exception as e:
+        logger.exception(f"Error getting reconcile report: {e}")
+        return convert_resp(code=500, status=500, message=f"获取校验报告失败: {str(e)}")
+
+
+@vectorstore_bp.route('/reconcile', methods=['POST'])
+@auth_required
+def run_reconcile():
+    """立即执行一次一致性校验与修复"""
+    try:
+        from utils.vector_sync import reconcile_vectorstore
+
+        data = request.get_json(silent=True) or {}
+        max_repairs = data.get('max_repairs')
+
+        if max_repairs is not None and (not isinstance(max_repairs, int) or max_repairs < 0):
+            return convert_resp(code=400, status=400, message="max_repairs 必须是非负整数")
+
+        report = reconcile_vectorstore(
+            max_repairs=max_repairs,
+            dry_run=bool(data.get('dry_run', False)),
+            full=bool(data.get('full', False))
+        )
+
+        if not report.get('success'):
+            return convert_resp(code=409, status=409, message=report.get('message', '校验未执行'), data={"report": report})
+
+        return convert_resp(message="一致性校验完成", data={"report": report})
+
+    except Exception as e:
+        logger.exception(f"Error running reconcile: {e}")
+        return convert_resp(code=500, status=500, message=f"执行校验失败: {str(e)}")
+
+
+@vectorstore_bp.route('/reindex', methods=['GET'])
+@auth_required
+def get_reindex_status():
+    """获取重建索引任务状态与进度"""
+    try:
+        from utils.reindex import get_reindex_status as _get_reindex_status
+
+        return convert_resp(data=_get_reindex_status())
+
+    except Exception as e:
+        logger.exception(f"Error getting reindex status: {e}")
+        return convert_resp(code=500, status=500, message=f"获取重建状态失败: {str(e)}")
+
+
+@vectorstore_bp.route('/reindex', methods=['POST'])
+@auth_required
+def start_reindex():
+    """启动（或续跑）后台重建索引任务"""
+    try:
+        from utils.reindex import start_reindex as _start_reindex
+
+        data = request.get_json(silent=True) or {}
+        batch_size = data.get('batch_size')
+        concurrency = data.get('concurrency')
+
+        for name, value in (('batch_size', batch_size), ('concurrency', concurrency)):
+            if value is not None and (not isinstance(value, int) or value <= 0):
+                return convert_resp(code=400, status=400, message=f"{name} 必须是正整数")
+
+        result = _start_reindex(
+            batch_size=batch_size,
+            concurrency=concurrency,
+            restart=bool(data.get('restart', False))
+        )
+
+        if not result.get('success'):
+            return convert_resp(code=409, status=409, message=result.get('message', '重建未启动'), data={"job": result.get('job')})
+
+        return convert_resp(code=202, status=202, message=result['message'], data={"job": result['job']})
+
+    except Exception as e:
+        logger.exception(f"Error starting reindex: {e}")
+        return convert_resp(code=500, status=500, message=f"启动重建失败: {str(e)}")
+
+
+@vectorstore_bp.route('/reindex', methods=['DELETE'])
+@auth_required
+def cancel_reindex():
+    """取消未完成的重建索引任务"""
+    try:
+        from utils.reindex import cancel_reindex as _cancel_reindex
+
+        result = _cancel_reindex()
+        if not result.get('success'):
+            return convert_resp(code=404, status=404, message=result.get('message', '没有可取消的任务'))
+
+        return convert_resp(message=result['message'], data={"job": result['job']})
+
+    except Exception as e:
+        logger.exception(f"Error cancelling reindex: {e}")
+        return convert_resp(code=500, status=500, message=f"取消重建失败: {str(e)}")
@@ -23,7 +23,12 @@ from config import (
     ENABLE_SCHEDULER_TODO,
     ENABLE_SCHEDULER_TIP,
     ENABLE_SCHEDULER_REPORT,
-    ENABLE_SCHEDULER_DAILY_FEED
+    ENABLE_SCHEDULER_DAILY_FEED,
+    ENABLE_SCHEDULER_VECTOR_RECONCILE,
+    ENABLE_SCHEDULER_SESSION_MEMORY,
+    ENABLE_VECTOR_STORAGE,
+    VECTOR_RECONCILE_INTERVAL_MINUTES,
+    SESSION_MEMORY_MAINTENANCE_INTERVAL_MINUTES
 )
 
 logger = get_logger(__name__)
@@ -111,6 +116,32 @@ def init_scheduler():
     else:
         logger.info("⏸️ Daily Feed scheduler disabled")
     
+    # 6. 校验 SQLite 与向量库一致性
+    if ENABLE_SCHEDULER_VECTOR_RECONCILE and ENABLE_VECTOR_STORAGE:
+        scheduler.add_job(
+            func=job_reconcile_vectorstore,
+            trigger=IntervalTrigger(minutes=VECTOR_RECONCILE_INTERVAL_MINUTES),
+            id='vector_reconcile',
+            name=f'每{VECTOR_RECONCILE_INTERVAL_MINUTES}分钟校验向量库一致性',
+            replace_existing=True
+        )
+        logger.info(f"✅ Vector reconcile scheduler enabled (interval: {VECTOR_RECONCILE_INTERVAL_MINUTES} minutes)")
+    else:
+        logger.info("⏸️ Vector reconcile scheduler disabled")
+    
+    # 7. 会话记忆维护（过期清理与旧轮次压缩）
+    if ENABLE_SCHEDULER_SESSION_MEMORY and ENABLE_VECTOR_STORAGE:
+        scheduler.add_job(
+            func=job_maintain_session_memory,
+            trigger=IntervalTrigger(minutes=SESSION_MEMORY_MAINTENANCE_INTERVAL_MINUTES),
+            id='session_memory_maintenance',
+            name=f'每{SESSION_MEMORY_MAINTENANCE_INTERVAL_MINUTES}分钟维护会话记忆',
+            replace_existing=True
+        )
+        logger.info(f"✅ Session memory maintenance scheduler enabled (interval: {SESSION_MEMORY_MAINTENANCE_INTERVAL_MINUTES} minutes)")
+    else:
+        logger.info("⏸️ Session memory maintenance scheduler disabled")
+    
     scheduler.start()
     logger.info("Scheduler initialized and started")
     
@@ -157,8 +188,8 @@ def job_generate_todos():
             todo_count = len(todo_ids)
             logger.info(f"✅ Generated {todo_count} todos")
             
-            # 发布事件
-            if todo_count > 0:
+            # 发布事件（流式生成时已逐条发布）
+            if todo_count > 0 and not result.get('published'):
                 # 使用第一个 todo 的 title，如果有多个则在 message 中说明
                 first_todo_title = todos[0].get('title', '待办任务') if todos else '待办任务'
                 
@@ -191,8 +222,8 @@ def job_generate_tips():
             tip_count = len(tip_ids)
             logger.info(f"✅ Generated {tip_count} tips")
             
-            # 发布事件
-            if tip_count > 0:
+            # 发布事件（流式生成时已逐条发布）
+            if tip_count > 0 and not result.get('published'):
                 # 使用第一个 tip 的 title，如果有多个则在 message 中说明
                 first_tip_title = tips[0].get('title', '智能提示') if tips else '智能提示'
                 
@@ -299,6 +330,45 @@ def job_generate_daily_feed():
         logger.exception(f"❌ Error in daily feed generation job: {e}")
 
 
+def job_reconcile_vectorstore():
+    """定时任务：校验并增量修复 SQLite 与向量库的一致性"""
+    try:
+        from utils.vector_sync import reconcile_vectorstore
+        
+        logger.info("Starting scheduled vectorstore reconcile")
+        report = reconcile_vectorstore()
+        
+        if report.get('success'):
+            logger.info(
+                f"✅ Vector reconcile finished: missing={report.get('missing')}, stale={report.get('stale')}, "
+                f"orphaned={report.get('orphaned')}, repaired={report.get('repaired')}, remaining={report.get('remaining')}"
+            )
+        else:
+            logger.warning(f"⚠️ Vector reconcile skipped: {report.get('message')}")
+    except Exception as e:
+        logger.exception(f"❌ Error in vector reconcile job: {e}")
+
+
+def job_maintain_session_memory():
+    """定时任务：清理过期会话记忆，并把旧的对话轮次压缩为摘要"""
+    try:
+        from utils.session_memory import run_session_memory_maintenance
+        
+        logger.info("Starting scheduled session memory maintenance")
+        report = run_session_memory_maintenance()
+        
+        if report.get('success'):
+            logger.info(
+                f"✅ Session memory maintenance finished: adopted={report.get('adopted')}, "
+                f"duplicates_removed={report.get('duplicates_removed')}, expired={report.get('expired')}, "
+                f"compacted={report.get('compacted')} (sessions={report.get('sessions')})"
+            )
+        else:
+            logger.warning(f"⚠️ Session memory maintenance skipped: {report.get('message')}")
+    except Exception as e:
+        logger.exception(f"❌ Error in session memory maintenance job: {e}")
+
+
 def stop_scheduler():
     """停止调度器"""
     global scheduler
@@ -0,0 +1,35 @@
+"""
+测试公共配置：把 backend 目录加入导入路径，并提供两种向量后端的实例
+"""
+
+import sys
+import uuid
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+BACKENDS = ["numpy", "chroma"]
+
+
+@pytest.fixture(params=BACKENDS)
+def backend(request, tmp_path, monkeypatch):
+    """每个用例一个空集合；未安装 chromadb 时跳过 Chroma 后端"""
+    import config
+
+    name = f"test_{uuid.uuid4().hex[:12]}"
+    if request.param == "numpy":
+        from utils.vector_backends.numpy_backend import NumpyFlatBackend
+
+        instance = NumpyFlatBackend(name, base_dir=tmp_path / "flat")
+    else:
+        pytest.importorskip("chromadb")
+        from utils.vector_backends import chroma_backend
+
+        monkeypatch.setattr(config, "CHROMA_PERSIST_DIR", tmp_path / "chroma")
+        monkeypatch.setattr(chroma_backend, "_chroma_client", None)
+        instance = chroma_backend.ChromaBackend(name)
+
+    yield instance
+    instance.drop()
@@ -0,0 +1,47 @@
+"""
+网页正文清理测试（站点样板学习）
+"""
+
+import pytest
+
+import config
+
+MENU = ["Home", "Products", "Pricing", "About us", "Contact"]
+
+
+def _page(body):
+    return "\n".join(MENU + body + ["© 2026 Example Inc."])
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    from utils.db import init_db
+
+    monkeypatch.setattr(config, "DATABASE_PATH", tmp_path / "test.db")
+    monkeypatch.setattr(config, "ENABLE_BOILERPLATE_LEARNING", True)
+    init_db()
+
+
+def test_repeated_uploads_of_one_url_do_not_learn_boilerplate(db):
+    from utils.content_cleaner import clean_page_text
+
+    # 超过 BOILERPLATE_MAX_BLOCK_CHARS 的段落不参与统计，其余正文行若被误判为样板就会被删除
+    body = ["第一段正文，介绍产品的主要功能。", "第二段正文，说明价格与使用方式。", "长段落" * 120]
+    text = _page(body)
+    for i in range(config.BOILERPLATE_MIN_PAGES * 3):
+        # 跟踪参数与 fragment 不同的上传仍是同一页面
+        cleaned = clean_page_text(text, url=f"https://www.example.com/app?utm_source={i}#top")
+    for line in body:
+        assert line in cleaned
+
+
+def test_blocks_shared_by_distinct_pages_are_boilerplate(db):
+    from utils.content_cleaner import clean_page_text
+
+    for i in range(config.BOILERPLATE_MIN_PAGES):
+        clean_page_text(_page([f"Article {i} explains a different topic in detail."]), url=f"https://example.com/a/{i}")
+
+    body = "A brand new article with its own long paragraph of content."
+    cleaned = clean_page_text(_page([body]), url="https://example.com/a/new")
+    assert body in cleaned
+    assert "Pricing" not in cleaned.split("\n")
@@ -0,0 +1,35 @@
+"""
+流式 JSON 数组解析测试
+"""
+
+import json
+
+from utils.json_utils import JsonArrayStreamParser
+
+TIPS = [{"title": f"t{i}", "content": "x" * 300} for i in range(40)]
+
+
+def _feed(parser, text, size=7):
+    out = []
+    for i in range(0, len(text), size):
+        out.extend(parser.feed(text[i:i + size]))
+    return out
+
+
+def test_long_array_in_small_chunks():
+    # 超过 4KB 的输出会触发缓冲区裁剪，裁剪后字符串位置须保持正确
+    assert _feed(JsonArrayStreamParser(array_key="tips"), json.dumps({"tips": TIPS})) == TIPS
+    assert _feed(JsonArrayStreamParser(), json.dumps(TIPS)) == TIPS
+
+
+def test_long_prefix_before_keyed_array():
+    text = '{"note": "' + "y" * 5000 + '", "tips": ' + json.dumps(TIPS) + "}"
+    parser = JsonArrayStreamParser(array_key="tips")
+    assert _feed(parser, text) == TIPS
+    assert parser.done
+
+
+def test_truncated_output_keeps_closed_elements():
+    text = json.dumps({"tips": TIPS})
+    # 截断在最后一个元素中间
+    assert _feed(JsonArrayStreamParser(array_key="tips"), text[:-100]) == TIPS[:-1]
@@ -0,0 +1,87 @@
+"""
+网页版本链的向量同步测试
+"""
+
+import random
+
+import pytest
+
+import config
+
+PAGE_KEY = "https://chat.example.com/c/1"
+
+
+@pytest.fixture
+def vectorstore(tmp_path, monkeypatch):
+    from utils import vectorstore
+    from utils.db import init_db
+
+    monkeypatch.setattr(config, "DATABASE_PATH", tmp_path / "test.db")
+    monkeypatch.setattr(config, "ENABLE_VECTOR_STORAGE", True)
+    monkeypatch.setattr(config, "VECTOR_BACKEND", "numpy")
+    monkeypatch.setattr(config, "FLAT_INDEX_DIR", tmp_path / "flat")
+    monkeypatch.setattr(config, "CHUNK_SIZE", 300)
+    monkeypatch.setattr(vectorstore, "_collection", None)
+    init_db()
+    yield vectorstore
+    vectorstore._collection = None
+
+
+def _embed(texts):
+    return [[random.random() for _ in range(8)] for _ in texts]
+
+
+def _sync(vectorstore, web_data_id, content):
+    return vectorstore.sync_page_to_vectorstore(
+        page_key=PAGE_KEY, web_data_id=web_data_id, title="Chat", url=PAGE_KEY,
+        content=content, source="web-crawler-incremental", embedding_function=_embed
+    )
+
+
+def test_reused_chunks_move_to_current_version(vectorstore):
+    lines = [f"Message number {i}: some chat text that is reasonably long to be content." for i in range(60)]
+    first = _sync(vectorstore, 1, "\n".join(lines))
+    lines[10] = "Edited message ten, now different."
+    current = _sync(vectorstore, 2, "\n".join(lines))
+
+    assert set(current.values()) == {2}
+    collection = vectorstore.get_collection()
+    page = collection.get(where={"page_key": PAGE_KEY})
+    assert sorted(page["ids"]) == sorted(current)
+    assert {metadata["web_data_id"] for metadata in page["metadatas"]} == {2}
+    # 未变化的分块沿用原来的向量
+    assert len(set(first) & set(current)) >= len(current) - 2
+
+    # 删除历史版本的行不影响页面当前的分块
+    assert vectorstore.delete_web_data_from_vectorstore(1)
+    assert sorted(collection.get(where={"page_key": PAGE_KEY}, include=[])["ids"]) == sorted(current)
+
+
+def test_sync_pages_embeds_all_pages_in_one_pass(vectorstore, monkeypatch):
+    monkeypatch.setattr(config, "EMBEDDING_BATCH_MAX_INPUTS", 1000)
+    monkeypatch.setattr(config, "EMBEDDING_BATCH_MAX_TOKENS", 1000000)
+    lines = [f"Message number {i}: some chat text that is reasonably long to be content." for i in range(60)]
+    _sync(vectorstore, 1, "\n".join(lines))
+
+    calls = []
+
+    def embed(texts):
+        calls.append(len(texts))
+        return _embed(texts)
+
+    lines[10] = "Edited message ten, now different."
+    other = "https://chat.example.com/c/2"
+    results = vectorstore.sync_pages_to_vectorstore(
+        [
+            {"page_key": PAGE_KEY, "web_data_id": 2, "title": "Chat", "url": PAGE_KEY, "content": "\n".join(lines)},
+            {"page_key": other, "web_data_id": 3, "title": "Other", "url": other, "content": "\n".join(lines[:20])},
+        ],
+        embedding_function=embed
+    )
+
+    assert len(calls) == 1
+    assert set(results[PAGE_KEY].values()) == {2}
+    assert set(results[other].values()) == {3}
+    collection = vectorstore.get_collection()
+    assert sorted(collection.get(where={"page_key": PAGE_KEY}, include=[])["ids"]) == sorted(results[PAGE_KEY])
+    assert sorted(collection.get(where={"page_key": other}, include=[])["ids"]) == sorted(results[other])
@@ -0,0 +1,43 @@
+"""
+URL 黑名单匹配测试
+"""
+
+import fnmatch
+import itertools
+
+from utils import url_blacklist
+from utils.url_blacklist import UrlBlacklistMatcher
+
+ENTRIES = ["*.ads.*.com", "example.com/*/x/*", "foo.org", "https://bar.net/private", "*tracker*"]
+
+
+def _translate_py310(pattern, _counter=itertools.count()):
+    """Python 3.10 的 fnmatch.translate：两个及以上 * 时生成 (?P<gN>...) 命名分组"""
+    parts = [fnmatch.re.escape(part) for part in pattern.split("*")]
+    if len(parts) < 3:
+        return f"(?s:{'.*'.join(parts)})\\Z"
+    body = [parts[0]]
+    for part in parts[1:-1]:
+        group = f"g{next(_counter)}"
+        body.append(f"(?=(?P<{group}>.*?{part}))(?P={group})")
+    body.append(".*" + parts[-1])
+    return f"(?s:{''.join(body)})\\Z"
+
+
+def _check(matcher):
+    assert matcher.match("https://a.ads.b.com/p") == "*.ads.*.com"
+    assert matcher.match("http://example.com/a/x/b") == "example.com/*/x/*"
+    assert matcher.match("https://sub.foo.org/") == "foo.org"
+    assert matcher.match("http://bar.net/private/page") == "https://bar.net/private"
+    assert matcher.match("http://bar.net/public") is None
+    assert matcher.match("http://mytracker.net/") == "*tracker*"
+    assert matcher.match("http://ok.com/") is None
+
+
+def test_match():
+    _check(UrlBlacklistMatcher(ENTRIES))
+
+
+def test_glob_groups_do_not_collide_with_fnmatch(monkeypatch):
+    monkeypatch.setattr(url_blacklist.fnmatch, "translate", _translate_py310)
+    _check(UrlBlacklistMatcher(ENTRIES))
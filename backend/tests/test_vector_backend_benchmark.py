@@ -0,0 +1,63 @@
+"""
+向量后端基准测试
+写入与查询耗时、以及相对精确检索的召回率（规模可通过 VECTOR_BENCH_DOCS / VECTOR_BENCH_DIM / VECTOR_BENCH_QUERIES 调整）
+
+    python -m pytest tests/test_vector_backend_benchmark.py -s
+"""
+
+import os
+import time
+
+import numpy as np
+
+N_DOCS = int(os.getenv("VECTOR_BENCH_DOCS", "2000"))
+DIM = int(os.getenv("VECTOR_BENCH_DIM", "64"))
+N_QUERIES = int(os.getenv("VECTOR_BENCH_QUERIES", "50"))
+TOP_K = 10
+# ANN 后端允许的最低召回率（NumPy 平铺索引为精确检索，应为 1.0）
+MIN_RECALL = 0.9
+
+
+def test_benchmark(backend):
+    rng = np.random.default_rng(42)
+    vectors = rng.standard_normal((N_DOCS, DIM)).astype(np.float32)
+    queries = rng.standard_normal((N_QUERIES, DIM)).astype(np.float32)
+    ids = [f"doc_{i}" for i in range(N_DOCS)]
+
+    started = time.perf_counter()
+    for start in range(0, N_DOCS, 500):
+        end = start + 500
+        backend.add(
+            ids=ids[start:end],
+            embeddings=vectors[start:end].tolist(),
+            documents=ids[start:end],
+            metadatas=[{"bucket": i % 10} for i in range(start, min(end, N_DOCS))],
+        )
+    write_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    result = backend.query(query_embeddings=queries.tolist(), n_results=TOP_K, include=["distances"])
+    query_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    filtered = backend.query(query_embeddings=queries.tolist(), n_results=TOP_K, where={"bucket": 3}, include=[])
+    filtered_seconds = time.perf_counter() - started
+
+    distances = ((queries[:, None, :] - vectors[None, :, :]) ** 2).sum(axis=2)
+    exact = np.argsort(distances, axis=1)[:, :TOP_K]
+    recall = np.mean([
+        len({f"doc_{i}" for i in exact[q]} & set(result["ids"][q])) / TOP_K
+        for q in range(N_QUERIES)
+    ])
+
+    print(
+        f"\n[{type(backend).__name__}] docs={N_DOCS} dim={DIM} "
+        f"write={write_seconds * 1000:.1f}ms "
+        f"query={query_seconds / N_QUERIES * 1000:.2f}ms/q "
+        f"filtered={filtered_seconds / N_QUERIES * 1000:.2f}ms/q "
+        f"recall@{TOP_K}={recall:.3f}"
+    )
+
+    assert backend.count() == N_DOCS
+    assert all(int(i.split("_")[1]) % 10 == 3 for row in filtered["ids"] for i in row)
+    assert recall >= MIN_RECALL
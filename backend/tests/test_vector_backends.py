@@ -0,0 +1,150 @@
+"""
+向量后端一致性测试
+NumPy 平铺索引与 ChromaDB 后端运行同一组用例，保证两者的返回结构与语义一致
+"""
+
+import pytest
+
+DOCS = {
+    "a": ([1.0, 0.0, 0.0], "alpha", {"kind": "web", "rank": 1}),
+    "b": ([0.0, 1.0, 0.0], "beta", {"kind": "web", "rank": 2}),
+    "c": ([0.0, 0.0, 1.0], "gamma", {"kind": "todo", "rank": 3}),
+    "d": ([0.9, 0.1, 0.0], "delta", {"kind": "tip", "rank": 4}),
+}
+
+
+def _fill(backend, ids=None):
+    ids = ids or list(DOCS)
+    backend.add(
+        ids=ids,
+        embeddings=[DOCS[i][0] for i in ids],
+        documents=[DOCS[i][1] for i in ids],
+        metadatas=[DOCS[i][2] for i in ids],
+    )
+
+
+def test_add_and_count(backend):
+    assert backend.count() == 0
+    _fill(backend)
+    assert backend.count() == len(DOCS)
+
+
+def test_add_existing_id_raises(backend):
+    _fill(backend, ["a"])
+    with pytest.raises(ValueError):
+        backend.add(ids=["a"], embeddings=[[0.0, 1.0, 0.0]], documents=["other"], metadatas=[{"kind": "web"}])
+    assert backend.get(ids=["a"])["documents"] == ["alpha"]
+
+
+def test_upsert_overwrites(backend):
+    _fill(backend)
+    backend.upsert(ids=["a", "e"], embeddings=[[0.0, 0.0, 1.0], [0.5, 0.5, 0.0]],
+                   documents=["alpha2", "epsilon"], metadatas=[{"kind": "todo", "rank": 9}, {"kind": "web", "rank": 5}])
+    assert backend.count() == len(DOCS) + 1
+    got = backend.get(ids=["a"])
+    assert got["documents"] == ["alpha2"]
+    assert got["metadatas"][0]["kind"] == "todo"
+    top = backend.query(query_embeddings=[[0.0, 0.0, 1.0]], n_results=2)
+    assert set(top["ids"][0]) == {"a", "c"}
+
+
+def test_query_order_and_distances(backend):
+    _fill(backend)
+    result = backend.query(query_embeddings=[[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]], n_results=2)
+    assert result["ids"] == [["a", "d"], ["b", "d"]]
+    assert result["documents"][0] == ["alpha", "delta"]
+    assert result["metadatas"][0][0]["rank"] == 1
+    # 平方 L2 距离
+    assert result["distances"][0][0] == pytest.approx(0.0, abs=1e-5)
+    assert result["distances"][0][1] == pytest.approx(0.02, abs=1e-4)
+
+
+def test_query_where_filters(backend):
+    _fill(backend)
+    query = [[1.0, 0.0, 0.0]]
+    assert backend.query(query_embeddings=query, n_results=4, where={"kind": "web"})["ids"][0] == ["a", "b"]
+    assert backend.query(query_embeddings=query, n_results=4, where={"rank": {"$gte": 3}})["ids"][0] == ["d", "c"]
+    assert backend.query(query_embeddings=query, n_results=4, where={"kind": {"$in": ["todo", "tip"]}})["ids"][0] == ["d", "c"]
+    both = {"$and": [{"kind": "web"}, {"rank": {"$gt": 1}}]}
+    assert backend.query(query_embeddings=query, n_results=4, where=both)["ids"][0] == ["b"]
+    either = {"$or": [{"kind": "todo"}, {"rank": 1}]}
+    assert backend.query(query_embeddings=query, n_results=4, where=either)["ids"][0] == ["a", "c"]
+
+
+def test_query_include(backend):
+    _fill(backend)
+    result = backend.query(query_embeddings=[[1.0, 0.0, 0.0]], n_results=1, include=["distances"])
+    assert result["ids"] == [["a"]]
+    assert not result.get("documents")
+    assert not result.get("metadatas")
+
+
+def test_get_by_ids_and_where(backend):
+    _fill(backend)
+    got = backend.get(ids=["c", "a", "missing"])
+    assert sorted(got["ids"]) == ["a", "c"]
+    by_id = dict(zip(got["ids"], got["documents"]))
+    assert by_id == {"a": "alpha", "c": "gamma"}
+
+    web = backend.get(where={"kind": "web"})
+    assert sorted(web["ids"]) == ["a", "b"]
+    assert all(metadata["kind"] == "web" for metadata in web["metadatas"])
+
+    assert backend.get(ids=["a", "c"], where={"kind": "todo"})["ids"] == ["c"]
+
+
+def test_get_ids_only(backend):
+    _fill(backend)
+    got = backend.get(where={"kind": "web"}, include=[])
+    assert sorted(got["ids"]) == ["a", "b"]
+    assert not got.get("documents")
+    assert not got.get("metadatas")
+
+
+def test_get_paging(backend):
+    _fill(backend)
+    seen = []
+    for offset in range(0, len(DOCS), 3):
+        seen.extend(backend.get(limit=3, offset=offset, include=[])["ids"])
+    assert sorted(seen) == sorted(DOCS)
+
+
+def test_get_embeddings(backend):
+    _fill(backend)
+    got = backend.get(ids=["b"], include=["embeddings"])
+    assert [float(x) for x in got["embeddings"][0]] == pytest.approx([0.0, 1.0, 0.0])
+
+
+def test_delete_by_ids_and_where(backend):
+    _fill(backend)
+    backend.delete(ids=["a", "missing"])
+    assert backend.count() == len(DOCS) - 1
+    backend.delete(where={"kind": "web"})
+    assert sorted(backend.get(include=[])["ids"]) == ["c", "d"]
+    assert backend.query(query_embeddings=[[1.0, 0.0, 0.0]], n_results=4)["ids"][0] == ["d", "c"]
+
+
+def test_delete_requires_condition(backend):
+    _fill(backend)
+    with pytest.raises(ValueError):
+        backend.delete()
+    assert backend.count() == len(DOCS)
+
+
+def test_reset(backend):
+    _fill(backend)
+    backend.reset()
+    assert backend.count() == 0
+    _fill(backend, ["a"])
+    assert backend.get(include=[])["ids"] == ["a"]
+
+
+def test_update_metadata(backend):
+    _fill(backend)
+    backend.update_metadata(ids=["a", "missing"], metadatas=[{"kind": "todo", "extra": 1}, {"kind": "web"}])
+    got = backend.get(ids=["a"], include=["metadatas", "documents", "embeddings"])
+    assert got["metadatas"][0] == {"kind": "todo", "rank": 1, "extra": 1}
+    assert got["documents"] == ["alpha"]
+    assert [float(x) for x in got["embeddings"][0]] == pytest.approx([1.0, 0.0, 0.0])
+    assert backend.count() == len(DOCS)
+    assert sorted(backend.get(where={"kind": "todo"}, include=[])["ids"]) == ["a", "c"]
@@ -183,10 +183,8 @@ class SessionMemoryTool(BaseTool):
     @staticmethod
     def clear_session_memory(session_id: str) -> bool:
         """清除会话记忆（用于测试或清理）"""
-        # This function is no longer needed as memory is stored in vectorstore
-        # and can be cleared via vectorstore.clear_collection().
-        # Keeping it for now, but it will return False.
-        return False
+        from utils.session_memory import clear_session_memories
+        return clear_session_memories(session_id)
 
 
 def get_operation_tools() -> List[BaseTool]:
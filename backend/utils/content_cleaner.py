@@ -0,0 +1,232 @@
+"""
+网页正文提取模块
+插件上传的是整页可见文本（或 HTML），其中的导航、页脚、Cookie 提示和重复菜单会占用 LLM 的输入长度并稀释向量检索。
+入库前按行做以下清理，清理后的文本才交给 LLM 分析和 embedding（SQLite 中仍保存原始内容）：
+1. HTML 去标签（跳过 script/style/nav/header/footer/aside 等非正文元素），折叠空白与缩进
+2. 去除页面内重复出现的行
+3. 去除 Cookie 提示等固定样板
+4. 按站点学习样板：同一站点多数不同页面（按规范化 URL 计）都出现的文本块（菜单、页脚、侧栏）在后续页面中删除
+5. 截掉正文区域前后由短行组成的导航区
+"""
+
+import hashlib
+import re
+from html.parser import HTMLParser
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit
+import config
+from utils.helpers import get_logger
+
+logger = get_logger(__name__)
+
+# 非正文元素（其中的文本整体丢弃）
+_SKIP_TAGS = {"script", "style", "noscript", "template", "svg", "nav", "header", "footer", "aside", "form", "iframe"}
+# 块级元素（前后断行）
+_BLOCK_TAGS = {
+    "p", "div", "section", "article", "main", "li", "ul", "ol", "br", "tr", "table", "pre", "blockquote",
+    "h1", "h2", "h3", "h4", "h5", "h6", "dd", "dt", "figcaption", "hr",
+}
+
+_WHITESPACE = re.compile(r"[ \t\u00a0\u3000\u200b]+")
+# 句子标点：含有这些字符的短行更像正文（标题、短句）而非菜单项
+_SENTENCE_PUNCT = re.compile(r"[。！？；：，.!?;:,]")
+# Cookie 提示：同时提到 cookie 与同意/设置类字眼的短行
+_COOKIE_LINE = re.compile(
+    r"cookie.*(accept|agree|consent|settings|preferences|policy|同意|接受|设置|政策)"
+    r"|(accept|agree|consent|同意|接受|使用).*cookie",
+    re.IGNORECASE
+)
+# 判定为“正文行”的最小长度
+_CONTENT_LINE_MIN_CHARS = 40
+# 正文区域前后允许保留的短行数（标题、作者、日期等）
+_EDGE_CONTEXT_LINES = 2
+
+
+class _TextExtractor(HTMLParser):
+    """把 HTML 转为按块断行的纯文本"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag in _BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in _SKIP_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in _BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self.parts.append(data)
+
+
+def _looks_like_html(text: str) -> bool:
+    head = text[:1000].lower()
+    return head.lstrip().startswith("<") and ("<body" in head or "<div" in head or "<html" in head or "<p" in head)
+
+
+def html_to_text(html: str) -> str:
+    """HTML 转纯文本（丢弃非正文元素）"""
+    parser = _TextExtractor()
+    try:
+        parser.feed(html)
+        parser.close()
+    except Exception as e:
+        logger.debug(f"HTML parsing failed, using raw text: {e}")
+        return html
+    return "".join(parser.parts)
+
+
+def extract_page_text(content: Any) -> Optional[str]:
+    """
+    取出上传内容中的页面文本
+
+    Returns:
+        字符串内容或 {"content": "..."} 中的文本；其他结构化内容（如 dom-diff）返回 None
+    """
+    if isinstance(content, str):
+        return content
+    if isinstance(content, dict) and isinstance(content.get("content"), str):
+        return content["content"]
+    return None
+
+
+def _normalize_lines(text: str) -> List[str]:
+    """折叠空白与缩进，去掉空行"""
+    if _looks_like_html(text):
+        text = html_to_text(text)
+    lines = []
+    for line in text.replace("\r\n", "\n").replace("\r", "\n").split("\n"):
+        line = _WHITESPACE.sub(" ", line).strip()
+        if line:
+            lines.append(line)
+    return lines
+
+
+def _block_hash(line: str) -> str:
+    return hashlib.sha1(line.lower().encode("utf-8")).hexdigest()[:16]
+
+
+def _is_content_line(line: str) -> bool:
+    return len(line) >= _CONTENT_LINE_MIN_CHARS or (len(line) >= 12 and bool(_SENTENCE_PUNCT.search(line)))
+
+
+def _trim_navigation(lines: List[str]) -> List[str]:
+    """截掉第一条正文行之前、最后一条正文行之后的短行区域（保留紧邻正文的少量行）"""
+    content_indices = [i for i, line in enumerate(lines) if _is_content_line(line)]
+    if not content_indices:
+        return lines
+    start = max(0, content_indices[0] - _EDGE_CONTEXT_LINES)
+    end = min(len(lines), content_indices[-1] + 1 + _EDGE_CONTEXT_LINES)
+    return lines[start:end]
+
+
+def _site_key(url: Optional[str]) -> str:
+    try:
+        host = (urlsplit(url or "").hostname or "").lower()
+    except ValueError:
+        return ""
+    return host[4:] if host.startswith("www.") else host
+
+
+def _page_hash(url: str) -> str:
+    """页面标识：规范化 URL 的哈希（同一页面带不同跟踪参数、fragment 的上传视为同一页面）"""
+    from utils.url_utils import normalize_url
+
+    canonical = normalize_url(url)["canonical"] or url
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+def clean_page_text(text: str, url: Optional[str] = None, learn: bool = True) -> str:
+    """
+    清理页面文本，返回交给 LLM 与 embedding 的正文
+
+    Args:
+        text: 页面文本或 HTML
+        url: 页面 URL（用于按站点学习样板）
+        learn: 是否把本页的文本块计入站点统计（重建索引等重复处理同一页面时应为 False）
+
+    Returns:
+        清理后的文本；清理后为空时返回仅折叠空白的文本
+    """
+    lines = _normalize_lines(text)
+    if not lines:
+        return ""
+    collapsed = "\n".join(lines)
+
+    # 页面内重复的行只保留第一次出现
+    seen = set()
+    unique_lines = []
+    for line in lines:
+        key = line.lower()
+        if key in seen:
+            continue
+        seen.add(key)
+        unique_lines.append(line)
+
+    # 站点样板：按多数页面都出现的文本块删除
+    site = _site_key(url)
+    boilerplate = set()
+    if site and config.ENABLE_BOILERPLATE_LEARNING:
+        hashes = list({
+            _block_hash(line)
+            for line in unique_lines
+            if len(line) <= config.BOILERPLATE_MAX_BLOCK_CHARS
+        })
+        try:
+            from utils.db import get_boilerplate_hashes, record_boilerplate_page
+
+            boilerplate = get_boilerplate_hashes(
+                site,
+                hashes,
+                min_pages=config.BOILERPLATE_MIN_PAGES,
+                min_ratio=config.BOILERPLATE_MIN_RATIO
+            )
+            if learn:
+                record_boilerplate_page(site, _page_hash(url), hashes)
+        except Exception as e:
+            logger.warning(f"Boilerplate lookup failed for {site}: {e}")
+
+    kept = [
+        line for line in unique_lines
+        if not (boilerplate and len(line) <= config.BOILERPLATE_MAX_BLOCK_CHARS and _block_hash(line) in boilerplate)
+        and not (len(line) < 200 and _COOKIE_LINE.search(line))
+    ]
+    kept = _trim_navigation(kept)
+
+    cleaned = "\n".join(kept)
+    return cleaned or collapsed
+
+
+def clean_web_content(content: Any, url: Optional[str] = None, title: Optional[str] = None, learn: bool = True) -> Optional[str]:
+    """
+    从上传的内容中提取并清理正文
+
+    Returns:
+        清理后的文本（有标题时置于首行）；内容不是页面文本时返回 None（调用方沿用原有处理）
+    """
+    text = extract_page_text(content)
+    if text is None:
+        return None
+    cleaned = clean_page_text(text, url=url, learn=learn)
+    if title and cleaned and not cleaned.startswith(title):
+        cleaned = f"{title}\n{cleaned}"
+    return cleaned
+
+
+def get_cleaning_stats(raw: str, cleaned: str) -> Dict[str, Any]:
+    """清理前后的长度对比（写入元数据，便于评估效果）"""
+    raw_chars = len(raw or "")
+    clean_chars = len(cleaned or "")
+    return {
+        "raw_chars": raw_chars,
+        "clean_chars": clean_chars,
+        "reduction": round(1 - clean_chars / raw_chars, 3) if raw_chars else 0.0,
+    }
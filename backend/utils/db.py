@@ -8,10 +8,13 @@ from datetime import datetime
 from pathlib import Path
 import config
 from utils.helpers import get_logger
-from typing import Optional, List
+from typing import Optional, List, Dict
 
 logger = get_logger(__name__)
 
+# 需要与向量库保持同步的表
+VECTOR_SYNC_TABLES = ("todos", "tips", "web_data")
+
 
 def get_db_connection():
     """获取数据库连接"""
@@ -154,6 +157,204 @@ def init_db():
         )
     """)
     
+    # 向量库同步状态字段（用于 SQLite 与向量库的一致性校验）
+    for table in VECTOR_SYNC_TABLES:
+        for column in ("vector_synced_at", "vector_fingerprint"):
+            try:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} TEXT")
+                logger.info(f"Added {column} column to {table} table")
+            except sqlite3.OperationalError:
+                # 字段已存在，忽略错误
+                pass
+    
+    # 创建 URL 索引表（规范化 URL -> 向量库文档 ID，用于页面级检索）
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS url_index (
+            doc_id TEXT PRIMARY KEY,
+            web_data_id INTEGER,
+            canonical_url TEXT NOT NULL,
+            base_url TEXT NOT NULL,
+            domain TEXT,
+            source TEXT,
+            session_id TEXT,
+            create_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_url_index_canonical ON url_index (canonical_url)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_url_index_base ON url_index (base_url)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_url_index_domain ON url_index (domain)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_url_index_web_data ON url_index (web_data_id)")
+    
+    # 创建向量重建任务表（更换 embedding 模型后写入影子集合，记录断点）
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS reindex_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            source_collection TEXT NOT NULL,
+            target_collection TEXT NOT NULL,
+            embedding_model TEXT,
+            status TEXT NOT NULL DEFAULT 'pending',
+            cursor TEXT,
+            total INTEGER DEFAULT 0,
+            processed INTEGER DEFAULT 0,
+            failed INTEGER DEFAULT 0,
+            error TEXT,
+            create_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            update_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            finish_time TIMESTAMP
+        )
+    """)
+    
+    # 创建会话记忆登记表（内容哈希去重、上限淘汰、过期清理与压缩）
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS session_memories (
+            memory_id TEXT PRIMARY KEY,
+            session_id TEXT NOT NULL,
+            content_hash TEXT NOT NULL,
+            content_type TEXT,
+            hit_count INTEGER DEFAULT 1,
+            create_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_seen_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_session_memories_hash ON session_memories (session_id, content_hash)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_session_memories_last_seen ON session_memories (last_seen_time)")
+    
+    # 创建 LLM 响应缓存表（按请求参数哈希缓存确定性调用的结果）
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS llm_cache (
+            cache_key TEXT PRIMARY KEY,
+            model TEXT,
+            response TEXT NOT NULL,
+            size INTEGER DEFAULT 0,
+            hit_count INTEGER DEFAULT 0,
+            create_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_hit_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            expire_time TIMESTAMP NOT NULL
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_expire ON llm_cache (expire_time)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_hit ON llm_cache (last_hit_time)")
+    
+    # LLM / Embedding 调用监控（滚动保留）
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS llm_call_metrics (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            call_site TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            model TEXT,
+            status TEXT NOT NULL,
+            error_type TEXT,
+            latency_ms REAL DEFAULT 0,
+            queue_ms REAL DEFAULT 0,
+            prompt_tokens INTEGER DEFAULT 0,
+            completion_tokens INTEGER DEFAULT 0,
+            total_tokens INTEGER DEFAULT 0,
+            cost REAL DEFAULT 0,
+            retries INTEGER DEFAULT 0,
+            cache_hit INTEGER DEFAULT 0,
+            stream INTEGER DEFAULT 0,
+            create_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_llm_call_metrics_time ON llm_call_metrics (create_time)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_llm_call_metrics_site ON llm_call_metrics (call_site, create_time)")
+    
+    # 网页数据摄取任务（上传接口保存原始数据后立即返回，由后台 worker 完成分析与向量化）
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS ingestion_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            status TEXT NOT NULL DEFAULT 'pending',
+            payload TEXT NOT NULL,
+            title TEXT,
+            url TEXT,
+            web_data_id INTEGER,
+            result TEXT,
+            error TEXT,
+            attempts INTEGER DEFAULT 0,
+            create_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            update_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            start_time TIMESTAMP,
+            finish_time TIMESTAMP
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_ingestion_jobs_status ON ingestion_jobs (status, id)")
+    
+    # 上传合并字段：同一页面（URL + 会话）静默期内的上传合并到同一个待处理任务，run_after 之前不执行
+    for column, column_type in (("coalesce_key", "TEXT"), ("run_after", "TIMESTAMP"), ("merged", "INTEGER DEFAULT 0")):
+        try:
+            cursor.execute(f"ALTER TABLE ingestion_jobs ADD COLUMN {column} {column_type}")
+            logger.info(f"Added {column} column to ingestion_jobs table")
+        except sqlite3.OperationalError:
+            # 字段已存在，忽略错误
+            pass
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_ingestion_jobs_coalesce ON ingestion_jobs (coalesce_key, status)")
+    
+    # 站点样板统计（各站点见过的不同页面数，以及每个文本块出现在多少个不同页面中）
+    # boilerplate_pages 记录已计入的页面（按规范化 URL）及其已计入的文本块，同一页面重复上传不重复计数
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'boilerplate_pages'")
+    has_page_table = cursor.fetchone() is not None
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS boilerplate_pages (
+            site TEXT NOT NULL,
+            page_hash TEXT NOT NULL,
+            blocks TEXT DEFAULT '[]',
+            last_seen_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (site, page_hash)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS boilerplate_sites (
+            site TEXT PRIMARY KEY,
+            pages INTEGER DEFAULT 0,
+            update_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS boilerplate_blocks (
+            site TEXT NOT NULL,
+            block_hash TEXT NOT NULL,
+            hits INTEGER DEFAULT 0,
+            last_seen_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (site, block_hash)
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_boilerplate_blocks_seen ON boilerplate_blocks (last_seen_time)")
+    if not has_page_table:
+        # 旧版统计按上传次数累加（同一页面重复上传会被误判为样板），无法还原为按页面计数，清空后重新学习
+        cursor.execute("DELETE FROM boilerplate_sites")
+        cursor.execute("DELETE FROM boilerplate_blocks")
+    
+    # 网页当前版本（按规范化 URL，dom-diff 应用到当前文本上；chunks 为 {分块文档ID: 所属 web_data_id（当前版本的行）}）
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS page_documents (
+            page_key TEXT PRIMARY KEY,
+            url TEXT,
+            version INTEGER DEFAULT 0,
+            content_hash TEXT,
+            content TEXT,
+            web_data_id INTEGER,
+            chunks TEXT,
+            update_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_page_documents_update ON page_documents (update_time)")
+    
+    # 网页版本链（每次上传对应一个版本，指向保存该次上传的 web_data 行）
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS page_versions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            page_key TEXT NOT NULL,
+            version INTEGER NOT NULL,
+            web_data_id INTEGER,
+            change_type TEXT,
+            base_hash TEXT,
+            content_hash TEXT,
+            exact INTEGER DEFAULT 1,
+            create_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_page_versions_key ON page_versions (page_key, version)")
+    
     conn.commit()
     conn.close()
     logger.info("Database initialized successfully")
@@ -583,7 +784,10 @@ def get_web_data(start_time=None, end_time=None, limit=50, offset=0):
         web_data_list.append(item)
     
     conn.close()
-    return web_data_list
+    
+    # 过滤命中 URL 黑名单的页面（加入黑名单前已存储的数据也不再进入生成流程）
+    from utils.url_blacklist import filter_blacklisted
+    return filter_blacklisted(web_data_list, lambda item: item.get('url'))
 
 
 def insert_web_data(title, url, content, source="web_crawler", tags=None, metadata=None):
@@ -609,6 +813,76 @@ def insert_web_data(title, url, content, source="web_crawler", tags=None, metada
     return web_data_id
 
 
+def insert_web_data_batch(items: List[Dict]) -> List[int]:
+    """
+    在一个事务中批量插入网页数据（任一条失败则全部回滚）
+
+    Args:
+        items: 每项包含 title、url、content，可选 source、tags、metadata；
+               可选 page_version（save_page_version 除 web_data_id 外的参数），同时记录该行形成的页面版本
+
+    Returns:
+        与 items 一一对应的 web_data_id 列表
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    create_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    ids = []
+    try:
+        for item in items:
+            content = item.get('content')
+            cursor.execute(
+                "INSERT INTO web_data (title, url, content, source, tags, metadata, create_time) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    item.get('title'),
+                    item.get('url'),
+                    json.dumps(content) if isinstance(content, dict) else content,
+                    item.get('source', 'web_crawler'),
+                    json.dumps(item['tags']) if item.get('tags') else None,
+                    json.dumps(item['metadata']) if item.get('metadata') else None,
+                    create_time
+                )
+            )
+            ids.append(cursor.lastrowid)
+            if item.get('page_version'):
+                _write_page_version(cursor, web_data_id=cursor.lastrowid, now=create_time, **item['page_version'])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return ids
+
+
+def get_web_data_with_temp_files(after_id: int = 0, limit: int = 500) -> List[dict]:
+    """按 ID 分页获取元数据中记录了临时文件路径的网页数据（旧版上传流程遗留）"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT id, metadata FROM web_data WHERE id > ? AND metadata LIKE '%\"temp_file_path\"%' ORDER BY id LIMIT ?",
+        (after_id, limit)
+    )
+    rows = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return rows
+
+
+def update_web_data_metadata(web_data_id: int, metadata: dict) -> bool:
+    """更新网页数据的元数据"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        "UPDATE web_data SET metadata = ? WHERE id = ?",
+        (json.dumps(metadata) if metadata else None, web_data_id)
+    )
+    updated = cursor.rowcount > 0
+    conn.commit()
+    conn.close()
+    return updated
+
+
 def get_screenshots(start_time=None, end_time=None, limit=10, offset=0):
     """获取截图列表"""
     conn = get_db_connection()
@@ -683,6 +957,16 @@ def add_url_to_blacklist(url: str):
         conn.close()
 
 
+def get_all_blacklisted_urls() -> List[str]:
+    """获取全部黑名单条目（用于编译内存匹配器）"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT url FROM url_blacklist")
+    urls = [row['url'] for row in cursor.fetchall()]
+    conn.close()
+    return urls
+
+
 def delete_url_from_blacklist(entry_id: int):
     """从黑名单中删除指定记录"""
     conn = get_db_connection()
@@ -696,141 +980,823 @@ def delete_url_from_blacklist(entry_id: int):
     return affected_rows > 0
 
 
-# 设置相关操作
-def get_setting(key, default_value=None):
-    """获取设置值
-    
+# URL 索引相关操作
+def add_url_index_entries(entries: List[dict]) -> int:
+    """
+    批量写入 URL 索引
+
     Args:
-        key: 设置键名
-        default_value: 如果不存在时返回的默认值
-    
+        entries: 每项包含 doc_id, web_data_id, canonical_url, base_url, domain, source, session_id
+
     Returns:
-        str: 设置值，如果不存在则返回 default_value
+        写入的条目数
     """
+    if not entries:
+        return 0
+    
     conn = get_db_connection()
     cursor = conn.cursor()
     
-    cursor.execute("SELECT value FROM settings WHERE key = ?", (key,))
-    row = cursor.fetchone()
-    conn.close()
+    create_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     
-    if row:
-        return row['value']
-    return default_value
+    cursor.executemany(
+        """
+        INSERT OR REPLACE INTO url_index
+            (doc_id, web_data_id, canonical_url, base_url, domain, source, session_id, create_time)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        [
+            (
+                entry["doc_id"],
+                entry.get("web_data_id"),
+                entry["canonical_url"],
+                entry["base_url"],
+                entry.get("domain", ""),
+                entry.get("source"),
+                entry.get("session_id"),
+                create_time
+            )
+            for entry in entries
+        ]
+    )
+    
+    count = cursor.rowcount
+    conn.commit()
+    conn.close()
+    return count
 
 
-def set_setting(key, value, description=None):
-    """设置配置值
-    
+def get_url_index_doc_ids(
+    url_value: str,
+    match: str = "canonical",
+    sources: Optional[List[str]] = None,
+    session_id: Optional[str] = None,
+    limit: int = 1000
+) -> List[str]:
+    """
+    按规范化 URL 查询向量库文档 ID
+
     Args:
-        key: 设置键名
-        value: 设置值（字符串）
-        description: 设置描述（可选）
-    
+        url_value: 已规范化的 URL 或域名（与 match 对应）
+        match: 匹配字段（canonical, base, domain）
+        sources: 来源过滤（为空表示不限）
+        session_id: 会话ID过滤（为空表示不限）
+        limit: 最多返回数量
+
     Returns:
-        bool: 是否设置成功
+        文档 ID 列表（最新写入的在前）
     """
+    columns = {"canonical": "canonical_url", "base": "base_url", "domain": "domain"}
+    if match not in columns:
+        raise ValueError(f"不支持的匹配方式: {match}")
+    if not url_value:
+        return []
+    
     conn = get_db_connection()
     cursor = conn.cursor()
     
-    update_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    query = f"SELECT doc_id FROM url_index WHERE {columns[match]} = ?"
+    params = [url_value]
     
-    if description:
-        cursor.execute("""
-            INSERT OR REPLACE INTO settings (key, value, description, update_time)
-            VALUES (?, ?, ?, ?)
-        """, (key, str(value), description, update_time))
-    else:
-        cursor.execute("""
-            INSERT OR REPLACE INTO settings (key, value, update_time)
-            VALUES (?, ?, ?)
-        """, (key, str(value), update_time))
+    if sources:
+        query += f" AND source IN ({','.join('?' * len(sources))})"
+        params.extend(sources)
+    
+    if session_id:
+        query += " AND session_id = ?"
+        params.append(session_id)
+    
+    query += " ORDER BY create_time DESC, doc_id LIMIT ?"
+    params.append(limit)
+    
+    cursor.execute(query, params)
+    doc_ids = [row["doc_id"] for row in cursor.fetchall()]
+    conn.close()
+    return doc_ids
+
+
+def delete_url_index_by_web_data(web_data_id: int) -> int:
+    """删除指定网页数据的 URL 索引"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute("DELETE FROM url_index WHERE web_data_id = ?", (web_data_id,))
+    affected_rows = cursor.rowcount
     
     conn.commit()
     conn.close()
-    return True
+    return affected_rows
 
 
-def get_all_settings():
-    """获取所有设置
+def delete_url_index_doc_ids(doc_ids: List[str]) -> int:
+    """删除指定文档的 URL 索引"""
+    if not doc_ids:
+        return 0
     
-    Returns:
-        dict: 所有设置的键值对
-    """
     conn = get_db_connection()
     cursor = conn.cursor()
     
-    cursor.execute("SELECT key, value, description FROM settings")
-    rows = cursor.fetchall()
-    conn.close()
+    deleted = 0
+    for start in range(0, len(doc_ids), 500):
+        batch = doc_ids[start:start + 500]
+        placeholders = ",".join("?" * len(batch))
+        cursor.execute(f"DELETE FROM url_index WHERE doc_id IN ({placeholders})", batch)
+        deleted += cursor.rowcount
     
-    settings = {}
-    for row in rows:
-        row_dict = dict(row)  # 转换为字典
-        settings[row_dict['key']] = {
-            'value': row_dict['value'],
-            'description': row_dict.get('description', '')  # 现在可以使用 .get() 了
-        }
+    conn.commit()
+    conn.close()
+    return deleted
+
+
+def clear_url_index() -> None:
+    """清空 URL 索引"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM url_index")
+    conn.commit()
+    conn.close()
+
+
+def count_url_index() -> int:
+    """获取 URL 索引条目数"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
     
-    return settings
+    cursor.execute("SELECT COUNT(*) FROM url_index")
+    count = cursor.fetchone()[0]
+    conn.close()
+    return count
 
 
-# ============================================================================
-# Daily Feed 相关函数
-# ============================================================================
+# 向量库同步状态相关操作
+def _check_vector_sync_table(table: str):
+    if table not in VECTOR_SYNC_TABLES:
+        raise ValueError(f"不支持的同步表: {table}")
 
-def insert_daily_feed(date: str, cards: List[dict], total_count: int) -> Optional[int]:
-    """插入或更新每日Feed
+
+def mark_vector_synced(table: str, row_id: int, fingerprint: str) -> bool:
+    """记录某行已同步到向量库"""
+    _check_vector_sync_table(table)
     
-    Args:
-        date: 日期字符串 (YYYY-MM-DD)
-        cards: 卡片列表
-        total_count: 卡片总数
+    conn = get_db_connection()
+    cursor = conn.cursor()
     
-    Returns:
-        int: feed ID，失败返回 None
-    """
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # 将cards列表转换为JSON字符串
-        cards_json = json.dumps(cards, ensure_ascii=False)
-        
-        # 使用 INSERT OR REPLACE 实现 upsert
-        cursor.execute("""
-            INSERT OR REPLACE INTO daily_feeds (date, cards, total_count, create_time)
-            VALUES (?, ?, ?, CURRENT_TIMESTAMP)
-        """, (date, cards_json, total_count))
-        
-        feed_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
-        
-        logger.info(f"Inserted/Updated daily feed for date {date} with {total_count} cards")
-        return feed_id
-        
-    except Exception as e:
-        logger.exception(f"Error inserting daily feed: {e}")
-        return None
+    synced_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    cursor.execute(
+        f"UPDATE {table} SET vector_synced_at = ?, vector_fingerprint = ? WHERE id = ?",
+        (synced_at, fingerprint, row_id)
+    )
+    
+    affected_rows = cursor.rowcount
+    conn.commit()
+    conn.close()
+    return affected_rows > 0
 
 
-def get_daily_feed(date: str) -> Optional[dict]:
-    """获取指定日期的Feed
+def clear_vector_sync_state(table: Optional[str] = None) -> None:
+    """清除同步状态（向量库被清空或重建后调用）"""
+    tables = [table] if table else list(VECTOR_SYNC_TABLES)
+    for name in tables:
+        _check_vector_sync_table(name)
+    
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    for name in tables:
+        cursor.execute(f"UPDATE {name} SET vector_synced_at = NULL, vector_fingerprint = NULL")
+    conn.commit()
+    conn.close()
+
+
+def get_rows_for_vector_sync(
+    table: str,
+    after_id: int = 0,
+    limit: int = 500,
+    only_unsynced: bool = False,
+    created_before: Optional[str] = None,
+    synced_since: Optional[str] = None
+) -> List[dict]:
+    """
+    按 ID 顺序分页读取待校验的行
     
     Args:
-        date: 日期字符串 (YYYY-MM-DD)
+        table: 表名（todos, tips, web_data）
+        after_id: 只返回 ID 大于该值的行（键集分页）
+        limit: 每页数量
+        only_unsynced: 只返回从未同步过的行
+        created_before: 只返回该时间之前创建的行（跳过可能仍在写入中的新行）
+        synced_since: 只返回在该时间之后写入过向量库的行
     
     Returns:
-        dict: Feed数据，包含 date, cards, total_count, create_time
+        行字典列表
     """
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT id, date, cards, total_count, create_time
-            FROM daily_feeds
+    _check_vector_sync_table(table)
+    
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    query = f"SELECT * FROM {table} WHERE id > ?"
+    params = [after_id]
+    
+    if only_unsynced:
+        query += " AND vector_synced_at IS NULL"
+    
+    if created_before:
+        query += " AND create_time <= ?"
+        params.append(created_before)
+    
+    if synced_since:
+        query += " AND vector_synced_at >= ?"
+        params.append(synced_since)
+    
+    query += " ORDER BY id LIMIT ?"
+    params.append(limit)
+    
+    cursor.execute(query, params)
+    rows = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return rows
+
+
+def get_existing_row_ids(table: str, row_ids: List[int]) -> set:
+    """返回 row_ids 中在表内仍存在的 ID 集合"""
+    _check_vector_sync_table(table)
+    if not row_ids:
+        return set()
+    
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    existing = set()
+    for start in range(0, len(row_ids), 500):
+        batch = row_ids[start:start + 500]
+        cursor.execute(
+            f"SELECT id FROM {table} WHERE id IN ({','.join('?' * len(batch))})",
+            batch
+        )
+        existing.update(row["id"] for row in cursor.fetchall())
+    
+    conn.close()
+    return existing
+
+
+def count_table_rows(table: str) -> int:
+    """统计参与向量同步的表的行数"""
+    _check_vector_sync_table(table)
+    
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT COUNT(*) FROM {table}")
+    count = cursor.fetchone()[0]
+    conn.close()
+    return count
+
+
+# 会话记忆登记相关操作
+def get_session_memory_by_hash(session_id: str, content_hash: str) -> Optional[dict]:
+    """按内容哈希查找会话中已存在的记忆"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT * FROM session_memories WHERE session_id = ? AND content_hash = ?",
+        (session_id, content_hash)
+    )
+    row = cursor.fetchone()
+    conn.close()
+    return dict(row) if row else None
+
+
+def touch_session_memory(memory_id: str) -> bool:
+    """重复写入时只刷新最近出现时间与命中次数"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    cursor.execute("""
+        UPDATE session_memories SET hit_count = hit_count + 1, last_seen_time = ?
+        WHERE memory_id = ?
+    """, (now, memory_id))
+    
+    success = cursor.rowcount > 0
+    conn.commit()
+    conn.close()
+    return success
+
+
+def add_session_memory_record(
+    memory_id: str,
+    session_id: str,
+    content_hash: str,
+    content_type: str,
+    create_time: Optional[str] = None
+) -> bool:
+    """登记会话记忆（向量写入成功后调用）"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    cursor.execute("""
+        INSERT OR REPLACE INTO session_memories
+        (memory_id, session_id, content_hash, content_type, create_time, last_seen_time)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, (memory_id, session_id, content_hash, content_type, create_time or now, create_time or now))
+    
+    conn.commit()
+    conn.close()
+    return True
+
+
+def get_session_memory_records(
+    session_id: Optional[str] = None,
+    content_types: Optional[List[str]] = None,
+    last_seen_before: Optional[str] = None,
+    limit: Optional[int] = None
+) -> List[dict]:
+    """
+    获取会话记忆登记记录（按最近出现时间从旧到新）
+    
+    Args:
+        session_id: 会话ID（可选）
+        content_types: 只返回这些内容类型（可选）
+        last_seen_before: 只返回该时间之前最后出现的记忆（可选）
+        limit: 返回数量（可选）
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    query = "SELECT * FROM session_memories WHERE 1=1"
+    params = []
+    
+    if session_id:
+        query += " AND session_id = ?"
+        params.append(session_id)
+    
+    if content_types:
+        query += f" AND content_type IN ({','.join('?' for _ in content_types)})"
+        params.extend(content_types)
+    
+    if last_seen_before:
+        query += " AND last_seen_time < ?"
+        params.append(last_seen_before)
+    
+    query += " ORDER BY last_seen_time ASC, create_time ASC, rowid ASC"
+    
+    if limit:
+        query += " LIMIT ?"
+        params.append(limit)
+    
+    cursor.execute(query, params)
+    rows = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return rows
+
+
+def get_session_memory_counts(
+    content_types: Optional[List[str]] = None,
+    last_seen_before: Optional[str] = None,
+    min_count: int = 1
+) -> List[dict]:
+    """按会话统计记忆数量，返回 [{"session_id", "count"}]"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    query = "SELECT session_id, COUNT(*) AS count FROM session_memories WHERE 1=1"
+    params = []
+    
+    if content_types:
+        query += f" AND content_type IN ({','.join('?' for _ in content_types)})"
+        params.extend(content_types)
+    
+    if last_seen_before:
+        query += " AND last_seen_time < ?"
+        params.append(last_seen_before)
+    
+    query += " GROUP BY session_id HAVING COUNT(*) >= ?"
+    params.append(min_count)
+    
+    cursor.execute(query, params)
+    rows = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return rows
+
+
+def delete_session_memory_records(memory_ids: List[str]) -> int:
+    """删除会话记忆登记记录"""
+    if not memory_ids:
+        return 0
+    
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    deleted = 0
+    for start in range(0, len(memory_ids), 500):
+        batch = memory_ids[start:start + 500]
+        cursor.execute(
+            f"DELETE FROM session_memories WHERE memory_id IN ({','.join('?' for _ in batch)})",
+            batch
+        )
+        deleted += cursor.rowcount
+    
+    conn.commit()
+    conn.close()
+    return deleted
+
+
+def clear_session_memory_records() -> None:
+    """清空会话记忆登记（向量库被清空后调用）"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM session_memories")
+    conn.commit()
+    conn.close()
+
+
+# LLM 响应缓存相关操作
+def get_llm_cache_entry(cache_key: str) -> Optional[str]:
+    """获取未过期的缓存响应，命中时更新命中次数与时间"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    cursor.execute(
+        "SELECT response FROM llm_cache WHERE cache_key = ? AND expire_time > ?",
+        (cache_key, now)
+    )
+    row = cursor.fetchone()
+    
+    if row:
+        cursor.execute(
+            "UPDATE llm_cache SET hit_count = hit_count + 1, last_hit_time = ? WHERE cache_key = ?",
+            (now, cache_key)
+        )
+        conn.commit()
+    
+    conn.close()
+    return row['response'] if row else None
+
+
+def set_llm_cache_entry(cache_key: str, model: str, response: str, expire_time: str) -> bool:
+    """写入缓存响应"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    cursor.execute("""
+        INSERT OR REPLACE INTO llm_cache
+        (cache_key, model, response, size, hit_count, create_time, last_hit_time, expire_time)
+        VALUES (?, ?, ?, ?, 0, ?, ?, ?)
+    """, (cache_key, model, response, len(response.encode('utf-8')), now, now, expire_time))
+    
+    conn.commit()
+    conn.close()
+    return True
+
+
+def evict_llm_cache(max_entries: int, max_bytes: int) -> int:
+    """
+    删除过期缓存，并按最近命中时间淘汰超出数量或总大小上限的条目
+    
+    Returns:
+        删除的条目数
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    cursor.execute("DELETE FROM llm_cache WHERE expire_time <= ?", (now,))
+    deleted = cursor.rowcount
+    
+    cursor.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache")
+    count, total_size = cursor.fetchone()
+    
+    if count > max_entries or total_size > max_bytes:
+        cursor.execute("SELECT cache_key, size FROM llm_cache ORDER BY last_hit_time ASC")
+        victims = []
+        for row in cursor.fetchall():
+            if count <= max_entries and total_size <= max_bytes:
+                break
+            victims.append(row['cache_key'])
+            count -= 1
+            total_size -= row['size'] or 0
+        
+        for start in range(0, len(victims), 500):
+            batch = victims[start:start + 500]
+            cursor.execute(f"DELETE FROM llm_cache WHERE cache_key IN ({','.join('?' for _ in batch)})", batch)
+        deleted += len(victims)
+    
+    conn.commit()
+    conn.close()
+    return deleted
+
+
+def get_llm_cache_stats() -> dict:
+    """获取缓存统计（条目数、总大小、累计命中次数）"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) AS entries, COALESCE(SUM(size), 0) AS size, COALESCE(SUM(hit_count), 0) AS hits FROM llm_cache")
+    stats = dict(cursor.fetchone())
+    conn.close()
+    return stats
+
+
+def clear_llm_cache() -> int:
+    """清空 LLM 响应缓存"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM llm_cache")
+    deleted = cursor.rowcount
+    conn.commit()
+    conn.close()
+    return deleted
+
+
+# LLM 调用监控相关操作
+_LLM_METRIC_FIELDS = (
+    "call_site", "kind", "model", "status", "error_type", "latency_ms", "queue_ms",
+    "prompt_tokens", "completion_tokens", "total_tokens", "cost", "retries",
+    "cache_hit", "stream", "create_time"
+)
+
+
+def add_llm_call_metrics(records: List[dict]) -> int:
+    """批量写入调用记录"""
+    if not records:
+        return 0
+    
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.executemany(
+        f"INSERT INTO llm_call_metrics ({', '.join(_LLM_METRIC_FIELDS)}) "
+        f"VALUES ({', '.join('?' for _ in _LLM_METRIC_FIELDS)})",
+        [tuple(record.get(field) for field in _LLM_METRIC_FIELDS) for record in records]
+    )
+    conn.commit()
+    conn.close()
+    return len(records)
+
+
+def prune_llm_call_metrics(before: str, max_rows: int) -> int:
+    """删除早于 before 的记录，并只保留最新的 max_rows 条"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute("DELETE FROM llm_call_metrics WHERE create_time < ?", (before,))
+    deleted = cursor.rowcount
+    cursor.execute(
+        "DELETE FROM llm_call_metrics WHERE id <= (SELECT id FROM llm_call_metrics ORDER BY id DESC LIMIT 1 OFFSET ?)",
+        (max_rows,)
+    )
+    deleted += max(cursor.rowcount, 0)
+    
+    conn.commit()
+    conn.close()
+    return deleted
+
+
+def get_llm_call_metrics(since: str, call_site: Optional[str] = None) -> List[dict]:
+    """获取 since 之后的调用记录（按时间顺序）"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    query = f"SELECT {', '.join(_LLM_METRIC_FIELDS)} FROM llm_call_metrics WHERE create_time >= ?"
+    params = [since]
+    if call_site:
+        query += " AND call_site = ?"
+        params.append(call_site)
+    query += " ORDER BY id ASC"
+    
+    cursor.execute(query, params)
+    rows = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return rows
+
+
+# 向量重建任务相关操作
+def create_reindex_job(source_collection: str, target_collection: str, embedding_model: str, total: int = 0) -> int:
+    """创建向量重建任务，返回任务ID"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    cursor.execute("""
+        INSERT INTO reindex_jobs (source_collection, target_collection, embedding_model, status, cursor, total, create_time, update_time)
+        VALUES (?, ?, ?, 'pending', '{}', ?, ?, ?)
+    """, (source_collection, target_collection, embedding_model, total, now, now))
+    
+    job_id = cursor.lastrowid
+    conn.commit()
+    conn.close()
+    return job_id
+
+
+def update_reindex_job(job_id: int, **fields) -> bool:
+    """
+    更新向量重建任务
+    
+    Args:
+        job_id: 任务ID
+        **fields: status, cursor, total, processed, failed, error, finish_time
+    
+    Returns:
+        是否更新成功
+    """
+    allowed = {'status', 'cursor', 'total', 'processed', 'failed', 'error', 'finish_time'}
+    updates = {key: value for key, value in fields.items() if key in allowed}
+    if not updates:
+        return False
+    
+    if isinstance(updates.get('cursor'), dict):
+        updates['cursor'] = json.dumps(updates['cursor'], ensure_ascii=False)
+    updates['update_time'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    set_clause = ", ".join(f"{key} = ?" for key in updates)
+    cursor.execute(f"UPDATE reindex_jobs SET {set_clause} WHERE id = ?", (*updates.values(), job_id))
+    
+    success = cursor.rowcount > 0
+    conn.commit()
+    conn.close()
+    return success
+
+
+def _reindex_job_to_dict(row) -> dict:
+    job = dict(row)
+    try:
+        job['cursor'] = json.loads(job['cursor']) if job.get('cursor') else {}
+    except (json.JSONDecodeError, TypeError):
+        job['cursor'] = {}
+    return job
+
+
+def get_reindex_job(job_id: int) -> Optional[dict]:
+    """获取指定向量重建任务"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM reindex_jobs WHERE id = ?", (job_id,))
+    row = cursor.fetchone()
+    conn.close()
+    return _reindex_job_to_dict(row) if row else None
+
+
+def get_latest_reindex_job(statuses: Optional[List[str]] = None) -> Optional[dict]:
+    """
+    获取最近的向量重建任务
+    
+    Args:
+        statuses: 只在这些状态中查找（可选）
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    query = "SELECT * FROM reindex_jobs"
+    params = []
+    if statuses:
+        query += f" WHERE status IN ({','.join('?' for _ in statuses)})"
+        params.extend(statuses)
+    query += " ORDER BY id DESC LIMIT 1"
+    
+    cursor.execute(query, params)
+    row = cursor.fetchone()
+    conn.close()
+    return _reindex_job_to_dict(row) if row else None
+
+
+# 设置相关操作
+def get_setting(key, default_value=None):
+    """获取设置值
+    
+    Args:
+        key: 设置键名
+        default_value: 如果不存在时返回的默认值
+    
+    Returns:
+        str: 设置值，如果不存在则返回 default_value
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute("SELECT value FROM settings WHERE key = ?", (key,))
+    row = cursor.fetchone()
+    conn.close()
+    
+    if row:
+        return row['value']
+    return default_value
+
+
+def set_setting(key, value, description=None):
+    """设置配置值
+    
+    Args:
+        key: 设置键名
+        value: 设置值（字符串）
+        description: 设置描述（可选）
+    
+    Returns:
+        bool: 是否设置成功
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    update_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    
+    if description:
+        cursor.execute("""
+            INSERT OR REPLACE INTO settings (key, value, description, update_time)
+            VALUES (?, ?, ?, ?)
+        """, (key, str(value), description, update_time))
+    else:
+        cursor.execute("""
+            INSERT OR REPLACE INTO settings (key, value, update_time)
+            VALUES (?, ?, ?)
+        """, (key, str(value), update_time))
+    
+    conn.commit()
+    conn.close()
+    return True
+
+
+def get_all_settings():
+    """获取所有设置
+    
+    Returns:
+        dict: 所有设置的键值对
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute("SELECT key, value, description FROM settings")
+    rows = cursor.fetchall()
+    conn.close()
+    
+    settings = {}
+    for row in rows:
+        row_dict = dict(row)  # 转换为字典
+        settings[row_dict['key']] = {
+            'value': row_dict['value'],
+            'description': row_dict.get('description', '')  # 现在可以使用 .get() 了
+        }
+    
+    return settings
+
+
+# ============================================================================
+# Daily Feed 相关函数
+# ============================================================================
+
+def insert_daily_feed(date: str, cards: List[dict], total_count: int) -> Optional[int]:
+    """插入或更新每日Feed
+    
+    Args:
+        date: 日期字符串 (YYYY-MM-DD)
+        cards: 卡片列表
+        total_count: 卡片总数
+    
+    Returns:
+        int: feed ID，失败返回 None
+    """
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        
+        # 将cards列表转换为JSON字符串
+        cards_json = json.dumps(cards, ensure_ascii=False)
+        
+        # 使用 INSERT OR REPLACE 实现 upsert
+        cursor.execute("""
+            INSERT OR REPLACE INTO daily_feeds (date, cards, total_count, create_time)
+            VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+        """, (date, cards_json, total_count))
+        
+        feed_id = cursor.lastrowid
+        conn.commit()
+        conn.close()
+        
+        logger.info(f"Inserted/Updated daily feed for date {date} with {total_count} cards")
+        return feed_id
+        
+    except Exception as e:
+        logger.exception(f"Error inserting daily feed: {e}")
+        return None
+
+
+def get_daily_feed(date: str) -> Optional[dict]:
+    """获取指定日期的Feed
+    
+    Args:
+        date: 日期字符串 (YYYY-MM-DD)
+    
+    Returns:
+        dict: Feed数据，包含 date, cards, total_count, create_time
+    """
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            SELECT id, date, cards, total_count, create_time
+            FROM daily_feeds
             WHERE date = ?
         """, (date,))
         
@@ -913,3 +1879,399 @@ def delete_daily_feed(date: str) -> bool:
         logger.exception(f"Error deleting daily feed: {e}")
         return False
 
+
+# 网页数据摄取任务相关操作
+def create_ingestion_job(payload: dict, coalesce_key: Optional[str] = None, run_after: Optional[str] = None) -> int:
+    """
+    保存上传的原始数据并创建待处理的摄取任务，返回任务ID
+    
+    Args:
+        payload: 上传的原始数据
+        coalesce_key: 合并键（之后同一键的上传可合并到该任务）
+        run_after: 最早执行时间（静默期结束时间）
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    cursor.execute("""
+        INSERT INTO ingestion_jobs (status, payload, title, url, coalesce_key, run_after, create_time, update_time)
+        VALUES ('pending', ?, ?, ?, ?, ?, ?, ?)
+    """, (
+        json.dumps(payload, ensure_ascii=False), payload.get('title'), payload.get('url'),
+        coalesce_key, run_after, now, now
+    ))
+    
+    job_id = cursor.lastrowid
+    conn.commit()
+    conn.close()
+    return job_id
+
+
+def claim_ingestion_job(job_id: int) -> Optional[dict]:
+    """
+    领取待处理的摄取任务（pending -> running，尝试次数加一）
+    
+    Returns:
+        任务（含解析后的 payload）；任务不存在、已被领取或未到执行时间时返回 None
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    cursor.execute("""
+        UPDATE ingestion_jobs
+        SET status = 'running', attempts = attempts + 1, start_time = ?, update_time = ?
+        WHERE id = ? AND status = 'pending' AND (run_after IS NULL OR run_after <= ?)
+    """, (now, now, job_id, now))
+    
+    claimed = cursor.rowcount > 0
+    conn.commit()
+    
+    job = None
+    if claimed:
+        cursor.execute("SELECT * FROM ingestion_jobs WHERE id = ?", (job_id,))
+        job = _ingestion_job_to_dict(cursor.fetchone(), include_payload=True)
+    conn.close()
+    return job
+
+
+def update_ingestion_job(job_id: int, **fields) -> bool:
+    """
+    更新摄取任务
+    
+    Args:
+        job_id: 任务ID
+        **fields: status, web_data_id, result, error, finish_time
+    """
+    allowed = {'status', 'web_data_id', 'result', 'error', 'finish_time'}
+    updates = {key: value for key, value in fields.items() if key in allowed}
+    if not updates:
+        return False
+    
+    if isinstance(updates.get('result'), dict):
+        updates['result'] = json.dumps(updates['result'], ensure_ascii=False)
+    updates['update_time'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    set_clause = ", ".join(f"{key} = ?" for key in updates)
+    cursor.execute(f"UPDATE ingestion_jobs SET {set_clause} WHERE id = ?", (*updates.values(), job_id))
+    
+    success = cursor.rowcount > 0
+    conn.commit()
+    conn.close()
+    return success
+
+
+def _ingestion_job_to_dict(row, include_payload: bool = False) -> dict:
+    job = dict(row)
+    payload = job.pop('payload', None)
+    if include_payload:
+        job['payload'] = json.loads(payload) if payload else {}
+    try:
+        job['result'] = json.loads(job['result']) if job.get('result') else None
+    except (json.JSONDecodeError, TypeError):
+        job['result'] = None
+    return job
+
+
+def get_ingestion_job(job_id: int) -> Optional[dict]:
+    """获取摄取任务（不含原始数据）"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM ingestion_jobs WHERE id = ?", (job_id,))
+    row = cursor.fetchone()
+    conn.close()
+    return _ingestion_job_to_dict(row) if row else None
+
+
+def get_coalescable_ingestion_job(coalesce_key: str) -> Optional[dict]:
+    """获取同一合并键下最新的待处理任务（含解析后的 payload），没有时返回 None"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT * FROM ingestion_jobs WHERE coalesce_key = ? AND status = 'pending' ORDER BY id DESC LIMIT 1",
+        (coalesce_key,)
+    )
+    row = cursor.fetchone()
+    conn.close()
+    return _ingestion_job_to_dict(row, include_payload=True) if row else None
+
+
+def merge_into_ingestion_job(job_id: int, payload: dict, run_after: str) -> bool:
+    """
+    用合并后的数据替换待处理任务的原始数据并推迟执行时间
+    
+    Returns:
+        是否成功（任务已被 worker 领取时返回 False）
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("""
+        UPDATE ingestion_jobs
+        SET payload = ?, title = ?, url = ?, run_after = ?, merged = merged + 1, update_time = ?
+        WHERE id = ? AND status = 'pending'
+    """, (
+        json.dumps(payload, ensure_ascii=False), payload.get('title'), payload.get('url'), run_after,
+        datetime.now().strftime('%Y-%m-%d %H:%M:%S'), job_id
+    ))
+    merged = cursor.rowcount > 0
+    conn.commit()
+    conn.close()
+    return merged
+
+
+def requeue_running_ingestion_jobs() -> int:
+    """把上次进程退出时仍在运行的任务恢复为待处理，返回恢复的数量"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        "UPDATE ingestion_jobs SET status = 'pending', update_time = ? WHERE status = 'running'",
+        (datetime.now().strftime('%Y-%m-%d %H:%M:%S'),)
+    )
+    count = cursor.rowcount
+    conn.commit()
+    conn.close()
+    return count
+
+
+def get_pending_ingestion_job_ids() -> List[int]:
+    """待处理任务的ID（按提交顺序）"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT id FROM ingestion_jobs WHERE status = 'pending' ORDER BY id ASC")
+    ids = [row['id'] for row in cursor.fetchall()]
+    conn.close()
+    return ids
+
+
+def count_ingestion_jobs() -> Dict[str, int]:
+    """按状态统计摄取任务数"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT status, COUNT(*) AS count FROM ingestion_jobs GROUP BY status")
+    counts = {row['status']: row['count'] for row in cursor.fetchall()}
+    conn.close()
+    return counts
+
+
+def prune_ingestion_jobs(before: str) -> int:
+    """删除早于 before 结束（成功、失败或跳过）的任务"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        "DELETE FROM ingestion_jobs WHERE status IN ('completed', 'failed', 'skipped') AND finish_time < ?",
+        (before,)
+    )
+    deleted = cursor.rowcount
+    conn.commit()
+    conn.close()
+    return deleted
+
+
+# ============================================================================
+# 站点样板统计相关函数
+# ============================================================================
+
+def record_boilerplate_page(site: str, page_hash: str, block_hashes: List[str]) -> None:
+    """
+    记录站点的一个页面及其包含的文本块
+    
+    每个页面（page_hash，按规范化 URL）只计一次页面数；文本块只在首次出现于该页面时计数，
+    因此文本块的出现次数是包含它的不同页面数，同一页面重复上传不会使其正文被判定为样板
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    # 先写入页面行以取得写锁，之后读取其已计入的文本块，避免并发上传同一页面时重复计数
+    cursor.execute("""
+        INSERT INTO boilerplate_pages (site, page_hash, blocks, last_seen_time) VALUES (?, ?, '[]', ?)
+        ON CONFLICT(site, page_hash) DO NOTHING
+    """, (site, page_hash, now))
+    if cursor.rowcount:
+        cursor.execute("""
+            INSERT INTO boilerplate_sites (site, pages, update_time) VALUES (?, 1, ?)
+            ON CONFLICT(site) DO UPDATE SET pages = pages + 1, update_time = excluded.update_time
+        """, (site, now))
+    
+    cursor.execute("SELECT blocks FROM boilerplate_pages WHERE site = ? AND page_hash = ?", (site, page_hash))
+    known = set(json.loads(cursor.fetchone()['blocks'] or '[]'))
+    new_hashes = [block_hash for block_hash in block_hashes if block_hash not in known]
+    
+    cursor.executemany("""
+        INSERT INTO boilerplate_blocks (site, block_hash, hits, last_seen_time) VALUES (?, ?, 1, ?)
+        ON CONFLICT(site, block_hash) DO UPDATE SET hits = hits + 1, last_seen_time = excluded.last_seen_time
+    """, [(site, block_hash, now) for block_hash in new_hashes])
+    cursor.executemany(
+        "UPDATE boilerplate_blocks SET last_seen_time = ? WHERE site = ? AND block_hash = ?",
+        [(now, site, block_hash) for block_hash in block_hashes if block_hash in known]
+    )
+    cursor.execute(
+        "UPDATE boilerplate_pages SET blocks = ?, last_seen_time = ? WHERE site = ? AND page_hash = ?",
+        (json.dumps(sorted(known.union(new_hashes))), now, site, page_hash)
+    )
+    
+    conn.commit()
+    conn.close()
+
+
+def get_boilerplate_hashes(site: str, block_hashes: List[str], min_pages: int, min_ratio: float) -> set:
+    """
+    找出给定文本块中属于站点样板的部分
+    
+    Args:
+        site: 站点（主机名）
+        block_hashes: 待判断的文本块哈希
+        min_pages: 站点至少见过多少个不同页面才开始判定
+        min_ratio: 出现在该比例以上页面中的文本块视为样板（至少出现在两个不同页面中）
+    
+    Returns:
+        样板文本块的哈希集合
+    """
+    if not block_hashes:
+        return set()
+    
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute("SELECT pages FROM boilerplate_sites WHERE site = ?", (site,))
+    row = cursor.fetchone()
+    pages = row['pages'] if row else 0
+    if pages < min_pages:
+        conn.close()
+        return set()
+    
+    threshold = max(2, int(pages * min_ratio + 0.5))
+    found = set()
+    for start in range(0, len(block_hashes), 500):
+        batch = block_hashes[start:start + 500]
+        placeholders = ",".join("?" * len(batch))
+        cursor.execute(
+            f"SELECT block_hash FROM boilerplate_blocks WHERE site = ? AND hits >= ? AND block_hash IN ({placeholders})",
+            [site, threshold, *batch]
+        )
+        found.update(r['block_hash'] for r in cursor.fetchall())
+    
+    conn.close()
+    return found
+
+
+def prune_boilerplate_blocks(before: str) -> int:
+    """删除 before 之后再未出现、且只出现过一次的文本块（正文段落），返回删除数量"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        "DELETE FROM boilerplate_blocks WHERE hits <= 1 AND last_seen_time < ?",
+        (before,)
+    )
+    deleted = cursor.rowcount
+    conn.commit()
+    conn.close()
+    return deleted
+
+
+# 网页版本链相关操作
+def _page_document_to_dict(row) -> dict:
+    page = dict(row)
+    try:
+        page['chunks'] = json.loads(page['chunks']) if page.get('chunks') else {}
+    except (json.JSONDecodeError, TypeError):
+        page['chunks'] = {}
+    return page
+
+
+def get_page_document(page_key: str) -> Optional[dict]:
+    """获取网页的当前版本（chunks 解析为字典）"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM page_documents WHERE page_key = ?", (page_key,))
+    row = cursor.fetchone()
+    conn.close()
+    return _page_document_to_dict(row) if row else None
+
+
+def save_page_version(
+    page_key: str,
+    url: str,
+    version: int,
+    content: str,
+    content_hash: str,
+    web_data_id: int,
+    change_type: str,
+    base_hash: Optional[str] = None,
+    exact: bool = True
+) -> None:
+    """在一个事务中追加版本记录并更新网页的当前版本（分块映射保持不变，向量写入后另行更新）"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    try:
+        _write_page_version(
+            cursor, page_key=page_key, url=url, version=version, content=content, content_hash=content_hash,
+            web_data_id=web_data_id, change_type=change_type, base_hash=base_hash, exact=exact, now=now
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def _write_page_version(cursor, page_key: str, url: str, version: int, content: str, content_hash: str,
+                        web_data_id: int, change_type: str, base_hash: Optional[str], exact: bool, now: str) -> None:
+    """追加版本记录并更新网页的当前版本（在调用方的事务中执行）"""
+    cursor.execute(
+        """
+        INSERT INTO page_versions (page_key, version, web_data_id, change_type, base_hash, content_hash, exact, create_time)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        (page_key, version, web_data_id, change_type, base_hash, content_hash, 1 if exact else 0, now)
+    )
+    cursor.execute(
+        """
+        INSERT INTO page_documents (page_key, url, version, content_hash, content, web_data_id, update_time)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(page_key) DO UPDATE SET
+            url = excluded.url,
+            version = excluded.version,
+            content_hash = excluded.content_hash,
+            content = excluded.content,
+            web_data_id = excluded.web_data_id,
+            update_time = excluded.update_time
+        """,
+        (page_key, url, version, content_hash, content, web_data_id, now)
+    )
+
+
+def update_page_document_chunks(page_key: str, chunks: Dict[str, int]) -> bool:
+    """更新网页当前版本的分块映射（向量写入成功后调用）"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        "UPDATE page_documents SET chunks = ? WHERE page_key = ?",
+        (json.dumps(chunks), page_key)
+    )
+    updated = cursor.rowcount > 0
+    conn.commit()
+    conn.close()
+    return updated
+
+
+def prune_page_documents(before: str) -> int:
+    """删除 before 之后再未更新的网页当前文本与版本记录（已写入的向量保留），返回删除的网页数"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        "DELETE FROM page_versions WHERE page_key IN (SELECT page_key FROM page_documents WHERE update_time < ?)",
+        (before,)
+    )
+    cursor.execute("DELETE FROM page_documents WHERE update_time < ?", (before,))
+    deleted = cursor.rowcount
+    conn.commit()
+    conn.close()
+    return deleted
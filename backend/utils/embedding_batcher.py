@@ -0,0 +1,176 @@
+"""
+Embedding 微批处理模块
+把并发调用方的小请求在短时间窗口内合并为一次 embeddings.create（不超过单次请求的条数与 token 上限），
+结果按请求拆分后通过 Future 返回。同一批次内的重复文本只请求一次
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
+import config
+from utils.helpers import get_logger, estimate_tokens
+from utils.llm_metrics import llm_call_site, current_call_site
+
+logger = get_logger(__name__)
+
+
+class _Request:
+    """一个调用方的 embedding 请求"""
+
+    def __init__(self, texts: List[str]):
+        self.texts = texts
+        self.tokens = sum(estimate_tokens(text, config.EMBEDDING_MODEL) for text in texts)
+        self.future: Future = Future()
+        # 在调用方线程中确定调用点，批次在后台线程中发送
+        self.call_site = current_call_site()
+
+
+class EmbeddingBatcher:
+    """按时间窗口或条数合并 embedding 请求"""
+
+    def __init__(
+        self,
+        window_ms: float = None,
+        max_inputs: int = None,
+        max_tokens: int = None,
+        max_inflight: int = None
+    ):
+        self.window = (window_ms if window_ms is not None else config.EMBEDDING_BATCH_WINDOW_MS) / 1000.0
+        self.max_inputs = max_inputs or config.EMBEDDING_BATCH_MAX_INPUTS
+        self.max_tokens = max_tokens or config.EMBEDDING_BATCH_MAX_TOKENS
+        self._queue: "queue.Queue[_Request]" = queue.Queue()
+        # 批次的发送并行进行，并发上限与 Embedding 端点调度器一致
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_inflight or config.EMBEDDING_MAX_CONCURRENCY,
+            thread_name_prefix="embedding-batch"
+        )
+        self._stats_lock = threading.Lock()
+        self._stats = {"requests": 0, "batches": 0, "inputs": 0, "unique_inputs": 0}
+        self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, texts: List[str]) -> Future:
+        """提交请求，返回结果为 embedding 列表（与 texts 一一对应）的 Future"""
+        request = _Request(texts)
+        self._queue.put(request)
+        return request.future
+
+    def embed(self, texts: List[str], timeout: float = None) -> List[List[float]]:
+        """提交请求并等待结果（失败时抛出异常）"""
+        return self.submit(texts).result(timeout=timeout)
+
+    def _fits(self, batch_inputs: int, batch_tokens: int, request: _Request) -> bool:
+        return (
+            batch_inputs + len(request.texts) <= self.max_inputs
+            and batch_tokens + request.tokens <= self.max_tokens
+        )
+
+    @staticmethod
+    def _fail(batch: List[_Request], error: Exception) -> None:
+        for request in batch:
+            if not request.future.done():
+                request.future.set_exception(error)
+
+    def _run(self) -> None:
+        carry: Optional[_Request] = None
+        while True:
+            first = carry or self._queue.get()
+            carry = None
+            batch = [first]
+            # 单个批次出错只影响该批次的调用方，后台线程继续处理后续请求
+            try:
+                inputs, tokens = len(first.texts), first.tokens
+
+                # 收集窗口内到达的请求，满额或超时即发送
+                deadline = time.monotonic() + self.window
+                while inputs < self.max_inputs:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        request = self._queue.get(timeout=remaining)
+                    except queue.Empty:
+                        break
+                    if not self._fits(inputs, tokens, request):
+                        carry = request
+                        break
+                    batch.append(request)
+                    inputs += len(request.texts)
+                    tokens += request.tokens
+
+                self._executor.submit(self._flush, batch)
+            except Exception as e:
+                logger.exception(f"Failed to schedule embedding batch ({len(batch)} callers): {e}")
+                self._fail(batch, e)
+
+    def _flush(self, batch: List[_Request]) -> None:
+        """发送一个批次；任何未预期的错误都交给该批次尚未完成的 Future，避免调用方一直等待"""
+        try:
+            self._dispatch(batch)
+        except Exception as e:
+            logger.exception(f"Embedding batch failed unexpectedly ({len(batch)} callers): {e}")
+            self._fail(batch, e)
+
+    def _dispatch(self, batch: List[_Request]) -> None:
+        from utils.llm import request_embeddings
+
+        # 去重后发送，保持首次出现的顺序
+        unique_texts = list(dict.fromkeys(text for request in batch for text in request.texts))
+        call_sites = {request.call_site for request in batch}
+        try:
+            with llm_call_site(call_sites.pop() if len(call_sites) == 1 else "embedding_batch"):
+                embeddings = request_embeddings(unique_texts)
+            if len(embeddings) != len(unique_texts):
+                raise ValueError(f"Embedding count mismatch: {len(embeddings)} for {len(unique_texts)} inputs")
+        except Exception as e:
+            if len(batch) > 1:
+                # 单个调用方的非法输入不应拖累整批，逐个重发以隔离失败
+                logger.warning(f"Batched embedding request failed ({len(batch)} callers), retrying individually: {e}")
+                for request in batch:
+                    self._dispatch([request])
+                return
+            self._fail(batch, e)
+            return
+
+        vectors = dict(zip(unique_texts, embeddings))
+        for request in batch:
+            # 调用方可能已取消等待（如协程被取消）
+            if not request.future.done():
+                request.future.set_result([vectors[text] for text in request.texts])
+
+        with self._stats_lock:
+            self._stats["requests"] += len(batch)
+            self._stats["batches"] += 1
+            self._stats["inputs"] += sum(len(request.texts) for request in batch)
+            self._stats["unique_inputs"] += len(unique_texts)
+        if len(batch) > 1:
+            logger.debug(f"Embedded {len(unique_texts)} inputs for {len(batch)} callers in one request")
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["queued"] = self._queue.qsize()
+        return stats
+
+
+_batcher: Optional[EmbeddingBatcher] = None
+_batcher_lock = threading.Lock()
+
+
+def get_embedding_batcher() -> Optional[EmbeddingBatcher]:
+    """获取进程内共享的批处理器（未启用时返回 None）"""
+    global _batcher
+    if not config.ENABLE_EMBEDDING_BATCHING:
+        return None
+    if _batcher is None:
+        with _batcher_lock:
+            if _batcher is None:
+                _batcher = EmbeddingBatcher()
+    return _batcher
+
+
+def get_embedding_batcher_stats() -> Optional[Dict[str, Any]]:
+    """批处理器统计（尚未创建时返回 None）"""
+    return _batcher.get_stats() if _batcher else None
@@ -26,6 +26,7 @@ class EventType(str, Enum):
     REPORT_GENERATED = "report"
     FEED_GENERATED = "feed"
     SYSTEM_STATUS = "system_status"
+    INGESTION_COMPLETED = "ingestion"
 
 
 @dataclass
@@ -65,6 +66,7 @@ class EventManager:
             EventType.REPORT_GENERATED: config.ENABLE_EVENT_REPORT,
             EventType.FEED_GENERATED: config.ENABLE_EVENT_FEED,
             EventType.SYSTEM_STATUS: config.ENABLE_EVENT_SYSTEM_STATUS,
+            EventType.INGESTION_COMPLETED: config.ENABLE_EVENT_INGESTION,
         }
         return event_config_map.get(event_type, True)  # 默认启用
     
@@ -128,6 +130,7 @@ class EventManager:
             EventType.REPORT_GENERATED.value: config.ENABLE_EVENT_REPORT,
             EventType.FEED_GENERATED.value: config.ENABLE_EVENT_FEED,
             EventType.SYSTEM_STATUS.value: config.ENABLE_EVENT_SYSTEM_STATUS,
+            EventType.INGESTION_COMPLETED.value: config.ENABLE_EVENT_INGESTION,
         }
         
         return {
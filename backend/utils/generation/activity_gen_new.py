@@ -16,21 +16,14 @@ from utils.helpers import (
 )
 from utils.json_utils import parse_llm_json_response
 from utils.db import get_web_data, get_screenshots, insert_activity
-from utils.llm import get_openai_client
+from utils.llm import get_async_openai_client
 from utils.prompt_config import get_current_prompts
 
 logger = get_logger(__name__)
 
-# 客户端缓存
-_client = None
-
-
 def _init_client():
-    """初始化客户端"""
-    global _client
-    if _client is None:
-        _client = get_openai_client()
-    return _client
+    """获取异步LLM客户端（当前事件循环内共享连接池）"""
+    return get_async_openai_client()
 
 
 async def create_activity_record(time_span_mins: int = 15) -> Dict[str, Any]:
@@ -148,7 +141,7 @@ async def _analyze_and_summarize(data_items: List[Dict], start_dt: datetime, end
         other_items = [item for item in data_items if item.get('type') != 'web']
         
         # 估算其他数据的 token
-        other_data_tokens = estimate_tokens(json.dumps(other_items, ensure_ascii=False))
+        other_data_tokens = estimate_tokens(json.dumps(other_items, ensure_ascii=False, indent=2))
         
         # 计算可用于 web_data 的 token 数
         available_tokens = calculate_available_context_tokens('activity', other_data_tokens)
@@ -167,7 +160,7 @@ async def _analyze_and_summarize(data_items: List[Dict], start_dt: datetime, end
         user_template = Template(prompts["activity"]["user_template"])
         user_msg = user_template.safe_substitute(data_json=data_json)
         
-        response = client.chat.completions.create(
+        response = await client.chat.completions.create(
             model=config.LLM_MODEL,
             messages=[
                 {"role": "system", "content": system_msg},
@@ -3,6 +3,7 @@
 生成包含 Summary、Todo、News、Knowledge 等类型的每日推荐卡片
 """
 
+import asyncio
 import json
 import hashlib
 from datetime import datetime, timedelta
@@ -15,25 +16,19 @@ from utils.helpers import (
     truncate_web_data_by_tokens,
     calculate_available_context_tokens
 )
-from utils.json_utils import parse_llm_json_response
+from utils.json_utils import parse_llm_json_response, stream_json_array
 from utils.db import get_web_data, get_todos, get_activities
-from utils.llm import get_openai_client
+from utils.llm import get_async_openai_client
+from utils.llm_cache import cached_chat_completion_async
 from utils.vectorstore import search_similar_content
 from utils.prompt_config import get_current_prompts
 from utils.db import insert_daily_feed, get_daily_feed
 
 logger = get_logger(__name__)
 
-# 全局LLM客户端缓存
-_client_cache = None
-
-
 def _init_llm():
-    """初始化LLM客户端"""
-    global _client_cache
-    if _client_cache is None:
-        _client_cache = get_openai_client()
-    return _client_cache
+    """获取异步LLM客户端（当前事件循环内共享连接池）"""
+    return get_async_openai_client()
 
 
 def _generate_cover_url(card_type: str, title: str, date_str: str) -> str:
@@ -70,12 +65,13 @@ def _assign_sequential_ids(cards: List[dict], start: int = 1) -> List[dict]:
     return cards
 
 
-async def generate_daily_feed(lookback_hours: int = 24) -> Dict[str, Any]:
+async def generate_daily_feed(lookback_hours: int = 24, use_cache: bool = True) -> Dict[str, Any]:
     """
     生成每日Feed卡片（主入口）
     
     Args:
         lookback_hours: 向前回溯的小时数，默认24小时
+        use_cache: 待办清单卡片是否使用响应缓存（待办未变化时不重复请求）
     
     Returns:
         包含卡片列表的字典
@@ -97,26 +93,21 @@ async def generate_daily_feed(lookback_hours: int = 24) -> Dict[str, Any]:
                 "message": "insufficient data for daily feed generation"
             }
         
-        # 生成各类卡片
-        cards = []
+        # 并行生成各类卡片（各卡片的 LLM 调用互不依赖）
+        summary_card, todo_card, news_cards, knowledge_cards = await asyncio.gather(
+            _generate_summary_card(context, date_str),                 # 1. Summary卡片（1张）
+            _generate_todo_card(context, date_str, use_cache),         # 2. Todo卡片（1张）
+            _generate_news_cards(context, date_str, count=4),          # 3. News推荐卡片（3-5张）
+            _generate_knowledge_cards(context, date_str, count=4)      # 4. Knowledge推荐卡片（3-5张）
+        )
         
-        # 1. 生成Summary卡片（1张）
-        summary_card = await _generate_summary_card(context, date_str)
+        cards = []
         if summary_card:
             cards.append(summary_card)
-        
-        # 2. 生成Todo卡片（1张）
-        todo_card = await _generate_todo_card(context, date_str)
         if todo_card:
             cards.append(todo_card)
-        
-        # 3. 生成News推荐卡片（3-5张）
-        news_cards = await _generate_news_cards(context, date_str, count=4)
-        cards.extend(news_cards)
-        
-        # 4. 生成Knowledge推荐卡片（3-5张）
-        knowledge_cards = await _generate_knowledge_cards(context, date_str, count=4)
-        cards.extend(knowledge_cards)
+        cards.extend(news_cards or [])
+        cards.extend(knowledge_cards or [])
         
         logger.info(f"Generated {len(cards)} feed cards")
 
@@ -256,7 +247,7 @@ async def _generate_summary_card(context: Dict[str, Any], date_str: str) -> Opti
         return None
 
 
-async def _generate_todo_card(context: Dict[str, Any], date_str: str) -> Optional[Dict[str, Any]]:
+async def _generate_todo_card(context: Dict[str, Any], date_str: str, use_cache: bool = True) -> Optional[Dict[str, Any]]:
     """
     生成Todo待办卡片
     使用LLM分析待办事项，生成结构化的Markdown清单
@@ -309,7 +300,9 @@ $todos_json
             todos_json=todos_json
         )
         
-        response = client.chat.completions.create(
+        result_text = await cached_chat_completion_async(
+            client,
+            use_cache=use_cache,
             model=config.LLM_MODEL,
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -319,7 +312,7 @@ $todos_json
             max_tokens=2000
         )
         
-        result_text = response.choices[0].message.content.strip()
+        result_text = result_text.strip()
         
         # 直接使用Markdown文本作为卡片内容
         card = {
@@ -338,6 +331,46 @@ $todos_json
         return None
 
 
+async def _request_recommendations(
+    client,
+    system_prompt: str,
+    user_prompt: str,
+    max_tokens: int
+) -> Optional[List[Dict[str, Any]]]:
+    """
+    请求推荐列表（{"recommendations": [...]}），解析失败时返回 None
+    
+    启用流式生成时边接收边解析，输出被截断也能保留已完整的推荐项。
+    Feed 作为整体保存，这里不逐条推送事件
+    """
+    request_params = {
+        "model": config.LLM_MODEL,
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ],
+        "temperature": 0.7,
+        "max_tokens": max_tokens
+    }
+    
+    if config.ENABLE_STREAMING_GENERATION:
+        recommendations, result_text = await stream_json_array(
+            client,
+            array_key='recommendations',
+            **request_params
+        )
+        if recommendations:
+            return recommendations
+    else:
+        response = await client.chat.completions.create(**request_params)
+        result_text = response.choices[0].message.content
+    
+    result = parse_llm_json_response((result_text or '').strip())
+    if not result or 'recommendations' not in result:
+        return None
+    return result['recommendations']
+
+
 async def _generate_news_cards(context: Dict[str, Any], date_str: str, count: int = 4) -> List[Dict[str, Any]]:
     """
     生成News新闻/资讯推荐卡片
@@ -357,8 +390,10 @@ async def _generate_news_cards(context: Dict[str, Any], date_str: str, count: in
             logger.info("No data for news generation")
             return []
         
-        # 为news推荐预留足够的上下文空间（约8000 tokens）
-        max_context_tokens = 8000
+        # activities 通常较短，保留更多；其余预算按价值装填 web_data
+        activities = activities[:30]
+        other_data_tokens = estimate_tokens(json.dumps(activities, ensure_ascii=False, indent=2))
+        max_context_tokens = calculate_available_context_tokens('news', other_data_tokens)
         truncated_web_data = truncate_web_data_by_tokens(
             web_data, 
             max_tokens=max_context_tokens,
@@ -371,7 +406,7 @@ async def _generate_news_cards(context: Dict[str, Any], date_str: str, count: in
         # 构建上下文JSON
         context_data = {
             "web_data": truncated_web_data,
-            "activities": activities[:30]  # activities通常较短，可以保留更多
+            "activities": activities
         }
         context_json = json.dumps(context_data, ensure_ascii=False, indent=2)
         
@@ -421,25 +456,12 @@ $context_json
             count=count
         )
         
-        response = client.chat.completions.create(
-            model=config.LLM_MODEL,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            temperature=0.7,
-            max_tokens=2000
-        )
+        recommendations = await _request_recommendations(client, system_prompt, user_prompt, max_tokens=2000)
         
-        result_text = response.choices[0].message.content.strip()
-        result = parse_llm_json_response(result_text)
-        
-        if not result or 'recommendations' not in result:
+        if recommendations is None:
             logger.warning("Failed to parse news recommendations")
             return []
         
-        recommendations = result['recommendations']
-        
         # 为每条新闻生成一张独立的卡片
         cards = []
         for idx, rec in enumerate(recommendations[:count]):
@@ -487,8 +509,10 @@ async def _generate_knowledge_cards(context: Dict[str, Any], date_str: str, coun
             logger.info("No data for knowledge generation")
             return []
         
-        # 为knowledge推荐预留足够的上下文空间
-        max_context_tokens = 10000
+        # activities 通常较短，保留更多；其余预算按价值装填 web_data
+        activities = activities[:30]
+        other_data_tokens = estimate_tokens(json.dumps(activities, ensure_ascii=False, indent=2))
+        max_context_tokens = calculate_available_context_tokens('knowledge', other_data_tokens)
         truncated_web_data = truncate_web_data_by_tokens(
             web_data, 
             max_tokens=max_context_tokens,
@@ -501,7 +525,7 @@ async def _generate_knowledge_cards(context: Dict[str, Any], date_str: str, coun
         # 构建上下文JSON
         context_data = {
             "web_data": truncated_web_data,
-            "activities": activities[:30]  # activities通常较短，可以保留更多
+            "activities": activities
         }
         context_json = json.dumps(context_data, ensure_ascii=False, indent=2)
         
@@ -551,25 +575,12 @@ $context_json
             count=count
         )
         
-        response = client.chat.completions.create(
-            model=config.LLM_MODEL,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            temperature=0.7,
-            max_tokens=3000
-        )
+        recommendations = await _request_recommendations(client, system_prompt, user_prompt, max_tokens=3000)
         
-        result_text = response.choices[0].message.content.strip()
-        result = parse_llm_json_response(result_text)
-        
-        if not result or 'recommendations' not in result:
+        if recommendations is None:
             logger.warning("Failed to parse knowledge recommendations")
             return []
         
-        recommendations = result['recommendations']
-        
         # 为每条知识生成一张独立的卡片
         cards = []
         for idx, rec in enumerate(recommendations[:count]):
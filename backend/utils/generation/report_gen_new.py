@@ -17,24 +17,15 @@ from utils.helpers import (
 )
 from utils.json_utils import parse_llm_json_response
 from utils.db import get_tips, get_todos, get_web_data, get_reports, insert_report
-from utils.llm import get_openai_client
+from utils.llm import get_async_openai_client
 from utils.vectorstore import search_similar_content
 from utils.prompt_config import get_current_prompts
 
 logger = get_logger(__name__)
 
-_llm = None
-
-# 全局LLM客户端
-_client_cache = None
-
-
 def _init_llm():
-    """初始化LLM客户端"""
-    global _client_cache
-    if _client_cache is None:
-        _client_cache = get_openai_client()
-    return _client_cache
+    """获取异步LLM客户端（当前事件循环内共享连接池）"""
+    return get_async_openai_client()
 
 
 async def create_activity_report(start_ts: int, end_ts: int) -> Dict[str, Any]:
@@ -115,18 +106,27 @@ async def _generate_segmented_report(start_ts: int, end_ts: int) -> Optional[str
         segments.append((current, next_point))
         current = next_point
     
-    # 生成各段摘要
-    summaries = []
-    for seg_start, seg_end in segments:
+    # 并行生成各段摘要（限制同时进行的 LLM 调用数）
+    semaphore = asyncio.Semaphore(max(1, config.LLM_PARALLEL_CALLS))
+    
+    async def _summarize_segment(seg_start: int, seg_end: int) -> Optional[Dict[str, Any]]:
         data = _fetch_time_range_data(seg_start, seg_end)
-        if data:
+        if not data:
+            return None
+        async with semaphore:
             summary = await _make_segment_summary(data, seg_start, seg_end)
-            if summary:
-                summaries.append({
-                    'time_start': seg_start,
-                    'time_end': seg_end,
-                    'text': summary
-                })
+        if not summary:
+            return None
+        return {
+            'time_start': seg_start,
+            'time_end': seg_end,
+            'text': summary
+        }
+    
+    results = await asyncio.gather(*[
+        _summarize_segment(seg_start, seg_end) for seg_start, seg_end in segments
+    ])
+    summaries = [item for item in results if item]
     
     if not summaries:
         return None
@@ -270,7 +270,7 @@ async def _ask_llm_for_report(data_dict: Dict[str, Any], start_ts: int, end_ts:
         other_data_json = json.dumps({
             "tips": tips,
             "todos": todos
-        }, ensure_ascii=False)
+        }, ensure_ascii=False, indent=2)
         other_data_tokens = estimate_tokens(other_data_json)
         
         # 计算可用于 web_data 的 token 数
@@ -309,7 +309,7 @@ async def _ask_llm_for_report(data_dict: Dict[str, Any], start_ts: int, end_ts:
             todos_json=todos_json
         )
         
-        response = client.chat.completions.create(
+        response = await client.chat.completions.create(
             model=config.LLM_MODEL,
             messages=[
                 {"role": "system", "content": sys_msg},
@@ -350,7 +350,7 @@ async def _make_segment_summary(data_list: List[Dict], start_ts: int, end_ts: in
             data_json=data_json
         )
         
-        response = client.chat.completions.create(
+        response = await client.chat.completions.create(
             model=config.LLM_MODEL,
             messages=[
                 {"role": "system", "content": system_msg},
@@ -394,7 +394,7 @@ async def _combine_summaries(summaries: List[Dict], start_ts: int, end_ts: int)
             summary_text=summary_text
         )
         
-        response = client.chat.completions.create(
+        response = await client.chat.completions.create(
             model=config.LLM_MODEL,
             messages=[
                 {"role": "system", "content": system_msg},
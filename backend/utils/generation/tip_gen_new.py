@@ -14,24 +14,18 @@ from utils.helpers import (
     truncate_web_data_by_tokens, 
     calculate_available_context_tokens
 )
-from utils.json_utils import parse_llm_json_response
+from utils.json_utils import parse_llm_json_response, stream_json_array
 from utils.db import get_web_data, get_activities, get_todos, insert_tip, get_tips
-from utils.llm import get_openai_client
-from utils.vectorstore import search_similar_content
+from utils.llm import get_async_openai_client
+from utils.vectorstore import search_similar_content_many
 from utils.prompt_config import get_current_prompts
+from utils.event_manager import EventType, publish_event
 
 logger = get_logger(__name__)
 
-# LLM客户端缓存
-_llm = None
-
-
 def _get_client():
-    """获取LLM客户端"""
-    global _llm
-    if _llm is None:
-        _llm = get_openai_client()
-    return _llm
+    """获取异步LLM客户端（当前事件循环内共享连接池）"""
+    return get_async_openai_client()
 
 
 async def generate_smart_tips(history_mins: int = 60) -> Dict[str, Any]:
@@ -63,7 +57,32 @@ async def generate_smart_tips(history_mins: int = 60) -> Dict[str, Any]:
         
         # 生成提示
         logger.info("第二步：调用 LLM 生成提示...")
-        tips_list = await _produce_tips(context_info, history_mins)
+        # 流式生成时每条提示一闭合就保存并推送，不必等待完整响应
+        streaming = config.ENABLE_STREAMING_GENERATION
+        tip_ids = []
+        
+        def _on_tip(tip_item: Dict[str, Any]) -> None:
+            tid = _save_tip(tip_item, len(tip_ids) + 1)
+            if not tid:
+                return
+            tip_ids.append(tid)
+            title = tip_item.get('title', '智能提示')
+            publish_event(
+                event_type=EventType.TIP_GENERATED,
+                data={
+                    "tip_ids": [str(tid)],
+                    "count": 1,
+                    "title": title,
+                    "message": f"生成了新的智能提示: {title}",
+                    "tips": [tip_item]
+                }
+            )
+        
+        tips_list = await _produce_tips(
+            context_info,
+            history_mins,
+            on_tip=_on_tip if streaming else None
+        )
         
         if not tips_list:
             logger.error("❌ 提示生成失败：LLM 未返回有效的提示")
@@ -72,37 +91,14 @@ async def generate_smart_tips(history_mins: int = 60) -> Dict[str, Any]:
         logger.info(f"✅ LLM 生成了 {len(tips_list)} 个提示")
         
         # 保存提示（使用LLM返回的source_urls）
-        logger.info("第三步：保存提示到数据库...")
-        tip_ids = []
-        for idx, tip_item in enumerate(tips_list):
-            try:
-                # 使用LLM返回的source_urls，如果没有则使用空数组
-                source_urls = tip_item.get('source_urls', [])
-                if not isinstance(source_urls, list):
-                    # 如果不是列表，尝试转换
-                    source_urls = [source_urls] if source_urls else []
-                
-                # 验证URL格式（只保留有效的URL）
-                valid_urls = []
-                for url in source_urls:
-                    if url and isinstance(url, str) and url.strip():
-                        url = url.strip()
-                        # 简单验证：以http://或https://开头
-                        if url.startswith('http://') or url.startswith('https://'):
-                            valid_urls.append(url)
-                
-                logger.info(f"  Tip {idx + 1} 的 source_urls: {len(valid_urls)} 个有效URL")
-                
-                tid = insert_tip(
-                    title=tip_item['title'],
-                    content=tip_item['content'],
-                    tip_type=tip_item.get('type', 'smart'),
-                    source_urls=valid_urls if valid_urls else None
-                )
-                tip_ids.append(tid)
-                logger.info(f"  ✅ Tip {idx + 1} 保存成功，ID: {tid}")
-            except Exception as e:
-                logger.error(f"  ❌ Tip {idx + 1} 保存失败: {e}")
+        if streaming:
+            logger.info("第三步：提示已在流式生成过程中逐条保存并推送")
+        else:
+            logger.info("第三步：保存提示到数据库...")
+            for idx, tip_item in enumerate(tips_list):
+                tid = _save_tip(tip_item, idx + 1)
+                if tid:
+                    tip_ids.append(tid)
         
         logger.info(f"✅ 成功保存 {len(tip_ids)} 个提示")
         logger.info("🎉" * 30)
@@ -110,7 +106,8 @@ async def generate_smart_tips(history_mins: int = 60) -> Dict[str, Any]:
         return {
             "success": True,
             "tip_ids": tip_ids,
-            "tips": tips_list
+            "tips": tips_list,
+            "published": streaming  # 流式生成时已逐条发布事件
         }
     except Exception as e:
         logger.error("💥" * 30)
@@ -122,6 +119,39 @@ async def generate_smart_tips(history_mins: int = 60) -> Dict[str, Any]:
         return {"success": False, "message": str(e)}
 
 
+def _save_tip(tip_item: Dict[str, Any], index: int):
+    """保存单条提示，返回提示 ID（失败时返回 None）"""
+    try:
+        # 使用LLM返回的source_urls，如果没有则使用空数组
+        source_urls = tip_item.get('source_urls', [])
+        if not isinstance(source_urls, list):
+            # 如果不是列表，尝试转换
+            source_urls = [source_urls] if source_urls else []
+        
+        # 验证URL格式（只保留有效的URL）
+        valid_urls = []
+        for url in source_urls:
+            if url and isinstance(url, str) and url.strip():
+                url = url.strip()
+                # 简单验证：以http://或https://开头
+                if url.startswith('http://') or url.startswith('https://'):
+                    valid_urls.append(url)
+        
+        logger.info(f"  Tip {index} 的 source_urls: {len(valid_urls)} 个有效URL")
+        
+        tid = insert_tip(
+            title=tip_item['title'],
+            content=tip_item['content'],
+            tip_type=tip_item.get('type', 'smart'),
+            source_urls=valid_urls if valid_urls else None
+        )
+        logger.info(f"  ✅ Tip {index} 保存成功，ID: {tid}")
+        return tid
+    except Exception as e:
+        logger.error(f"  ❌ Tip {index} 保存失败: {e}")
+        return None
+
+
 def _assemble_context(start_dt: datetime, end_dt: datetime) -> Dict[str, Any]:
     """组装上下文数据"""
     try:
@@ -232,24 +262,18 @@ def _retrieve_relevant_history(context: Dict[str, Any]) -> List[Dict[str, Any]]:
             logger.info("No query text generated from current context")
             return []
         
-        # 2. 对每个查询执行语义搜索
+        # 2. 批量执行语义搜索（一次 embedding 调用 + 一次向量查询）
         all_results = []
-        for query_text in query_texts:
-            try:
-                # 使用向量数据库进行语义搜索
-                search_results = search_similar_content(
-                    query=query_text,
-                    limit=5  # 每个查询返回5个相关结果
-                )
-                
-                for result in search_results:
-                    # 添加查询来源标识
-                    result['query_source'] = query_text[:50] + "..." if len(query_text) > 50 else query_text
-                    all_results.append(result)
-                    
-            except Exception as e:
-                logger.warning(f"Search failed for query '{query_text[:50]}...': {e}")
-                continue
+        batched_results = search_similar_content_many(
+            queries=query_texts,
+            limit=5  # 每个查询返回5个相关结果
+        )
+        
+        for query_text, search_results in zip(query_texts, batched_results):
+            for result in search_results:
+                # 添加查询来源标识
+                result['query_source'] = query_text[:50] + "..." if len(query_text) > 50 else query_text
+                all_results.append(result)
         
         # 3. 去重和排序（按相似度分数）
         unique_results = _deduplicate_results(all_results)
@@ -405,8 +429,15 @@ def _format_historical_contexts(results: List[Dict[str, Any]]) -> List[Dict[str,
     return formatted
 
 
-async def _produce_tips(context: Dict, history_mins: int) -> List[Dict[str, Any]]:
-    """生成提示列表（增强版：包含语义搜索的相关历史）"""
+async def _produce_tips(context: Dict, history_mins: int, on_tip=None) -> List[Dict[str, Any]]:
+    """
+    生成提示列表（增强版：包含语义搜索的相关历史）
+    
+    Args:
+        context: 上下文数据
+        history_mins: 历史回溯分钟数
+        on_tip: 传入时以流式方式调用 LLM，每条提示解析完成后立即回调
+    """
     client = _get_client()
     
     if not client or not config.ENABLE_LLM_PROCESSING:
@@ -427,7 +458,7 @@ async def _produce_tips(context: Dict, history_mins: int) -> List[Dict[str, Any]
             "todos": todos,
             "existing_tips": existing_tips,
             "relevant_history": relevant_history
-        }, ensure_ascii=False)
+        }, ensure_ascii=False, indent=2)
         other_data_tokens = estimate_tokens(other_data_json)
         
         # 计算可用于 web_data 的 token 数
@@ -515,9 +546,21 @@ async def _produce_tips(context: Dict, history_mins: int) -> List[Dict[str, Any]
         except Exception as e:
             logger.debug(f"JSON mode不可用: {e}")
         
-        response = client.chat.completions.create(**request_params)
-        
-        result_text = response.choices[0].message.content.strip()
+        if on_tip is not None:
+            tips, result_text = await stream_json_array(
+                client,
+                array_key='tips',
+                on_item=on_tip,
+                **request_params
+            )
+            if tips:
+                logger.info(f"✅ 流式解析完成，共 {len(tips)} 个 tips")
+                return tips
+            # 未能增量解析出任何元素时回退到完整解析（逐条保存由回调完成）
+            result_text = result_text.strip()
+        else:
+            response = await client.chat.completions.create(**request_params)
+            result_text = response.choices[0].message.content.strip()
         
         # 详细打印 LLM 返回信息
         logger.info("=" * 60)
@@ -542,6 +585,9 @@ async def _produce_tips(context: Dict, history_mins: int) -> List[Dict[str, Any]
         # 提取tips数组
         if result is not None:
             tips = result.get('tips', [])
+            if on_tip is not None:
+                for tip in tips:
+                    on_tip(tip)
             logger.info("=" * 60)
             logger.info(f"✅ JSON 解析成功！生成了 {len(tips)} 个 tips")
             for idx, tip in enumerate(tips):
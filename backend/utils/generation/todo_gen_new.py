@@ -14,29 +14,23 @@ from utils.helpers import (
     truncate_web_data_by_tokens,
     calculate_available_context_tokens
 )
-from utils.json_utils import parse_llm_json_response
+from utils.json_utils import parse_llm_json_response, stream_json_array
 from utils.db import (
     get_todos,
     get_web_data,
     get_activities,
     insert_todo
 )
-from utils.llm import get_openai_client
+from utils.llm import get_async_openai_client
 from utils.prompt_config import get_current_prompts
-from utils.vectorstore import search_similar_content
+from utils.vectorstore import search_similar_content_many
+from utils.event_manager import EventType, publish_event
 
 logger = get_logger(__name__)
 
-# 全局客户端
-_llm_instance = None
-
-
 def _get_llm():
-    """获取LLM实例"""
-    global _llm_instance
-    if _llm_instance is None:
-        _llm_instance = get_openai_client()
-    return _llm_instance
+    """获取异步LLM客户端（当前事件循环内共享连接池）"""
+    return get_async_openai_client()
 
 
 async def generate_task_list(lookback_mins: int = 30) -> Dict[str, Any]:
@@ -60,34 +54,66 @@ async def generate_task_list(lookback_mins: int = 30) -> Dict[str, Any]:
             logger.warning(f"Insufficient data in last {lookback_mins} minutes")
             return {"success": False, "message": "数据不足，无法生成待办"}
         
+        # 流式生成时每个任务一闭合就保存并推送，不必等待完整响应
+        streaming = config.ENABLE_STREAMING_GENERATION
+        task_ids = []
+        
+        def _on_task(task: Dict[str, Any]) -> None:
+            try:
+                tid = _save_task(task)
+            except Exception as e:
+                logger.error(f"Failed to save streamed task: {e}")
+                return
+            task_ids.append(tid)
+            title = task.get('title', '待办任务')
+            publish_event(
+                event_type=EventType.TODO_GENERATED,
+                data={
+                    "todo_ids": [str(tid)],
+                    "count": 1,
+                    "title": title,
+                    "message": f"生成了新的待办任务: {title}",
+                    "todos": [task]
+                }
+            )
+        
         # 生成任务
-        tasks = await _create_tasks_from_context(context, lookback_mins)
+        tasks = await _create_tasks_from_context(
+            context,
+            lookback_mins,
+            on_task=_on_task if streaming else None
+        )
         
         if not tasks:
             return {"success": False, "message": "任务生成失败"}
         
         # 保存到数据库
-        task_ids = []
-        for task in tasks:
-            tid = insert_todo(
-                title=task['title'],
-                description=task.get('description', ''),
-                priority=task.get('priority', 1)
-            )
-            task_ids.append(tid)
+        if not streaming:
+            for task in tasks:
+                task_ids.append(_save_task(task))
         
         logger.info(f"Generated {len(task_ids)} tasks")
         
         return {
             "success": True,
             "todo_ids": task_ids,
-            "todos": tasks
+            "todos": tasks,
+            "published": streaming  # 流式生成时已逐条发布事件
         }
     except Exception as e:
         logger.exception(f"Task generation error: {e}")
         return {"success": False, "message": str(e)}
 
 
+def _save_task(task: Dict[str, Any]) -> int:
+    """保存单个任务，返回待办 ID"""
+    return insert_todo(
+        title=task['title'],
+        description=task.get('description', ''),
+        priority=task.get('priority', 1)
+    )
+
+
 def _gather_context(start_dt: datetime, end_dt: datetime) -> Dict[str, Any]:
     """收集上下文数据"""
     try:
@@ -186,8 +212,19 @@ def _gather_context(start_dt: datetime, end_dt: datetime) -> Dict[str, Any]:
         return {"has_content": False}
 
 
-async def _create_tasks_from_context(context: Dict, lookback_mins: int) -> List[Dict[str, Any]]:
-    """从上下文数据生成任务"""
+async def _create_tasks_from_context(
+    context: Dict,
+    lookback_mins: int,
+    on_task=None
+) -> List[Dict[str, Any]]:
+    """
+    从上下文数据生成任务
+    
+    Args:
+        context: 上下文数据
+        lookback_mins: 向前回溯的分钟数
+        on_task: 传入时以流式方式调用 LLM，每个任务解析完成后立即回调
+    """
     client = _get_llm()
     
     if not client or not config.ENABLE_LLM_PROCESSING:
@@ -205,7 +242,7 @@ async def _create_tasks_from_context(context: Dict, lookback_mins: int) -> List[
             "activities": activities,
             "existing_todos": existing_todos,
             "relevant_history": relevant_history
-        }, ensure_ascii=False)
+        }, ensure_ascii=False, indent=2)
         other_data_tokens = estimate_tokens(other_data_json)
         
         # 计算可用于 web_data 的 token 数
@@ -234,17 +271,26 @@ async def _create_tasks_from_context(context: Dict, lookback_mins: int) -> List[
         user_template = Template(prompts["todo"]["user_template"])
         user_msg = user_template.safe_substitute(context_json=context_json)
         
-        response = client.chat.completions.create(
-            model=config.LLM_MODEL,
-            messages=[
+        request_params = {
+            "model": config.LLM_MODEL,
+            "messages": [
                 {"role": "system", "content": system_msg},
                 {"role": "user", "content": user_msg}
             ],
-            temperature=0.8,
-            max_tokens=1000
-        )
+            "temperature": 0.8,
+            "max_tokens": 1000
+        }
         
-        result_text = response.choices[0].message.content.strip()
+        if on_task is not None:
+            tasks, result_text = await stream_json_array(client, on_item=on_task, **request_params)
+            if tasks:
+                logger.info(f"✅ 流式解析完成，共 {len(tasks)} 个待办任务")
+                return tasks
+            # 未能增量解析出任何元素时回退到完整解析（逐条保存由回调完成）
+            result_text = result_text.strip()
+        else:
+            response = await client.chat.completions.create(**request_params)
+            result_text = response.choices[0].message.content.strip()
         
         # 详细打印 LLM 返回信息
         logger.info("=" * 60)
@@ -266,6 +312,10 @@ async def _create_tasks_from_context(context: Dict, lookback_mins: int) -> List[
             error_file_prefix='failed_todo_response'
         )
         
+        if isinstance(tasks, list) and on_task is not None:
+            for task in tasks:
+                on_task(task)
+        
         # 打印解析结果
         if tasks is not None:
             logger.info("=" * 60)
@@ -300,14 +350,11 @@ def _retrieve_relevant_history(context: Dict[str, Any]) -> List[Dict[str, Any]]:
             return []
 
         all_results: List[Dict[str, Any]] = []
-        for query_text in query_texts:
-            try:
-                results = search_similar_content(query=query_text, limit=5)
-                for item in results:
-                    item['query_source'] = query_text[:50] + "..." if len(query_text) > 50 else query_text
-                    all_results.append(item)
-            except Exception as exc:
-                logger.warning(f"Semantic search failed for todo query '{query_text[:50]}...': {exc}")
+        batched_results = search_similar_content_many(queries=query_texts, limit=5)
+        for query_text, results in zip(query_texts, batched_results):
+            for item in results:
+                item['query_source'] = query_text[:50] + "..." if len(query_text) > 50 else query_text
+                all_results.append(item)
 
         unique = _deduplicate_results(all_results)
         return _format_historical_contexts(unique[:10])
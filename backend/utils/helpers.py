@@ -2,11 +2,14 @@
 辅助工具函数
 """
 
+import hashlib
 import json
 import logging
 import logging.handlers
-from functools import wraps
-from typing import List, Dict, Any
+import threading
+from collections import OrderedDict
+from functools import wraps, lru_cache
+from typing import List, Dict, Any, Callable, Optional
 from flask import request, jsonify
 from datetime import datetime
 import config
@@ -158,33 +161,230 @@ def allowed_file(filename, allowed_extensions):
            filename.rsplit('.', 1)[1].lower() in allowed_extensions
 
 
-def estimate_tokens(text: str) -> int:
+def _heuristic_tokens(text: str) -> int:
+    """粗略估算：中文约 1.5 字/token，其他字符约 4 字符/token（误差约 ±20%）"""
+    chinese_chars = sum(1 for char in text if '\u4e00' <= char <= '\u9fff')
+    other_chars = len(text) - chinese_chars
+    return int(chinese_chars / 1.5 + other_chars / 4)
+
+
+_tiktoken_missing_logged = False
+
+
+@lru_cache(maxsize=16)
+def _get_encoding(model: str):
+    """获取模型对应的 tiktoken 编码器（缓存），tiktoken 不可用时返回 None"""
+    global _tiktoken_missing_logged
+    try:
+        import tiktoken
+    except ImportError:
+        if not _tiktoken_missing_logged:
+            _tiktoken_missing_logged = True
+            get_logger(__name__).warning("tiktoken is not installed, falling back to estimated token counts")
+        return None
+
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        pass
+    except Exception as e:
+        get_logger(__name__).warning(f"Failed to load tokenizer for {model}: {e}")
+        return None
+
+    # 非 OpenAI 模型名，使用通用编码（编码文件需下载，离线或下载失败时退回估算）
+    try:
+        return tiktoken.get_encoding(config.TOKENIZER_FALLBACK_ENCODING)
+    except Exception as e:
+        get_logger(__name__).warning(f"Failed to load tokenizer {config.TOKENIZER_FALLBACK_ENCODING}: {e}")
+        return None
+
+
+# 文本 token 计数缓存：以文本摘要为键，避免缓存长期持有大段原文
+_token_counts: "OrderedDict[tuple, int]" = OrderedDict()
+_token_counts_lock = threading.Lock()
+
+
+def _count_tokens_cached(text: str, model: str) -> int:
+    key = (hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest(), model)
+    with _token_counts_lock:
+        count = _token_counts.get(key)
+        if count is not None:
+            _token_counts.move_to_end(key)
+            return count
+
+    encoding = _get_encoding(model)
+    if encoding is None:
+        count = _heuristic_tokens(text)
+    else:
+        count = len(encoding.encode(text, disallowed_special=()))
+
+    with _token_counts_lock:
+        _token_counts[key] = count
+        if len(_token_counts) > config.TOKEN_COUNT_CACHE_SIZE:
+            _token_counts.popitem(last=False)
+    return count
+
+
+def estimate_tokens(text: str, model: str = None) -> int:
     """
-    估算文本的 token 数量
+    计算文本的 token 数量
     
-    简单估算规则：
-    - 英文：约 4 个字符 = 1 token
-    - 中文：约 1.5 个字符 = 1 token
-    - 这是一个粗略估算，实际值可能有±20%的误差
+    安装 tiktoken 时按模型的编码器精确计数（编码器与重复文本的计数均有缓存），
+    否则退回按字符粗略估算
     
     Args:
-        text: 要估算的文本
+        text: 要计算的文本
+        model: 模型名称（默认 config.LLM_MODEL）
     
     Returns:
-        估算的 token 数量
+        token 数量
     """
     if not text:
         return 0
+    return _count_tokens_cached(text, model or config.LLM_MODEL or "")
+
+
+def truncate_text_to_tokens(text: str, max_tokens: int, model: str = None, suffix: str = "...") -> str:
+    """
+    将文本截断到不超过 max_tokens 个 token（含后缀）
     
-    # 统计中文字符数量
-    chinese_chars = sum(1 for char in text if '\u4e00' <= char <= '\u9fff')
-    # 统计其他字符数量
-    other_chars = len(text) - chinese_chars
+    Args:
+        text: 原始文本
+        max_tokens: 允许的最大 token 数
+        model: 模型名称（默认 config.LLM_MODEL）
+        suffix: 截断后追加的后缀
     
-    # 估算 token：中文按 1.5 字/token，英文按 4 字/token
-    estimated_tokens = int(chinese_chars / 1.5 + other_chars / 4)
+    Returns:
+        截断后的文本
+    """
+    if not text or max_tokens <= 0:
+        return ""
+    if estimate_tokens(text, model) <= max_tokens:
+        return text
+
+    budget = max(0, max_tokens - estimate_tokens(suffix, model))
+    encoding = _get_encoding(model or config.LLM_MODEL or "")
+    if encoding is not None:
+        return encoding.decode(encoding.encode(text, disallowed_special=())[:budget]) + suffix
+
+    # 无编码器时按比例截取，再逐步收缩到预算以内
+    cut = int(len(text) * budget / max(1, estimate_tokens(text, model)))
+    while cut > 0 and _heuristic_tokens(text[:cut]) > budget:
+        cut = int(cut * 0.9)
+    return text[:cut] + suffix
+
+
+def _parse_item_time(value: Any) -> Optional[datetime]:
+    if isinstance(value, datetime):
+        return value
+    if not value or not isinstance(value, str):
+        return None
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).replace(tzinfo=None)
+    except ValueError:
+        return None
+
+
+def score_context_item(item: Dict[str, Any], now: datetime = None) -> float:
+    """
+    计算上下文条目的价值：相关度 × 时效性
     
-    return estimated_tokens
+    - 相关度：relevance_score / score / similarity，或由向量距离 distance 换算，缺省为 1
+    - 时效性：按 create_time / update_time / timestamp 以 CONTEXT_RECENCY_HALF_LIFE_HOURS 为半衰期衰减，
+      并保留 CONTEXT_RECENCY_FLOOR 的下限，避免旧但相关的内容被完全排除
+    """
+    relevance = None
+    for key in ('relevance_score', 'score', 'similarity'):
+        if isinstance(item.get(key), (int, float)):
+            relevance = float(item[key])
+            break
+    if relevance is None and isinstance(item.get('distance'), (int, float)):
+        relevance = 1.0 / (1.0 + max(0.0, float(item['distance'])))
+    if relevance is None:
+        relevance = 1.0
+
+    metadata = item.get('metadata') if isinstance(item.get('metadata'), dict) else {}
+    timestamp = None
+    for key in ('create_time', 'update_time', 'timestamp'):
+        timestamp = _parse_item_time(item.get(key) or metadata.get(key))
+        if timestamp:
+            break
+
+    recency = 1.0
+    if timestamp:
+        age_hours = max(0.0, ((now or datetime.now()) - timestamp).total_seconds() / 3600)
+        recency = 0.5 ** (age_hours / config.CONTEXT_RECENCY_HALF_LIFE_HOURS)
+
+    floor = config.CONTEXT_RECENCY_FLOOR
+    return max(0.0, relevance) * (floor + (1 - floor) * recency)
+
+
+def pack_context_items(
+    items: List[Any],
+    max_tokens: int,
+    render: Callable[[Any], str] = None,
+    value: Callable[[Any], float] = None,
+    shrink: Callable[[Any, int], Any] = None,
+    min_item_tokens: int = 50,
+    max_item_share: float = None,
+    model: str = None
+) -> List[Any]:
+    """
+    按价值贪心地把上下文条目装入 token 预算
+    
+    条目按价值从高到低依次放入；单条超过剩余预算（或单条上限）时，若提供 shrink 则截短后放入。
+    返回的条目保持原有顺序。
+    
+    Args:
+        items: 候选条目
+        max_tokens: token 预算
+        render: 条目 -> 计入 prompt 的文本（默认 JSON 序列化）
+        value: 条目 -> 价值（默认 score_context_item）
+        shrink: (条目, 目标 token 数) -> 截短后的条目，无法截短时返回 None
+        min_item_tokens: 剩余预算低于该值时不再截短放入
+        max_item_share: 单条最多占用预算的比例（默认 config.CONTEXT_PACK_MAX_ITEM_SHARE）
+        model: 计数使用的模型
+    
+    Returns:
+        装入预算的条目列表
+    """
+    if not items or max_tokens <= 0:
+        return []
+
+    now = datetime.now()
+    render = render or (lambda item: json.dumps(item, ensure_ascii=False, indent=2))
+    value = value or (lambda item: score_context_item(item, now))
+    if max_item_share is None:
+        max_item_share = config.CONTEXT_PACK_MAX_ITEM_SHARE
+    item_cap = max(min_item_tokens, int(max_tokens * max_item_share))
+
+    values = [value(item) for item in items]
+    ranked = sorted(range(len(items)), key=lambda index: -values[index])
+
+    remaining = max_tokens
+    packed: Dict[int, Any] = {}
+    for index in ranked:
+        if remaining < min_item_tokens:
+            break
+
+        item = items[index]
+        # 每条另计 2 个 token 的分隔符开销
+        cost = estimate_tokens(render(item), model) + 2
+        limit = min(remaining, item_cap)
+        if cost > limit:
+            if shrink is None:
+                continue
+            item = shrink(item, limit - 2)
+            if item is None:
+                continue
+            cost = estimate_tokens(render(item), model) + 2
+            if cost > remaining:
+                continue
+
+        packed[index] = item
+        remaining -= cost
+
+    return [packed[index] for index in sorted(packed)]
 
 
 def truncate_web_data_by_tokens(
@@ -194,12 +394,12 @@ def truncate_web_data_by_tokens(
     use_metadata: bool = False
 ) -> List[Dict[str, Any]]:
     """
-    根据 token 限制动态截取 web_data 列表
+    根据 token 预算选取并截取 web_data 列表
     
     策略：
-    1. 优先保留更多条目（降低每条内容长度）
-    2. 为每条数据的元数据（title, url, tags 等）预留 token
-    3. 剩余 token 平均分配给内容字段
+    1. 每条只保留 prompt 需要的字段（title、url、tags 等 + 内容或 metadata 摘要）
+    2. 按价值（时效性与相关度）从高到低装入预算，token 按模型精确计数
+    3. 放不下的高价值条目截短内容后放入，单条最多占用 CONTEXT_PACK_MAX_ITEM_SHARE 的预算
     
     Args:
         web_data: 网页数据列表
@@ -208,43 +408,14 @@ def truncate_web_data_by_tokens(
         use_metadata: 是否使用 metadata 替代 content（默认 False）
     
     Returns:
-        截取后的网页数据列表
+        截取后的网页数据列表（保持原有顺序）
     """
     if not web_data:
         return []
     
     logger = get_logger(__name__)
     
-    # 1. 为每条数据的元数据预留 token（title、url、tags 等）
-    METADATA_TOKENS_PER_ITEM = 100  # 每条数据的元数据约占 100 tokens
-    
-    # 2. 计算可用于内容的 token 数
-    num_items = len(web_data)
-    metadata_total_tokens = num_items * METADATA_TOKENS_PER_ITEM
-    
-    if metadata_total_tokens >= max_tokens:
-        # 如果元数据就超过限制，减少条目数量
-        max_items = max(1, max_tokens // METADATA_TOKENS_PER_ITEM)
-        web_data = web_data[:max_items]
-        num_items = len(web_data)
-        metadata_total_tokens = num_items * METADATA_TOKENS_PER_ITEM
-        logger.warning(f"Too many items, reduced to {num_items} items")
-    
-    content_tokens_available = max_tokens - metadata_total_tokens
-    
-    # 3. 平均分配给每条内容
-    tokens_per_content = max(50, content_tokens_available // num_items)  # 每条内容至少 50 tokens
-    
-    # 4. Token 转换为字符数（保守估计：1 token ≈ 2 字符）
-    max_chars_per_content = tokens_per_content * 2
-    
-    if use_metadata:
-        logger.info(f"Truncating {num_items} web_data items, using metadata instead of content")
-    else:
-        logger.info(f"Truncating {num_items} web_data items, max {max_chars_per_content} chars per content")
-    
-    # 5. 截取每条数据
-    truncated_data = []
+    candidates = []
     for item in web_data:
         truncated_item = {
             "title": item.get("title", ""),
@@ -271,36 +442,60 @@ def truncate_web_data_by_tokens(
                     "diff_meta": metadata.get("diff_meta", {}) if metadata.get("change_type") == "dom-diff" else None
                 }
                 # 移除空值
-                metadata_summary = {k: v for k, v in metadata_summary.items() if v}
-                
-                # 转换为字符串估算长度
-                metadata_str = json.dumps(metadata_summary, ensure_ascii=False, indent=2)
-                
-                # 如果太长，截取 llm_input_preview（最长的字段）
-                if len(metadata_str) > max_chars_per_content:
-                    preview = metadata_summary.get("llm_input_preview", "")
-                    if preview and len(preview) > 200:
-                        # 截取预览内容
-                        max_preview_len = max_chars_per_content - len(json.dumps({k: v for k, v in metadata_summary.items() if k != "llm_input_preview"}, ensure_ascii=False))
-                        metadata_summary["llm_input_preview"] = preview[:max_preview_len] + "..."
-                
-                truncated_item["metadata"] = metadata_summary
+                truncated_item["metadata"] = {k: v for k, v in metadata_summary.items() if v}
             else:
                 truncated_item["metadata"] = {}
         else:
-            # 截取内容
             content = item.get(content_field, "")
             if isinstance(content, dict):
                 content = json.dumps(content, ensure_ascii=False)
-            
-            if len(content) > max_chars_per_content:
-                truncated_item[content_field] = content[:max_chars_per_content] + "..."
-            else:
-                truncated_item[content_field] = content
+            truncated_item[content_field] = content or ""
         
-        truncated_data.append(truncated_item)
+        candidates.append(truncated_item)
+    
+    def _render(entry: Dict[str, Any]) -> str:
+        # 按放入 {"web_data": [...]} 后的缩进计数，与各生成器最终序列化的形式一致
+        return json.dumps({"web_data": [entry]}, ensure_ascii=False, indent=2)
     
-    return truncated_data
+    def _shrink(entry: Dict[str, Any], target_tokens: int) -> Optional[Dict[str, Any]]:
+        # 只截短最长的文本字段（content 或 llm_input_preview），其余字段保持完整
+        if use_metadata:
+            text = entry.get("metadata", {}).get("llm_input_preview", "")
+        else:
+            text = entry.get(content_field, "")
+        if not text:
+            return None
+        
+        overhead = estimate_tokens(_render(entry)) - estimate_tokens(text)
+        text_budget = target_tokens - overhead
+        if text_budget < 20:
+            return None
+        
+        shrunk = dict(entry)
+        if use_metadata:
+            shrunk["metadata"] = dict(entry["metadata"], llm_input_preview=truncate_text_to_tokens(text, text_budget))
+        else:
+            shrunk[content_field] = truncate_text_to_tokens(text, text_budget)
+        return shrunk
+    
+    # 合并原始条目的相关度信息用于排序
+    scores = {
+        id(candidate): score_context_item({**original, **candidate})
+        for original, candidate in zip(web_data, candidates)
+    }
+    packed = pack_context_items(
+        candidates,
+        max_tokens,
+        render=_render,
+        value=lambda entry: scores.get(id(entry), 0.0),
+        shrink=_shrink
+    )
+    
+    logger.info(
+        f"Packed {len(packed)}/{len(web_data)} web_data items into {max_tokens} tokens "
+        f"({'metadata' if use_metadata else content_field})"
+    )
+    return packed
 
 
 def calculate_available_context_tokens(
@@ -0,0 +1,809 @@
+"""
+网页数据摄取模块
+上传接口只校验并持久化原始数据（ingestion_jobs 表）后立即返回 202，
+由固定数量的后台 worker 执行 LLM 分析、入库与向量化。任务在数据库中持久化，进程重启后自动续跑，
+摄取吞吐由 worker 数量决定，而不会占用请求线程
+
+页面抓取的上传按（URL, 会话）合并：静默期内同一页面的后续上传合并到尚未执行的任务中
+（全量内容以最后一次为准，dom-diff 依次叠加），每次合并推迟执行时间，只处理页面稳定后的版本
+"""
+
+import json
+import os
+import queue
+import tempfile
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+import config
+from utils.helpers import get_logger
+
+logger = get_logger(__name__)
+
+# settings 表中记录旧版临时文件已清理的键
+TEMP_FILE_CLEANUP_SETTING = 'ingestion_temp_files_cleaned'
+
+_queue: "queue.Queue[int]" = queue.Queue()
+_workers: list = []
+_start_lock = threading.Lock()
+# 查找与合并待处理任务需串行，避免同一页面的两次上传同时创建任务
+_coalesce_lock = threading.Lock()
+
+_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def _now() -> str:
+    return datetime.now().strftime(_TIME_FORMAT)
+
+
+def _linearize_diff(diff_dict) -> str:
+    """把 dom-diff 线性化为 +/- 行文本（equal 跳过以避免噪音），附带简要摘要"""
+    try:
+        ops = (diff_dict or {}).get('ops') or []
+        lines = []
+        for op in ops:
+            t = op.get('type')
+            if t == 'added':
+                for ln in str(op.get('text','')).split('\n'):
+                    if ln:
+                        lines.append(f"+ {ln}")
+            elif t == 'removed':
+                for ln in str(op.get('text','')).split('\n'):
+                    if ln:
+                        lines.append(f"- {ln}")
+            elif t == 'modified':
+                for ln in str(op.get('oldText','')).split('\n'):
+                    if ln:
+                        lines.append(f"- {ln}")
+                for ln in str(op.get('newText','')).split('\n'):
+                    if ln:
+                        lines.append(f"+ {ln}")
+            # equal 默认跳过，避免噪音
+        # 附带简要摘要
+        summary = (diff_dict or {}).get('summary') or {}
+        header = [
+            f"[DOM DIFF] version={(diff_dict or {}).get('version')}",
+            f"oldHash={(diff_dict or {}).get('oldHash')} newHash={(diff_dict or {}).get('newHash')}",
+            f"added={summary.get('added',0)} removed={summary.get('removed',0)} modifiedOld={summary.get('modifiedOld',0)} modifiedNew={summary.get('modifiedNew',0)}",
+            "---"
+        ]
+        return "\n".join(header + lines) or "[EMPTY DIFF]"
+    except Exception as _:
+        return json.dumps(diff_dict or {}, ensure_ascii=False)
+
+
+def serialize_content(content: Any) -> str:
+    """把上传的内容序列化为紧凑文本（入库、LLM 分析与分块共用同一份）"""
+    if isinstance(content, (dict, list)):
+        return json.dumps(content, ensure_ascii=False, separators=(',', ':'))
+    return str(content)
+
+
+def _prepare_web_data(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    入库前的处理：生成用于 LLM/向量 的文本、LLM 分析（可选）并构建完整元数据
+    整个过程只在内存中进行，内容只序列化一次
+
+    Returns:
+        处理上下文（入库参数与向量化参数）
+    """
+    from utils.content_cleaner import clean_web_content, get_cleaning_stats
+    from utils.llm import analyze_web_content
+    from utils.url_blacklist import UrlBlacklisted, is_url_blacklisted
+
+    title = data.get('title')
+    url = data.get('url')
+    content = data.get('content')
+
+    # 排队期间被加入黑名单的页面不再处理
+    if is_url_blacklisted(url):
+        raise UrlBlacklisted(f"URL 在黑名单中: {url}")
+
+    # 获取可选字段
+    source = data.get('source', 'web_crawler')
+    tags = data.get('tags', [])
+    metadata = data.get('metadata', {})
+    session_id = data.get('session_id')
+
+    logger.info(f"[ingestion] Processing: title={title}, url={url}")
+
+    # 将内容序列化一次，入库与 LLM/向量 处理共用
+    # 如果为增量 diff，LLM/向量 仅使用线性化的 diff，而非全量文本，保持处理流程不变
+    serialized = serialize_content(content)
+    is_dom_diff = (data.get('changeType') == 'dom-diff') or (isinstance(content, dict) and content.get('diffOnly'))
+    logger.info(f"[ingestion] is_dom_diff={is_dom_diff}")
+    if is_dom_diff:
+        # diff 优先从顶层 diff 字段获取，其次从 content.diff
+        diff_dict = data.get('diff') or (content.get('diff') if isinstance(content, dict) else None)
+        content_str = _linearize_diff(diff_dict)
+        logger.info(f"[ingestion] diff linearized length={len(content_str)}")
+    else:
+        content_str = serialized
+
+    # 正文提取：去除导航、页脚与重复块，LLM 与 embedding 只看清理后的正文
+    cleaning_stats = None
+    if not is_dom_diff and config.ENABLE_CONTENT_CLEANING:
+        try:
+            cleaned = clean_web_content(content, url=url, title=title)
+            if cleaned:
+                cleaning_stats = get_cleaning_stats(content_str, cleaned)
+                content_str = cleaned
+                logger.info(f"[ingestion] content cleaned: {cleaning_stats}")
+        except Exception as e:
+            logger.warning(f"[ingestion] Content cleaning failed: {e}, using raw content")
+    logger.info(f"[ingestion] content_str length used for LLM/vector={len(content_str)}")
+    try:
+        preview = content_str[:200].replace('\n', ' ')
+        logger.info(f"[ingestion] input preview: {preview}")
+    except Exception:
+        pass
+
+    # 1. LLM 分析内容（如果启用）
+    llm_analysis = None
+    if config.ENABLE_LLM_PROCESSING:
+        try:
+            logger.info("[ingestion] Starting LLM analysis...")
+            llm_analysis = analyze_web_content(
+                title=title,
+                url=url or "",
+                content=content_str
+            )
+
+            if llm_analysis:
+                logger.info(f"[ingestion] LLM analysis completed: {llm_analysis}")
+
+                # 将 LLM 分析结果添加到元数据
+                metadata['llm_analysis'] = llm_analysis
+
+                # 从分析结果中提取标签（如果没有提供标签）
+                # 新的JSON结构中，keywords在metadata_analysis下
+                metadata_analysis = llm_analysis.get('metadata_analysis', {})
+                if not tags and metadata_analysis.get('keywords'):
+                    tags = metadata_analysis['keywords']
+            else:
+                logger.info("[ingestion] LLM analysis returned no results")
+
+        except Exception as e:
+            logger.warning(f"[ingestion] LLM analysis failed: {e}, continuing without it")
+
+    # 2. 构建完整的元数据
+    full_metadata = {
+        "url": url,
+        "source": source,
+        "tags": tags,
+        "content_type": "web_data",
+        "crawled_at": datetime.now().isoformat(),
+    }
+    # 标记输入模式与预览
+    full_metadata["llm_input_mode"] = "diff" if is_dom_diff else "full"
+    try:
+        full_metadata["llm_input_preview"] = content_str[:500]
+    except Exception:
+        pass
+    if cleaning_stats:
+        full_metadata["content_cleaning"] = cleaning_stats
+    # 若为 dom-diff，将 diff 元数据纳入 metadata，便于检索/回放
+    if is_dom_diff:
+        try:
+            full_metadata.update({
+                "change_type": data.get('changeType'),
+                "diff_meta": {
+                    "old_hash": (data.get('diff') or {}).get('oldHash'),
+                    "new_hash": (data.get('diff') or {}).get('newHash'),
+                    "version": (data.get('diff') or {}).get('version'),
+                    "summary": (data.get('diff') or {}).get('summary'),
+                }
+            })
+        except Exception:
+            pass
+    full_metadata.update(metadata)
+
+    return {
+        "record": {
+            "title": title,
+            "url": url,
+            "content": serialized,
+            "source": source,
+            "tags": tags,
+            "metadata": full_metadata,
+        },
+        "vector": {
+            "title": title,
+            "url": url or "",
+            "content": content_str,
+            "source": source,
+            "tags": tags,
+            "metadata": metadata,
+            "session_id": session_id,
+        },
+        "llm_analysis": llm_analysis,
+    }
+
+
+def _embedding_function(texts):
+    from utils.llm import generate_embeddings
+
+    embeddings = generate_embeddings(texts)
+    return embeddings if embeddings else None
+
+
+def _vector_storage_ready() -> bool:
+    """是否需要写入向量数据库（启用但未配置 EMBEDDING_API_KEY 时跳过）"""
+    if not config.ENABLE_VECTOR_STORAGE:
+        return False
+    if not config.EMBEDDING_API_KEY:
+        logger.warning("[ingestion] Vector storage is enabled but EMBEDDING_API_KEY is not configured. Skipping vector storage.")
+        return False
+    return True
+
+
+def _build_result(
+    prepared: Dict[str, Any],
+    web_data_id: int,
+    vector_success: bool,
+    page_version: Optional[int] = None
+) -> Dict[str, Any]:
+    llm_analysis = prepared["llm_analysis"]
+    result = {
+        "web_data_id": web_data_id,
+        "title": prepared["record"]["title"],
+        "url": prepared["record"]["url"],
+        "processed": {
+            "llm_analysis": llm_analysis is not None,
+            "vector_storage": vector_success
+        }
+    }
+    if page_version is not None:
+        result["processed"]["page_version"] = page_version
+
+    # 如果有 LLM 分析结果，也返回
+    if llm_analysis:
+        result["analysis"] = llm_analysis
+    return result
+
+
+def process_web_data(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    处理一条已校验的网页数据（LLM 分析、存入 SQLite 与向量数据库）
+
+    处理流程：
+    1. LLM 分析内容（可选）
+    2. 构建元数据
+    3. 存入 SQLite 数据库
+    4. 存入向量数据库（可选）
+
+    Returns:
+        处理结果（web_data_id、各步骤是否成功、LLM 分析结果）
+    """
+    from utils.db import insert_web_data
+    from utils.page_versions import get_page_key, page_lock
+    from utils.vectorstore import add_web_data_to_vectorstore
+
+    prepared = _prepare_web_data(data)
+
+    # 页面抓取：同一 URL 的上传组成版本链，向量库只保留页面当前版本
+    page_key = get_page_key(data)
+    if page_key:
+        with page_lock(page_key):
+            result = _process_page_version(prepared, data, page_key)
+        if result is not None:
+            return result
+
+    # 3. 存入 SQLite 数据库
+    web_data_id = insert_web_data(**prepared["record"])
+    logger.info(f"[ingestion] Saved to database: web_data_id={web_data_id}")
+
+    # 4. 存入向量数据库（如果启用）
+    vector_success = False
+    if _vector_storage_ready():
+        try:
+            logger.info(f"[ingestion] Adding to vector store with embedding model: {config.EMBEDDING_MODEL}")
+            vector_success = add_web_data_to_vectorstore(
+                web_data_id=web_data_id,
+                embedding_function=_embedding_function,
+                **prepared["vector"]
+            )
+
+            if vector_success:
+                logger.info(f"[ingestion] Added to vector store successfully")
+            else:
+                logger.warning(f"[ingestion] Failed to add to vector store")
+
+        except Exception as e:
+            logger.warning(f"[ingestion] Vector storage failed: {e}, continuing without it")
+
+    logger.info(f"[ingestion] Processing completed for: {prepared['record']['title']}")
+    return _build_result(prepared, web_data_id, vector_success)
+
+
+def _page_version_record(prepared: Dict[str, Any], update: Dict[str, Any]) -> Dict[str, Any]:
+    """本次上传的 web_data 行（元数据中记录所属页面版本）"""
+    record = dict(prepared["record"])
+    record["metadata"] = {
+        **record["metadata"],
+        "page_version": {"key": update["page_key"], "version": update["version"], "exact": update["exact"]},
+    }
+    return record
+
+
+def _page_vector_entry(prepared: Dict[str, Any], update: Dict[str, Any], web_data_id: int) -> Dict[str, Any]:
+    """页面当前版本的向量同步参数（sync_page_to_vectorstore 除 embedding_function 外的参数）"""
+    from utils.content_cleaner import clean_web_content
+
+    vector = prepared["vector"]
+    # 向量使用页面当前全文（清理后），而不是本次上传的 diff
+    content = update["content"]
+    if config.ENABLE_CONTENT_CLEANING:
+        content = clean_web_content(content, url=vector["url"], title=vector["title"], learn=False) or content
+    return {
+        "page_key": update["page_key"],
+        "web_data_id": web_data_id,
+        "title": vector["title"],
+        "url": vector["url"],
+        "content": content,
+        "source": vector["source"],
+        "tags": vector["tags"],
+        "metadata": vector["metadata"],
+        "session_id": vector["session_id"],
+    }
+
+
+def _process_page_version(prepared: Dict[str, Any], data: Dict[str, Any], page_key: str) -> Optional[Dict[str, Any]]:
+    """
+    作为页面的新版本入库（需在 page_lock 内调用）：
+    diff 应用到当前文本上，web_data 行保存本次上传并指向所属版本，向量库只为变化的分块重新 embedding
+
+    Returns:
+        处理结果；无法形成新版本（如 diff 没有可应用的基准版本）时返回 None，由调用方按独立文档处理
+    """
+    from utils.db import insert_web_data, update_page_document_chunks
+    from utils.page_versions import resolve_page_update, commit_page_update
+    from utils.vectorstore import sync_page_to_vectorstore
+
+    update = resolve_page_update(page_key, data)
+    if update is None:
+        return None
+
+    record = _page_version_record(prepared, update)
+    web_data_id = insert_web_data(**record)
+    commit_page_update(update, web_data_id)
+    logger.info(
+        f"[ingestion] Saved to database: web_data_id={web_data_id}, "
+        f"page version {update['version']} ({update['change_type']})"
+    )
+
+    vector_success = False
+    if _vector_storage_ready():
+        chunks = sync_page_to_vectorstore(
+            **_page_vector_entry(prepared, update, web_data_id),
+            embedding_function=_embedding_function
+        )
+        if chunks is not None:
+            from utils.vector_sync import record_vector_sync
+
+            update_page_document_chunks(page_key, chunks)
+            record_vector_sync("web_data", web_data_id)
+            vector_success = True
+        else:
+            logger.warning(f"[ingestion] Failed to sync page version to vector store")
+
+    logger.info(f"[ingestion] Processing completed for: {record['title']}")
+    return _build_result(prepared, web_data_id, vector_success, page_version=update["version"])
+
+
+def process_web_data_batch(items: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    批量处理已校验的网页数据（如离线补传、数据集回放）
+
+    各条的 LLM 分析并行进行；页面抓取按页面分组，在各页面的锁内按上传顺序依次形成版本
+    （后一次上传以前一次的结果为基准，与 process_web_data 相同）。
+    所有成功的条目（含页面版本）在一个事务中入库；各页面缺少的分块与独立文档的分块分别合并，
+    按服务商单次请求上限分批生成 embedding
+
+    Returns:
+        {"items": 与 items 一一对应的处理结果（失败项为 {"error": ...}）, "succeeded": 成功数, "failed": 失败数}
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from contextlib import ExitStack
+    from utils.db import insert_web_data_batch, update_page_document_chunks
+    from utils.page_versions import get_page_key, page_lock, resolve_page_updates, version_record
+    from utils.url_blacklist import UrlBlacklisted
+    from utils.vectorstore import add_web_data_batch_to_vectorstore, sync_pages_to_vectorstore
+
+    results: List[Dict[str, Any]] = [{} for _ in items]
+    prepared: List[Optional[Dict[str, Any]]] = [None] * len(items)
+
+    def _prepare(index: int) -> None:
+        try:
+            prepared[index] = _prepare_web_data(items[index])
+        except UrlBlacklisted as e:
+            results[index] = {"error": str(e)}
+        except Exception as e:
+            logger.exception(f"[ingestion] Failed to prepare batch item #{index}: {e}")
+            results[index] = {"error": str(e)}
+
+    # LLM 分析受端点调度器限流，这里的并行度只决定同时排队的页面数
+    with ThreadPoolExecutor(max_workers=max(1, config.LLM_PARALLEL_CALLS)) as executor:
+        list(executor.map(_prepare, range(len(items))))
+
+    pages: Dict[str, List[int]] = {}
+    for index, entry in enumerate(prepared):
+        if entry is None:
+            continue
+        page_key = get_page_key(items[index])
+        if page_key:
+            pages.setdefault(page_key, []).append(index)
+
+    with ExitStack() as locks:
+        # 按固定顺序加锁，避免与其他批次互相等待；锁一直持有到向量同步完成，保证版本链与向量库一致
+        for page_key in sorted(pages):
+            locks.enter_context(page_lock(page_key))
+
+        # 无法形成新版本的（如 diff 没有可应用的基准版本）与非页面来源一起按独立文档入库
+        updates: Dict[int, Dict[str, Any]] = {}
+        for page_key, page_indices in pages.items():
+            try:
+                page_updates = resolve_page_updates(page_key, [items[index] for index in page_indices])
+            except Exception as e:
+                logger.exception(f"[ingestion] Failed to resolve page versions for {page_key}: {e}")
+                for index in page_indices:
+                    results[index] = {"error": str(e)}
+                    prepared[index] = None
+                continue
+            for index, update in zip(page_indices, page_updates):
+                if update is not None:
+                    updates[index] = update
+
+        indices = [index for index, entry in enumerate(prepared) if entry is not None]
+        if not indices:
+            return {"items": results, "succeeded": 0, "failed": len(items)}
+
+        records = []
+        for index in indices:
+            if index in updates:
+                records.append({
+                    **_page_version_record(prepared[index], updates[index]),
+                    "page_version": version_record(updates[index]),
+                })
+            else:
+                records.append(prepared[index]["record"])
+        web_data_ids = dict(zip(indices, insert_web_data_batch(records)))
+
+        logger.info(f"[ingestion] Saved {len(web_data_ids)} batch items to database ({len(updates)} page versions)")
+
+        vector_results: Dict[int, bool] = {}
+        if _vector_storage_ready():
+            from utils.vector_sync import record_vector_sync
+
+            # 每个页面只同步最后形成的版本，成功后该页面本批所有行都视为已同步
+            heads: Dict[str, int] = {}
+            for index in indices:
+                if index in updates:
+                    heads[updates[index]["page_key"]] = index
+            page_chunks = {}
+            if heads:
+                page_chunks = sync_pages_to_vectorstore(
+                    [
+                        _page_vector_entry(prepared[index], updates[index], web_data_ids[index])
+                        for index in heads.values()
+                    ],
+                    embedding_function=_embedding_function
+                )
+            for page_key, chunks in page_chunks.items():
+                if chunks is None:
+                    logger.warning(f"[ingestion] Failed to sync page {page_key} to vector store")
+                    continue
+                update_page_document_chunks(page_key, chunks)
+                for index in pages[page_key]:
+                    if index in updates:
+                        record_vector_sync("web_data", web_data_ids[index])
+                        vector_results[web_data_ids[index]] = True
+
+            standalone = [index for index in indices if index not in updates]
+            if standalone:
+                vector_results.update(add_web_data_batch_to_vectorstore(
+                    [
+                        {"web_data_id": web_data_ids[index], **prepared[index]["vector"]}
+                        for index in standalone
+                    ],
+                    embedding_function=_embedding_function
+                ))
+
+    for index in indices:
+        web_data_id = web_data_ids[index]
+        update = updates.get(index)
+        results[index] = _build_result(
+            prepared[index],
+            web_data_id,
+            vector_results.get(web_data_id, False),
+            page_version=update["version"] if update else None
+        )
+
+    logger.info(f"[ingestion] Batch completed: {len(indices)}/{len(items)} items stored ({len(updates)} page versions)")
+    return {"items": results, "succeeded": len(indices), "failed": len(items) - len(indices)}
+
+
+def cleanup_orphaned_temp_files(page_size: int = 500) -> int:
+    """
+    一次性迁移：删除旧版上传流程为每条网页数据遗留的临时文件，并从元数据中移除其路径
+
+    只删除元数据中记录、且位于系统临时目录下的 tmp*.txt 文件；完成后在 settings 中记录，之后不再执行
+
+    Returns:
+        删除的文件数
+    """
+    from utils.db import get_setting, set_setting, get_web_data_with_temp_files, update_web_data_metadata
+
+    if get_setting(TEMP_FILE_CLEANUP_SETTING):
+        return 0
+
+    temp_dir = os.path.realpath(tempfile.gettempdir())
+    removed = 0
+    after_id = 0
+    while True:
+        rows = get_web_data_with_temp_files(after_id=after_id, limit=page_size)
+        if not rows:
+            break
+        after_id = rows[-1]['id']
+
+        for row in rows:
+            try:
+                metadata = json.loads(row['metadata'])
+            except (json.JSONDecodeError, TypeError):
+                continue
+            path = metadata.pop('temp_file_path', None)
+            if isinstance(path, str):
+                real_path = os.path.realpath(path)
+                name = os.path.basename(real_path)
+                if os.path.dirname(real_path) == temp_dir and name.startswith('tmp') and name.endswith('.txt'):
+                    try:
+                        os.unlink(real_path)
+                        removed += 1
+                    except FileNotFoundError:
+                        pass
+                    except OSError as e:
+                        logger.warning(f"[ingestion] Failed to remove temp file {real_path}: {e}")
+            update_web_data_metadata(row['id'], metadata)
+
+    set_setting(TEMP_FILE_CLEANUP_SETTING, datetime.now().strftime('%Y-%m-%d %H:%M:%S'), '旧版上传临时文件清理完成时间')
+    logger.info(f"[ingestion] Removed {removed} orphaned temp file(s) left by the previous upload pipeline")
+    return removed
+
+
+def _publish(job_id: int, status: str, data: Dict[str, Any]) -> None:
+    from utils.event_manager import EventType, publish_event
+
+    publish_event(
+        event_type=EventType.INGESTION_COMPLETED,
+        data={"job_id": str(job_id), "status": status, **data}
+    )
+
+
+def _run_job(job_id: int) -> None:
+    """执行一个摄取任务；失败时按退避重新排队，超过最大尝试次数后标记为失败"""
+    from utils.db import claim_ingestion_job, get_ingestion_job, update_ingestion_job
+    from utils.url_blacklist import UrlBlacklisted
+
+    job = claim_ingestion_job(job_id)
+    if job is None:
+        # 已被其他 worker 领取或已完成；仍待处理的是静默期内又合并了新的上传，到新的执行时间再处理
+        pending = get_ingestion_job(job_id)
+        if pending and pending['status'] == 'pending' and pending.get('run_after'):
+            _schedule(job_id, pending['run_after'])
+        return
+
+    payload = job['payload']
+    is_batch = isinstance(payload.get('items'), list)
+    try:
+        if is_batch:
+            result = process_web_data_batch(payload['items'])
+            # 逐项结果附带在原始请求中的下标（校验失败的项不进入任务）
+            for index, item in zip(payload.get('indices') or range(len(result['items'])), result['items']):
+                item['index'] = index
+        else:
+            result = process_web_data(payload)
+    except UrlBlacklisted as e:
+        logger.info(f"[ingestion] Job #{job_id} skipped: {e}")
+        update_ingestion_job(job_id, status='skipped', error=str(e), finish_time=_now())
+        return
+    except Exception as e:
+        logger.exception(f"[ingestion] Job #{job_id} failed (attempt {job['attempts']}): {e}")
+        if job['attempts'] < config.INGESTION_MAX_ATTEMPTS:
+            update_ingestion_job(job_id, status='pending', error=str(e))
+            delay = config.INGESTION_RETRY_DELAY_SECONDS * (2 ** (job['attempts'] - 1))
+            timer = threading.Timer(delay, _queue.put, args=(job_id,))
+            timer.daemon = True
+            timer.start()
+        else:
+            update_ingestion_job(job_id, status='failed', error=str(e), finish_time=_now())
+            _publish(job_id, 'failed', {
+                "title": job.get('title') or '',
+                "message": f"网页数据处理失败: {job.get('title') or job_id}",
+                "error": str(e)[:200]
+            })
+        return
+
+    update_ingestion_job(
+        job_id,
+        status='completed',
+        web_data_id=result.get('web_data_id'),
+        result=result,
+        error=None,
+        finish_time=_now()
+    )
+    if is_batch:
+        _publish(job_id, 'completed', {
+            "title": job.get('title') or '',
+            "message": f"批量网页数据处理完成: 成功 {result['succeeded']} 条，失败 {result['failed']} 条",
+            "succeeded": result['succeeded'],
+            "failed": result['failed']
+        })
+        return
+    _publish(job_id, 'completed', {
+        "web_data_id": str(result.get('web_data_id')),
+        "title": result.get('title') or '',
+        "url": result.get('url') or '',
+        "message": f"网页数据处理完成: {result.get('title') or ''}",
+        "processed": result.get('processed', {})
+    })
+
+
+def _worker_loop() -> None:
+    while True:
+        job_id = _queue.get()
+        try:
+            _run_job(job_id)
+        except Exception as e:
+            logger.exception(f"[ingestion] Unexpected error in job #{job_id}: {e}")
+
+
+def start_ingestion_workers() -> None:
+    """启动后台 worker，恢复上次未完成的任务并清理过期任务、样板统计与页面版本（可重复调用）"""
+    from utils.db import (
+        requeue_running_ingestion_jobs,
+        get_pending_ingestion_job_ids,
+        prune_ingestion_jobs,
+        prune_boilerplate_blocks,
+        prune_page_documents
+    )
+
+    with _start_lock:
+        if _workers:
+            return
+
+        try:
+            recovered = requeue_running_ingestion_jobs()
+            if recovered:
+                logger.info(f"[ingestion] Recovered {recovered} interrupted job(s)")
+            before = (datetime.now() - timedelta(days=config.INGESTION_JOB_RETENTION_DAYS)).strftime('%Y-%m-%d %H:%M:%S')
+            prune_ingestion_jobs(before)
+            before = (datetime.now() - timedelta(days=config.BOILERPLATE_RETENTION_DAYS)).strftime('%Y-%m-%d %H:%M:%S')
+            prune_boilerplate_blocks(before)
+            before = (datetime.now() - timedelta(days=config.PAGE_VERSION_RETENTION_DAYS)).strftime('%Y-%m-%d %H:%M:%S')
+            prune_page_documents(before)
+            for job_id in get_pending_ingestion_job_ids():
+                _queue.put(job_id)
+        except Exception as e:
+            logger.warning(f"[ingestion] Failed to restore pending jobs: {e}")
+
+        for index in range(max(1, config.INGESTION_WORKERS)):
+            worker = threading.Thread(target=_worker_loop, name=f"ingestion-worker-{index}", daemon=True)
+            worker.start()
+            _workers.append(worker)
+        logger.info(f"[ingestion] Started {len(_workers)} worker(s), {_queue.qsize()} job(s) queued")
+
+
+def _schedule(job_id: int, run_after: Optional[str]) -> None:
+    """到 run_after 时把任务放入队列（未设置或已到时间则立即放入）"""
+    delay = (datetime.strptime(run_after, _TIME_FORMAT) - datetime.now()).total_seconds() if run_after else 0
+    if delay <= 0:
+        _queue.put(job_id)
+        return
+    timer = threading.Timer(delay, _queue.put, args=(job_id,))
+    timer.daemon = True
+    timer.start()
+
+
+def _coalesce_key(data: Dict[str, Any]) -> Optional[str]:
+    """上传的合并键（规范化 URL + 会话）；未启用合并、不是页面抓取或没有 URL 时返回 None"""
+    from utils.page_versions import PAGE_SOURCES
+    from utils.url_utils import normalize_url
+
+    if config.INGESTION_COALESCE_SECONDS <= 0 or isinstance(data.get('items'), list):
+        return None
+    if data.get('source', 'web_crawler') not in PAGE_SOURCES:
+        return None
+    canonical = normalize_url(data.get('url') or "")["canonical"]
+    if not canonical:
+        return None
+    return f"{data.get('session_id') or ''}|{canonical}"
+
+
+def _merge_payloads(pending: Dict[str, Any], data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    把新的上传合并到待处理任务的原始数据中
+
+    - 新上传是全量内容：以最后一次为准
+    - 两次都是 dom-diff：按顺序叠加为一个 diff
+    - 待处理的是全量内容、新上传是 dom-diff：把 diff 应用到全量文本上
+
+    Returns:
+        合并后的数据；diff 无法应用到待处理的全量文本时返回 None（新上传单独排队）
+    """
+    from utils.content_cleaner import extract_page_text
+    from utils.page_versions import apply_line_diff, compose_diffs, content_hash, get_diff, is_dom_diff
+
+    if not is_dom_diff(data):
+        return data
+
+    diff = get_diff(data)
+    if is_dom_diff(pending):
+        composed = compose_diffs(get_diff(pending), diff)
+        merged = {**data, "diff": composed}
+        if isinstance(data.get('content'), dict):
+            merged["content"] = {**data['content'], "diff": composed}
+        return merged
+
+    text = extract_page_text(pending.get('content'))
+    if text is None:
+        return None
+    applied = apply_line_diff(text, diff.get('ops') or [], diff.get('newHash'))
+    if applied is None:
+        return None
+    new_text, exact = applied
+    if not exact and diff.get('oldHash') is not None and str(diff['oldHash']) != content_hash(text):
+        return None
+
+    title = data.get('title') or pending.get('title')
+    content = pending['content']
+    merged = {**pending, "title": title, "tags": data.get('tags') or pending.get('tags', [])}
+    merged["content"] = {**content, "title": title, "content": new_text} if isinstance(content, dict) else new_text
+    return merged
+
+
+def submit_ingestion_job(data: Dict[str, Any]) -> int:
+    """
+    持久化原始数据并排队处理，返回任务ID（data 含 items 列表时作为一个批量任务处理）
+
+    页面抓取的上传在静默期后才执行；期间同一页面的后续上传合并到该任务并推迟执行（返回同一个任务ID），
+    从第一次上传起最多推迟 INGESTION_COALESCE_MAX_WAIT_SECONDS
+    """
+    from utils.db import create_ingestion_job, get_coalescable_ingestion_job, merge_into_ingestion_job
+
+    start_ingestion_workers()
+
+    coalesce_key = _coalesce_key(data)
+    if coalesce_key is None:
+        job_id = create_ingestion_job(data)
+        _queue.put(job_id)
+        return job_id
+
+    now = datetime.now()
+    run_after = (now + timedelta(seconds=config.INGESTION_COALESCE_SECONDS)).strftime(_TIME_FORMAT)
+    with _coalesce_lock:
+        pending = get_coalescable_ingestion_job(coalesce_key)
+        if pending is not None:
+            merged = _merge_payloads(pending['payload'], data)
+            deadline = (
+                datetime.strptime(pending['create_time'], _TIME_FORMAT)
+                + timedelta(seconds=config.INGESTION_COALESCE_MAX_WAIT_SECONDS)
+            ).strftime(_TIME_FORMAT)
+            # 已排好的定时器到期时发现执行时间被推迟，会按新的时间重新排队
+            if merged is not None and merge_into_ingestion_job(pending['id'], merged, min(run_after, deadline)):
+                logger.info(f"[ingestion] Coalesced upload into job #{pending['id']}: url={data.get('url')}")
+                return pending['id']
+
+        job_id = create_ingestion_job(data, coalesce_key=coalesce_key, run_after=run_after)
+    _schedule(job_id, run_after)
+    return job_id
+
+
+def get_ingestion_stats() -> Dict[str, Any]:
+    """worker 数量、内存队列长度与各状态任务数"""
+    from utils.db import count_ingestion_jobs
+
+    return {
+        "workers": len(_workers),
+        "queued": _queue.qsize(),
+        "jobs": count_ingestion_jobs(),
+    }
@@ -371,4 +371,185 @@ def _save_failed_response(text: str, error_msg: str, prefix: str):
         logger.info(f"Failed response saved to: {debug_file}")
         
     except Exception as e:
-        logger.warning(f"Could not save failed response: {e}")
\ No newline at end of file
+        logger.warning(f"Could not save failed response: {e}")
+
+
+class JsonArrayStreamParser:
+    """
+    增量解析 LLM 流式输出中的 JSON 数组，每个数组元素（对象）闭合后立即返回
+    
+    支持顶层数组（[...]）和包在对象某个键下的数组（{"tips": [...]}），忽略数组之前的
+    markdown 代码块标记等前缀文本。输出被截断时，已闭合的元素仍然有效。
+    
+    Examples:
+        >>> parser = JsonArrayStreamParser(array_key='tips')
+        >>> parser.feed('{"tips": [{"title": "a"}, {"ti')
+        [{'title': 'a'}]
+        >>> parser.feed('tle": "b"}]}')
+        [{'title': 'b'}]
+    """
+    
+    def __init__(self, array_key: str = None):
+        self.array_key = array_key
+        self.done = False
+        self._buffer = ""
+        self._pos = 0
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._target_depth = None   # 目标数组所在的栈深度（入栈后）
+        self._element_start = None
+        self._last_string = None    # 最近一个完整字符串（用于判断数组所属的键）
+        self._string_start = None
+        self._after_colon = False
+    
+    def feed(self, chunk: str) -> List[Any]:
+        """追加一段文本，返回本次新闭合的数组元素"""
+        if self.done or not chunk:
+            return []
+        
+        self._buffer += chunk
+        completed = []
+        buffer = self._buffer
+        
+        while self._pos < len(buffer):
+            char = buffer[self._pos]
+            index = self._pos
+            self._pos += 1
+            
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    self._last_string = buffer[self._string_start + 1:index]
+                continue
+            
+            if char == '"':
+                self._in_string = True
+                self._string_start = index
+                self._after_colon = False
+                continue
+            
+            if char == ':':
+                self._after_colon = True
+                continue
+            
+            if char in '{[':
+                if self._target_depth is None and char == '[' and self._is_target_array():
+                    self._stack.append(char)
+                    self._target_depth = len(self._stack)
+                    self._after_colon = False
+                    continue
+                if self._target_depth is not None and len(self._stack) == self._target_depth and char == '{':
+                    self._element_start = index
+                self._stack.append(char)
+                self._after_colon = False
+                continue
+            
+            if char in '}]':
+                if self._stack:
+                    self._stack.pop()
+                if self._target_depth is None:
+                    continue
+                depth = len(self._stack)
+                if depth == self._target_depth and self._element_start is not None and char == '}':
+                    element = self._load_element(buffer[self._element_start:index + 1])
+                    if element is not None:
+                        completed.append(element)
+                    self._element_start = None
+                elif depth < self._target_depth:
+                    # 目标数组已闭合
+                    self.done = True
+                    break
+                continue
+            
+            if not char.isspace():
+                self._after_colon = False
+        
+        # 丢弃已处理且不再需要的前缀，避免长输出反复拼接
+        keep_from = self._element_start if self._element_start is not None else self._pos
+        if self._in_string:
+            # 未闭合的字符串（如键名）闭合时还要从缓冲区取出
+            keep_from = min(keep_from, self._string_start)
+        if keep_from > 4096:
+            self._buffer = buffer[keep_from:]
+            self._pos -= keep_from
+            if self._element_start is not None:
+                self._element_start -= keep_from
+            if self._string_start is not None:
+                self._string_start = self._string_start - keep_from if self._string_start >= keep_from else None
+        
+        return completed
+    
+    def _is_target_array(self) -> bool:
+        if self.array_key is None:
+            # 未指定键时取第一个数组（顶层数组或对象中第一个数组值）
+            return len(self._stack) <= 1
+        return self._after_colon and self._last_string == self.array_key and len(self._stack) == 1
+    
+    @staticmethod
+    def _load_element(text: str) -> Any:
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError:
+            try:
+                return json.loads(repair_json(text))
+            except Exception:
+                get_logger(__name__).warning(f"[JSON流式解析] 跳过无法解析的元素: {text[:200]}")
+                return None
+
+
+async def stream_json_array(
+    client,
+    array_key: str = None,
+    on_item=None,
+    **params
+) -> tuple:
+    """
+    以流式方式调用 chat completion，并在每个数组元素闭合时回调 on_item
+    
+    Args:
+        client: 异步 OpenAI 客户端
+        array_key: 数组所在的键（如 'tips'），None 表示顶层数组
+        on_item: 每个元素闭合时调用的函数 (item) -> None，可以是协程函数
+        **params: chat.completions.create 的参数（stream 会被设为 True，并请求在最后一个片段中返回 usage）
+    
+    Returns:
+        (已解析的元素列表, 完整响应文本)
+    """
+    import inspect
+    
+    logger = get_logger(__name__)
+    parser = JsonArrayStreamParser(array_key=array_key)
+    items: List[Any] = []
+    parts: List[str] = []
+    
+    async def _emit(new_items: List[Any]) -> None:
+        for item in new_items:
+            items.append(item)
+            if on_item is not None:
+                result = on_item(item)
+                if inspect.isawaitable(result):
+                    await result
+    
+    params.setdefault("stream_options", {"include_usage": True})
+    stream = await client.chat.completions.create(stream=True, **params)
+    try:
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
+            parts.append(delta)
+            await _emit(parser.feed(delta))
+    except Exception as e:
+        # 输出中断时保留已闭合的元素
+        if not items:
+            raise
+        logger.warning(f"[JSON流式解析] 流式输出中断，保留已解析的 {len(items)} 个元素: {e}")
+    
+    return items, "".join(parts)
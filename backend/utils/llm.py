@@ -2,54 +2,763 @@
 LLM 处理模块 - OpenAI API
 """
 
+import asyncio
+import contextvars
+import hashlib
+import heapq
+import itertools
 import json
+import random
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
 from string import Template
 from typing import Dict, Any, List, Optional
 import openai
 import config
 from utils.helpers import get_logger
+from utils.llm_cache import cached_chat_completion, cached_chat_completion_async
+from utils.single_flight import embedding_flight
+from utils.llm_metrics import record_llm_call, current_call_site
+from utils.llm_recorder import record_response
 from utils.prompt_config import get_current_prompts
 
 logger = get_logger(__name__)
 
 
-def get_openai_client():
-    """获取 OpenAI 客户端（用于 LLM）"""
-    if not config.LLM_API_KEY:
+# ==================== LLM 调用调度 ====================
+# 进程内所有 LLM / Embedding 请求都经过按端点共享的调度器：限制并发、按 RPM/TPM 令牌桶限速，
+# 交互式请求（对话）排在后台生成之前；遇到 429/5xx/连接错误时按 Retry-After 或带抖动的指数退避重试
+
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_BACKGROUND = "background"
+_PRIORITY_RANK = {PRIORITY_INTERACTIVE: 0, PRIORITY_BACKGROUND: 1}
+
+_llm_priority = contextvars.ContextVar("llm_priority", default=PRIORITY_BACKGROUND)
+
+
+def set_llm_priority(priority: str):
+    """设置当前上下文的 LLM 调用优先级，返回可用于 reset_llm_priority 的 token"""
+    if priority not in _PRIORITY_RANK:
+        raise ValueError(f"Unknown LLM priority: {priority}")
+    return _llm_priority.set(priority)
+
+
+def reset_llm_priority(token) -> None:
+    """恢复 set_llm_priority 之前的优先级"""
+    _llm_priority.reset(token)
+
+
+@contextmanager
+def llm_priority(priority: str):
+    """在代码块内使用指定优先级发起 LLM 调用"""
+    token = set_llm_priority(priority)
+    try:
+        yield
+    finally:
+        reset_llm_priority(token)
+
+
+class _TokenBucket:
+    """按分钟补充的令牌桶，limit <= 0 表示不限制"""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.updated = time.monotonic()
+
+    @property
+    def unlimited(self) -> bool:
+        return self.capacity <= 0
+
+    def refill(self, now: float) -> None:
+        if self.unlimited:
+            return
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.capacity / 60.0)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """取出 amount 个令牌还需等待的秒数（单次请求超过容量时按容量计）"""
+        if self.unlimited:
+            return 0.0
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) * 60.0 / self.capacity
+
+    def take(self, amount: float) -> None:
+        if not self.unlimited:
+            self.tokens -= min(amount, self.capacity)
+
+    def give_back(self, amount: float) -> None:
+        """按实际用量修正（amount 为负表示实际用量超过预估）"""
+        if not self.unlimited:
+            self.tokens = max(-self.capacity, min(self.capacity, self.tokens + amount))
+
+
+class _Governor:
+    """单个端点的调度器（线程安全，同步调用与各事件循环中的异步调用共用）"""
+
+    def __init__(self, name: str, max_concurrency: int, rpm: int, tpm: int):
+        self.name = name
+        self.max_concurrency = max(1, max_concurrency)
+        self.requests = _TokenBucket(rpm)
+        self.tokens = _TokenBucket(tpm)
+        self.active = 0
+        self.blocked_until = 0.0
+        self._cond = threading.Condition()
+        self._waiters: List[tuple] = []
+        self._seq = itertools.count()
+
+    def _slot_limit(self, rank: int) -> int:
+        """后台请求不能占用为交互式请求保留的并发槽位"""
+        if rank == _PRIORITY_RANK[PRIORITY_INTERACTIVE]:
+            return self.max_concurrency
+        return max(1, self.max_concurrency - config.LLM_INTERACTIVE_RESERVED_SLOTS)
+
+    def _try_acquire(self, ticket: tuple, cost: float) -> Optional[float]:
+        """
+        尝试获取调用许可（需持有锁）
+
+        Returns:
+            0 表示已获取；正数表示需等待的秒数；None 表示等待其他请求释放
+        """
+        if self._waiters[0] != ticket:
+            return None
+        if self.active >= self._slot_limit(ticket[0]):
+            return None
+
+        now = time.monotonic()
+        if self.blocked_until > now:
+            return self.blocked_until - now
+
+        self.requests.refill(now)
+        self.tokens.refill(now)
+        wait = max(self.requests.wait_time(1), self.tokens.wait_time(cost))
+        if wait > 0:
+            return wait
+
+        self.requests.take(1)
+        self.tokens.take(cost)
+        self.active += 1
+        heapq.heappop(self._waiters)
+        self._cond.notify_all()
+        return 0.0
+
+    def _enqueue(self) -> tuple:
+        ticket = (_PRIORITY_RANK.get(_llm_priority.get(), 1), next(self._seq))
+        heapq.heappush(self._waiters, ticket)
+        return ticket
+
+    def _abandon(self, ticket: tuple) -> None:
+        if ticket in self._waiters:
+            self._waiters.remove(ticket)
+            heapq.heapify(self._waiters)
+            self._cond.notify_all()
+
+    def acquire(self, cost: float) -> None:
+        with self._cond:
+            ticket = self._enqueue()
+            try:
+                while True:
+                    wait = self._try_acquire(ticket, cost)
+                    if wait == 0:
+                        return
+                    self._cond.wait(timeout=wait if wait is not None else 1.0)
+            except BaseException:
+                self._abandon(ticket)
+                raise
+
+    async def acquire_async(self, cost: float) -> None:
+        # 不能在事件循环中阻塞等待条件变量，改为短间隔轮询
+        with self._cond:
+            ticket = self._enqueue()
+        try:
+            while True:
+                with self._cond:
+                    wait = self._try_acquire(ticket, cost)
+                if wait == 0:
+                    return
+                await asyncio.sleep(min(wait, 0.25) if wait is not None else 0.05)
+        except BaseException:
+            with self._cond:
+                self._abandon(ticket)
+            raise
+
+    def release(self, estimated: float = 0, used: Optional[float] = None) -> None:
+        with self._cond:
+            self.active -= 1
+            if used is not None:
+                self.tokens.give_back(estimated - used)
+            self._cond.notify_all()
+
+    def settle(self, estimated: float, used: float) -> None:
+        """流式响应读完后按实际用量修正令牌（并发槽位已在建立连接时释放）"""
+        with self._cond:
+            self.tokens.give_back(estimated - used)
+            self._cond.notify_all()
+
+    def pause(self, seconds: float) -> None:
+        """服务端限流时暂停整个端点，避免其他请求继续撞上 429"""
+        with self._cond:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+_governors: Dict[tuple, _Governor] = {}
+_governors_lock = threading.Lock()
+
+
+def _get_governor(kind: str, base_url: Optional[str]) -> _Governor:
+    """获取端点对应的调度器（LLM 与 Embedding 分别限流）"""
+    key = (kind, base_url)
+    with _governors_lock:
+        governor = _governors.get(key)
+        if governor is None:
+            if kind == "embedding":
+                limits = (config.EMBEDDING_MAX_CONCURRENCY, config.EMBEDDING_RATE_LIMIT_RPM, config.EMBEDDING_RATE_LIMIT_TPM)
+            else:
+                limits = (config.LLM_MAX_CONCURRENCY, config.LLM_RATE_LIMIT_RPM, config.LLM_RATE_LIMIT_TPM)
+            governor = _Governor(f"{kind}@{base_url or 'default'}", *limits)
+            _governors[key] = governor
+        return governor
+
+
+def get_llm_governor_stats() -> List[Dict[str, Any]]:
+    """各端点调度器的当前状态"""
+    with _governors_lock:
+        governors = list(_governors.values())
+    now = time.monotonic()
+    return [
+        {
+            "endpoint": governor.name,
+            "active": governor.active,
+            "waiting": len(governor._waiters),
+            "max_concurrency": governor.max_concurrency,
+            "blocked_seconds": round(max(0.0, governor.blocked_until - now), 2),
+        }
+        for governor in governors
+    ]
+
+
+def _estimate_tokens(params: Dict[str, Any]) -> int:
+    """粗略估算请求消耗的 token（输入按字符数估算，加上输出上限）"""
+    if "messages" in params:
+        text = json.dumps(params.get("messages"), ensure_ascii=False, default=str)
+        return len(text) // 3 + int(params.get("max_tokens") or config.LLM_MAX_TOKENS)
+    inputs = params.get("input")
+    text = inputs if isinstance(inputs, str) else "".join(str(item) for item in inputs or [])
+    return len(text) // 3 + 1
+
+
+def _used_tokens(response) -> Optional[int]:
+    usage = getattr(response, "usage", None)
+    return getattr(usage, "total_tokens", None) if usage else None
+
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, openai.APIConnectionError):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in (408, 409, 429) or error.status_code >= 500
+    return False
+
+
+def _retry_after_seconds(error: Exception) -> Optional[float]:
+    """读取响应头中的 Retry-After（支持 retry-after-ms、秒数和 HTTP 日期）"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+    except (TypeError, ValueError):
+        pass
+
+    value = headers.get("retry-after")
+    if not value:
         return None
-    
     try:
-        client = openai.OpenAI(
-            api_key=config.LLM_API_KEY,
-            base_url=config.LLM_BASE_URL
+        return float(value)
+    except (TypeError, ValueError):
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _retry_delay(error: Exception, attempt: int, governor: _Governor) -> float:
+    """计算重试等待时间；429 时同时暂停整个端点"""
+    retry_after = _retry_after_seconds(error)
+    backoff = min(config.LLM_RETRY_MAX_DELAY_SECONDS, config.LLM_RETRY_BASE_DELAY_SECONDS * (2 ** attempt))
+    if retry_after is not None:
+        delay = retry_after + random.uniform(0, config.LLM_RETRY_BASE_DELAY_SECONDS)
+    else:
+        delay = random.uniform(backoff / 2, backoff)
+
+    if getattr(error, "status_code", None) == 429:
+        governor.pause(delay)
+    logger.warning(
+        f"LLM request to {governor.name} failed ({type(error).__name__}), "
+        f"retry {attempt + 1}/{config.LLM_MAX_RETRIES} in {delay:.1f}s"
+    )
+    return delay
+
+
+class _MeteredStream:
+    """透传流式响应，读完（或中断）后以最后一个片段中的 usage 回调 on_done(usage, error)"""
+
+    def __init__(self, stream, on_done):
+        self._stream = stream
+        self._on_done = on_done
+        self._usage = None
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+    def _collect(self, chunk) -> None:
+        usage = getattr(chunk, "usage", None)
+        if usage is not None:
+            self._usage = usage
+
+    def _finish(self, error: Exception = None) -> None:
+        on_done, self._on_done = self._on_done, None
+        if on_done is not None:
+            on_done(self._usage, error)
+
+    def __iter__(self):
+        try:
+            for chunk in self._stream:
+                self._collect(chunk)
+                yield chunk
+        except Exception as e:
+            self._finish(e)
+            raise
+        finally:
+            self._finish()
+
+    async def __aiter__(self):
+        try:
+            async for chunk in self._stream:
+                self._collect(chunk)
+                yield chunk
+        except Exception as e:
+            self._finish(e)
+            raise
+        finally:
+            self._finish()
+
+
+class _GovernedResource:
+    """包装 chat.completions / embeddings，使 create 调用经过调度器并记录调用指标"""
+
+    def __init__(self, resource, governor: _Governor, is_async: bool, kind: str):
+        self._resource = resource
+        self._governor = governor
+        self._is_async = is_async
+        self._kind = kind
+
+    def __getattr__(self, name):
+        return getattr(self._resource, name)
+
+    def _record(self, params: Dict[str, Any], call_site: str, started: float, queue_s: float,
+                attempt: int, response=None, error: Exception = None, usage=None) -> None:
+        record_llm_call(
+            kind=self._kind,
+            model=params.get("model"),
+            latency_ms=(time.monotonic() - started) * 1000,
+            usage=usage if usage is not None else getattr(response, "usage", None),
+            status="error" if error else "ok",
+            error=error,
+            retries=attempt,
+            queue_ms=queue_s * 1000,
+            stream=bool(params.get("stream")),
+            call_site=call_site
+        )
+
+    def _finish(self, params: Dict[str, Any], call_site: str, started: float, queue_s: float,
+                attempt: int, cost: float, response):
+        """请求成功后记录指标；流式响应的 usage 在最后一个片段中（需 stream_options.include_usage），读完后再记录"""
+        if not params.get("stream"):
+            self._record(params, call_site, started, queue_s, attempt, response=response)
+            return response
+
+        def _on_done(usage, error):
+            used = getattr(usage, "total_tokens", None) if usage is not None else None
+            if used is not None:
+                self._governor.settle(cost, used)
+            self._record(params, call_site, started, queue_s, attempt, error=error, usage=usage)
+
+        return _MeteredStream(response, _on_done)
+
+    def create(self, **params):
+        return self.request(config.LLM_MAX_RETRIES, **params)
+
+    def request(self, max_retries: int, **params):
+        """发起请求，最多重试 max_retries 次（多端点路由时由路由器决定每个端点的重试次数）"""
+        # 在调用方的栈上确定调用点（异步调用在协程开始执行前确定）
+        call_site = current_call_site()
+        if self._is_async:
+            return self._create_async(call_site, max_retries, **params)
+
+        governor = self._governor
+        cost = _estimate_tokens(params)
+        queue_s = 0.0
+        for attempt in range(max_retries + 1):
+            waited = time.monotonic()
+            governor.acquire(cost)
+            started = time.monotonic()
+            queue_s += started - waited
+            try:
+                response = self._resource.create(**params)
+            except Exception as e:
+                governor.release()
+                if attempt >= max_retries or not _is_retryable(e):
+                    self._record(params, call_site, started, queue_s, attempt, error=e)
+                    raise
+                time.sleep(_retry_delay(e, attempt, governor))
+                continue
+            # 流式响应在建立连接后即释放并发槽位
+            governor.release(cost, _used_tokens(response))
+            response = self._finish(params, call_site, started, queue_s, attempt, cost, response)
+            return record_response(self._kind, params, response)
+
+    async def _create_async(self, call_site: str, max_retries: int, **params):
+        governor = self._governor
+        cost = _estimate_tokens(params)
+        queue_s = 0.0
+        for attempt in range(max_retries + 1):
+            waited = time.monotonic()
+            await governor.acquire_async(cost)
+            started = time.monotonic()
+            queue_s += started - waited
+            try:
+                response = await self._resource.create(**params)
+            except asyncio.CancelledError:
+                # 被取消（如对冲请求中落后的一方）时归还并发槽位
+                governor.release()
+                raise
+            except Exception as e:
+                governor.release()
+                if attempt >= max_retries or not _is_retryable(e):
+                    self._record(params, call_site, started, queue_s, attempt, error=e)
+                    raise
+                await asyncio.sleep(_retry_delay(e, attempt, governor))
+                continue
+            governor.release(cost, _used_tokens(response))
+            response = self._finish(params, call_site, started, queue_s, attempt, cost, response)
+            return record_response(self._kind, params, response)
+
+
+class _GovernedChat:
+    def __init__(self, chat, governor: _Governor, is_async: bool):
+        self._chat = chat
+        self.completions = _GovernedResource(chat.completions, governor, is_async, "chat")
+
+    def __getattr__(self, name):
+        return getattr(self._chat, name)
+
+
+class _GovernedClient:
+    """OpenAI 客户端包装：chat.completions.create 与 embeddings.create 受调度器控制，其余属性透传"""
+
+    def __init__(self, client, governor: _Governor, is_async: bool = False):
+        self._client = client
+        self.chat = _GovernedChat(client.chat, governor, is_async)
+        self.embeddings = _GovernedResource(client.embeddings, governor, is_async, "embedding")
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+def get_llm_priority() -> str:
+    """当前上下文的 LLM 调用优先级"""
+    return _llm_priority.get()
+
+
+def get_llm_endpoints() -> List[Dict[str, Any]]:
+    """按优先顺序返回 LLM 端点：主端点（LLM_BASE_URL）在前，LLM_FALLBACK_ENDPOINTS 依次在后"""
+    endpoints = []
+    if config.LLM_API_KEY:
+        endpoints.append({
+            "api_key": config.LLM_API_KEY,
+            "base_url": config.LLM_BASE_URL,
+            "model": config.LLM_MODEL,
+        })
+    for item in config.LLM_FALLBACK_ENDPOINTS or []:
+        if not isinstance(item, dict) or not item.get("base_url"):
+            logger.warning(f"Ignoring invalid LLM fallback endpoint: {item}")
+            continue
+        api_key = item.get("api_key") or config.LLM_API_KEY
+        if not api_key:
+            continue
+        endpoints.append({
+            "api_key": api_key,
+            "base_url": item["base_url"],
+            "model": item.get("model") or config.LLM_MODEL,
+        })
+    return endpoints
+
+
+def _endpoint_name(endpoint: Dict[str, Any]) -> str:
+    return f"{endpoint['base_url'] or 'default'}#{endpoint['model']}"
+
+
+# 进程内共享的客户端：{kind: (key, client)}，凭据或地址变化时重建
+_clients: Dict[str, Any] = {}
+_clients_lock = threading.Lock()
+
+
+def _build_http_client():
+    """创建带连接池与 keep-alive 的 HTTP 客户端"""
+    import httpx
+
+    return httpx.Client(
+        timeout=httpx.Timeout(
+            config.LLM_HTTP_TIMEOUT_SECONDS,
+            connect=config.LLM_HTTP_CONNECT_TIMEOUT_SECONDS
+        ),
+        limits=httpx.Limits(
+            max_connections=config.LLM_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=config.LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=config.LLM_HTTP_KEEPALIVE_EXPIRY_SECONDS
+        )
+    )
+
+
+def _create_client(kind: str, api_key: str, base_url: Optional[str], is_async: bool):
+    """创建受调度器控制的客户端"""
+    # 重试由调度器统一处理（可感知端点级限流），SDK 自身不再重试
+    if is_async:
+        raw = openai.AsyncOpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            max_retries=0,
+            http_client=_build_async_http_client()
+        )
+    else:
+        raw = openai.OpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            max_retries=0,
+            http_client=_build_http_client()
         )
+    return _GovernedClient(raw, _get_governor(kind, base_url), is_async=is_async)
+
+
+def _client_key(kind: str) -> Optional[tuple]:
+    """客户端缓存键（未配置凭据时返回 None）"""
+    if kind == "embedding":
+        return (config.EMBEDDING_API_KEY, config.EMBEDDING_BASE_URL) if config.EMBEDDING_API_KEY else None
+    endpoints = get_llm_endpoints()
+    return tuple((e["api_key"], e["base_url"], e["model"]) for e in endpoints) or None
+
+
+def _build_client(kind: str, is_async: bool):
+    """创建客户端；配置了多个 LLM 端点时返回带故障转移与对冲的路由客户端"""
+    if kind == "embedding":
+        return _create_client(kind, config.EMBEDDING_API_KEY, config.EMBEDDING_BASE_URL, is_async)
+
+    endpoints = get_llm_endpoints()
+    if len(endpoints) == 1:
+        return _create_client(kind, endpoints[0]["api_key"], endpoints[0]["base_url"], is_async)
+
+    from utils.llm_router import Endpoint, RoutedClient
+
+    return RoutedClient(
+        [
+            Endpoint(
+                _endpoint_name(endpoint),
+                endpoint["model"],
+                _create_client(kind, endpoint["api_key"], endpoint["base_url"], is_async)
+            )
+            for endpoint in endpoints
+        ],
+        is_async=is_async
+    )
+
+
+def _get_shared_client(kind: str):
+    """获取共享客户端，首次调用或凭据变化时创建"""
+    key = _client_key(kind)
+    if key is None:
+        return None
+
+    cached = _clients.get(kind)
+    if cached and cached[0] == key:
+        return cached[1]
+
+    with _clients_lock:
+        cached = _clients.get(kind)
+        if cached and cached[0] == key:
+            return cached[1]
+
+        client = _build_client(kind, is_async=False)
+        # 旧客户端可能仍有进行中的请求，不主动关闭，由垃圾回收释放
+        _clients[kind] = (key, client)
+        logger.info(f"{'Rebuilt' if cached else 'Created'} shared {kind} client ({len(key) if kind == 'llm' else 1} endpoint(s))")
         return client
+
+
+def get_openai_client():
+    """获取 OpenAI 客户端（用于 LLM，进程内共享连接池）"""
+    try:
+        return _get_shared_client("llm")
     except Exception as e:
         logger.exception(f"Failed to create OpenAI client: {e}")
         return None
 
 
 def get_embedding_client():
-    """获取 Embedding 客户端"""
-    if not config.EMBEDDING_API_KEY:
-        return None
-    
+    """获取 Embedding 客户端（与 LLM 客户端使用独立的连接池）"""
     try:
-        client = openai.OpenAI(
-            api_key=config.EMBEDDING_API_KEY,
-            base_url=config.EMBEDDING_BASE_URL
+        return _get_shared_client("embedding")
+    except Exception as e:
+        logger.exception(f"Failed to create Embedding client: {e}")
+        return None
+
+
+# 异步客户端按事件循环缓存：httpx.AsyncClient 绑定创建它的事件循环，
+# 而 asyncio.run 每次都会新建循环，因此每个循环各自持有一份连接池，并在循环关闭时释放
+# {loop: {"clients": {kind: (key, client)}, "opened": [AsyncOpenAI, ...], "closer": 异步生成器}}
+_async_clients: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+def _build_async_http_client():
+    """创建带连接池与 keep-alive 的异步 HTTP 客户端"""
+    import httpx
+
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(
+            config.LLM_HTTP_TIMEOUT_SECONDS,
+            connect=config.LLM_HTTP_CONNECT_TIMEOUT_SECONDS
+        ),
+        limits=httpx.Limits(
+            max_connections=config.LLM_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=config.LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=config.LLM_HTTP_KEEPALIVE_EXPIRY_SECONDS
         )
+    )
+
+
+def _raw_clients(client) -> List[Any]:
+    """受调度器控制的客户端（或路由客户端）底层的 OpenAI 客户端"""
+    from utils.llm_router import RoutedClient
+
+    if isinstance(client, RoutedClient):
+        return [endpoint.client._client for endpoint in client.endpoints]
+    return [client._client]
+
+
+async def _close_on_loop_shutdown(opened: List[Any]):
+    """
+    随事件循环存活的异步生成器，只用于在循环关闭时关闭该循环创建的异步客户端
+
+    asyncio.run 结束前会调用 loop.shutdown_asyncgens()，对仍挂起的异步生成器执行 aclose()，
+    此时 finally 在同一循环内运行，可以 await 客户端的 close() 释放连接池
+    """
+    try:
+        yield
+    finally:
+        for raw in opened:
+            try:
+                await raw.close()
+            except Exception as e:
+                logger.warning(f"Failed to close async client: {e}")
+        opened.clear()
+
+
+def _get_shared_async_client(kind: str):
+    """获取当前事件循环共享的异步客户端（必须在协程中调用）"""
+    key = _client_key(kind)
+    if key is None:
+        return None
+
+    loop = asyncio.get_running_loop()
+
+    with _clients_lock:
+        state = _async_clients.get(loop)
+        if state is None:
+            state = {"clients": {}, "opened": []}
+            # 首次迭代即向当前循环登记该生成器，推进到 yield 处挂起，等待循环关闭时 aclose()
+            state["closer"] = _close_on_loop_shutdown(state["opened"])
+            asyncio.ensure_future(state["closer"].__anext__(), loop=loop)
+            _async_clients[loop] = state
+
+        cached = state["clients"].get(kind)
+        if cached and cached[0] == key:
+            return cached[1]
+
+        client = _build_client(kind, is_async=True)
+        # 凭据变化时旧客户端可能仍有进行中的请求，不立即关闭，与新客户端一起在循环关闭时释放
+        state["clients"][kind] = (key, client)
+        state["opened"].extend(_raw_clients(client))
         return client
+
+
+def get_async_openai_client():
+    """获取异步 OpenAI 客户端（用于 LLM，当前事件循环内共享连接池）"""
+    try:
+        return _get_shared_async_client("llm")
     except Exception as e:
-        logger.exception(f"Failed to create Embedding client: {e}")
+        logger.exception(f"Failed to create async OpenAI client: {e}")
+        return None
+
+
+def get_async_embedding_client():
+    """获取异步 Embedding 客户端"""
+    try:
+        return _get_shared_async_client("embedding")
+    except Exception as e:
+        logger.exception(f"Failed to create async Embedding client: {e}")
         return None
 
 
+def _build_web_analysis_request(title: str, url: str, content: Any, max_tokens: int = None) -> Dict[str, Any]:
+    """构建网页内容分析的请求参数（同步/异步共用）"""
+    # 如果 content 是字典，转换为字符串
+    if isinstance(content, dict):
+        content_text = json.dumps(content, ensure_ascii=False, indent=2)
+    else:
+        content_text = str(content)
+    
+    # 限制内容长度（避免超出 token 限制）
+    if len(content_text) > 4000:
+        content_text = content_text[:4000] + "..."
+    
+    # 动态获取当前配置的提示词
+    prompts = get_current_prompts()
+    system_prompt = prompts["web_analysis"]["system"]
+
+    user_template = Template(prompts["web_analysis"]["user_template"])
+    user_prompt = user_template.safe_substitute(
+        title=title,
+        url=url or "",
+        content_text=content_text
+    )
+    
+    return {
+        "model": config.LLM_MODEL,
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ],
+        "temperature": config.LLM_TEMPERATURE,
+        "max_tokens": max_tokens or config.LLM_MAX_TOKENS,
+        "response_format": {"type": "json_object"}
+    }
+
+
 def analyze_web_content(
     title: str,
     url: str,
     content: str,
-    max_tokens: int = None
+    max_tokens: int = None,
+    use_cache: bool = True
 ) -> Optional[Dict[str, Any]]:
     """
     使用 LLM 分析网页内容
@@ -59,6 +768,7 @@ def analyze_web_content(
         url: URL
         content: 内容
         max_tokens: 最大 token 数
+        use_cache: 是否使用响应缓存（同一页面重复上传时不重复请求）
     
     Returns:
         分析结果字典，包含摘要、关键词、分类等
@@ -73,41 +783,50 @@ def analyze_web_content(
             logger.warning("OpenAI client not available")
             return None
         
-        # 如果 content 是字典，转换为字符串
-        if isinstance(content, dict):
-            content_text = json.dumps(content, ensure_ascii=False, indent=2)
-        else:
-            content_text = str(content)
+        # 调用 LLM
+        result_text = cached_chat_completion(
+            client,
+            use_cache=use_cache,
+            **_build_web_analysis_request(title, url, content, max_tokens)
+        )
         
-        # 限制内容长度（避免超出 token 限制）
-        if len(content_text) > 4000:
-            content_text = content_text[:4000] + "..."
+        # 解析结果
+        analysis_result = json.loads(result_text)
         
-        # 动态获取当前配置的提示词
-        prompts = get_current_prompts()
-        system_prompt = prompts["web_analysis"]["system"]
+        logger.info(f"LLM analysis completed for: {title}")
+        return analysis_result
+        
+    except json.JSONDecodeError as e:
+        logger.error(f"Failed to parse LLM response as JSON: {e}")
+        return None
+    except Exception as e:
+        logger.exception(f"Error analyzing web content with LLM: {e}")
+        return None
 
-        user_template = Template(prompts["web_analysis"]["user_template"])
-        user_prompt = user_template.safe_substitute(
-            title=title,
-            url=url or "",
-            content_text=content_text
-        )
+
+async def analyze_web_content_async(
+    title: str,
+    url: str,
+    content: str,
+    max_tokens: int = None,
+    use_cache: bool = True
+) -> Optional[Dict[str, Any]]:
+    """analyze_web_content 的异步版本"""
+    try:
+        if not config.ENABLE_LLM_PROCESSING:
+            logger.info("LLM processing is disabled, skipping analysis")
+            return None
         
-        # 调用 LLM
-        response = client.chat.completions.create(
-            model=config.LLM_MODEL,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            temperature=config.LLM_TEMPERATURE,
-            max_tokens=max_tokens or config.LLM_MAX_TOKENS,
-            response_format={"type": "json_object"}
-        )
+        client = get_async_openai_client()
+        if not client:
+            logger.warning("Async OpenAI client not available")
+            return None
         
-        # 解析结果
-        result_text = response.choices[0].message.content
+        result_text = await cached_chat_completion_async(
+            client,
+            use_cache=use_cache,
+            **_build_web_analysis_request(title, url, content, max_tokens)
+        )
         analysis_result = json.loads(result_text)
         
         logger.info(f"LLM analysis completed for: {title}")
@@ -121,6 +840,41 @@ def analyze_web_content(
         return None
 
 
+def _embedding_key(inputs: Any) -> str:
+    """Embedding 请求的合并键（模型 + 输入文本）"""
+    raw = json.dumps([config.EMBEDDING_MODEL, inputs], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _limit_embedding_inputs(texts: List[str]) -> List[str]:
+    # 限制每个文本的长度
+    return [text[:8000] if len(text) > 8000 else text for text in texts]
+
+
+def _use_batcher(texts: List[str]):
+    """小请求交给微批处理器合并发送，大批量请求（如重建索引）直接发送"""
+    from utils.embedding_batcher import get_embedding_batcher
+
+    if len(texts) >= config.EMBEDDING_BATCH_MAX_INPUTS:
+        return None
+    return get_embedding_batcher()
+
+
+def request_embeddings(texts: List[str]) -> List[List[float]]:
+    """
+    直接发送一次 embeddings.create 请求（不经过批处理）
+    
+    Returns:
+        与 texts 一一对应的嵌入向量；客户端不可用或请求失败时抛出异常
+    """
+    client = get_embedding_client()
+    if not client:
+        raise RuntimeError("Embedding client is not available")
+
+    response = client.embeddings.create(model=config.EMBEDDING_MODEL, input=texts)
+    return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+
 def generate_embedding(text: str) -> Optional[List[float]]:
     """
     生成文本嵌入向量
@@ -131,32 +885,17 @@ def generate_embedding(text: str) -> Optional[List[float]]:
     Returns:
         嵌入向量列表
     """
-    try:
-        client = get_embedding_client()
-        if not client:
-            return None
-        
-        # 限制文本长度
-        if len(text) > 8000:
-            text = text[:8000]
-        
-        response = client.embeddings.create(
-            model=config.EMBEDDING_MODEL,
-            input=text
-        )
-        
-        embedding = response.data[0].embedding
-        logger.info(f"Generated embedding with {len(embedding)} dimensions")
-        return embedding
-        
-    except Exception as e:
-        logger.exception(f"Error generating embedding: {e}")
+    embeddings = generate_embeddings([text])
+    if not embeddings:
         return None
 
+    logger.info(f"Generated embedding with {len(embeddings[0])} dimensions")
+    return embeddings[0]
+
 
 def generate_embeddings(texts: List[str]) -> Optional[List[List[float]]]:
     """
-    批量生成文本嵌入向量
+    批量生成文本嵌入向量（并发的小请求会被合并为一次 API 调用）
     
     Args:
         texts: 文本列表
@@ -165,19 +904,17 @@ def generate_embeddings(texts: List[str]) -> Optional[List[List[float]]]:
         嵌入向量列表
     """
     try:
-        client = get_embedding_client()
-        if not client:
+        if not texts or not get_embedding_client():
             return None
         
-        # 限制每个文本的长度
-        processed_texts = [text[:8000] if len(text) > 8000 else text for text in texts]
+        processed_texts = _limit_embedding_inputs(texts)
+        batcher = _use_batcher(processed_texts)
         
-        response = client.embeddings.create(
-            model=config.EMBEDDING_MODEL,
-            input=processed_texts
+        embeddings = embedding_flight.do(
+            _embedding_key(processed_texts),
+            lambda: batcher.embed(processed_texts) if batcher else request_embeddings(processed_texts)
         )
         
-        embeddings = [item.embedding for item in response.data]
         logger.info(f"Generated {len(embeddings)} embeddings")
         return embeddings
         
@@ -186,13 +923,49 @@ def generate_embeddings(texts: List[str]) -> Optional[List[List[float]]]:
         return None
 
 
-def summarize_content(content: str, max_length: int = 200) -> Optional[str]:
+async def generate_embedding_async(text: str) -> Optional[List[float]]:
+    """generate_embedding 的异步版本"""
+    embeddings = await generate_embeddings_async([text])
+    return embeddings[0] if embeddings else None
+
+
+async def generate_embeddings_async(texts: List[str]) -> Optional[List[List[float]]]:
+    """generate_embeddings 的异步版本"""
+    try:
+        if not texts:
+            return None
+        
+        processed_texts = _limit_embedding_inputs(texts)
+        batcher = _use_batcher(processed_texts)
+        # 批处理器在后台线程中使用同步客户端发送
+        client = get_embedding_client() if batcher else get_async_embedding_client()
+        if not client:
+            return None
+        
+        async def _request() -> List[List[float]]:
+            if batcher:
+                return await asyncio.wrap_future(batcher.submit(processed_texts))
+            response = await client.embeddings.create(model=config.EMBEDDING_MODEL, input=processed_texts)
+            return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+        
+        embeddings = await embedding_flight.do_async(_embedding_key(processed_texts), _request)
+        
+        logger.info(f"Generated {len(embeddings)} embeddings")
+        return embeddings
+        
+    except Exception as e:
+        logger.exception(f"Error generating embeddings: {e}")
+        return None
+
+
+def summarize_content(content: str, max_length: int = 200, use_cache: bool = True) -> Optional[str]:
     """
     生成内容摘要
     
     Args:
         content: 原始内容
         max_length: 最大摘要长度
+        use_cache: 是否使用响应缓存
     
     Returns:
         摘要文本
@@ -224,7 +997,9 @@ def summarize_content(content: str, max_length: int = 200) -> Optional[str]:
             content_text=content_text
         )
         
-        response = client.chat.completions.create(
+        result_text = cached_chat_completion(
+            client,
+            use_cache=use_cache,
             model=config.LLM_MODEL,
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -234,7 +1009,7 @@ def summarize_content(content: str, max_length: int = 200) -> Optional[str]:
             max_tokens=max_length * 2
         )
         
-        summary = response.choices[0].message.content.strip()
+        summary = result_text.strip()
         logger.info("Generated content summary")
         return summary
         
@@ -243,13 +1018,14 @@ def summarize_content(content: str, max_length: int = 200) -> Optional[str]:
         return None
 
 
-def extract_keywords(content: str, max_keywords: int = 10) -> Optional[List[str]]:
+def extract_keywords(content: str, max_keywords: int = 10, use_cache: bool = True) -> Optional[List[str]]:
     """
     提取关键词
     
     Args:
         content: 内容
         max_keywords: 最大关键词数量
+        use_cache: 是否使用响应缓存
     
     Returns:
         关键词列表
@@ -281,7 +1057,9 @@ def extract_keywords(content: str, max_keywords: int = 10) -> Optional[List[str]
             content_text=content_text
         )
         
-        response = client.chat.completions.create(
+        result_text = cached_chat_completion(
+            client,
+            use_cache=use_cache,
             model=config.LLM_MODEL,
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -292,7 +1070,7 @@ def extract_keywords(content: str, max_keywords: int = 10) -> Optional[List[str]
             response_format={"type": "json_object"}
         )
         
-        result = json.loads(response.choices[0].message.content)
+        result = json.loads(result_text)
         keywords = result.get("keywords", [])
         
         logger.info(f"Extracted {len(keywords)} keywords")
@@ -0,0 +1,138 @@
+"""
+LLM 响应缓存模块
+按 (model, messages, temperature, response_format) 缓存确定性调用的结果，持久化到 SQLite，
+支持 TTL 过期与按数量/大小淘汰。只缓存低温度（不超过 LLM_CACHE_MAX_TEMPERATURE）或 JSON 模式的调用，
+调用方可通过 use_cache=False 绕过；流式与工具调用不缓存。
+未命中时，同一缓存键的并发请求合并为一次上游调用
+"""
+
+import hashlib
+import json
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional
+import config
+from utils.helpers import get_logger
+from utils.single_flight import chat_flight
+from utils.llm_metrics import record_llm_call
+
+logger = get_logger(__name__)
+
+# 参与缓存键计算的请求参数
+_KEY_FIELDS = ("model", "messages", "temperature", "response_format")
+
+
+def build_cache_key(params: Dict[str, Any]) -> str:
+    """由请求参数计算缓存键"""
+    payload = {field: params.get(field) for field in _KEY_FIELDS}
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _is_coalescable(params: Dict[str, Any]) -> bool:
+    return not params.get("stream") and not params.get("tools")
+
+
+def _is_deterministic(params: Dict[str, Any]) -> bool:
+    """低温度或 JSON 模式的调用结果基本稳定，可以复用；未指定温度时服务端默认约为 1，不缓存"""
+    response_format = params.get("response_format")
+    if isinstance(response_format, dict) and response_format.get("type") == "json_object":
+        return True
+    temperature = params.get("temperature")
+    return temperature is not None and temperature <= config.LLM_CACHE_MAX_TEMPERATURE
+
+
+def _is_cacheable(params: Dict[str, Any]) -> bool:
+    return config.ENABLE_LLM_CACHE and _is_coalescable(params) and _is_deterministic(params)
+
+
+def get_cached_response(params: Dict[str, Any]) -> Optional[str]:
+    """查询缓存，未命中或出错时返回 None"""
+    try:
+        from utils.db import get_llm_cache_entry
+        return get_llm_cache_entry(build_cache_key(params))
+    except Exception as e:
+        logger.warning(f"Failed to read LLM cache: {e}")
+        return None
+
+
+def store_cached_response(params: Dict[str, Any], content: str) -> None:
+    """写入缓存并执行淘汰"""
+    try:
+        from utils.db import set_llm_cache_entry, evict_llm_cache
+
+        expire_time = (
+            datetime.now() + timedelta(hours=config.LLM_CACHE_TTL_HOURS)
+        ).strftime('%Y-%m-%d %H:%M:%S')
+        set_llm_cache_entry(build_cache_key(params), params.get("model"), content, expire_time)
+        evict_llm_cache(config.LLM_CACHE_MAX_ENTRIES, config.LLM_CACHE_MAX_SIZE_MB * 1024 * 1024)
+    except Exception as e:
+        logger.warning(f"Failed to write LLM cache: {e}")
+
+
+def _lookup(params: Dict[str, Any]) -> Optional[str]:
+    """查询缓存，命中时记录一次未请求上游的调用"""
+    started = time.monotonic()
+    cached = get_cached_response(params)
+    if cached is not None:
+        logger.info("LLM cache hit")
+        record_llm_call(
+            kind="chat",
+            model=params.get("model"),
+            latency_ms=(time.monotonic() - started) * 1000,
+            cache_hit=True
+        )
+    return cached
+
+
+def cached_chat_completion(client, use_cache: bool = True, **params) -> Optional[str]:
+    """
+    带缓存的 chat completion（同步）
+
+    Args:
+        client: OpenAI 客户端
+        use_cache: 是否使用缓存与请求合并（False 时直接请求且不写入缓存；
+                   True 时也只缓存低温度或 JSON 模式的调用，其余只合并并发的相同请求）
+        **params: chat.completions.create 的参数
+
+    Returns:
+        响应文本（message.content）
+    """
+    if not use_cache or not _is_coalescable(params):
+        return client.chat.completions.create(**params).choices[0].message.content
+
+    cacheable = _is_cacheable(params)
+    if cacheable:
+        cached = _lookup(params)
+        if cached is not None:
+            return cached
+
+    def _request() -> Optional[str]:
+        content = client.chat.completions.create(**params).choices[0].message.content
+        if cacheable and content:
+            store_cached_response(params, content)
+        return content
+
+    return chat_flight.do(build_cache_key(params), _request)
+
+
+async def cached_chat_completion_async(client, use_cache: bool = True, **params) -> Optional[str]:
+    """带缓存的 chat completion（异步客户端）"""
+    if not use_cache or not _is_coalescable(params):
+        response = await client.chat.completions.create(**params)
+        return response.choices[0].message.content
+
+    cacheable = _is_cacheable(params)
+    if cacheable:
+        cached = _lookup(params)
+        if cached is not None:
+            return cached
+
+    async def _request() -> Optional[str]:
+        response = await client.chat.completions.create(**params)
+        content = response.choices[0].message.content
+        if cacheable and content:
+            store_cached_response(params, content)
+        return content
+
+    return await chat_flight.do_async(build_cache_key(params), _request)
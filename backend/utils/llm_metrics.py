@@ -0,0 +1,325 @@
+"""
+LLM / Embedding 调用监控模块
+每次调用按调用点（如 tip_gen._generate_tips、agent.optimize_user_prompt）记录耗时、token 用量、
+估算费用、错误、重试与缓存命中。进程内累计指标以 Prometheus 文本格式导出，
+明细写入滚动保留的 SQLite 表，用于按时间窗口汇总
+"""
+
+import atexit
+import contextvars
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+import config
+from utils.helpers import get_logger
+
+logger = get_logger(__name__)
+
+# 延迟直方图的分桶上界（毫秒）
+LATENCY_BUCKETS_MS = (100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+# 推断调用点时跳过的基础设施模块
+_INFRA_MODULES = {
+    "utils.llm", "utils.llm_cache", "utils.single_flight",
+    "utils.embedding_batcher", "utils.llm_metrics", "utils.vectorstore"
+}
+_INFRA_PREFIXES = ("asyncio", "concurrent", "threading", "contextlib", "functools", "nest_asyncio")
+
+_call_site = contextvars.ContextVar("llm_call_site", default=None)
+
+_lock = threading.Lock()
+_buffer: List[Dict[str, Any]] = []
+_last_flush = time.monotonic()
+_last_prune = 0.0
+# {(call_site, kind, model): 累计指标}
+_totals: Dict[tuple, Dict[str, Any]] = {}
+
+
+@contextmanager
+def llm_call_site(label: str):
+    """显式指定代码块内 LLM 调用的调用点名称"""
+    token = _call_site.set(label)
+    try:
+        yield
+    finally:
+        _call_site.reset(token)
+
+
+def _short_module(module: str) -> str:
+    name = module.rsplit(".", 1)[-1]
+    return name[:-4] if name.endswith("_new") else name
+
+
+def current_call_site() -> str:
+    """当前调用点：优先使用显式指定的名称，否则取调用栈中第一个业务函数"""
+    label = _call_site.get()
+    if label:
+        return label
+
+    frame = sys._getframe(1)
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if module not in _INFRA_MODULES and not module.startswith(_INFRA_PREFIXES):
+            return f"{_short_module(module)}.{frame.f_code.co_name}"
+        frame = frame.f_back
+    return "unknown"
+
+
+def _estimate_cost(model: Optional[str], prompt_tokens: int, completion_tokens: int) -> float:
+    """按 LLM_PRICING（每百万 token 价格）估算费用"""
+    pricing = config.LLM_PRICING.get(model or "")
+    if not pricing:
+        return 0.0
+    return (
+        prompt_tokens * pricing.get("input", 0.0) + completion_tokens * pricing.get("output", 0.0)
+    ) / 1_000_000
+
+
+def _usage_tokens(usage: Any) -> tuple:
+    if usage is None:
+        return 0, 0, 0
+    prompt = getattr(usage, "prompt_tokens", 0) or 0
+    completion = getattr(usage, "completion_tokens", 0) or 0
+    total = getattr(usage, "total_tokens", 0) or prompt + completion
+    return prompt, completion, total
+
+
+def record_llm_call(
+    kind: str,
+    model: Optional[str],
+    latency_ms: float,
+    usage: Any = None,
+    status: str = "ok",
+    error: Optional[BaseException] = None,
+    retries: int = 0,
+    queue_ms: float = 0.0,
+    cache_hit: bool = False,
+    stream: bool = False,
+    call_site: Optional[str] = None
+) -> None:
+    """
+    记录一次调用
+
+    Args:
+        kind: chat / embedding
+        model: 模型名称
+        latency_ms: 上游请求耗时（最后一次尝试）
+        usage: 响应中的 usage 对象
+        status: ok / error
+        error: 失败时的异常
+        retries: 重试次数
+        queue_ms: 在调度器中排队等待的时间
+        cache_hit: 是否命中响应缓存（未请求上游）
+        stream: 是否为流式调用（usage 取自最后一个片段，未请求 include_usage 时为空）
+        call_site: 调用点名称（默认自动推断）
+    """
+    if not config.ENABLE_LLM_METRICS:
+        return
+
+    try:
+        prompt_tokens, completion_tokens, total_tokens = _usage_tokens(usage)
+        record = {
+            "call_site": call_site or current_call_site(),
+            "kind": kind,
+            "model": model,
+            "status": status,
+            "error_type": type(error).__name__ if error else None,
+            "latency_ms": round(latency_ms, 2),
+            "queue_ms": round(queue_ms, 2),
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": total_tokens,
+            "cost": _estimate_cost(model, prompt_tokens, completion_tokens),
+            "retries": retries,
+            "cache_hit": 1 if cache_hit else 0,
+            "stream": 1 if stream else 0,
+            "create_time": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        }
+
+        with _lock:
+            _accumulate(record)
+            _buffer.append(record)
+            should_flush = (
+                len(_buffer) >= config.LLM_METRICS_FLUSH_SIZE
+                or time.monotonic() - _last_flush >= config.LLM_METRICS_FLUSH_INTERVAL_SECONDS
+            )
+        if should_flush:
+            flush_metrics()
+
+    except Exception as e:
+        logger.warning(f"Failed to record LLM call metrics: {e}")
+
+
+def _accumulate(record: Dict[str, Any]) -> None:
+    """累加进程内指标（需持有锁）"""
+    key = (record["call_site"], record["kind"], record["model"] or "")
+    totals = _totals.get(key)
+    if totals is None:
+        totals = {
+            "calls": 0, "errors": 0, "cache_hits": 0, "retries": 0,
+            "prompt_tokens": 0, "completion_tokens": 0, "cost": 0.0,
+            "latency_sum_ms": 0.0, "latency_count": 0,
+            "buckets": [0] * (len(LATENCY_BUCKETS_MS) + 1),
+        }
+        _totals[key] = totals
+
+    totals["calls"] += 1
+    totals["errors"] += record["status"] != "ok"
+    totals["cache_hits"] += record["cache_hit"]
+    totals["retries"] += record["retries"]
+    totals["prompt_tokens"] += record["prompt_tokens"]
+    totals["completion_tokens"] += record["completion_tokens"]
+    totals["cost"] += record["cost"]
+
+    # 缓存命中不计入上游延迟
+    if not record["cache_hit"]:
+        latency = record["latency_ms"]
+        totals["latency_sum_ms"] += latency
+        totals["latency_count"] += 1
+        index = next((i for i, bound in enumerate(LATENCY_BUCKETS_MS) if latency <= bound), len(LATENCY_BUCKETS_MS))
+        totals["buckets"][index] += 1
+
+
+def flush_metrics() -> int:
+    """把缓冲的记录写入数据库，并定期清理过期记录"""
+    global _last_flush, _last_prune
+
+    with _lock:
+        records = _buffer[:]
+        _buffer.clear()
+        _last_flush = time.monotonic()
+        prune = time.monotonic() - _last_prune >= 600
+        if prune:
+            _last_prune = time.monotonic()
+
+    try:
+        from utils.db import add_llm_call_metrics, prune_llm_call_metrics
+
+        written = add_llm_call_metrics(records)
+        if prune:
+            before = (datetime.now() - timedelta(days=config.LLM_METRICS_RETENTION_DAYS)).strftime('%Y-%m-%d %H:%M:%S')
+            prune_llm_call_metrics(before, config.LLM_METRICS_MAX_ROWS)
+        return written
+
+    except Exception as e:
+        logger.warning(f"Failed to persist LLM call metrics: {e}")
+        return 0
+
+
+atexit.register(flush_metrics)
+
+
+def _escape_label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+
+def render_prometheus() -> str:
+    """以 Prometheus 文本格式导出进程启动以来的累计指标"""
+    with _lock:
+        snapshot = {key: dict(value, buckets=list(value["buckets"])) for key, value in _totals.items()}
+
+    counters = [
+        ("lifecontext_llm_calls_total", "calls", "LLM/embedding calls"),
+        ("lifecontext_llm_errors_total", "errors", "Failed LLM/embedding calls"),
+        ("lifecontext_llm_cache_hits_total", "cache_hits", "Calls served from the response cache"),
+        ("lifecontext_llm_retries_total", "retries", "Retried upstream requests"),
+        ("lifecontext_llm_prompt_tokens_total", "prompt_tokens", "Prompt tokens"),
+        ("lifecontext_llm_completion_tokens_total", "completion_tokens", "Completion tokens"),
+        ("lifecontext_llm_cost_total", "cost", "Estimated cost (LLM_PRICING currency)"),
+    ]
+
+    lines = []
+    for name, field, help_text in counters:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} counter")
+        for (site, kind, model), totals in sorted(snapshot.items()):
+            labels = f'call_site="{_escape_label(site)}",kind="{kind}",model="{_escape_label(model)}"'
+            lines.append(f"{name}{{{labels}}} {totals[field]}")
+
+    name = "lifecontext_llm_latency_ms"
+    lines.append(f"# HELP {name} Upstream request latency in milliseconds")
+    lines.append(f"# TYPE {name} histogram")
+    for (site, kind, model), totals in sorted(snapshot.items()):
+        labels = f'call_site="{_escape_label(site)}",kind="{kind}",model="{_escape_label(model)}"'
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS_MS, totals["buckets"]):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        cumulative += totals["buckets"][-1]
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {cumulative}')
+        lines.append(f"{name}_sum{{{labels}}} {round(totals['latency_sum_ms'], 2)}")
+        lines.append(f"{name}_count{{{labels}}} {totals['latency_count']}")
+
+    return "\n".join(lines) + "\n"
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, int(round(q * (len(values) - 1)))))
+    return round(values[index], 2)
+
+
+def get_metrics_summary(hours: float = 24, call_site: Optional[str] = None) -> Dict[str, Any]:
+    """
+    汇总最近 hours 小时的调用记录
+
+    Returns:
+        {"window_hours", "totals", "call_sites": [按 token 用量降序的调用点汇总]}
+    """
+    from utils.db import get_llm_call_metrics
+
+    flush_metrics()
+    since = (datetime.now() - timedelta(hours=hours)).strftime('%Y-%m-%d %H:%M:%S')
+    rows = get_llm_call_metrics(since, call_site=call_site)
+
+    groups: Dict[tuple, List[Dict[str, Any]]] = {}
+    for row in rows:
+        groups.setdefault((row["call_site"], row["kind"], row["model"] or ""), []).append(row)
+
+    sites = []
+    for (site, kind, model), items in groups.items():
+        latencies = sorted(item["latency_ms"] for item in items if not item["cache_hit"])
+        errors = sum(1 for item in items if item["status"] != "ok")
+        histogram = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        for latency in latencies:
+            histogram[next((i for i, bound in enumerate(LATENCY_BUCKETS_MS) if latency <= bound), len(LATENCY_BUCKETS_MS))] += 1
+
+        sites.append({
+            "call_site": site,
+            "kind": kind,
+            "model": model,
+            "calls": len(items),
+            "errors": errors,
+            "error_rate": round(errors / len(items), 4),
+            "cache_hits": sum(item["cache_hit"] for item in items),
+            "retries": sum(item["retries"] for item in items),
+            "prompt_tokens": sum(item["prompt_tokens"] for item in items),
+            "completion_tokens": sum(item["completion_tokens"] for item in items),
+            "total_tokens": sum(item["total_tokens"] for item in items),
+            "cost": round(sum(item["cost"] for item in items), 6),
+            "latency_ms": {
+                "avg": round(sum(latencies) / len(latencies), 2) if latencies else 0.0,
+                "p50": _percentile(latencies, 0.5),
+                "p90": _percentile(latencies, 0.9),
+                "p99": _percentile(latencies, 0.99),
+                "max": round(latencies[-1], 2) if latencies else 0.0,
+            },
+            "queue_ms_avg": round(sum(item["queue_ms"] for item in items) / len(items), 2),
+            "latency_histogram": {
+                **{f"le_{bound}": count for bound, count in zip(LATENCY_BUCKETS_MS, histogram)},
+                "le_inf": histogram[-1],
+            },
+        })
+
+    sites.sort(key=lambda entry: (entry["total_tokens"], entry["calls"]), reverse=True)
+    totals = {
+        field: sum(entry[field] for entry in sites)
+        for field in ("calls", "errors", "cache_hits", "retries", "prompt_tokens", "completion_tokens", "total_tokens")
+    }
+    totals["cost"] = round(sum(entry["cost"] for entry in sites), 6)
+
+    return {"window_hours": hours, "since": since, "totals": totals, "call_sites": sites}
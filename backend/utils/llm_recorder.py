@@ -0,0 +1,143 @@
+"""
+LLM 请求录制模块
+设置 LLM_RECORD_DIR 后，经过调度器的每次成功调用都以 {请求键}.json 保存请求与响应（流式响应在读完后合并保存），
+本地桩服务（llm_stub_server.py --replay）按同样的请求键回放，便于离线、可复现地压测各条流水线
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+import config
+from utils.helpers import get_logger
+
+logger = get_logger(__name__)
+
+# 决定响应内容的请求字段（stream 等传输参数不参与，录制的非流式响应也可以按流式回放）
+_KEY_FIELDS = ("model", "messages", "temperature", "max_tokens", "response_format", "tools", "tool_choice", "input", "dimensions")
+
+_write_lock = threading.Lock()
+
+
+def fixture_key(kind: str, params: Dict[str, Any]) -> str:
+    """计算请求键（录制端与回放端共用）"""
+    payload = {field: params.get(field) for field in _KEY_FIELDS if params.get(field) is not None}
+    payload["kind"] = kind
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _record_dir() -> Optional[Path]:
+    return Path(config.LLM_RECORD_DIR) if config.LLM_RECORD_DIR else None
+
+
+def _dump(value) -> Dict[str, Any]:
+    return value.model_dump(mode="json", exclude_none=True) if hasattr(value, "model_dump") else value
+
+
+def save_fixture(kind: str, params: Dict[str, Any], response: Dict[str, Any]) -> None:
+    """写入一条录制（原子替换，同一请求重复录制时保留最新的响应）"""
+    directory = _record_dir()
+    if directory is None:
+        return
+    try:
+        key = fixture_key(kind, params)
+        fixture = {
+            "key": key,
+            "kind": kind,
+            "request": {field: params[field] for field in _KEY_FIELDS if params.get(field) is not None},
+            "response": response,
+            "recorded_at": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        }
+        with _write_lock:
+            directory.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(fixture, f, ensure_ascii=False, default=str)
+            os.replace(tmp_path, directory / f"{key}.json")
+    except Exception as e:
+        logger.warning(f"Failed to record LLM exchange: {e}")
+
+
+class _RecordingStream:
+    """透传流式响应，读完后把各片段合并为一个完整响应保存"""
+
+    def __init__(self, stream, kind: str, params: Dict[str, Any]):
+        self._stream = stream
+        self._kind = kind
+        self._params = params
+        self._parts: List[str] = []
+        self._finish_reason = None
+        self._usage = None
+        self._model = None
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+    def _collect(self, chunk) -> None:
+        self._model = getattr(chunk, "model", None) or self._model
+        usage = getattr(chunk, "usage", None)
+        if usage is not None:
+            self._usage = _dump(usage)
+        for choice in getattr(chunk, "choices", None) or []:
+            content = getattr(choice.delta, "content", None)
+            if content:
+                self._parts.append(content)
+            if getattr(choice, "finish_reason", None):
+                self._finish_reason = choice.finish_reason
+
+    def _save(self) -> None:
+        response = {
+            "object": "chat.completion",
+            "model": self._model or self._params.get("model"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": "".join(self._parts)},
+                "finish_reason": self._finish_reason or "stop",
+            }],
+        }
+        if self._usage:
+            response["usage"] = self._usage
+        save_fixture(self._kind, self._params, response)
+
+    def __iter__(self):
+        for chunk in self._stream:
+            self._collect(chunk)
+            yield chunk
+        self._save()
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            self._collect(chunk)
+            yield chunk
+        self._save()
+
+
+def record_response(kind: str, params: Dict[str, Any], response):
+    """录制模式下保存响应；流式响应返回包装后的迭代器"""
+    if not config.LLM_RECORD_DIR:
+        return response
+    if params.get("stream"):
+        return _RecordingStream(response, kind, params)
+    try:
+        save_fixture(kind, params, _dump(response))
+    except Exception as e:
+        logger.warning(f"Failed to record LLM exchange: {e}")
+    return response
+
+
+def load_fixtures(directory: str) -> Dict[str, Dict[str, Any]]:
+    """读取录制目录，返回 {请求键: 录制}"""
+    fixtures = {}
+    for path in sorted(Path(directory).glob("*.json")):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                fixture = json.load(f)
+            fixtures[fixture["key"]] = fixture
+        except Exception as e:
+            logger.warning(f"Skipping unreadable fixture {path.name}: {e}")
+    return fixtures
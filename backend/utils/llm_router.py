@@ -0,0 +1,414 @@
+"""
+多端点 LLM 路由模块
+按配置顺序使用多个 OpenAI 兼容端点：记录每个端点的延迟与失败情况，连续失败的端点熔断一段时间，
+冷却后只放行一次试探请求；请求失败时切换到下一个可用端点。
+交互式请求可在主端点超过其 p95 延迟仍未返回时向下一个端点发出对冲请求，先成功的结果胜出，另一个被取消
+"""
+
+import asyncio
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, Any, List, Optional
+import openai
+import config
+from utils.helpers import get_logger
+
+logger = get_logger(__name__)
+
+CIRCUIT_CLOSED = "closed"
+CIRCUIT_OPEN = "open"
+CIRCUIT_HALF_OPEN = "half_open"
+
+
+class EndpointHealth:
+    """单个端点的健康状况与熔断状态（线程安全，同步与异步客户端共用）"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.state = CIRCUIT_CLOSED
+        self.consecutive_failures = 0
+        self.opened_until = 0.0
+        self.trial_in_flight = False
+        self.latencies: deque = deque(maxlen=config.LLM_ENDPOINT_LATENCY_WINDOW)
+        self.successes = 0
+        self.failures = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.last_error: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def available(self) -> bool:
+        """是否可以接收请求（不占用试探名额）"""
+        with self._lock:
+            if self.state == CIRCUIT_CLOSED:
+                return True
+            if self.state == CIRCUIT_OPEN:
+                return time.monotonic() >= self.opened_until
+            return not self.trial_in_flight
+
+    def allow(self) -> bool:
+        """申请发送一次请求；熔断冷却结束后只放行一个试探请求"""
+        with self._lock:
+            if self.state == CIRCUIT_CLOSED:
+                return True
+            if self.state == CIRCUIT_OPEN:
+                if time.monotonic() < self.opened_until:
+                    return False
+                self.state = CIRCUIT_HALF_OPEN
+                self.trial_in_flight = False
+            if self.trial_in_flight:
+                return False
+            self.trial_in_flight = True
+            return True
+
+    def record_success(self, latency: float, sample: bool = True) -> None:
+        with self._lock:
+            if self.state != CIRCUIT_CLOSED:
+                logger.info(f"LLM endpoint {self.name} recovered, circuit closed")
+            self.state = CIRCUIT_CLOSED
+            self.consecutive_failures = 0
+            self.trial_in_flight = False
+            self.successes += 1
+            if sample:
+                self.latencies.append(latency)
+
+    def record_failure(self, error: Exception) -> None:
+        with self._lock:
+            self.failures += 1
+            self.consecutive_failures += 1
+            self.trial_in_flight = False
+            self.last_error = f"{type(error).__name__}: {error}"[:200]
+            if self.state == CIRCUIT_HALF_OPEN or self.consecutive_failures >= config.LLM_CIRCUIT_FAILURE_THRESHOLD:
+                if self.state != CIRCUIT_OPEN:
+                    logger.warning(
+                        f"LLM endpoint {self.name} circuit opened for {config.LLM_CIRCUIT_OPEN_SECONDS}s "
+                        f"after {self.consecutive_failures} consecutive failure(s)"
+                    )
+                self.state = CIRCUIT_OPEN
+                self.opened_until = time.monotonic() + config.LLM_CIRCUIT_OPEN_SECONDS
+
+    def record_hedge(self) -> None:
+        with self._lock:
+            self.hedges += 1
+
+    def record_hedge_win(self) -> None:
+        with self._lock:
+            self.hedge_wins += 1
+
+    def release_trial(self) -> None:
+        """请求既未成功也未计为端点故障（如参数错误、对冲中被取消）时归还试探名额"""
+        with self._lock:
+            self.trial_in_flight = False
+
+    def percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self.latencies)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def hedge_delay(self) -> float:
+        """对冲延迟：主端点的 p95 延迟（样本不足时使用默认值）"""
+        with self._lock:
+            enough = len(self.latencies) >= config.LLM_HEDGE_MIN_SAMPLES
+        p95 = self.percentile(0.95) if enough else None
+        delay = p95 if p95 is not None else config.LLM_HEDGE_DEFAULT_DELAY_SECONDS
+        return max(config.LLM_HEDGE_MIN_DELAY_SECONDS, delay)
+
+    def snapshot(self) -> Dict[str, Any]:
+        p50, p95 = self.percentile(0.5), self.percentile(0.95)
+        with self._lock:
+            return {
+                "endpoint": self.name,
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "open_seconds": round(max(0.0, self.opened_until - time.monotonic()), 2)
+                if self.state == CIRCUIT_OPEN else 0,
+                "successes": self.successes,
+                "failures": self.failures,
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+                "latency_p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+                "latency_p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+                "last_error": self.last_error,
+            }
+
+
+# 健康状况按端点在进程内共享（同步客户端与各事件循环的异步客户端看到同一份状态）
+_health: Dict[str, EndpointHealth] = {}
+_health_lock = threading.Lock()
+
+
+def get_endpoint_health(name: str) -> EndpointHealth:
+    with _health_lock:
+        health = _health.get(name)
+        if health is None:
+            health = EndpointHealth(name)
+            _health[name] = health
+        return health
+
+
+def get_llm_endpoint_stats() -> List[Dict[str, Any]]:
+    """各 LLM 端点的健康状况（只配置了一个端点时为空）"""
+    with _health_lock:
+        endpoints = list(_health.values())
+    return [health.snapshot() for health in endpoints]
+
+
+def _should_failover(error: Exception) -> bool:
+    """连接错误、超时、限流、5xx 以及端点相关的鉴权/模型不存在错误换端点重试；请求本身有误则直接抛出"""
+    if isinstance(error, openai.APIConnectionError):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in (401, 403, 404, 408, 409, 429) or error.status_code >= 500
+    return False
+
+
+class Endpoint:
+    """路由中的一个端点"""
+
+    def __init__(self, name: str, model: Optional[str], client):
+        self.name = name
+        self.model = model
+        self.client = client
+        self.health = get_endpoint_health(name)
+
+    def params_for(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """调用方按主端点的模型名发起请求，换到其他端点时替换为该端点的模型"""
+        if self.model and params.get("model") in (None, config.LLM_MODEL) and params.get("model") != self.model:
+            return {**params, "model": self.model}
+        return params
+
+
+# 同步对冲请求在线程池中并行发送
+_hedge_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="llm-hedge")
+
+
+class _RoutedCompletions:
+    """chat.completions 的多端点实现"""
+
+    def __init__(self, endpoints: List[Endpoint], is_async: bool):
+        self._endpoints = endpoints
+        self._is_async = is_async
+
+    def __getattr__(self, name):
+        return getattr(self._endpoints[0].client.chat.completions, name)
+
+    # ---------- 端点选择 ----------
+
+    def _next_endpoint(self, tried: List[Endpoint]) -> Optional[Endpoint]:
+        for endpoint in self._endpoints:
+            if endpoint not in tried and endpoint.health.allow():
+                return endpoint
+        if not tried:
+            # 所有端点都已熔断时仍尝试主端点，而不是直接失败
+            return self._endpoints[0]
+        return None
+
+    def _has_next(self, tried: List[Endpoint]) -> bool:
+        return any(endpoint not in tried and endpoint.health.available() for endpoint in self._endpoints)
+
+    def _should_hedge(self, params: Dict[str, Any]) -> bool:
+        from utils.llm import get_llm_priority, PRIORITY_INTERACTIVE
+
+        return (
+            config.ENABLE_LLM_HEDGING
+            and not params.get("stream")
+            and get_llm_priority() == PRIORITY_INTERACTIVE
+        )
+
+    def create(self, **params):
+        if self._is_async:
+            return self._create_async(**params)
+        if self._should_hedge(params):
+            return self._create_hedged(**params)
+        return self._create_with_failover(params, [])
+
+    # ---------- 同步 ----------
+
+    def _call(self, endpoint: Endpoint, params: Dict[str, Any], last: bool):
+        # 还有其他端点可用时不在当前端点上重试，直接切换
+        retries = config.LLM_MAX_RETRIES if last else 0
+        started = time.monotonic()
+        try:
+            response = endpoint.client.chat.completions.request(retries, **endpoint.params_for(params))
+        except Exception as e:
+            if _should_failover(e):
+                endpoint.health.record_failure(e)
+            else:
+                endpoint.health.release_trial()
+            raise
+        endpoint.health.record_success(time.monotonic() - started, sample=not params.get("stream"))
+        return response
+
+    def _create_with_failover(self, params: Dict[str, Any], tried: List[Endpoint], last_error: Exception = None):
+        while True:
+            endpoint = self._next_endpoint(tried)
+            if endpoint is None:
+                break
+            tried.append(endpoint)
+            try:
+                return self._call(endpoint, params, last=not self._has_next(tried))
+            except Exception as e:
+                if not _should_failover(e):
+                    raise
+                last_error = e
+                logger.warning(f"LLM endpoint {endpoint.name} failed ({type(e).__name__}), trying next endpoint")
+        raise last_error or RuntimeError("No LLM endpoint available")
+
+    def _submit(self, endpoint: Endpoint, params: Dict[str, Any], last: bool):
+        # 在线程池中执行时保留调用方的优先级与调用点
+        context = contextvars.copy_context()
+        return _hedge_executor.submit(context.run, self._call, endpoint, params, last)
+
+    def _create_hedged(self, **params):
+        primary = self._next_endpoint([])
+        tried = [primary]
+        # 没有其他端点可对冲或切换时，主端点就是最后的候选，保留重试
+        first = self._submit(primary, params, last=not self._has_next(tried))
+        done, _ = wait([first], timeout=primary.health.hedge_delay())
+        if done:
+            try:
+                return first.result()
+            except Exception as e:
+                if not _should_failover(e):
+                    raise
+                return self._create_with_failover(params, tried, e)
+
+        backup = self._next_endpoint(tried)
+        if backup is None:
+            return first.result()
+        tried.append(backup)
+        primary.health.record_hedge()
+        logger.info(f"Hedging slow LLM request on {primary.name} with {backup.name}")
+        second = self._submit(backup, params, last=not self._has_next(tried))
+
+        pending = {first: primary, second: backup}
+        last_error = None
+        while pending:
+            done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+            for future in done:
+                endpoint = pending.pop(future)
+                try:
+                    response = future.result()
+                except Exception as e:
+                    if not _should_failover(e):
+                        raise
+                    last_error = e
+                    continue
+                # 同步请求无法中断，落后的一方完成后结果被丢弃
+                for loser in pending:
+                    loser.cancel()
+                if endpoint is backup:
+                    backup.health.record_hedge_win()
+                return response
+        return self._create_with_failover(params, tried, last_error)
+
+    # ---------- 异步 ----------
+
+    async def _call_async(self, endpoint: Endpoint, params: Dict[str, Any], last: bool):
+        retries = config.LLM_MAX_RETRIES if last else 0
+        started = time.monotonic()
+        try:
+            response = await endpoint.client.chat.completions.request(retries, **endpoint.params_for(params))
+        except asyncio.CancelledError:
+            endpoint.health.release_trial()
+            raise
+        except Exception as e:
+            if _should_failover(e):
+                endpoint.health.record_failure(e)
+            else:
+                endpoint.health.release_trial()
+            raise
+        endpoint.health.record_success(time.monotonic() - started, sample=not params.get("stream"))
+        return response
+
+    async def _create_async(self, **params):
+        tried: List[Endpoint] = []
+        last_error = None
+        if self._should_hedge(params):
+            try:
+                return await self._create_hedged_async(params, tried)
+            except Exception as e:
+                if not _should_failover(e):
+                    raise
+                last_error = e
+
+        while True:
+            endpoint = self._next_endpoint(tried)
+            if endpoint is None:
+                break
+            tried.append(endpoint)
+            try:
+                return await self._call_async(endpoint, params, last=not self._has_next(tried))
+            except Exception as e:
+                if not _should_failover(e):
+                    raise
+                last_error = e
+                logger.warning(f"LLM endpoint {endpoint.name} failed ({type(e).__name__}), trying next endpoint")
+        raise last_error or RuntimeError("No LLM endpoint available")
+
+    async def _create_hedged_async(self, params: Dict[str, Any], tried: List[Endpoint]):
+        """主端点在对冲延迟内未返回时并行请求下一个端点，先成功者胜出并取消另一个（失败的端点记入 tried）"""
+        primary = self._next_endpoint(tried)
+        tried.append(primary)
+        # 没有其他端点可对冲或切换时，主端点就是最后的候选，保留重试
+        first = asyncio.ensure_future(self._call_async(primary, params, last=not self._has_next(tried)))
+        pending = {first: primary}
+        try:
+            done, _ = await asyncio.wait({first}, timeout=primary.health.hedge_delay())
+            if done:
+                pending.clear()
+                return first.result()
+
+            backup = self._next_endpoint(tried)
+            if backup is None:
+                return await first
+            tried.append(backup)
+            primary.health.record_hedge()
+            logger.info(f"Hedging slow LLM request on {primary.name} with {backup.name}")
+            pending[asyncio.ensure_future(self._call_async(backup, params, last=not self._has_next(tried)))] = backup
+
+            last_error = None
+            while pending:
+                done, _ = await asyncio.wait(set(pending), return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    endpoint = pending.pop(task)
+                    error = task.exception()
+                    if error is not None:
+                        if not _should_failover(error):
+                            raise error
+                        last_error = error
+                        continue
+                    if endpoint is backup:
+                        backup.health.record_hedge_win()
+                    return task.result()
+            raise last_error
+        finally:
+            # 取消落后的一方（或调用方被取消时的全部请求），其并发槽位在取消时归还
+            for task in pending:
+                task.cancel()
+
+
+class _RoutedChat:
+    def __init__(self, endpoints: List[Endpoint], is_async: bool):
+        self._chat = endpoints[0].client.chat
+        self.completions = _RoutedCompletions(endpoints, is_async)
+
+    def __getattr__(self, name):
+        return getattr(self._chat, name)
+
+
+class RoutedClient:
+    """多端点 LLM 客户端：chat.completions.create 按端点健康状况故障转移与对冲，其余属性透传主端点客户端"""
+
+    def __init__(self, endpoints: List[Endpoint], is_async: bool = False):
+        self.endpoints = endpoints
+        self._client = endpoints[0].client
+        self.chat = _RoutedChat(endpoints, is_async)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
@@ -0,0 +1,293 @@
+"""
+网页版本链模块
+插件对同一页面先上传全量文本（initial-load），之后只上传相对上一版本的行级 diff（dom-diff）。
+这里按规范化 URL 维护每个页面的当前文本：全量上传替换当前文本，diff 应用到当前文本上得到新版本，
+每个版本记录在 page_versions 表中并指向保存该次上传的 web_data 行。
+向量库中每个页面只保留当前版本的分块（见 vectorstore.sync_page_to_vectorstore）
+
+插件上传的 diff 不含未变化的行（equal），只能按顺序在当前文本中定位被删除/修改的行；
+新增行的确切位置无法确定，分别尝试紧跟上一处变更与紧邻下一处变更两种放置方式，
+以插件提供的 newHash 校验结果，都不一致时采用后者并标记为近似版本；
+diff 的基准哈希与当前版本不一致（中间版本丢失）且结果无法校验时不应用，按独立文档处理
+"""
+
+import re
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+import config
+from utils.helpers import get_logger
+
+logger = get_logger(__name__)
+
+# 参与版本链的上传来源（插件的页面抓取；聊天上下文等其他来源按 URL 合并没有意义）
+PAGE_SOURCES = {"web_crawler", "web-crawler-initial", "web-crawler-incremental"}
+
+# 合并多个连续 diff 时的分隔操作：之前的操作应用完后，之后的操作基于得到的新文本重新定位（hash 为分隔处的版本哈希）
+CHECKPOINT_OP = {"type": "checkpoint"}
+
+_LINE_SPLIT = re.compile(r"\r?\n")
+
+_key_locks: Dict[str, list] = {}
+_key_locks_guard = threading.Lock()
+
+
+def content_hash(text: str) -> str:
+    """与插件 calculateContentHash 一致的 32 位字符串哈希（按 UTF-16 码元计算，返回十进制字符串）"""
+    data = (text or "").encode("utf-16-le")
+    h = 0
+    for i in range(0, len(data), 2):
+        h = (h * 31 + (data[i] | (data[i + 1] << 8))) & 0xFFFFFFFF
+    return str(h - 0x100000000 if h >= 0x80000000 else h)
+
+
+def is_dom_diff(data: Dict[str, Any]) -> bool:
+    """上传数据是否为 dom-diff（只含相对上一版本的变更）"""
+    content = data.get('content')
+    return (data.get('changeType') == 'dom-diff') or (isinstance(content, dict) and bool(content.get('diffOnly')))
+
+
+def get_diff(data: Dict[str, Any]) -> Dict[str, Any]:
+    """dom-diff 上传中的 diff（优先取顶层 diff 字段，其次 content.diff）"""
+    content = data.get('content')
+    return data.get('diff') or (content.get('diff') if isinstance(content, dict) else None) or {}
+
+
+def get_page_key(data: Dict[str, Any]) -> Optional[str]:
+    """上传数据对应的版本链键（规范化 URL）；未启用版本链、来源不参与或无法规范化时返回 None"""
+    from utils.url_utils import normalize_url
+
+    if not config.ENABLE_PAGE_VERSIONING or data.get('source', 'web_crawler') not in PAGE_SOURCES:
+        return None
+    return normalize_url(data.get('url') or "")["canonical"] or None
+
+
+@contextmanager
+def page_lock(page_key: str):
+    """同一页面的版本更新与向量同步串行执行（不同页面互不影响）"""
+    with _key_locks_guard:
+        entry = _key_locks.setdefault(page_key, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _key_locks_guard:
+            entry[1] -= 1
+            if not entry[1]:
+                _key_locks.pop(page_key, None)
+
+
+def _split_lines(text: str) -> List[str]:
+    return _LINE_SPLIT.split(text or "")
+
+
+def _find_lines(lines: List[str], target: List[str], start: int) -> int:
+    """从 start 起查找连续行 target 的位置，找不到返回 -1"""
+    size = len(target)
+    first = target[0]
+    for i in range(start, len(lines) - size + 1):
+        if lines[i] == first and lines[i:i + size] == target:
+            return i
+    return -1
+
+
+def _apply_ops(base: List[str], ops: List[Dict[str, Any]], late_inserts: bool) -> Optional[List[str]]:
+    """
+    按顺序把 diff 应用到 base 上
+
+    Args:
+        late_inserts: 新增行放在下一处变更之前（True）还是紧跟上一处变更（False）
+
+    Returns:
+        新版本的行；被删除/修改的行在当前文本中找不到时返回 None
+    """
+    out: List[str] = []
+    pending: List[str] = []
+    cursor = 0
+
+    for op in ops:
+        op_type = op.get('type')
+        if op_type == 'added':
+            pending.extend(_split_lines(str(op.get('text', ''))))
+            continue
+        if op_type == 'removed':
+            old, new = _split_lines(str(op.get('text', ''))), []
+        elif op_type == 'modified':
+            old, new = _split_lines(str(op.get('oldText', ''))), _split_lines(str(op.get('newText', '')))
+        else:
+            continue
+
+        index = _find_lines(base, old, cursor)
+        if index < 0:
+            return None
+        out.extend(base[cursor:index] + pending if late_inserts else pending + base[cursor:index])
+        out.extend(new)
+        pending = []
+        cursor = index + len(old)
+
+    out.extend(base[cursor:] + pending if late_inserts else pending + base[cursor:])
+    return out
+
+
+def apply_line_diff(base_text: str, ops: List[Dict[str, Any]], expected_hash: Optional[str] = None):
+    """
+    把插件的行级 diff 应用到当前文本
+
+    Returns:
+        (新文本, 是否与 expected_hash（及各分段哈希）一致)；diff 无法应用时返回 None
+    """
+    # 合并后的 diff 按 CHECKPOINT_OP 分段依次应用，每段以其结果哈希选择新增行的放置方式
+    segments, segment = [], []
+    for op in ops:
+        if op.get('type') == CHECKPOINT_OP['type']:
+            segments.append((segment, op.get('hash')))
+            segment = []
+        else:
+            segment.append(op)
+    segments.append((segment, expected_hash))
+
+    lines = _split_lines(base_text)
+    exact = True
+    for segment, segment_hash in segments:
+        fallback = None
+        for late_inserts in (True, False):
+            result = _apply_ops(lines, segment, late_inserts)
+            if result is None:
+                return None
+            if segment_hash is not None and content_hash("\n".join(result)) == str(segment_hash):
+                fallback = None
+                break
+            if fallback is None:
+                fallback = result
+        if fallback is not None:
+            result = fallback
+            exact = False
+        lines = result
+    return "\n".join(lines), exact
+
+
+def compose_diffs(first: Dict[str, Any], second: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    把两个连续的 diff 合并为一个（first 的新版本是 second 的基准）
+
+    两个 diff 都不含未变化的行，无法在没有原文的情况下合并为一组操作，这里按顺序拼接并以 CHECKPOINT_OP 分隔
+    （附带 first 的结果哈希），应用时依次生效；整体哈希取 first 的基准与 second 的结果，摘要累加
+    """
+    summary = {}
+    for diff in (first, second):
+        for key, value in (diff.get('summary') or {}).items():
+            if isinstance(value, (int, float)):
+                summary[key] = summary.get(key, 0) + value
+
+    return {
+        **second,
+        "oldHash": first.get('oldHash'),
+        "oldLength": first.get('oldLength'),
+        "summary": summary,
+        "ops": list(first.get('ops') or []) + [{**CHECKPOINT_OP, "hash": first.get('newHash')}] + list(second.get('ops') or []),
+    }
+
+
+def resolve_page_update(page_key: str, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    计算本次上传后页面的新版本（需在 page_lock 内调用，与 commit_page_update 之间不应有其他写入）
+
+    - 全量上传：页面文本即新版本
+    - dom-diff：应用到当前版本上；页面没有当前版本或 diff 无法应用时返回 None（调用方按独立文档处理）
+
+    Returns:
+        新版本信息，或 None
+    """
+    from utils.db import get_page_document
+
+    return _resolve(page_key, data, get_page_document(page_key))
+
+
+def resolve_page_updates(page_key: str, uploads: List[Dict[str, Any]]) -> List[Optional[Dict[str, Any]]]:
+    """
+    按上传顺序计算同一页面多次上传各自形成的新版本（批量入库用，需在 page_lock 内调用）
+
+    后一次上传以前一次形成的版本为基准；无法形成版本的上传对应 None，不影响后续上传的基准
+
+    Returns:
+        与 uploads 一一对应的新版本信息（或 None）
+    """
+    from utils.db import get_page_document
+
+    current = get_page_document(page_key)
+    updates = []
+    for data in uploads:
+        update = _resolve(page_key, data, current)
+        updates.append(update)
+        if update is not None:
+            current = {
+                "version": update["version"],
+                "content": update["content"],
+                "content_hash": update["content_hash"],
+            }
+    return updates
+
+
+def _resolve(page_key: str, data: Dict[str, Any], current: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    from utils.content_cleaner import extract_page_text
+
+    if is_dom_diff(data):
+        diff = get_diff(data)
+        if current is None:
+            logger.info(f"[page_versions] No base version for {page_key}, diff stored as a standalone document")
+            return None
+
+        applied = apply_line_diff(current['content'] or "", diff.get('ops') or [], diff.get('newHash'))
+        if applied is None:
+            logger.info(f"[page_versions] Diff does not apply to {page_key} v{current['version']}, stored as a standalone document")
+            return None
+        text, exact = applied
+        if not exact:
+            # 基准版本与插件不一致（漏掉了中间版本）时结果不可信；基准一致只是新增行位置不确定时保留近似版本
+            if diff.get('oldHash') is not None and str(diff.get('oldHash')) != current['content_hash']:
+                logger.info(f"[page_versions] Diff base does not match {page_key} v{current['version']}, stored as a standalone document")
+                return None
+            logger.info(f"[page_versions] Approximate version for {page_key} v{current['version'] + 1}")
+        change_type = "diff"
+        # 记录插件侧的哈希，近似版本之后的 diff 仍能接上版本链
+        new_hash = str(diff['newHash']) if diff.get('newHash') is not None else content_hash(text)
+    else:
+        text = extract_page_text(data.get('content'))
+        if text is None:
+            return None
+        exact = True
+        change_type = "full"
+        new_hash = content_hash(text)
+
+    return {
+        "page_key": page_key,
+        "url": data.get('url') or "",
+        "version": (current['version'] if current else 0) + 1,
+        "content": text,
+        "content_hash": new_hash,
+        "base_hash": current['content_hash'] if current else None,
+        "change_type": change_type,
+        "exact": exact,
+    }
+
+
+def version_record(update: Dict[str, Any]) -> Dict[str, Any]:
+    """新版本的入库字段（save_page_version 除 web_data_id 外的参数，也用于 insert_web_data_batch 的 page_version）"""
+    return {
+        "page_key": update['page_key'],
+        "url": update['url'],
+        "version": update['version'],
+        "content": update['content'],
+        "content_hash": update['content_hash'],
+        "change_type": update['change_type'],
+        "base_hash": update['base_hash'],
+        "exact": update['exact'],
+    }
+
+
+def commit_page_update(update: Dict[str, Any], web_data_id: int) -> None:
+    """记录新版本并将其设为页面的当前版本"""
+    from utils.db import save_page_version
+
+    save_page_version(web_data_id=web_data_id, **version_record(update))
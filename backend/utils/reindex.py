@@ -0,0 +1,459 @@
+"""
+向量库重建索引模块
+更换 EMBEDDING_MODEL 后，从 SQLite（网页数据、待办、提示）和现有集合（会话记忆）流式读取内容，
+批量并发重新 embedding 写入影子集合，按页记录断点（重启后可续跑），完成后原子切换
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+import config
+from utils.helpers import get_logger
+
+logger = get_logger(__name__)
+
+# 从 SQLite 重建的表（按此顺序处理）
+_SQL_SOURCES = ("web_data", "todos", "tips")
+
+# 会话记忆只存在于向量库中，从旧集合复制文本后重新 embedding
+_MEMORY_SOURCE = "session_memory"
+_MEMORY_WHERE = {"source": "session_memory"}
+
+# settings 表中记录当前集合所用 embedding 模型的键
+EMBEDDING_MODEL_SETTING = 'vector_embedding_model'
+
+# 可续跑的任务状态
+_RESUMABLE_STATUSES = ['pending', 'running', 'failed']
+
+# 运行中的任务超过该时间未更新断点，视为所属进程已退出
+_STALE_SECONDS = 300
+
+_worker: Optional[threading.Thread] = None
+_start_lock = threading.Lock()
+
+
+class ReindexCancelled(Exception):
+    """任务被取消"""
+    pass
+
+
+def _now() -> str:
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _is_cancelled(job_id: int) -> bool:
+    """通过数据库状态判断是否取消（支持跨进程取消，如脚本取消服务中的任务）"""
+    from utils.db import get_reindex_job
+
+    job = get_reindex_job(job_id)
+    return job is None or job['status'] == 'cancelling'
+
+
+def _embed_batch(texts: List[str]) -> List[List[float]]:
+    """为一批文本生成 embedding，失败时指数退避重试"""
+    from utils.llm import generate_embeddings
+
+    for attempt in range(config.REINDEX_MAX_RETRIES + 1):
+        embeddings = generate_embeddings(texts)
+        if embeddings and len(embeddings) == len(texts):
+            return embeddings
+        if attempt < config.REINDEX_MAX_RETRIES:
+            time.sleep(min(30, 2 ** attempt))
+
+    raise RuntimeError(f"Failed to generate embeddings for a batch of {len(texts)} texts")
+
+
+def _write_documents(shadow, executor, batch_size: int, ids, documents, metadatas) -> None:
+    """分批并发 embedding 后写入影子集合"""
+    if not ids:
+        return
+
+    batches = [documents[start:start + batch_size] for start in range(0, len(documents), batch_size)]
+    embeddings = []
+    for batch_embeddings in executor.map(_embed_batch, batches):
+        embeddings.extend(batch_embeddings)
+
+    shadow.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+
+def _build_rows(table: str, rows: List[Dict[str, Any]]):
+    """把一页 SQLite 行展开为向量文档"""
+    from utils.vector_sync import build_row_documents
+
+    ids, documents, metadatas = [], [], []
+    for row in rows:
+        row_ids, row_documents, row_metadatas = build_row_documents(table, row)
+        ids.extend(row_ids)
+        documents.extend(row_documents)
+        metadatas.extend(row_metadatas)
+    return ids, documents, metadatas
+
+
+def _reindex_table(job: Dict[str, Any], table: str, shadow, executor, batch_size: int, page_size: int) -> None:
+    """按 ID 键集分页重建单张表，每页写完后记录断点"""
+    from utils.db import get_rows_for_vector_sync, update_reindex_job
+
+    cursor = job['cursor']
+    after_id = cursor.get(table, 0)
+
+    while True:
+        if _is_cancelled(job['id']):
+            raise ReindexCancelled()
+
+        rows = get_rows_for_vector_sync(table, after_id=after_id, limit=page_size)
+        if not rows:
+            break
+
+        ids, documents, metadatas = _build_rows(table, rows)
+        _write_documents(shadow, executor, batch_size, ids, documents, metadatas)
+
+        after_id = rows[-1]['id']
+        cursor[table] = after_id
+        job['processed'] += len(rows)
+        update_reindex_job(job['id'], cursor=cursor, processed=job['processed'])
+
+        if len(rows) < page_size:
+            break
+
+
+def _reindex_memories(job: Dict[str, Any], source, shadow, executor, batch_size: int, page_size: int) -> None:
+    """从旧集合分页复制会话记忆并重新 embedding"""
+    from utils.db import update_reindex_job
+
+    cursor = job['cursor']
+    offset = cursor.get(_MEMORY_SOURCE, 0)
+
+    while True:
+        if _is_cancelled(job['id']):
+            raise ReindexCancelled()
+
+        batch = source.get(where=_MEMORY_WHERE, limit=page_size, offset=offset, include=["documents", "metadatas"])
+        if not batch or not batch.get('ids'):
+            break
+
+        _write_documents(
+            shadow, executor, batch_size,
+            batch['ids'], batch.get('documents') or [], batch.get('metadatas') or []
+        )
+
+        offset += len(batch['ids'])
+        cursor[_MEMORY_SOURCE] = offset
+        job['processed'] += len(batch['ids'])
+        update_reindex_job(job['id'], cursor=cursor, processed=job['processed'])
+
+        if len(batch['ids']) < page_size:
+            break
+
+
+def _catch_up(job: Dict[str, Any], source, shadow, executor, batch_size: int, page_size: int, since: str) -> int:
+    """
+    追平重建期间发生的写入
+
+    - SQLite 行：重新写入 since 之后写过向量库的行（新增与更新）
+    - 会话记忆：复制旧集合中有、影子集合中没有的记忆，删除旧集合中已不存在的记忆
+    重建期间删除的行留下的孤立文档由一致性校验任务清理
+
+    Returns:
+        追平的文档（行）数
+    """
+    from utils.db import get_rows_for_vector_sync
+
+    caught_up = 0
+
+    for table in _SQL_SOURCES:
+        after_id = 0
+        while True:
+            rows = get_rows_for_vector_sync(table, after_id=after_id, limit=page_size, synced_since=since)
+            if not rows:
+                break
+
+            # 网页数据分块数可能变化，先删除旧分块（页面当前版本删除该页面的全部分块）
+            if table == "web_data":
+                from utils.vector_sync import page_head_key
+
+                for row in rows:
+                    shadow.delete(where={"web_data_id": row['id']})
+                    page_key = page_head_key(row)
+                    if page_key:
+                        shadow.delete(where={"page_key": page_key})
+
+            ids, documents, metadatas = _build_rows(table, rows)
+            _write_documents(shadow, executor, batch_size, ids, documents, metadatas)
+
+            caught_up += len(rows)
+            after_id = rows[-1]['id']
+            if len(rows) < page_size:
+                break
+
+    live_ids = set((source.get(where=_MEMORY_WHERE, include=[]) or {}).get('ids') or [])
+    shadow_ids = set((shadow.get(where=_MEMORY_WHERE, include=[]) or {}).get('ids') or [])
+
+    removed = list(shadow_ids - live_ids)
+    if removed:
+        shadow.delete(ids=removed)
+
+    added = list(live_ids - shadow_ids)
+    for start in range(0, len(added), page_size):
+        batch = source.get(ids=added[start:start + page_size], include=["documents", "metadatas"])
+        if batch and batch.get('ids'):
+            _write_documents(
+                shadow, executor, batch_size,
+                batch['ids'], batch.get('documents') or [], batch.get('metadatas') or []
+            )
+            caught_up += len(batch['ids'])
+
+    return caught_up
+
+
+def _open_source_collection(name: str):
+    """打开旧集合：与当前生效集合相同时复用同一实例（NumPy 后端的内存镜像不跨实例共享）"""
+    from utils.vectorstore import get_collection
+    from utils.vector_backends import create_vector_backend
+
+    collection = get_collection()
+    if collection.name == name:
+        return collection
+    return create_vector_backend(name)
+
+
+def _count_total(source) -> int:
+    from utils.db import count_table_rows
+
+    total = sum(count_table_rows(table) for table in _SQL_SOURCES)
+    memories = source.get(where=_MEMORY_WHERE, include=[]) or {}
+    return total + len(memories.get('ids') or [])
+
+
+def _run_job(job_id: int, batch_size: int, concurrency: int) -> None:
+    """执行（或续跑）重建任务：全量重建 -> 追平 -> 原子切换 -> 再次追平 -> 删除旧集合"""
+    from utils.db import get_reindex_job, update_reindex_job, set_setting
+    from utils.vectorstore import switch_collection
+    from utils.vector_backends import create_vector_backend
+
+    job = get_reindex_job(job_id)
+    if not job:
+        return
+
+    shadow = None
+    try:
+        update_reindex_job(job_id, status='running', error=None)
+        source = _open_source_collection(job['source_collection'])
+        shadow = create_vector_backend(job['target_collection'])
+        page_size = batch_size * concurrency
+
+        if not job['total']:
+            job['total'] = _count_total(source)
+            update_reindex_job(job_id, total=job['total'])
+
+        logger.info(
+            f"Reindex job #{job_id}: '{job['source_collection']}' -> '{job['target_collection']}' "
+            f"(model={job['embedding_model']}, total={job['total']}, resume_from={job['cursor']})"
+        )
+
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="reindex") as executor:
+            for table in _SQL_SOURCES:
+                _reindex_table(job, table, shadow, executor, batch_size, page_size)
+            _reindex_memories(job, source, shadow, executor, batch_size, page_size)
+
+            if _is_cancelled(job_id):
+                raise ReindexCancelled()
+
+            # 追平重建期间的写入，然后切换；切换瞬间写入旧集合的少量数据再追平一次
+            swap_started = _now()
+            _catch_up(job, source, shadow, executor, batch_size, page_size, since=job['create_time'])
+
+            switch_collection(job['target_collection'], backend=shadow)
+            set_setting(EMBEDDING_MODEL_SETTING, job['embedding_model'] or '', '当前向量集合使用的 embedding 模型')
+
+            _catch_up(job, source, shadow, executor, batch_size, page_size, since=swap_started)
+
+        update_reindex_job(job_id, status='completed', finish_time=_now())
+        logger.info(f"Reindex job #{job_id} completed, active collection is now '{job['target_collection']}'")
+
+        if config.REINDEX_DROP_OLD_COLLECTION and source.name != job['target_collection']:
+            try:
+                source.drop()
+            except Exception as e:
+                logger.warning(f"Failed to drop old collection '{source.name}': {e}")
+
+    except ReindexCancelled:
+        logger.info(f"Reindex job #{job_id} cancelled")
+        update_reindex_job(job_id, status='cancelled', finish_time=_now())
+        if shadow is not None:
+            try:
+                shadow.drop()
+            except Exception as e:
+                logger.warning(f"Failed to drop shadow collection '{shadow.name}': {e}")
+
+    except Exception as e:
+        # 保留影子集合和断点，下次启动任务时从断点续跑
+        logger.exception(f"Reindex job #{job_id} failed: {e}")
+        update_reindex_job(job_id, status='failed', error=str(e))
+
+
+def _is_running_elsewhere(job: Dict[str, Any]) -> bool:
+    """任务是否正被其他进程执行（状态为运行中且断点最近有更新）"""
+    if job['status'] not in ('running', 'cancelling'):
+        return False
+    try:
+        updated = datetime.strptime(job['update_time'], '%Y-%m-%d %H:%M:%S')
+    except (TypeError, ValueError):
+        return False
+    return (datetime.now() - updated).total_seconds() < _STALE_SECONDS
+
+
+def is_reindex_running() -> bool:
+    """当前进程中是否有重建任务在执行"""
+    return _worker is not None and _worker.is_alive()
+
+
+def start_reindex(
+    batch_size: Optional[int] = None,
+    concurrency: Optional[int] = None,
+    restart: bool = False,
+    background: bool = True,
+    force: bool = False
+) -> Dict[str, Any]:
+    """
+    启动（或续跑）向量库重建
+
+    Args:
+        batch_size: 每次 embedding 请求的文本数，默认 config.REINDEX_BATCH_SIZE
+        concurrency: 并发 embedding 请求数，默认 config.REINDEX_CONCURRENCY
+        restart: 放弃未完成的任务（删除其影子集合），重新开始
+        background: 在后台线程中执行（False 时阻塞直到完成）
+        force: 忽略“任务正在其他进程中运行”的检查
+
+    Returns:
+        {"success": bool, "message": str, "job": dict}
+    """
+    global _worker
+
+    from utils.db import create_reindex_job, get_latest_reindex_job, get_reindex_job, update_reindex_job
+    from utils.vectorstore import get_active_collection_name
+
+    if not config.ENABLE_VECTOR_STORAGE:
+        return {"success": False, "message": "Vector storage is disabled", "job": None}
+
+    batch_size = max(1, batch_size or config.REINDEX_BATCH_SIZE)
+    concurrency = max(1, concurrency or config.REINDEX_CONCURRENCY)
+
+    with _start_lock:
+        if is_reindex_running():
+            return {"success": False, "message": "Reindex already running", "job": get_latest_reindex_job()}
+
+        job = get_latest_reindex_job(statuses=_RESUMABLE_STATUSES + ['cancelling'])
+        if job and not force and _is_running_elsewhere(job):
+            return {"success": False, "message": "Reindex is running in another process", "job": job}
+
+        # 放弃的任务，或为其他模型创建的任务，不再续跑
+        if job and (restart or job['status'] == 'cancelling' or job['embedding_model'] != config.EMBEDDING_MODEL):
+            update_reindex_job(job['id'], status='cancelled', finish_time=_now())
+            try:
+                from utils.vector_backends import create_vector_backend
+                create_vector_backend(job['target_collection']).drop()
+            except Exception as e:
+                logger.warning(f"Failed to drop shadow collection '{job['target_collection']}': {e}")
+            job = None
+
+        if job:
+            message = "Reindex resumed"
+        else:
+            source_collection = get_active_collection_name()
+            target_collection = f"{config.CHROMA_COLLECTION_NAME}_{datetime.now().strftime('%Y%m%d%H%M%S')}"
+            job_id = create_reindex_job(source_collection, target_collection, config.EMBEDDING_MODEL)
+            job = get_reindex_job(job_id)
+            message = "Reindex started"
+
+        logger.info(f"{message}: job #{job['id']}")
+
+        if not background:
+            _run_job(job['id'], batch_size, concurrency)
+            return {"success": True, "message": message, "job": get_reindex_job(job['id'])}
+
+        _worker = threading.Thread(
+            target=_run_job,
+            args=(job['id'], batch_size, concurrency),
+            name=f"reindex-{job['id']}",
+            daemon=True
+        )
+        _worker.start()
+
+    return {"success": True, "message": message, "job": job}
+
+
+def cancel_reindex() -> Dict[str, Any]:
+    """取消未完成的重建任务（运行中的任务在处理完当前页后停止并删除影子集合）"""
+    from utils.db import get_latest_reindex_job, update_reindex_job
+    from utils.vector_backends import create_vector_backend
+
+    job = get_latest_reindex_job(statuses=_RESUMABLE_STATUSES)
+    if not job:
+        return {"success": False, "message": "No reindex job to cancel", "job": None}
+
+    if job['status'] == 'running':
+        update_reindex_job(job['id'], status='cancelling')
+    else:
+        update_reindex_job(job['id'], status='cancelled', finish_time=_now())
+        try:
+            create_vector_backend(job['target_collection']).drop()
+        except Exception as e:
+            logger.warning(f"Failed to drop shadow collection '{job['target_collection']}': {e}")
+
+    return {"success": True, "message": "Reindex cancelled", "job": job}
+
+
+def get_reindex_status() -> Dict[str, Any]:
+    """获取最近一次重建任务状态，以及当前集合的 embedding 模型是否与配置一致"""
+    from utils.db import get_latest_reindex_job, get_setting
+    from utils.vectorstore import get_active_collection_name
+
+    job = get_latest_reindex_job()
+    if job and job.get('total'):
+        job['progress'] = round(min(1.0, job['processed'] / job['total']), 4)
+
+    indexed_model = get_setting(EMBEDDING_MODEL_SETTING)
+    return {
+        "running": is_reindex_running(),
+        "active_collection": get_active_collection_name(),
+        "indexed_model": indexed_model,
+        "configured_model": config.EMBEDDING_MODEL,
+        "model_changed": indexed_model is not None and indexed_model != (config.EMBEDDING_MODEL or ''),
+        "job": job,
+    }
+
+
+def init_reindex() -> None:
+    """启动时续跑中断的重建任务，并检测 embedding 模型是否变化"""
+    from utils.db import get_latest_reindex_job, get_setting, set_setting
+
+    if not config.ENABLE_VECTOR_STORAGE:
+        return
+
+    try:
+        # 上次进程退出时仍在运行的任务自动续跑
+        job = get_latest_reindex_job(statuses=['pending', 'running'])
+        if job and job['embedding_model'] == config.EMBEDDING_MODEL:
+            logger.info(f"Resuming interrupted reindex job #{job['id']}")
+            start_reindex(force=True)
+            return
+
+        indexed_model = get_setting(EMBEDDING_MODEL_SETTING)
+        if indexed_model is None:
+            # 首次记录：认为现有向量由当前配置的模型生成
+            set_setting(EMBEDDING_MODEL_SETTING, config.EMBEDDING_MODEL or '', '当前向量集合使用的 embedding 模型')
+            return
+
+        if indexed_model != (config.EMBEDDING_MODEL or ''):
+            if config.REINDEX_AUTO_START:
+                logger.warning(f"EMBEDDING_MODEL changed ({indexed_model} -> {config.EMBEDDING_MODEL}), starting reindex")
+                start_reindex()
+            else:
+                logger.warning(
+                    f"EMBEDDING_MODEL changed ({indexed_model} -> {config.EMBEDDING_MODEL}); existing vectors are "
+                    f"incompatible. Run reindex_vectorstore.py or POST /api/vectorstore/reindex to rebuild."
+                )
+    except Exception as e:
+        logger.warning(f"Failed to check reindex state: {e}")
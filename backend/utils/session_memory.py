@@ -0,0 +1,237 @@
+"""
+会话记忆管理模块
+内容哈希去重、单会话数量上限、过期清理，以及把旧的对话轮次压缩为一条摘要记忆
+"""
+
+import hashlib
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+import config
+from utils.helpers import get_logger
+
+logger = get_logger(__name__)
+
+# 可被压缩为摘要的记忆类型（每轮对话都会写入）
+COMPACTABLE_TYPES = ["conversation", "iteration_context"]
+SUMMARY_TYPE = "summary"
+
+_MEMORY_WHERE = {"source": "session_memory"}
+
+
+def _format_time(value: datetime) -> str:
+    return value.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def memory_content_hash(content: str) -> str:
+    """计算记忆内容哈希（忽略空白差异）"""
+    normalized = " ".join(content.split())
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+
+
+def memory_doc_id(session_id: str, content_hash: str) -> str:
+    """由内容哈希生成确定性的向量文档 ID（重复写入天然幂等）"""
+    return f"memory_{session_id}_{content_hash[:16]}"
+
+
+def delete_session_memories(memory_ids: List[str]) -> int:
+    """从向量库和登记表中删除记忆"""
+    from utils.db import delete_session_memory_records
+    from utils.vectorstore import get_collection
+
+    if not memory_ids:
+        return 0
+
+    collection = get_collection()
+    for start in range(0, len(memory_ids), 500):
+        collection.delete(ids=memory_ids[start:start + 500])
+
+    delete_session_memory_records(memory_ids)
+    return len(memory_ids)
+
+
+def clear_session_memories(session_id: str) -> bool:
+    """清除单个会话的全部记忆"""
+    try:
+        from utils.db import get_session_memory_records, delete_session_memory_records
+        from utils.vectorstore import get_collection
+
+        get_collection().delete(where={"$and": [_MEMORY_WHERE, {"session_id": session_id}]})
+        records = get_session_memory_records(session_id=session_id)
+        delete_session_memory_records([record['memory_id'] for record in records])
+
+        logger.info(f"Cleared session memories: session_id={session_id}")
+        return True
+
+    except Exception as e:
+        logger.exception(f"Error clearing session memories: {e}")
+        return False
+
+
+def enforce_session_cap(session_id: str, max_memories: Optional[int] = None) -> int:
+    """
+    单会话记忆数超过上限时，淘汰最久未出现的记忆（摘要最后淘汰）
+
+    Returns:
+        淘汰的记忆数
+    """
+    from utils.db import get_session_memory_records
+
+    if max_memories is None:
+        max_memories = config.SESSION_MEMORY_MAX_PER_SESSION
+
+    records = get_session_memory_records(session_id=session_id)
+    excess = len(records) - max_memories
+    if excess <= 0:
+        return 0
+
+    # records 已按最近出现时间从旧到新排列，稳定排序把摘要放到最后
+    records.sort(key=lambda record: record['content_type'] == SUMMARY_TYPE)
+    evicted = delete_session_memories([record['memory_id'] for record in records[:excess]])
+
+    logger.info(f"Evicted {evicted} session memories over cap: session_id={session_id}")
+    return evicted
+
+
+def expire_session_memories(ttl_hours: Optional[float] = None) -> int:
+    """
+    删除超过 TTL 未再出现的记忆
+
+    Returns:
+        删除的记忆数
+    """
+    from utils.db import get_session_memory_records
+
+    if ttl_hours is None:
+        ttl_hours = config.SESSION_MEMORY_TTL_HOURS
+
+    before = _format_time(datetime.now() - timedelta(hours=ttl_hours))
+    records = get_session_memory_records(last_seen_before=before)
+    return delete_session_memories([record['memory_id'] for record in records])
+
+
+def adopt_unregistered_memories(page_size: int = 500) -> Dict[str, int]:
+    """
+    登记向量库中尚未登记的会话记忆（升级前写入的旧记忆），同时删除其中的重复内容
+
+    Returns:
+        {"adopted": int, "duplicates_removed": int}
+    """
+    from utils.db import get_session_memory_records, get_session_memory_by_hash, add_session_memory_record
+    from utils.vectorstore import get_collection
+
+    collection = get_collection()
+    all_ids = (collection.get(where=_MEMORY_WHERE, include=[]) or {}).get('ids') or []
+    registered = {record['memory_id'] for record in get_session_memory_records()}
+    unknown = [memory_id for memory_id in all_ids if memory_id not in registered]
+
+    adopted, duplicates = 0, []
+    for start in range(0, len(unknown), page_size):
+        batch = collection.get(ids=unknown[start:start + page_size], include=["documents", "metadatas"])
+        for memory_id, document, metadata in zip(
+            batch.get('ids') or [], batch.get('documents') or [], batch.get('metadatas') or []
+        ):
+            metadata = metadata or {}
+            session_id = metadata.get('session_id')
+            if not session_id or not document:
+                continue
+
+            content_hash = memory_content_hash(document)
+            if get_session_memory_by_hash(session_id, content_hash):
+                duplicates.append(memory_id)
+                continue
+
+            add_session_memory_record(memory_id, session_id, content_hash, metadata.get('content_type', 'general'))
+            adopted += 1
+
+    for start in range(0, len(duplicates), 500):
+        collection.delete(ids=duplicates[start:start + 500])
+
+    return {"adopted": adopted, "duplicates_removed": len(duplicates)}
+
+
+def compact_session_memories() -> Dict[str, int]:
+    """
+    把各会话中较早的对话轮次合并为一条摘要记忆，并删除原记忆
+
+    Returns:
+        {"sessions": 压缩的会话数, "compacted": 被合并的记忆数}
+    """
+    from utils.db import get_session_memory_counts, get_session_memory_records
+    from utils.llm import summarize_content
+    from utils.vectorstore import get_collection, add_session_memory_to_vectorstore
+
+    result = {"sessions": 0, "compacted": 0}
+    if not config.ENABLE_LLM_PROCESSING:
+        return result
+
+    before = _format_time(datetime.now() - timedelta(minutes=config.SESSION_MEMORY_COMPACT_AFTER_MINUTES))
+    sessions = get_session_memory_counts(
+        content_types=COMPACTABLE_TYPES,
+        last_seen_before=before,
+        min_count=config.SESSION_MEMORY_COMPACT_MIN_TURNS
+    )
+
+    collection = get_collection()
+    for entry in sessions:
+        session_id = entry['session_id']
+        records = get_session_memory_records(
+            session_id=session_id,
+            content_types=COMPACTABLE_TYPES,
+            last_seen_before=before,
+            limit=config.SESSION_MEMORY_COMPACT_BATCH
+        )
+        memory_ids = [record['memory_id'] for record in records]
+
+        fetched = collection.get(ids=memory_ids, include=["documents"])
+        documents = dict(zip(fetched.get('ids') or [], fetched.get('documents') or []))
+        turns = [documents[memory_id] for memory_id in memory_ids if documents.get(memory_id)]
+        if not turns:
+            continue
+
+        # 平均分配每轮的长度，避免摘要只覆盖最早的几轮
+        per_turn = max(200, 4000 // len(turns))
+        summary = summarize_content(
+            "\n\n---\n\n".join(turn[:per_turn] for turn in turns),
+            max_length=config.SESSION_MEMORY_SUMMARY_MAX_LENGTH
+        )
+        if not summary:
+            logger.warning(f"Failed to summarize session memories: session_id={session_id}")
+            continue
+
+        stored = add_session_memory_to_vectorstore(
+            session_id=session_id,
+            content=summary,
+            content_type=SUMMARY_TYPE,
+            metadata={
+                "compacted_count": len(turns),
+                "compacted_from": records[0]['create_time'],
+                "compacted_to": records[-1]['create_time'],
+                "timestamp": datetime.now().isoformat()
+            }
+        )
+        if not stored:
+            continue
+
+        delete_session_memories(memory_ids)
+        result["sessions"] += 1
+        result["compacted"] += len(memory_ids)
+        logger.info(f"Compacted {len(memory_ids)} session memories into a summary: session_id={session_id}")
+
+    return result
+
+
+def run_session_memory_maintenance() -> Dict[str, Any]:
+    """执行一轮会话记忆维护：登记旧记忆 -> 过期清理 -> 压缩旧轮次"""
+    if not config.ENABLE_VECTOR_STORAGE:
+        return {"success": False, "message": "Vector storage is disabled"}
+
+    try:
+        report = {"success": True}
+        report.update(adopt_unregistered_memories())
+        report["expired"] = expire_session_memories()
+        report.update(compact_session_memories())
+        return report
+
+    except Exception as e:
+        logger.exception(f"Error maintaining session memories: {e}")
+        return {"success": False, "message": str(e)}
@@ -0,0 +1,117 @@
+"""
+请求合并（single-flight）模块
+相同键的请求同时进行时只有第一个（leader）真正执行，其余调用（follower）等待并共享它的结果或异常。
+leader 被取消或因非 Exception 异常（CancelledError、KeyboardInterrupt 等）中断时不共享该异常，
+等待中的 follower 重新竞争，其中一个成为新的 leader 重新执行。
+同步线程与各事件循环中的协程共用同一张进行中请求表
+"""
+
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Tuple
+from utils.helpers import get_logger
+
+logger = get_logger(__name__)
+
+
+class _Call:
+    """一次进行中的请求"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: Exception = None
+        # leader 被中断（取消等），follower 需要重新发起请求
+        self.abandoned = False
+        self.followers = 0
+
+
+class SingleFlight:
+    """按键合并并发的相同请求"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def _join(self, key: str) -> Tuple[_Call, bool]:
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.followers += 1
+                self.coalesced += 1
+                return call, False
+            call = _Call()
+            self._calls[key] = call
+            return call, True
+
+    def _finish(self, key: str, call: _Call) -> None:
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+        call.event.set()
+        if call.followers:
+            logger.info(f"{self.name}: {call.followers} duplicate request(s) shared one upstream call")
+
+    @staticmethod
+    def _outcome(call: _Call) -> Any:
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """执行 fn，若已有相同键的请求在进行则等待其结果"""
+        while True:
+            call, leader = self._join(key)
+            if leader:
+                break
+            call.event.wait()
+            if not call.abandoned:
+                return self._outcome(call)
+
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        except BaseException:
+            call.abandoned = True
+            raise
+        finally:
+            self._finish(key, call)
+
+    async def do_async(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """do 的异步版本，fn 返回协程"""
+        while True:
+            call, leader = self._join(key)
+            if leader:
+                break
+            # leader 可能在其他线程或其他事件循环中，在线程池中等待以免阻塞当前循环
+            if not call.event.is_set():
+                await asyncio.to_thread(call.event.wait)
+            if not call.abandoned:
+                return self._outcome(call)
+
+        try:
+            call.result = await fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        except BaseException:
+            # 取消只针对 leader 自身，不应传给其他等待者
+            call.abandoned = True
+            raise
+        finally:
+            self._finish(key, call)
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+
+# 进程内共享的合并器
+chat_flight = SingleFlight("chat completion")
+embedding_flight = SingleFlight("embedding")
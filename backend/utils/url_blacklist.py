@@ -0,0 +1,168 @@
+"""
+URL 黑名单匹配模块
+把 url_blacklist 表编译为内存匹配器，摄取时在任何 LLM / embedding 调用之前拦截，检索时过滤结果
+
+黑名单条目支持三种写法：
+- 域名或不带路径的 URL（example.com、https://example.com）：屏蔽该域名及其所有子域名（域名后缀树，按标签逐级查找）
+- 带路径的 URL（https://example.com/private）：屏蔽该主机下以此路径开头的页面（前缀匹配，不区分协议）
+- 含 * 或 ? 的通配模式（*.example.com、example.com/*/settings）：不含 / 时匹配主机名，否则匹配 主机名+路径
+
+条目增删后立即重新编译；另按 URL_BLACKLIST_RELOAD_SECONDS 定期从数据库重新加载，以感知其他进程的修改
+"""
+
+import fnmatch
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+import config
+from utils.helpers import get_logger
+
+logger = get_logger(__name__)
+
+# 域名后缀树中标记“到此为止的域名已被屏蔽”的键
+_TERMINAL = ""
+
+# 合并通配正则中各条目的命名分组前缀
+_GLOB_GROUP = "bl_"
+
+_matcher: Optional["UrlBlacklistMatcher"] = None
+_loaded_at = 0.0
+_reload_lock = threading.Lock()
+
+
+class UrlBlacklisted(Exception):
+    """URL 命中黑名单"""
+
+
+def _split_url(url: str) -> Tuple[str, str]:
+    """拆分为（小写主机名, 路径），无协议的输入按 http 处理"""
+    text = (url or "").strip()
+    if not text:
+        return "", ""
+    if "://" not in text:
+        text = f"http://{text}"
+    try:
+        parts = urlsplit(text)
+        host = (parts.hostname or "").rstrip(".")
+    except ValueError:
+        return "", ""
+    return host, parts.path or ""
+
+
+class UrlBlacklistMatcher:
+    """编译后的黑名单（只读，重新加载时整体替换）"""
+
+    def __init__(self, entries: Iterable[str]):
+        self._domains: Dict[str, dict] = {}
+        self._prefixes: Dict[str, List[Tuple[str, str]]] = {}
+        host_globs, url_globs = [], []
+        self._globs: List[str] = []
+        self.size = 0
+
+        for entry in entries:
+            entry = (entry or "").strip()
+            if not entry:
+                continue
+            self.size += 1
+
+            if "*" in entry or "?" in entry:
+                pattern = entry.split("://", 1)[-1].lower()
+                # fnmatch.translate 在 Python 3.10 中自身会生成 g0、g1…命名分组，这里使用不冲突的前缀
+                group = f"{_GLOB_GROUP}{len(self._globs)}"
+                (url_globs if "/" in pattern else host_globs).append(f"(?P<{group}>{fnmatch.translate(pattern)})")
+                self._globs.append(entry)
+                continue
+
+            host, path = _split_url(entry)
+            if not host:
+                continue
+            path = path.rstrip("/")
+            if path:
+                self._prefixes.setdefault(host, []).append((path, entry))
+            else:
+                node = self._domains
+                for label in reversed(host.split(".")):
+                    node = node.setdefault(label, {})
+                node[_TERMINAL] = entry
+
+        # 所有通配模式合并为一个正则，命中的命名分组即对应条目
+        self._host_glob = re.compile("|".join(host_globs)) if host_globs else None
+        self._url_glob = re.compile("|".join(url_globs)) if url_globs else None
+
+    def _glob_entry(self, pattern, target: str) -> Optional[str]:
+        if pattern is None:
+            return None
+        m = pattern.match(target)
+        return self._globs[int(m.lastgroup[len(_GLOB_GROUP):])] if m else None
+
+    def match(self, url: str) -> Optional[str]:
+        """返回命中的黑名单条目，未命中返回 None"""
+        host, path = _split_url(url)
+        if not host:
+            return None
+
+        # 域名后缀树：逐级查找 com -> example -> www，任一层被屏蔽即命中
+        node = self._domains
+        for label in reversed(host.split(".")):
+            node = node.get(label)
+            if node is None:
+                break
+            if _TERMINAL in node:
+                return node[_TERMINAL]
+
+        for prefix, entry in self._prefixes.get(host, ()):
+            if path == prefix or path.startswith(prefix + "/"):
+                return entry
+
+        return self._glob_entry(self._host_glob, host) or self._glob_entry(self._url_glob, f"{host}{path}")
+
+    def is_blocked(self, url: str) -> bool:
+        return bool(url) and self.match(url) is not None
+
+
+def reload_url_blacklist() -> UrlBlacklistMatcher:
+    """从数据库重新编译黑名单（条目增删后调用）"""
+    global _matcher, _loaded_at
+    from utils.db import get_all_blacklisted_urls
+
+    with _reload_lock:
+        matcher = UrlBlacklistMatcher(get_all_blacklisted_urls())
+        _matcher = matcher
+        _loaded_at = time.monotonic()
+    logger.info(f"URL blacklist compiled: {matcher.size} entries")
+    return matcher
+
+
+def get_url_blacklist_matcher() -> UrlBlacklistMatcher:
+    """获取当前匹配器（首次调用或超过重新加载间隔时从数据库加载，加载失败时沿用旧的匹配器）"""
+    global _matcher, _loaded_at
+    matcher = _matcher
+    if matcher is not None and time.monotonic() - _loaded_at < config.URL_BLACKLIST_RELOAD_SECONDS:
+        return matcher
+    try:
+        return reload_url_blacklist()
+    except Exception as e:
+        logger.warning(f"Failed to load URL blacklist: {e}")
+        # 加载失败时也推迟下一次重试，避免每次匹配都访问数据库
+        _matcher = matcher or UrlBlacklistMatcher([])
+        _loaded_at = time.monotonic()
+        return _matcher
+
+
+def is_url_blacklisted(url: Optional[str]) -> bool:
+    """URL 是否命中黑名单（未启用黑名单或 URL 为空时返回 False）"""
+    if not url or not config.ENABLE_URL_BLACKLIST:
+        return False
+    return get_url_blacklist_matcher().is_blocked(url)
+
+
+def filter_blacklisted(items: List[Any], get_url: Callable[[Any], Optional[str]]) -> List[Any]:
+    """过滤掉 URL 命中黑名单的条目"""
+    if not items or not config.ENABLE_URL_BLACKLIST:
+        return items
+    matcher = get_url_blacklist_matcher()
+    if not matcher.size:
+        return items
+    return [item for item in items if not matcher.is_blocked(get_url(item))]
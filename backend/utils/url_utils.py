@@ -0,0 +1,105 @@
+"""
+URL 规范化工具
+用于 URL 索引、页面级检索等需要稳定比较 URL 的场景
+"""
+
+from typing import Dict
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+# 不影响页面内容的跟踪参数，规范化时丢弃
+_TRACKING_PARAMS = {
+    "fbclid", "gclid", "dclid", "msclkid", "yclid", "spm", "_ga", "_gl",
+    "mc_cid", "mc_eid", "ref_src", "igshid"
+}
+
+# 常见的二级公共后缀（无需引入完整的 Public Suffix List）
+_SECOND_LEVEL_SUFFIXES = {
+    "co.uk", "org.uk", "ac.uk", "gov.uk", "co.jp", "ne.jp", "or.jp", "ac.jp",
+    "com.cn", "net.cn", "org.cn", "gov.cn", "edu.cn", "ac.cn",
+    "com.hk", "com.tw", "org.tw", "edu.tw", "com.au", "net.au", "org.au", "edu.au",
+    "com.br", "com.sg", "com.my", "co.kr", "co.in", "co.nz", "com.mx", "co.za",
+    "github.io", "gitlab.io", "vercel.app", "netlify.app", "pages.dev"
+}
+
+_DEFAULT_PORTS = {"http": "80", "https": "443"}
+
+
+def get_registrable_domain(host: str) -> str:
+    """
+    获取可注册域名（例如 docs.python.org -> python.org，news.bbc.co.uk -> bbc.co.uk）
+
+    Args:
+        host: 主机名（不含端口）
+
+    Returns:
+        可注册域名（小写），IP 或单标签主机原样返回
+    """
+    host = (host or "").strip().lower().rstrip(".")
+    if not host:
+        return ""
+
+    labels = host.split(".")
+    if len(labels) <= 2 or all(label.isdigit() for label in labels):
+        return host
+
+    if ".".join(labels[-2:]) in _SECOND_LEVEL_SUFFIXES:
+        return ".".join(labels[-3:])
+    return ".".join(labels[-2:])
+
+
+def normalize_url(url: str) -> Dict[str, str]:
+    """
+    规范化 URL
+
+    Args:
+        url: 原始 URL
+
+    Returns:
+        {
+            "canonical": 规范 URL（小写协议/主机、去默认端口、去 fragment、去跟踪参数、查询参数排序、去尾部斜杠）,
+            "base": 去掉查询参数后的 URL,
+            "domain": 可注册域名
+        }
+        无法解析时三个字段均为空字符串
+    """
+    empty = {"canonical": "", "base": "", "domain": ""}
+    if not url or not isinstance(url, str):
+        return empty
+
+    try:
+        parts = urlsplit(url.strip())
+    except ValueError:
+        return empty
+
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if not host:
+        # 非标准 URL（例如 chrome:// 内部页或相对路径），仅做最基础的清理
+        cleaned = url.strip().split("#", 1)[0].rstrip("/")
+        return {"canonical": cleaned, "base": cleaned.split("?", 1)[0].rstrip("/"), "domain": ""}
+
+    netloc = host
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    if port and _DEFAULT_PORTS.get(scheme) != str(port):
+        netloc = f"{host}:{port}"
+
+    path = parts.path.rstrip("/")
+
+    query_pairs = [
+        (key, value)
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith("utm_") and key.lower() not in _TRACKING_PARAMS
+    ]
+    query = urlencode(sorted(query_pairs))
+
+    base = urlunsplit((scheme, netloc, path, "", ""))
+    canonical = urlunsplit((scheme, netloc, path, query, ""))
+
+    return {
+        "canonical": canonical,
+        "base": base,
+        "domain": get_registrable_domain(host)
+    }
@@ -0,0 +1,40 @@
+"""
+向量存储后端
+提供统一的 VectorBackend 接口，按配置选择 ChromaDB 或 NumPy 平铺索引实现
+"""
+
+from .base import VectorBackend
+from .filters import match_where
+
+
+def create_vector_backend(name: str, backend: str = None) -> VectorBackend:
+    """
+    创建向量后端实例
+
+    Args:
+        name: 集合名称
+        backend: 后端类型（chroma, numpy），默认读取 config.VECTOR_BACKEND
+
+    Returns:
+        VectorBackend 实例
+    """
+    import config
+
+    backend = (backend or config.VECTOR_BACKEND or "chroma").lower()
+
+    if backend == "chroma":
+        from .chroma_backend import ChromaBackend
+        return ChromaBackend(name)
+    if backend in ("numpy", "flat"):
+        from .numpy_backend import NumpyFlatBackend
+        return NumpyFlatBackend(name)
+
+    raise ValueError(f"Unknown vector backend: {backend}")
+
+
+# 导出公共接口
+__all__ = [
+    'VectorBackend',
+    'match_where',
+    'create_vector_backend',
+]
@@ -0,0 +1,119 @@
+"""
+向量后端基类
+定义所有向量存储后端的统一接口（返回结构与 ChromaDB Collection 保持一致）
+"""
+
+from abc import ABC, abstractmethod
+from typing import Dict, Any, List, Optional
+
+# 查询/获取时 include 的默认字段
+DEFAULT_QUERY_INCLUDE = ["documents", "metadatas", "distances"]
+DEFAULT_GET_INCLUDE = ["documents", "metadatas"]
+
+
+class VectorBackend(ABC):
+    """
+    向量后端基类 - 所有向量存储实现都应继承此类
+
+    query 返回按查询分组的嵌套列表：
+        {"ids": [[...]], "documents": [[...]], "metadatas": [[...]], "distances": [[...]], "embeddings": [[...]]}
+    get 返回扁平列表：
+        {"ids": [...], "documents": [...], "metadatas": [...], "embeddings": [...]}
+    未 include 的字段值为 None；距离统一为平方 L2 距离。
+    """
+
+    def __init__(self, name: str):
+        """
+        初始化后端
+
+        Args:
+            name: 集合名称
+        """
+        self.name = name
+
+    @abstractmethod
+    def add(
+        self,
+        ids: List[str],
+        embeddings: List[List[float]],
+        documents: Optional[List[str]] = None,
+        metadatas: Optional[List[Dict[str, Any]]] = None
+    ) -> None:
+        """添加文档（ID 已存在时报错）"""
+        pass
+
+    @abstractmethod
+    def upsert(
+        self,
+        ids: List[str],
+        embeddings: List[List[float]],
+        documents: Optional[List[str]] = None,
+        metadatas: Optional[List[Dict[str, Any]]] = None
+    ) -> None:
+        """添加或覆盖文档"""
+        pass
+
+    @abstractmethod
+    def update_metadata(self, ids: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        """按 ID 更新元数据（与已有元数据合并，向量与文档不变）；不存在的 ID 忽略"""
+        pass
+
+    @abstractmethod
+    def query(
+        self,
+        query_embeddings: List[List[float]],
+        n_results: int = 10,
+        where: Optional[Dict[str, Any]] = None,
+        ids: Optional[List[str]] = None,
+        include: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """
+        相似度查询
+
+        Args:
+            query_embeddings: 查询向量列表
+            n_results: 每个查询返回结果数量
+            where: 元数据过滤条件（ChromaDB where 语法）
+            ids: 限定查询范围的文档 ID
+            include: 返回字段（documents, metadatas, distances, embeddings）
+        """
+        pass
+
+    @abstractmethod
+    def get(
+        self,
+        ids: Optional[List[str]] = None,
+        where: Optional[Dict[str, Any]] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        include: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """按 ID 和/或元数据过滤获取文档"""
+        pass
+
+    @abstractmethod
+    def delete(
+        self,
+        ids: Optional[List[str]] = None,
+        where: Optional[Dict[str, Any]] = None
+    ) -> None:
+        """按 ID 和/或元数据过滤删除文档"""
+        pass
+
+    @abstractmethod
+    def count(self) -> int:
+        """文档总数"""
+        pass
+
+    @abstractmethod
+    def reset(self) -> None:
+        """删除集合内全部数据并重建空集合"""
+        pass
+
+    def drop(self) -> None:
+        """删除整个集合并释放存储（实例随后不可再使用）"""
+        self.reset()
+
+    def peek(self, limit: int = 10) -> Dict[str, Any]:
+        """查看前若干条文档"""
+        return self.get(limit=limit, include=["documents", "metadatas", "embeddings"])
@@ -0,0 +1,189 @@
+"""
+ChromaDB 向量后端
+"""
+
+from typing import Dict, Any, List, Optional
+import config
+from utils.helpers import get_logger
+from .base import VectorBackend, DEFAULT_QUERY_INCLUDE, DEFAULT_GET_INCLUDE
+
+logger = get_logger(__name__)
+
+# 全局 ChromaDB 客户端（所有集合共享）
+_chroma_client = None
+
+
+def get_chroma_client():
+    """获取或创建 ChromaDB 客户端"""
+    global _chroma_client
+    if _chroma_client is None:
+        try:
+            import chromadb
+            from chromadb.config import Settings
+
+            _chroma_client = chromadb.PersistentClient(
+                path=str(config.CHROMA_PERSIST_DIR),
+                settings=Settings(
+                    anonymized_telemetry=False,
+                    allow_reset=True
+                )
+            )
+            logger.info(f"ChromaDB client initialized at {config.CHROMA_PERSIST_DIR}")
+        except Exception as e:
+            logger.exception(f"Failed to initialize ChromaDB client: {e}")
+            raise
+    return _chroma_client
+
+
+class ChromaBackend(VectorBackend):
+    """基于 ChromaDB PersistentClient 的向量后端"""
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self._collection = self._open_collection()
+
+    def _open_collection(self):
+        # ChromaDB 仅用于存储向量，不使用其默认的 sentence-transformers
+        # 所有 embedding 由配置的向量模型生成
+        return get_chroma_client().get_or_create_collection(
+            name=self.name,
+            metadata={
+                "description": "Web data collection",
+                "embedding_provider": "external"  # 标记使用外部embedding
+            }
+        )
+
+    @property
+    def collection(self):
+        """底层 ChromaDB 集合"""
+        return self._collection
+
+    def add(self, ids, embeddings, documents=None, metadatas=None) -> None:
+        # ChromaDB 对已存在的 ID 只记录警告并忽略，这里与接口约定（及 NumPy 后端）保持一致：报错
+        existing = self._collection.get(ids=ids, include=[])["ids"] if ids else []
+        if existing:
+            raise ValueError(f"IDs already exist: {existing[:5]}")
+        self._collection.add(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def upsert(self, ids, embeddings, documents=None, metadatas=None) -> None:
+        self._collection.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def update_metadata(self, ids, metadatas) -> None:
+        # ChromaDB 的 update 只合并传入的元数据键，不会重新计算 embedding
+        existing = set(self._collection.get(ids=ids, include=[])["ids"]) if ids else set()
+        keep = [i for i, doc_id in enumerate(ids) if doc_id in existing]
+        if keep:
+            self._collection.update(ids=[ids[i] for i in keep], metadatas=[metadatas[i] for i in keep])
+
+    def query(
+        self,
+        query_embeddings: List[List[float]],
+        n_results: int = 10,
+        where: Optional[Dict[str, Any]] = None,
+        ids: Optional[List[str]] = None,
+        include: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        include = DEFAULT_QUERY_INCLUDE if include is None else include
+
+        if ids is None:
+            return self._collection.query(
+                query_embeddings=query_embeddings,
+                n_results=n_results,
+                where=where,
+                include=include
+            )
+
+        try:
+            return self._collection.query(
+                query_embeddings=query_embeddings,
+                n_results=n_results,
+                where=where,
+                ids=ids,
+                include=include
+            )
+        except TypeError:
+            # 旧版 ChromaDB 的 query 不支持 ids 参数，改为按 ID 取回后本地打分
+            return self._rank_ids_locally(query_embeddings, ids, n_results, where, include)
+
+    def _rank_ids_locally(
+        self,
+        query_embeddings: List[List[float]],
+        ids: List[str],
+        n_results: int,
+        where: Optional[Dict[str, Any]],
+        include: List[str]
+    ) -> Dict[str, Any]:
+        """按 ID 取回文档并在本地计算平方 L2 距离（与 ChromaDB 默认度量一致）"""
+        import numpy as np
+
+        fetched = self._collection.get(
+            ids=ids,
+            where=where,
+            include=["documents", "metadatas", "embeddings"]
+        )
+
+        result = {field: [] for field in ["ids", "documents", "metadatas", "distances", "embeddings"]}
+        embeddings = fetched.get('embeddings') if fetched else None
+        has_docs = embeddings is not None and len(embeddings) > 0
+        docs = np.asarray(embeddings, dtype=np.float32) if has_docs else None
+
+        for query_embedding in query_embeddings:
+            if not has_docs:
+                for values in result.values():
+                    values.append([])
+                continue
+
+            query = np.asarray(query_embedding, dtype=np.float32)
+            distances = np.sum((docs - query) ** 2, axis=1)
+            order = np.argsort(distances)[:n_results]
+
+            result["ids"].append([fetched['ids'][i] for i in order])
+            result["documents"].append([fetched['documents'][i] for i in order])
+            result["metadatas"].append([fetched['metadatas'][i] for i in order])
+            result["distances"].append([float(distances[i]) for i in order])
+            result["embeddings"].append(docs[order])
+
+        for field in ["documents", "metadatas", "distances", "embeddings"]:
+            if field not in include:
+                result[field] = None
+        return result
+
+    def get(
+        self,
+        ids: Optional[List[str]] = None,
+        where: Optional[Dict[str, Any]] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        include: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        return self._collection.get(
+            ids=ids,
+            where=where,
+            limit=limit,
+            offset=offset,
+            include=DEFAULT_GET_INCLUDE if include is None else include
+        )
+
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None) -> None:
+        if ids is None and not where:
+            raise ValueError("delete requires ids or where")
+        self._collection.delete(ids=ids, where=where)
+
+    def count(self) -> int:
+        return self._collection.count()
+
+    def reset(self) -> None:
+        client = get_chroma_client()
+        try:
+            client.delete_collection(name=self.name)
+            logger.info(f"Deleted collection: {self.name}")
+        except Exception as e:
+            logger.warning(f"Collection may not exist: {e}")
+        self._collection = self._open_collection()
+
+    def drop(self) -> None:
+        get_chroma_client().delete_collection(name=self.name)
+        logger.info(f"Dropped collection: {self.name}")
+
+    def peek(self, limit: int = 10) -> Dict[str, Any]:
+        return self._collection.peek(limit=limit)
@@ -0,0 +1,61 @@
+"""
+元数据过滤
+在内存中对元数据求值 ChromaDB 风格的 where 条件
+"""
+
+from typing import Dict, Any, Optional
+
+_COMPARATORS = {
+    "$eq": lambda actual, expected: actual == expected,
+    "$ne": lambda actual, expected: actual != expected,
+    "$gt": lambda actual, expected: actual is not None and actual > expected,
+    "$gte": lambda actual, expected: actual is not None and actual >= expected,
+    "$lt": lambda actual, expected: actual is not None and actual < expected,
+    "$lte": lambda actual, expected: actual is not None and actual <= expected,
+    "$in": lambda actual, expected: actual in expected,
+    "$nin": lambda actual, expected: actual not in expected,
+}
+
+
+def match_where(metadata: Optional[Dict[str, Any]], where: Optional[Dict[str, Any]]) -> bool:
+    """
+    判断元数据是否满足 where 条件
+
+    支持：{"key": value}、{"key": {"$eq"|"$ne"|"$gt"|"$gte"|"$lt"|"$lte"|"$in"|"$nin": value}}、
+    {"$and": [...]}、{"$or": [...]}，同一层多个键视为 AND
+
+    Args:
+        metadata: 文档元数据
+        where: 过滤条件（为空表示全部匹配）
+
+    Returns:
+        是否匹配
+    """
+    if not where:
+        return True
+
+    metadata = metadata or {}
+
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(match_where(metadata, sub) for sub in condition):
+                return False
+        elif key == "$or":
+            if not any(match_where(metadata, sub) for sub in condition):
+                return False
+        elif isinstance(condition, dict):
+            actual = metadata.get(key)
+            for operator, expected in condition.items():
+                comparator = _COMPARATORS.get(operator)
+                if comparator is None:
+                    raise ValueError(f"不支持的过滤运算符: {operator}")
+                try:
+                    if not comparator(actual, expected):
+                        return False
+                except TypeError:
+                    return False
+        else:
+            if metadata.get(key) != condition:
+                return False
+
+    return True
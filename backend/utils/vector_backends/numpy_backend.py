@@ -0,0 +1,380 @@
+"""
+NumPy 平铺索引向量后端
+精确暴力检索：向量以 float32 追加写入文件并内存映射，文档与元数据存于 SQLite
+适合个人规模的数据量（启动零开销、结果确定、无需网络）
+"""
+
+import json
+import shutil
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+import numpy as np
+import config
+from utils.helpers import get_logger
+from .base import VectorBackend, DEFAULT_QUERY_INCLUDE, DEFAULT_GET_INCLUDE
+from .filters import match_where
+
+logger = get_logger(__name__)
+
+# 死行（已删除/被覆盖的向量）占比超过该值时压缩向量文件
+_COMPACT_GARBAGE_RATIO = 0.5
+_COMPACT_MIN_ROWS = 1000
+
+
+class NumpyFlatBackend(VectorBackend):
+    """基于内存映射 float32 矩阵的精确检索后端"""
+
+    def __init__(self, name: str, base_dir: Optional[Path] = None):
+        super().__init__(name)
+        self._dir = Path(base_dir or config.FLAT_INDEX_DIR) / name
+        self._dir.mkdir(parents=True, exist_ok=True)
+        self._vectors_path = self._dir / "vectors.f32"
+        self._db_path = self._dir / "index.db"
+        self._lock = threading.RLock()
+
+        self._dim: Optional[int] = None
+        self._total_rows = 0
+        self._matrix = None
+
+        # 内存镜像（与 SQLite 同步）
+        self._ids: List[str] = []
+        self._rows: List[int] = []
+        self._documents: List[Optional[str]] = []
+        self._metadatas: List[Dict[str, Any]] = []
+        self._pos: Dict[str, int] = {}
+
+        self._init_storage()
+        self._load()
+
+    # ------------------------------------------------------------------
+    # 存储
+    # ------------------------------------------------------------------
+
+    def _connect(self):
+        conn = sqlite3.connect(self._db_path)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_storage(self):
+        conn = self._connect()
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS docs (
+                id TEXT PRIMARY KEY,
+                row INTEGER NOT NULL,
+                document TEXT,
+                metadata TEXT
+            )
+        """)
+        conn.commit()
+        conn.close()
+
+    def _load(self):
+        conn = self._connect()
+        meta = {row["key"]: row["value"] for row in conn.execute("SELECT key, value FROM meta")}
+        docs = conn.execute("SELECT id, row, document, metadata FROM docs ORDER BY row").fetchall()
+        conn.close()
+
+        self._dim = int(meta["dim"]) if meta.get("dim") else None
+        self._total_rows = int(meta.get("total_rows", 0))
+
+        self._ids = [doc["id"] for doc in docs]
+        self._rows = [doc["row"] for doc in docs]
+        self._documents = [doc["document"] for doc in docs]
+        self._metadatas = [json.loads(doc["metadata"]) if doc["metadata"] else {} for doc in docs]
+        self._pos = {doc_id: i for i, doc_id in enumerate(self._ids)}
+        self._matrix = None
+
+        logger.info(f"Flat index '{self.name}' loaded: {len(self._ids)} documents, dim={self._dim}")
+
+    def _get_matrix(self):
+        """内存映射向量文件（写入后重新映射）"""
+        if self._matrix is None and self._total_rows and self._dim:
+            self._matrix = np.memmap(
+                self._vectors_path,
+                dtype=np.float32,
+                mode="r",
+                shape=(self._total_rows, self._dim)
+            )
+        return self._matrix
+
+    def _write(self, ids, embeddings, documents, metadatas, overwrite: bool):
+        if not ids:
+            return
+
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if vectors.ndim != 2 or vectors.shape[0] != len(ids):
+            raise ValueError(f"Embedding count mismatch: {vectors.shape[0] if vectors.ndim == 2 else 0} embeddings for {len(ids)} ids")
+        if len(set(ids)) != len(ids):
+            raise ValueError("Duplicate ids in request")
+        if self._dim is not None and vectors.shape[1] != self._dim:
+            raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match index dimension {self._dim}")
+
+        documents = documents or [None] * len(ids)
+        metadatas = metadatas or [{}] * len(ids)
+
+        with self._lock:
+            existing = [doc_id for doc_id in ids if doc_id in self._pos]
+            if existing and not overwrite:
+                raise ValueError(f"IDs already exist: {existing[:5]}")
+
+            if self._dim is None:
+                self._dim = int(vectors.shape[1])
+
+            start_row = self._total_rows
+            with open(self._vectors_path, "ab") as f:
+                f.write(vectors.tobytes())
+            self._total_rows += len(ids)
+            self._matrix = None
+
+            conn = self._connect()
+            try:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO docs (id, row, document, metadata) VALUES (?, ?, ?, ?)",
+                    [
+                        (doc_id, start_row + i, documents[i], json.dumps(metadatas[i] or {}, ensure_ascii=False))
+                        for i, doc_id in enumerate(ids)
+                    ]
+                )
+                conn.executemany(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                    [("dim", str(self._dim)), ("total_rows", str(self._total_rows))]
+                )
+                conn.commit()
+            finally:
+                conn.close()
+
+            for i, doc_id in enumerate(ids):
+                if doc_id in self._pos:
+                    pos = self._pos[doc_id]
+                    self._rows[pos] = start_row + i
+                    self._documents[pos] = documents[i]
+                    self._metadatas[pos] = dict(metadatas[i] or {})
+                else:
+                    self._pos[doc_id] = len(self._ids)
+                    self._ids.append(doc_id)
+                    self._rows.append(start_row + i)
+                    self._documents.append(documents[i])
+                    self._metadatas.append(dict(metadatas[i] or {}))
+
+            self._maybe_compact()
+
+    def _select(self, ids: Optional[List[str]], where: Optional[Dict[str, Any]]) -> List[int]:
+        """返回满足条件的内存镜像下标"""
+        if ids is not None:
+            candidates = [self._pos[doc_id] for doc_id in ids if doc_id in self._pos]
+        else:
+            candidates = range(len(self._ids))
+        if not where:
+            return list(candidates)
+        return [i for i in candidates if match_where(self._metadatas[i], where)]
+
+    def _maybe_compact(self):
+        garbage = self._total_rows - len(self._ids)
+        if garbage >= _COMPACT_MIN_ROWS and garbage > self._total_rows * _COMPACT_GARBAGE_RATIO:
+            self.compact()
+
+    def compact(self) -> None:
+        """重写向量文件，丢弃已删除或被覆盖的向量行"""
+        with self._lock:
+            matrix = self._get_matrix()
+            if matrix is None:
+                return
+
+            live = np.asarray(self._rows, dtype=np.int64)
+            vectors = np.array(matrix[live], dtype=np.float32) if len(live) else np.empty((0, self._dim), dtype=np.float32)
+            self._matrix = None
+
+            tmp_path = self._vectors_path.with_suffix(".tmp")
+            with open(tmp_path, "wb") as f:
+                f.write(vectors.tobytes())
+
+            conn = self._connect()
+            try:
+                conn.executemany(
+                    "UPDATE docs SET row = ? WHERE id = ?",
+                    [(new_row, doc_id) for new_row, doc_id in enumerate(self._ids)]
+                )
+                conn.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('total_rows', ?)",
+                    (str(len(self._ids)),)
+                )
+                tmp_path.replace(self._vectors_path)
+                conn.commit()
+            finally:
+                conn.close()
+
+            old_total = self._total_rows
+            self._rows = list(range(len(self._ids)))
+            self._total_rows = len(self._ids)
+            logger.info(f"Flat index '{self.name}' compacted: {old_total} -> {self._total_rows} rows")
+
+    # ------------------------------------------------------------------
+    # VectorBackend 接口
+    # ------------------------------------------------------------------
+
+    def add(self, ids, embeddings, documents=None, metadatas=None) -> None:
+        self._write(ids, embeddings, documents, metadatas, overwrite=False)
+
+    def upsert(self, ids, embeddings, documents=None, metadatas=None) -> None:
+        self._write(ids, embeddings, documents, metadatas, overwrite=True)
+
+    def update_metadata(self, ids, metadatas) -> None:
+        with self._lock:
+            updates = []
+            for doc_id, metadata in zip(ids, metadatas):
+                pos = self._pos.get(doc_id)
+                if pos is not None:
+                    updates.append((pos, {**self._metadatas[pos], **(metadata or {})}))
+            if not updates:
+                return
+
+            conn = self._connect()
+            try:
+                conn.executemany(
+                    "UPDATE docs SET metadata = ? WHERE id = ?",
+                    [(json.dumps(merged, ensure_ascii=False), self._ids[pos]) for pos, merged in updates]
+                )
+                conn.commit()
+            finally:
+                conn.close()
+
+            for pos, merged in updates:
+                self._metadatas[pos] = merged
+
+    def query(
+        self,
+        query_embeddings: List[List[float]],
+        n_results: int = 10,
+        where: Optional[Dict[str, Any]] = None,
+        ids: Optional[List[str]] = None,
+        include: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        include = DEFAULT_QUERY_INCLUDE if include is None else include
+        result = {field: [] for field in ["ids", "documents", "metadatas", "distances", "embeddings"]}
+
+        with self._lock:
+            selected = self._select(ids, where)
+            matrix = self._get_matrix()
+
+            if selected and matrix is not None:
+                rows = np.asarray([self._rows[i] for i in selected], dtype=np.int64)
+                vectors = np.asarray(matrix[rows], dtype=np.float32)
+                queries = np.asarray(query_embeddings, dtype=np.float32)
+
+                # 平方 L2 距离：|q|^2 + |x|^2 - 2 q·x
+                distances = (
+                    np.sum(queries ** 2, axis=1, keepdims=True)
+                    + np.sum(vectors ** 2, axis=1)[None, :]
+                    - 2.0 * queries @ vectors.T
+                )
+                np.maximum(distances, 0.0, out=distances)
+                k = min(n_results, len(selected))
+            else:
+                distances = None
+                k = 0
+
+            for q in range(len(query_embeddings)):
+                if k == 0:
+                    top = np.empty(0, dtype=np.int64)
+                else:
+                    row_dist = distances[q]
+                    top = np.argpartition(row_dist, k - 1)[:k] if k < len(row_dist) else np.arange(len(row_dist))
+                    top = top[np.argsort(row_dist[top], kind="stable")]
+
+                result["ids"].append([self._ids[selected[j]] for j in top])
+                result["documents"].append([self._documents[selected[j]] for j in top])
+                result["metadatas"].append([dict(self._metadatas[selected[j]]) for j in top])
+                result["distances"].append([float(distances[q][j]) for j in top])
+                result["embeddings"].append(vectors[top] if k else np.empty((0, self._dim or 0), dtype=np.float32))
+
+        for field in ["documents", "metadatas", "distances", "embeddings"]:
+            if field not in include:
+                result[field] = None
+        return result
+
+    def get(
+        self,
+        ids: Optional[List[str]] = None,
+        where: Optional[Dict[str, Any]] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        include: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        include = DEFAULT_GET_INCLUDE if include is None else include
+
+        with self._lock:
+            selected = self._select(ids, where)
+            start = offset or 0
+            selected = selected[start:start + limit] if limit is not None else selected[start:]
+
+            result = {
+                "ids": [self._ids[i] for i in selected],
+                "documents": [self._documents[i] for i in selected] if "documents" in include else None,
+                "metadatas": [dict(self._metadatas[i]) for i in selected] if "metadatas" in include else None,
+                "embeddings": None
+            }
+
+            if "embeddings" in include:
+                matrix = self._get_matrix()
+                if selected and matrix is not None:
+                    rows = np.asarray([self._rows[i] for i in selected], dtype=np.int64)
+                    result["embeddings"] = np.asarray(matrix[rows], dtype=np.float32)
+                else:
+                    result["embeddings"] = np.empty((0, self._dim or 0), dtype=np.float32)
+
+        return result
+
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None) -> None:
+        if ids is None and not where:
+            raise ValueError("delete requires ids or where")
+
+        with self._lock:
+            doomed = set(self._ids[i] for i in self._select(ids, where))
+            if not doomed:
+                return
+
+            conn = self._connect()
+            try:
+                conn.executemany("DELETE FROM docs WHERE id = ?", [(doc_id,) for doc_id in doomed])
+                conn.commit()
+            finally:
+                conn.close()
+
+            keep = [i for i, doc_id in enumerate(self._ids) if doc_id not in doomed]
+            self._ids = [self._ids[i] for i in keep]
+            self._rows = [self._rows[i] for i in keep]
+            self._documents = [self._documents[i] for i in keep]
+            self._metadatas = [self._metadatas[i] for i in keep]
+            self._pos = {doc_id: i for i, doc_id in enumerate(self._ids)}
+
+            self._maybe_compact()
+
+    def count(self) -> int:
+        with self._lock:
+            return len(self._ids)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._matrix = None
+            if self._vectors_path.exists():
+                self._vectors_path.unlink()
+
+            conn = self._connect()
+            try:
+                conn.execute("DELETE FROM docs")
+                conn.execute("DELETE FROM meta")
+                conn.commit()
+            finally:
+                conn.close()
+
+            self._load()
+            logger.info(f"Flat index '{self.name}' reset")
+
+    def drop(self) -> None:
+        with self._lock:
+            self._matrix = None
+            shutil.rmtree(self._dir, ignore_errors=True)
+            logger.info(f"Flat index '{self.name}' dropped")
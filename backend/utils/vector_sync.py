@@ -0,0 +1,485 @@
+"""
+SQLite 与向量库一致性校验模块
+记录每行的同步指纹，定期找出缺失、过期和孤立的向量文档，并分批增量修复
+"""
+
+import hashlib
+import json
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+import config
+from utils.helpers import get_logger
+
+logger = get_logger(__name__)
+
+# 每张表参与指纹计算的字段（与写入向量库的内容对应）
+_FINGERPRINT_FIELDS = {
+    "todos": ("title", "description", "priority", "start_time", "end_time", "status"),
+    "tips": ("title", "content", "tip_type", "source_urls"),
+    "web_data": ("title", "url", "content", "source"),
+}
+
+# 向量文档来源 -> SQLite 表及行 ID 的元数据键
+_SOURCE_TABLES = {
+    "todo": ("todos", "todo_id"),
+    "tip": ("tips", "tip_id"),
+}
+
+# 最近一次校验报告
+_last_report: Optional[Dict[str, Any]] = None
+_run_lock = threading.Lock()
+
+
+def compute_fingerprint(table: str, row: Dict[str, Any]) -> str:
+    """计算行内容指纹（内容变化即视为向量过期）"""
+    payload = [row.get(field) for field in _FINGERPRINT_FIELDS[table]]
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _expected_doc_id(table: str, row_id: int) -> str:
+    """每行对应的（首个）向量文档 ID"""
+    if table == "todos":
+        return f"todo_{row_id}"
+    if table == "tips":
+        return f"tip_{row_id}"
+    return f"web_{row_id}_chunk_0"
+
+
+def record_vector_sync(table: str, row_id: int) -> None:
+    """
+    向量写入成功后记录同步状态
+
+    Args:
+        table: 表名（todos, tips, web_data）
+        row_id: 行ID
+    """
+    try:
+        from utils.db import get_db_connection, mark_vector_synced
+
+        conn = get_db_connection()
+        row = conn.execute(f"SELECT * FROM {table} WHERE id = ?", (row_id,)).fetchone()
+        conn.close()
+
+        if row:
+            mark_vector_synced(table, row_id, compute_fingerprint(table, dict(row)))
+    except Exception as e:
+        logger.warning(f"Failed to record vector sync for {table}#{row_id}: {e}")
+
+
+def _row_document_kwargs(table: str, row: Dict[str, Any]) -> Dict[str, Any]:
+    """将 SQLite 行转换为向量文档构建/写入函数的参数"""
+    if table == "todos":
+        return {
+            "todo_id": row["id"],
+            "title": row.get("title") or "",
+            "description": row.get("description") or "",
+            "priority": row.get("priority") or 0,
+            "start_time": row.get("start_time"),
+            "end_time": row.get("end_time"),
+            "status": row.get("status") or 0,
+        }
+
+    if table == "tips":
+        source_urls = row.get("source_urls")
+        if source_urls:
+            try:
+                source_urls = json.loads(source_urls)
+            except (json.JSONDecodeError, TypeError):
+                source_urls = [source_urls]
+        return {
+            "tip_id": row["id"],
+            "title": row.get("title") or "",
+            "content": row.get("content") or "",
+            "tip_type": row.get("tip_type") or "general",
+            "source_urls": source_urls or None,
+        }
+
+    content = row.get("content") or ""
+    parsed = content
+    try:
+        parsed = json.loads(content)
+        if isinstance(parsed, dict):
+            content = json.dumps(parsed, ensure_ascii=False, separators=(',', ':'))
+    except (json.JSONDecodeError, TypeError):
+        pass
+
+    try:
+        tags = json.loads(row["tags"]) if row.get("tags") else []
+    except (json.JSONDecodeError, TypeError):
+        tags = []
+    try:
+        metadata = json.loads(row["metadata"]) if row.get("metadata") else {}
+    except (json.JSONDecodeError, TypeError):
+        metadata = {}
+
+    # 与摄取时一致：页面文本清理后再分块（不计入站点样板统计）
+    if config.ENABLE_CONTENT_CLEANING and metadata.get("llm_input_mode") != "diff":
+        from utils.content_cleaner import clean_web_content
+
+        cleaned = clean_web_content(
+            parsed if isinstance(parsed, dict) else row.get("content") or "",
+            url=row.get("url"),
+            title=row.get("title"),
+            learn=False
+        )
+        if cleaned:
+            content = cleaned
+
+    return {
+        "web_data_id": row["id"],
+        "title": row.get("title") or "",
+        "url": row.get("url") or "",
+        "content": content,
+        "source": row.get("source") or "web_crawler",
+        "tags": tags,
+        "session_id": metadata.get("session_id"),
+    }
+
+
+def _row_page_key(row: Dict[str, Any]) -> Optional[str]:
+    """web_data 行所属的页面版本链（不属于版本链时返回 None）"""
+    try:
+        metadata = json.loads(row["metadata"]) if row.get("metadata") else {}
+    except (json.JSONDecodeError, TypeError):
+        return None
+    page_version = metadata.get("page_version") if isinstance(metadata, dict) else None
+    return page_version.get("key") if isinstance(page_version, dict) else None
+
+
+def page_head_key(row: Dict[str, Any]) -> Optional[str]:
+    """web_data 行是页面当前版本时返回其版本链键，否则返回 None"""
+    from utils.db import get_page_document
+
+    page_key = _row_page_key(row)
+    if not page_key:
+        return None
+    page = get_page_document(page_key)
+    return page_key if page and page.get("web_data_id") == row["id"] else None
+
+
+def _page_chunks_present(collection, row: Dict[str, Any]) -> bool:
+    """页面当前版本的分块是否都在向量库中（不是当前版本的行视为完整）"""
+    from utils.db import get_page_document
+
+    page = get_page_document(_row_page_key(row))
+    if not page or page.get("web_data_id") != row["id"] or not page.get("chunks"):
+        return True
+    doc_ids = list(page["chunks"].keys())
+    found = collection.get(ids=doc_ids, include=[])
+    return len(set(found.get("ids") or []) if found else set()) == len(doc_ids)
+
+
+def _page_document_kwargs(row: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """页面当前版本对应的 web_data 行转换为页面向量文档的参数（不是当前版本时返回 None）"""
+    from utils.db import get_page_document
+
+    page_key = _row_page_key(row)
+    page = get_page_document(page_key) if page_key else None
+    if not page or page.get("web_data_id") != row["id"]:
+        return None
+
+    kwargs = _row_document_kwargs("web_data", row)
+    content = page.get("content") or ""
+    if config.ENABLE_CONTENT_CLEANING:
+        from utils.content_cleaner import clean_web_content
+
+        content = clean_web_content(content, url=kwargs["url"], title=kwargs["title"], learn=False) or content
+    kwargs.update(page_key=page_key, content=content)
+    return kwargs
+
+
+def build_row_documents(table: str, row: Dict[str, Any]):
+    """
+    按 SQLite 行构建向量文档（不生成 embedding）
+    属于页面版本链的 web_data 行中，只有当前版本构建页面的分块，历史版本没有独立的向量文档
+
+    Returns:
+        (ids, documents, metadatas)
+    """
+    from utils.vectorstore import build_web_data_documents, build_todo_document, build_tip_document, build_page_documents
+
+    if table == "web_data" and _row_page_key(row):
+        kwargs = _page_document_kwargs(row)
+        return build_page_documents(**kwargs) if kwargs else ([], [], [])
+
+    kwargs = _row_document_kwargs(table, row)
+    if table == "todos":
+        doc_id, document, metadata = build_todo_document(**kwargs)
+        return [doc_id], [document], [metadata]
+    if table == "tips":
+        doc_id, document, metadata = build_tip_document(**kwargs)
+        return [doc_id], [document], [metadata]
+    return build_web_data_documents(**kwargs)
+
+
+def _repair_row(table: str, row: Dict[str, Any]) -> bool:
+    """重新写入单行的向量文档（写入函数成功后会自行记录同步状态）"""
+    from utils.vectorstore import (
+        add_todo_to_vectorstore,
+        add_tip_to_vectorstore,
+        add_web_data_to_vectorstore,
+        delete_web_data_from_vectorstore
+    )
+
+    kwargs = _row_document_kwargs(table, row)
+    if table == "todos":
+        return add_todo_to_vectorstore(**kwargs)
+    if table == "tips":
+        return add_tip_to_vectorstore(**kwargs)
+
+    from utils.llm import generate_embeddings
+
+    # 页面版本链：重新同步页面当前版本（只补写缺失的分块），历史版本无需写入
+    if _row_page_key(row):
+        page_kwargs = _page_document_kwargs(row)
+        if page_kwargs:
+            from utils.db import update_page_document_chunks
+            from utils.vectorstore import sync_page_to_vectorstore
+
+            chunks = sync_page_to_vectorstore(embedding_function=generate_embeddings, **page_kwargs)
+            if chunks is None:
+                return False
+            update_page_document_chunks(page_kwargs["page_key"], chunks)
+        record_vector_sync("web_data", row["id"])
+        return True
+
+    # web_data：先删除旧分块，避免分块数量变化后残留
+    delete_web_data_from_vectorstore(row["id"])
+    return add_web_data_to_vectorstore(embedding_function=generate_embeddings, **kwargs)
+
+
+def _find_drifted_rows(collection, full: bool, created_before: str, page_size: int = 500):
+    """
+    找出缺失与过期的行
+
+    - 向量库中不存在对应文档的行为缺失
+    - 从未记录同步状态但文档已存在的行直接认领（不重新 embedding）
+    - 已同步的行：当前指纹与记录指纹不一致即为过期
+    web_data 内容写入后不变，默认只检查未同步的行，full 模式下检查全部
+    """
+    from utils.db import get_rows_for_vector_sync, mark_vector_synced
+
+    missing, stale = [], []
+    adopted = 0
+    checked = 0
+
+    for table in _FINGERPRINT_FIELDS:
+        only_unsynced = table == "web_data" and not full
+        after_id = 0
+
+        while True:
+            rows = get_rows_for_vector_sync(
+                table,
+                after_id=after_id,
+                limit=page_size,
+                only_unsynced=only_unsynced,
+                created_before=created_before
+            )
+            if not rows:
+                break
+            after_id = rows[-1]["id"]
+            checked += len(rows)
+
+            # 按文档 ID 批量检查是否存在（只查 ID，不涉及 embedding）
+            expected = {_expected_doc_id(table, row["id"]): row for row in rows}
+            found = collection.get(ids=list(expected.keys()), include=[])
+            present = set(found.get("ids") or []) if found else set()
+
+            for doc_id, row in expected.items():
+                # 页面版本链中的行没有独立的文档：未同步的按缺失处理（修复时同步页面当前版本），
+                # full 模式下还检查页面当前版本的分块是否完整
+                if table == "web_data" and _row_page_key(row):
+                    if not row.get("vector_synced_at") or (full and not _page_chunks_present(collection, row)):
+                        missing.append((table, row))
+                    continue
+
+                fingerprint = compute_fingerprint(table, row)
+                if doc_id not in present:
+                    missing.append((table, row))
+                elif not row.get("vector_synced_at"):
+                    mark_vector_synced(table, row["id"], fingerprint)
+                    adopted += 1
+                elif row.get("vector_fingerprint") != fingerprint:
+                    stale.append((table, row))
+
+            if len(rows) < page_size:
+                break
+
+    return missing, stale, adopted, checked
+
+
+def _find_orphans(collection, page_size: int = 1000) -> Dict[str, List]:
+    """找出 SQLite 中已不存在对应行的向量文档（会话记忆等无对应行的文档不参与）"""
+    from utils.db import get_existing_row_ids
+
+    candidates = {"todos": {}, "tips": {}, "web_data": {}}
+    offset = 0
+
+    while True:
+        batch = collection.get(include=["metadatas"], limit=page_size, offset=offset)
+        if not batch or not batch.get("ids"):
+            break
+
+        for doc_id, metadata in zip(batch["ids"], batch.get("metadatas") or []):
+            metadata = metadata or {}
+            source = metadata.get("source")
+            if source in _SOURCE_TABLES:
+                table, key = _SOURCE_TABLES[source]
+            elif "web_data_id" in metadata:
+                table, key = "web_data", "web_data_id"
+            else:
+                continue
+
+            row_id = metadata.get(key)
+            if isinstance(row_id, int):
+                candidates[table].setdefault(row_id, []).append(doc_id)
+
+        offset += len(batch["ids"])
+        if len(batch["ids"]) < page_size:
+            break
+
+    orphans = {}
+    for table, by_row in candidates.items():
+        existing = get_existing_row_ids(table, list(by_row.keys()))
+        orphans[table] = [(row_id, doc_ids) for row_id, doc_ids in by_row.items() if row_id not in existing]
+    return orphans
+
+
+def reconcile_vectorstore(
+    max_repairs: Optional[int] = None,
+    dry_run: bool = False,
+    full: bool = False
+) -> Dict[str, Any]:
+    """
+    校验并修复 SQLite 与向量库之间的漂移
+
+    Args:
+        max_repairs: 本次最多修复（重新 embedding）的行数，默认 config.VECTOR_RECONCILE_MAX_REPAIRS
+        dry_run: 只统计不修复
+        full: 同时检查 web_data 的内容指纹（默认只检查未同步的 web_data 行）
+
+    Returns:
+        漂移报告（missing, stale, orphaned, repaired, failed 等）
+    """
+    global _last_report
+
+    if not config.ENABLE_VECTOR_STORAGE:
+        return {"success": False, "message": "Vector storage is disabled"}
+
+    if not _run_lock.acquire(blocking=False):
+        return {"success": False, "message": "Reconcile already running"}
+
+    started = time.time()
+    try:
+        from utils.db import delete_url_index_by_web_data
+        from utils.vectorstore import get_collection
+
+        if max_repairs is None:
+            max_repairs = config.VECTOR_RECONCILE_MAX_REPAIRS
+
+        collection = get_collection()
+        created_before = (
+            datetime.now() - timedelta(seconds=config.VECTOR_RECONCILE_GRACE_SECONDS)
+        ).strftime('%Y-%m-%d %H:%M:%S')
+
+        missing, stale, adopted, checked = _find_drifted_rows(collection, full, created_before)
+        orphans = _find_orphans(collection)
+        orphan_docs = sum(len(doc_ids) for entries in orphans.values() for _, doc_ids in entries)
+
+        report = {
+            "success": True,
+            "dry_run": dry_run,
+            "checked_rows": checked,
+            "adopted": adopted,
+            "missing": len(missing),
+            "stale": len(stale),
+            "orphaned": orphan_docs,
+            "missing_by_table": _count_by_table(missing),
+            "stale_by_table": _count_by_table(stale),
+            "repaired": 0,
+            "failed": 0,
+            "orphans_deleted": 0,
+            "remaining": 0,
+            "aborted": False,
+        }
+
+        if not dry_run:
+            # 1. 删除孤立文档（不需要 embedding，分批执行）
+            for table, entries in orphans.items():
+                doc_ids = [doc_id for _, ids in entries for doc_id in ids]
+                for start in range(0, len(doc_ids), 500):
+                    collection.delete(ids=doc_ids[start:start + 500])
+                if table == "web_data":
+                    for row_id, _ in entries:
+                        delete_url_index_by_web_data(row_id)
+                report["orphans_deleted"] += len(doc_ids)
+
+            # 2. 分批修复缺失和过期的行，连续失败时指数退避，超过上限则中止本轮
+            pending = missing + stale
+            to_repair = pending[:max_repairs]
+            batch_size = max(1, config.VECTOR_RECONCILE_BATCH_SIZE)
+            consecutive_failures = 0
+
+            for start in range(0, len(to_repair), batch_size):
+                for table, row in to_repair[start:start + batch_size]:
+                    try:
+                        ok = _repair_row(table, row)
+                    except Exception as e:
+                        logger.warning(f"Vector repair failed for {table}#{row['id']}: {e}")
+                        ok = False
+
+                    if ok:
+                        report["repaired"] += 1
+                        consecutive_failures = 0
+                        continue
+
+                    report["failed"] += 1
+                    consecutive_failures += 1
+                    if consecutive_failures >= config.VECTOR_RECONCILE_MAX_CONSECUTIVE_FAILURES:
+                        report["aborted"] = True
+                        break
+
+                    delay = min(
+                        config.VECTOR_RECONCILE_MAX_BACKOFF_SECONDS,
+                        2 ** (consecutive_failures - 1)
+                    )
+                    time.sleep(delay + random.uniform(0, delay / 2))
+
+                if report["aborted"]:
+                    logger.warning("Vector reconcile aborted after repeated failures, will retry next run")
+                    break
+
+            report["remaining"] = len(pending) - report["repaired"]
+
+        report["duration_seconds"] = round(time.time() - started, 2)
+        report["finished_at"] = datetime.now().isoformat()
+        _last_report = report
+
+        logger.info(
+            f"Vector reconcile: checked={checked}, adopted={adopted}, missing={report['missing']}, "
+            f"stale={report['stale']}, orphaned={orphan_docs}, repaired={report['repaired']}, "
+            f"failed={report['failed']}, remaining={report['remaining']}"
+        )
+        return report
+
+    except Exception as e:
+        logger.exception(f"Error reconciling vectorstore: {e}")
+        return {"success": False, "message": str(e)}
+    finally:
+        _run_lock.release()
+
+
+def _count_by_table(items: List) -> Dict[str, int]:
+    counts = {}
+    for table, _ in items:
+        counts[table] = counts.get(table, 0) + 1
+    return counts
+
+
+def get_last_reconcile_report() -> Optional[Dict[str, Any]]:
+    """获取最近一次校验报告"""
+    return _last_report
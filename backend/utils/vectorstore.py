@@ -1,62 +1,75 @@
 """
-向量数据库操作模块 - ChromaDB
+向量数据库操作模块（后端由 config.VECTOR_BACKEND 选择：ChromaDB 或 NumPy 平铺索引）
 """
 
+import hashlib
 import json
+import threading
 from typing import List, Dict, Any, Optional
-import chromadb
-from chromadb.config import Settings
 import config
 from utils.helpers import get_logger
+from utils.vector_backends import create_vector_backend
+from utils.vector_backends.chroma_backend import get_chroma_client
 
 logger = get_logger(__name__)
 
-# 全局 ChromaDB 客户端
-_chroma_client = None
+# 全局向量集合（VectorBackend 实例）
 _collection = None
+_collection_lock = threading.Lock()
 
+# settings 表中记录当前生效集合名称的键（重建索引切换后更新）
+ACTIVE_COLLECTION_SETTING = 'vector_collection_name'
 
-def get_chroma_client():
-    """获取或创建 ChromaDB 客户端"""
-    global _chroma_client
-    if _chroma_client is None:
-        try:
-            _chroma_client = chromadb.PersistentClient(
-                path=str(config.CHROMA_PERSIST_DIR),
-                settings=Settings(
-                    anonymized_telemetry=False,
-                    allow_reset=True
-                )
-            )
-            logger.info(f"ChromaDB client initialized at {config.CHROMA_PERSIST_DIR}")
-        except Exception as e:
-            logger.exception(f"Failed to initialize ChromaDB client: {e}")
-            raise
-    return _chroma_client
+# 按行分块时，平均每隔多少行出现一个分块边界（达到最小长度之后）
+_LINE_BOUNDARY_DIVISOR = 4
+
+
+def get_active_collection_name() -> str:
+    """获取当前生效的集合名称（未切换过时使用 config.CHROMA_COLLECTION_NAME）"""
+    try:
+        from utils.db import get_setting
+        return get_setting(ACTIVE_COLLECTION_SETTING) or config.CHROMA_COLLECTION_NAME
+    except Exception:
+        # 数据库尚未初始化（如独立脚本）
+        return config.CHROMA_COLLECTION_NAME
 
 
 def get_collection():
     """获取或创建集合（仅用于存储，不处理embedding）"""
     global _collection
     if _collection is None:
-        try:
-            client = get_chroma_client()
-            # ChromaDB 仅用于存储向量，不使用其默认的 sentence-transformers
-            # 所有 embedding 由配置的向量模型生成
-            _collection = client.get_or_create_collection(
-                name=config.CHROMA_COLLECTION_NAME,
-                metadata={
-                    "description": "Web data collection",
-                    "embedding_provider": "external"  # 标记使用外部embedding
-                }
-            )
-            logger.info(f"ChromaDB collection '{config.CHROMA_COLLECTION_NAME}' ready (external embedding only)")
-        except Exception as e:
-            logger.exception(f"Failed to get/create collection: {e}")
-            raise
+        with _collection_lock:
+            if _collection is None:
+                try:
+                    # 所有 embedding 由配置的向量模型生成，后端只负责存储与检索
+                    name = get_active_collection_name()
+                    _collection = create_vector_backend(name)
+                    logger.info(f"Vector collection '{name}' ready (backend: {config.VECTOR_BACKEND}, external embedding only)")
+                except Exception as e:
+                    logger.exception(f"Failed to get/create collection: {e}")
+                    raise
     return _collection
 
 
+def switch_collection(name: str, backend=None) -> None:
+    """
+    原子切换当前生效的集合（重建索引完成后调用）
+
+    Args:
+        name: 新集合名称
+        backend: 已打开的新集合实例（可选，默认按名称创建）
+    """
+    global _collection
+    from utils.db import set_setting
+
+    if backend is None:
+        backend = create_vector_backend(name)
+    with _collection_lock:
+        set_setting(ACTIVE_COLLECTION_SETTING, name, '当前生效的向量集合')
+        _collection = backend
+    logger.info(f"Switched active vector collection to '{name}'")
+
+
 def chunk_text(text: str, chunk_size: int = None, overlap: int = None) -> List[str]:
     """
     将文本分块
@@ -88,6 +101,512 @@ def chunk_text(text: str, chunk_size: int = None, overlap: int = None) -> List[s
     return chunks
 
 
+def chunk_text_by_lines(text: str, chunk_size: int = None) -> List[str]:
+    """
+    按行切分文本，分块边界由行内容决定（内容定义分块）
+
+    达到最小长度后，遇到哈希满足条件的行即结束当前分块；页面某处插入或删除几行只会改变附近的分块，
+    其余分块内容不变，可按内容哈希复用已有的 embedding。分块之间不重叠
+
+    Args:
+        text: 要分块的文本
+        chunk_size: 分块的最大长度（字符数），最小长度为其一半
+
+    Returns:
+        文本块列表
+    """
+    if chunk_size is None:
+        chunk_size = config.CHUNK_SIZE
+    min_size = chunk_size // 2
+
+    chunks, current, size = [], [], 0
+    for line in text.split("\n"):
+        line = line.strip()
+        if not line:
+            continue
+        # 超长的行按固定长度切开
+        for start in range(0, len(line), chunk_size):
+            piece = line[start:start + chunk_size]
+            if current and size + len(piece) > chunk_size:
+                chunks.append("\n".join(current))
+                current, size = [], 0
+            current.append(piece)
+            size += len(piece) + 1
+            if size >= min_size and int(hashlib.md5(piece.encode("utf-8")).hexdigest()[:8], 16) % _LINE_BOUNDARY_DIVISOR == 0:
+                chunks.append("\n".join(current))
+                current, size = [], 0
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+def _mmr_rerank(
+    query_embedding: List[float],
+    doc_embeddings,
+    limit: int,
+    lambda_mult: float = None,
+    duplicate_threshold: float = None
+) -> List[int]:
+    """
+    最大边际相关性（MMR）重排，同时丢弃近重复结果
+
+    Args:
+        query_embedding: 查询向量
+        doc_embeddings: 候选文档向量（N x D）
+        limit: 最多选出的结果数量
+        lambda_mult: 相关性权重
+        duplicate_threshold: 近重复的余弦相似度阈值
+
+    Returns:
+        选中的候选下标列表（按选中顺序）
+    """
+    import numpy as np
+
+    if lambda_mult is None:
+        lambda_mult = config.MMR_LAMBDA
+    if duplicate_threshold is None:
+        duplicate_threshold = config.MMR_DUPLICATE_THRESHOLD
+
+    docs = np.asarray(doc_embeddings, dtype=np.float32)
+    if docs.ndim != 2 or docs.shape[0] == 0 or limit <= 0:
+        return []
+
+    query = np.asarray(query_embedding, dtype=np.float32)
+    docs = docs / np.maximum(np.linalg.norm(docs, axis=1, keepdims=True), 1e-12)
+    query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+    relevance = docs @ query
+    pairwise = docs @ docs.T
+
+    candidates = np.ones(docs.shape[0], dtype=bool)
+    max_sim_to_selected = np.zeros(docs.shape[0], dtype=np.float32)
+    selected = []
+
+    while len(selected) < limit and candidates.any():
+        if selected:
+            scores = lambda_mult * relevance - (1 - lambda_mult) * max_sim_to_selected
+        else:
+            scores = relevance.copy()
+        scores[~candidates] = -np.inf
+
+        idx = int(np.argmax(scores))
+        selected.append(idx)
+
+        # 与新选中结果过于相似的候选直接淘汰（同页多块重叠、同页多次抓取）
+        candidates[idx] = False
+        candidates &= pairwise[idx] < duplicate_threshold
+        max_sim_to_selected = np.maximum(max_sim_to_selected, pairwise[idx])
+
+    return selected
+
+
+def _query_collection(
+    collection,
+    query_embedding: List[float],
+    limit: int,
+    where: Dict[str, Any] = None,
+    ids: Optional[List[str]] = None
+) -> List[Dict[str, Any]]:
+    """
+    执行向量查询，并对结果做 MMR 重排与近重复抑制
+
+    Args:
+        collection: ChromaDB 集合
+        query_embedding: 查询向量
+        limit: 返回结果数量
+        where: 元数据过滤条件
+        ids: 限定查询范围的文档 ID 列表（为空表示不限）
+
+    Returns:
+        结果列表，每个结果包含 content, metadata, distance
+    """
+    use_mmr = config.ENABLE_MMR_RERANK and limit > 1
+    include = ["documents", "metadatas", "distances"]
+    if use_mmr:
+        include.append("embeddings")
+
+    n_results = limit * config.MMR_FETCH_MULTIPLIER if use_mmr else limit
+    if ids is not None:
+        if not ids:
+            return []
+        n_results = min(n_results, len(ids))
+
+    results = collection.query(
+        query_embeddings=[query_embedding],
+        n_results=n_results,
+        where=where,
+        ids=ids,
+        include=include
+    )
+
+    return _format_query_results(results, [query_embedding], limit, use_mmr)[0]
+
+
+def _query_collection_many(
+    collection,
+    query_embeddings: List[List[float]],
+    limit: int,
+    where: Dict[str, Any] = None
+) -> List[List[Dict[str, Any]]]:
+    """
+    一次 ChromaDB 查询执行多个查询向量，每个查询的结果独立做 MMR 重排
+
+    Args:
+        collection: ChromaDB 集合
+        query_embeddings: 查询向量列表
+        limit: 每个查询返回结果数量
+        where: 元数据过滤条件
+
+    Returns:
+        与 query_embeddings 一一对应的结果列表
+    """
+    if not query_embeddings:
+        return []
+
+    use_mmr = config.ENABLE_MMR_RERANK and limit > 1
+    include = ["documents", "metadatas", "distances"]
+    if use_mmr:
+        include.append("embeddings")
+
+    results = collection.query(
+        query_embeddings=query_embeddings,
+        n_results=limit * config.MMR_FETCH_MULTIPLIER if use_mmr else limit,
+        where=where,
+        include=include
+    )
+
+    return _format_query_results(results, query_embeddings, limit, use_mmr)
+
+
+def _format_query_results(
+    results: Dict[str, Any],
+    query_embeddings: List[List[float]],
+    limit: int,
+    use_mmr: bool
+) -> List[List[Dict[str, Any]]]:
+    """将 collection.query 的结果按查询拆分并格式化（过滤 URL 黑名单，可选 MMR 重排）"""
+    from utils.url_blacklist import get_url_blacklist_matcher
+
+    blacklist = get_url_blacklist_matcher() if config.ENABLE_URL_BLACKLIST else None
+    if blacklist is not None and not blacklist.size:
+        blacklist = None
+    formatted = []
+
+    for q, query_embedding in enumerate(query_embeddings):
+        documents = results['documents'][q] if results and results.get('documents') and len(results['documents']) > q else []
+        if not documents:
+            formatted.append([])
+            continue
+
+        metadatas = results['metadatas'][q] if results.get('metadatas') else [{}] * len(documents)
+        distances = results['distances'][q] if results.get('distances') else [None] * len(documents)
+
+        candidates = list(range(len(documents)))
+        if blacklist is not None:
+            candidates = [i for i in candidates if not blacklist.is_blocked((metadatas[i] or {}).get('url'))]
+
+        order = candidates[:limit]
+        embeddings = results.get('embeddings') if use_mmr else None
+        if candidates and embeddings is not None and len(embeddings) > q and embeddings[q] is not None:
+            try:
+                doc_embeddings = embeddings[q] if len(candidates) == len(documents) else [embeddings[q][i] for i in candidates]
+                selected = _mmr_rerank(query_embedding, doc_embeddings, limit)
+                order = [candidates[i] for i in selected]
+                logger.debug(f"MMR rerank: {len(documents)} candidates -> {len(order)} results")
+            except Exception as e:
+                logger.warning(f"MMR rerank failed, falling back to similarity order: {e}")
+
+        formatted.append([
+            {
+                "content": documents[i],
+                "metadata": metadatas[i] or {},
+                "distance": distances[i]
+            }
+            for i in order
+        ])
+
+    return formatted
+
+
+def _index_web_data_urls(
+    doc_ids: List[str],
+    web_data_id: int,
+    url: str,
+    source: str,
+    session_id: Optional[str] = None
+) -> None:
+    """将网页数据的文档 ID 写入 SQLite URL 索引"""
+    from utils.db import add_url_index_entries
+    from utils.url_utils import normalize_url
+
+    normalized = normalize_url(url)
+    if not normalized["canonical"]:
+        return
+
+    add_url_index_entries([
+        {
+            "doc_id": doc_id,
+            "web_data_id": web_data_id,
+            "canonical_url": normalized["canonical"],
+            "base_url": normalized["base"],
+            "domain": normalized["domain"],
+            "source": source,
+            "session_id": session_id
+        }
+        for doc_id in doc_ids
+    ])
+
+
+def rebuild_url_index(batch_size: int = 1000) -> int:
+    """
+    从向量数据库的元数据重建 URL 索引（用于升级前已存在的数据）
+
+    Args:
+        batch_size: 每批读取的文档数量
+
+    Returns:
+        写入的索引条目数
+    """
+    try:
+        if not config.ENABLE_VECTOR_STORAGE:
+            return 0
+
+        from utils.db import add_url_index_entries
+        from utils.url_utils import normalize_url
+
+        collection = get_collection()
+        total = 0
+        offset = 0
+
+        while True:
+            batch = collection.get(include=["metadatas"], limit=batch_size, offset=offset)
+            if not batch or not batch.get('ids'):
+                break
+
+            entries = []
+            for doc_id, metadata in zip(batch['ids'], batch['metadatas'] or []):
+                metadata = metadata or {}
+                normalized = normalize_url(metadata.get("url", ""))
+                if not normalized["canonical"]:
+                    continue
+                entries.append({
+                    "doc_id": doc_id,
+                    "web_data_id": metadata.get("web_data_id"),
+                    "canonical_url": normalized["canonical"],
+                    "base_url": normalized["base"],
+                    "domain": normalized["domain"],
+                    "source": metadata.get("source"),
+                    "session_id": metadata.get("session_id")
+                })
+
+            total += add_url_index_entries(entries)
+            offset += len(batch['ids'])
+            if len(batch['ids']) < batch_size:
+                break
+
+        logger.info(f"Rebuilt URL index with {total} entries")
+        return total
+
+    except Exception as e:
+        logger.exception(f"Error rebuilding URL index: {e}")
+        return 0
+
+
+def build_web_data_documents(
+    web_data_id: int,
+    title: str,
+    url: str,
+    content: Any,
+    source: str = "web_crawler",
+    tags: List[str] = None,
+    metadata: Dict[str, Any] = None,
+    session_id: Optional[str] = None
+):
+    """
+    构建网页数据的向量文档（分块、文档ID、元数据）
+    
+    Returns:
+        (ids, documents, metadatas)
+    """
+    # 如果 content 是字典，转换为字符串（紧凑格式，与入库时的序列化一致）
+    if isinstance(content, dict):
+        content_text = json.dumps(content, ensure_ascii=False, separators=(',', ':'))
+    else:
+        content_text = str(content)
+    
+    # 将内容分块
+    chunks = chunk_text(content_text)
+    
+    documents = []
+    metadatas = []
+    ids = []
+    
+    for i, chunk in enumerate(chunks):
+        doc_id = f"web_{web_data_id}_chunk_{i}"
+        
+        chunk_metadata = _web_chunk_metadata(web_data_id, title, url, source, tags, metadata, session_id)
+        chunk_metadata["chunk_index"] = i
+        chunk_metadata["total_chunks"] = len(chunks)
+        
+        documents.append(chunk)
+        metadatas.append(chunk_metadata)
+        ids.append(doc_id)
+    
+    return ids, documents, metadatas
+
+
+def _web_chunk_metadata(
+    web_data_id: int,
+    title: str,
+    url: str,
+    source: str,
+    tags: List[str] = None,
+    metadata: Dict[str, Any] = None,
+    session_id: Optional[str] = None
+) -> Dict[str, Any]:
+    """网页分块的公共元数据"""
+    chunk_metadata = {
+        "web_data_id": web_data_id,
+        "title": title,
+        "url": url or "",
+        "source": source,
+        "tags": json.dumps(tags or [], ensure_ascii=False),
+    }
+    
+    # 添加 session_id（如果是 chat_context、chat_conversation 或 web_crawler 来源）
+    # 抓取的页面内容应该作为"上文"关联到当前session
+    if session_id and source in ["chat_context", "chat_conversation", "web_crawler", "web-crawler-initial", "web-crawler-incremental"]:
+        chunk_metadata["session_id"] = session_id
+    
+    # 添加自定义元数据
+    if metadata:
+        for key, value in metadata.items():
+            if isinstance(value, (str, int, float, bool)):
+                chunk_metadata[f"meta_{key}"] = value
+    
+    return chunk_metadata
+
+
+def build_page_documents(
+    page_key: str,
+    web_data_id: int,
+    title: str,
+    url: str,
+    content: str,
+    source: str = "web_crawler",
+    tags: List[str] = None,
+    metadata: Dict[str, Any] = None,
+    session_id: Optional[str] = None
+):
+    """
+    构建网页当前版本的向量文档（按行分块，文档 ID 由页面与分块内容的哈希决定）
+
+    Args:
+        page_key: 页面版本链键（规范化 URL）
+        web_data_id: 当前版本对应的 web_data 行（所有分块都归属于当前版本）
+
+    Returns:
+        (ids, documents, metadatas)
+    """
+    prefix = "page_" + hashlib.sha1(page_key.encode("utf-8")).hexdigest()[:16]
+    
+    ids, documents, metadatas = [], [], []
+    seen = set()
+    for chunk in chunk_text_by_lines(content):
+        chunk_hash = hashlib.sha1(chunk.encode("utf-8")).hexdigest()[:16]
+        doc_id = f"{prefix}_{chunk_hash}"
+        # 页面内完全相同的分块只保留一份
+        if doc_id in seen:
+            continue
+        seen.add(doc_id)
+        
+        chunk_metadata = _web_chunk_metadata(web_data_id, title, url, source, tags, metadata, session_id)
+        chunk_metadata["page_key"] = page_key
+        chunk_metadata["chunk_hash"] = chunk_hash
+        
+        ids.append(doc_id)
+        documents.append(chunk)
+        metadatas.append(chunk_metadata)
+    
+    return ids, documents, metadatas
+
+
+def build_todo_document(
+    todo_id: int,
+    title: str,
+    description: str = "",
+    priority: int = 0,
+    start_time: Optional[str] = None,
+    end_time: Optional[str] = None,
+    status: int = 0
+):
+    """
+    构建待办事项的向量文档
+    
+    Returns:
+        (doc_id, content, metadata)
+    """
+    # 构建待办事项的文本内容
+    content_parts = [f"待办事项: {title}"]
+    if description:
+        content_parts.append(f"描述: {description}")
+    if start_time:
+        content_parts.append(f"开始时间: {start_time}")
+    if end_time:
+        content_parts.append(f"结束时间: {end_time}")
+    if priority:
+        content_parts.append(f"优先级: {priority}")
+    
+    content = "\n".join(content_parts)
+    
+    # 准备元数据
+    metadata = {
+        "todo_id": todo_id,
+        "title": title,
+        "description": description or "",
+        "priority": priority,
+        "status": status,
+        "source": "todo"
+    }
+    
+    if start_time:
+        metadata["start_time"] = start_time
+    if end_time:
+        metadata["end_time"] = end_time
+    
+    return f"todo_{todo_id}", content, metadata
+
+
+def build_tip_document(
+    tip_id: int,
+    title: str,
+    content: str,
+    tip_type: str = "general",
+    source_urls: Optional[List[str]] = None
+):
+    """
+    构建提示的向量文档
+    
+    Returns:
+        (doc_id, content, metadata)
+    """
+    # 构建提示的文本内容
+    tip_content = f"提示: {title}\n{content}"
+    
+    # 准备元数据
+    metadata = {
+        "tip_id": tip_id,
+        "title": title,
+        "tip_type": tip_type,
+        "source": "tip"
+    }
+    
+    if source_urls:
+        metadata["source_urls"] = json.dumps(source_urls, ensure_ascii=False)
+    
+    return f"tip_{tip_id}", tip_content, metadata
+
+
 def add_web_data_to_vectorstore(
     web_data_id: int,
     title: str,
@@ -126,51 +645,21 @@ def add_web_data_to_vectorstore(
             logger.error("No embedding function provided. Vector storage requires external embedding model.")
             return False
         
-        # 如果 content 是字典，转换为字符串
-        if isinstance(content, dict):
-            content_text = json.dumps(content, ensure_ascii=False, indent=2)
-        else:
-            content_text = str(content)
-        
-        # 将内容分块
-        chunks = chunk_text(content_text)
-        logger.info(f"Split content into {len(chunks)} chunks")
+        ids, documents, metadatas = build_web_data_documents(
+            web_data_id=web_data_id,
+            title=title,
+            url=url,
+            content=content,
+            source=source,
+            tags=tags,
+            metadata=metadata,
+            session_id=session_id
+        )
+        logger.info(f"Split content into {len(documents)} chunks")
         
         # 准备向量数据库文档
         collection = get_collection()
         
-        documents = []
-        metadatas = []
-        ids = []
-        
-        for i, chunk in enumerate(chunks):
-            doc_id = f"web_{web_data_id}_chunk_{i}"
-            
-            chunk_metadata = {
-                "web_data_id": web_data_id,
-                "title": title,
-                "url": url or "",
-                "source": source,
-                "chunk_index": i,
-                "total_chunks": len(chunks),
-                "tags": json.dumps(tags or [], ensure_ascii=False),
-            }
-            
-            # 添加 session_id（如果是 chat_context、chat_conversation 或 web_crawler 来源）
-            # 抓取的页面内容应该作为"上文"关联到当前session
-            if session_id and source in ["chat_context", "chat_conversation", "web_crawler", "web-crawler-initial", "web-crawler-incremental"]:
-                chunk_metadata["session_id"] = session_id
-            
-            # 添加自定义元数据
-            if metadata:
-                for key, value in metadata.items():
-                    if isinstance(value, (str, int, float, bool)):
-                        chunk_metadata[f"meta_{key}"] = value
-            
-            documents.append(chunk)
-            metadatas.append(chunk_metadata)
-            ids.append(doc_id)
-        
         # 使用配置的向量模型生成 embeddings
         try:
             embeddings = embedding_function(documents)
@@ -191,7 +680,17 @@ def add_web_data_to_vectorstore(
                 embeddings=embeddings
             )
             
-            logger.info(f"Added {len(chunks)} chunks to vectorstore for web_data_id={web_data_id}, session_id={session_id}")
+            logger.info(f"Added {len(documents)} chunks to vectorstore for web_data_id={web_data_id}, session_id={session_id}")
+            
+            if url:
+                try:
+                    _index_web_data_urls(ids, web_data_id, url, source, metadatas[0].get("session_id"))
+                except Exception as e:
+                    logger.warning(f"Failed to update URL index for web_data_id={web_data_id}: {e}")
+            
+            from utils.vector_sync import record_vector_sync
+            record_vector_sync("web_data", web_data_id)
+            
             return True
             
         except Exception as e:
@@ -203,6 +702,296 @@ def add_web_data_to_vectorstore(
         return False
 
 
+def _embedding_batches(documents: List[str]) -> List[List[int]]:
+    """按单次请求的条数与 token 上限把文档下标分组"""
+    from utils.helpers import estimate_tokens
+
+    batches, current, current_tokens = [], [], 0
+    for index, document in enumerate(documents):
+        tokens = estimate_tokens(document, config.EMBEDDING_MODEL)
+        if current and (
+            len(current) >= config.EMBEDDING_BATCH_MAX_INPUTS
+            or current_tokens + tokens > config.EMBEDDING_BATCH_MAX_TOKENS
+        ):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(index)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+def add_web_data_batch_to_vectorstore(
+    entries: List[Dict[str, Any]],
+    embedding_function=None
+) -> Dict[int, bool]:
+    """
+    批量将网页数据添加到向量数据库
+    所有条目的分块合并后按服务商单次请求上限分批生成 embedding，再一次性写入
+
+    Args:
+        entries: 每项包含 add_web_data_to_vectorstore 的参数（web_data_id、title、url、content 等）
+        embedding_function: 自定义嵌入函数
+
+    Returns:
+        {web_data_id: 是否成功}（某批 embedding 失败只影响该批涉及的条目）
+    """
+    results = {entry["web_data_id"]: False for entry in entries}
+    try:
+        if not config.ENABLE_VECTOR_STORAGE:
+            logger.info("Vector storage is disabled, skipping")
+            return {web_data_id: True for web_data_id in results}
+
+        if not embedding_function:
+            logger.error("No embedding function provided. Vector storage requires external embedding model.")
+            return results
+
+        ids, documents, metadatas, owners = [], [], [], []
+        for entry in entries:
+            entry_ids, entry_documents, entry_metadatas = build_web_data_documents(**entry)
+            ids.extend(entry_ids)
+            documents.extend(entry_documents)
+            metadatas.extend(entry_metadatas)
+            owners.extend([entry["web_data_id"]] * len(entry_ids))
+
+        if not documents:
+            return results
+
+        batches = _embedding_batches(documents)
+        logger.info(f"Embedding {len(documents)} chunks of {len(entries)} pages in {len(batches)} request(s)")
+
+        def _embed(indices: List[int]):
+            try:
+                embeddings = embedding_function([documents[i] for i in indices])
+                if embeddings and len(embeddings) == len(indices):
+                    return embeddings
+                logger.error(f"Embedding batch of {len(indices)} chunks returned no or mismatched results")
+            except Exception as e:
+                logger.exception(f"Failed to generate embeddings for a batch of {len(indices)} chunks: {e}")
+            return None
+
+        from concurrent.futures import ThreadPoolExecutor
+
+        embeddings: List[Optional[List[float]]] = [None] * len(documents)
+        with ThreadPoolExecutor(max_workers=max(1, min(len(batches), config.EMBEDDING_MAX_CONCURRENCY))) as executor:
+            for indices, batch_embeddings in zip(batches, executor.map(_embed, batches)):
+                if batch_embeddings:
+                    for i, embedding in zip(indices, batch_embeddings):
+                        embeddings[i] = embedding
+
+        # 只写入全部分块都有 embedding 的条目，其余留给一致性校验补写
+        failed = {owners[i] for i in range(len(documents)) if embeddings[i] is None}
+        keep = [i for i in range(len(documents)) if owners[i] not in failed]
+        if keep:
+            get_collection().add(
+                documents=[documents[i] for i in keep],
+                metadatas=[metadatas[i] for i in keep],
+                ids=[ids[i] for i in keep],
+                embeddings=[embeddings[i] for i in keep]
+            )
+
+        from utils.vector_sync import record_vector_sync
+
+        positions: Dict[int, List[int]] = {}
+        for i in keep:
+            positions.setdefault(owners[i], []).append(i)
+
+        for entry in entries:
+            web_data_id = entry["web_data_id"]
+            if web_data_id in failed:
+                continue
+            results[web_data_id] = True
+            entry_positions = positions.get(web_data_id)
+            if entry.get("url") and entry_positions:
+                try:
+                    _index_web_data_urls(
+                        [ids[i] for i in entry_positions],
+                        web_data_id,
+                        entry["url"],
+                        entry.get("source", "web_crawler"),
+                        metadatas[entry_positions[0]].get("session_id")
+                    )
+                except Exception as e:
+                    logger.warning(f"Failed to update URL index for web_data_id={web_data_id}: {e}")
+            record_vector_sync("web_data", web_data_id)
+
+        logger.info(f"Added {len(keep)} chunks to vectorstore for {len(entries) - len(failed)}/{len(entries)} pages")
+        return results
+
+    except Exception as e:
+        logger.exception(f"Error adding web data batch to vectorstore: {e}")
+        return results
+
+
+def sync_page_to_vectorstore(
+    page_key: str,
+    web_data_id: int,
+    title: str,
+    url: str,
+    content: str,
+    source: str = "web_crawler",
+    tags: List[str] = None,
+    metadata: Dict[str, Any] = None,
+    session_id: Optional[str] = None,
+    embedding_function=None
+) -> Optional[Dict[str, int]]:
+    """
+    把网页当前版本同步到向量数据库：只对向量库中还没有的分块生成 embedding，删除已不在当前版本中的分块
+
+    以向量库中该页面实际存在的分块为准比较，上次写入失败留下的缺口会在下次同步时补上。
+    内容未变的分块只更新元数据，归属改为当前版本的 web_data 行（URL 索引同样改指当前行），
+    这样按 web_data_id 删除历史版本的行时不会误删仍属于当前页面的分块
+
+    Returns:
+        当前版本的分块 -> 所属 web_data_id；失败时返回 None
+    """
+    page = {
+        "page_key": page_key,
+        "web_data_id": web_data_id,
+        "title": title,
+        "url": url,
+        "content": content,
+        "source": source,
+        "tags": tags,
+        "metadata": metadata,
+        "session_id": session_id,
+    }
+    return sync_pages_to_vectorstore([page], embedding_function=embedding_function).get(page_key)
+
+
+def sync_pages_to_vectorstore(
+    pages: List[Dict[str, Any]],
+    embedding_function=None
+) -> Dict[str, Optional[Dict[str, int]]]:
+    """
+    批量同步多个网页的当前版本（规则同 sync_page_to_vectorstore）
+    所有页面缺少的分块合并后按服务商单次请求上限分批生成 embedding，再逐页写入、更新元数据和删除
+
+    Args:
+        pages: 每项包含 sync_page_to_vectorstore 的参数（page_key、web_data_id、title、url、content 等），page_key 不重复
+        embedding_function: 自定义嵌入函数
+
+    Returns:
+        {page_key: 当前版本的分块 -> 所属 web_data_id}；同步失败的页面为 None（某批 embedding 失败只影响该批涉及的页面）
+    """
+    results: Dict[str, Optional[Dict[str, int]]] = {page["page_key"]: None for page in pages}
+    try:
+        if not config.ENABLE_VECTOR_STORAGE:
+            logger.info("Vector storage is disabled, skipping")
+            return {page_key: {} for page_key in results}
+
+        if not embedding_function:
+            logger.error("No embedding function provided. Vector storage requires external embedding model.")
+            return results
+
+        collection = get_collection()
+
+        # 先比较每个页面的现有分块，收集所有需要生成 embedding 的分块
+        plans, documents, owners = [], [], []
+        for page in pages:
+            page_key = page["page_key"]
+            try:
+                ids, page_documents, metadatas = build_page_documents(**page)
+                existing = set((collection.get(where={"page_key": page_key}, include=[]) or {}).get("ids") or [])
+            except Exception as e:
+                logger.exception(f"Error preparing page {page_key} for vectorstore: {e}")
+                continue
+            added = [i for i, doc_id in enumerate(ids) if doc_id not in existing]
+            plans.append({
+                "page": page,
+                "ids": ids,
+                "documents": page_documents,
+                "metadatas": metadatas,
+                "added": added,
+                "reused": [i for i, doc_id in enumerate(ids) if doc_id in existing],
+                "obsolete": list(existing - set(ids)),
+                "offset": len(documents),
+            })
+            documents.extend(page_documents[i] for i in added)
+            owners.extend([page_key] * len(added))
+
+        embeddings: List[Optional[List[float]]] = [None] * len(documents)
+        if documents:
+            batches = _embedding_batches(documents)
+            logger.info(f"Embedding {len(documents)} new chunks of {len(plans)} pages in {len(batches)} request(s)")
+
+            def _embed(indices: List[int]):
+                try:
+                    batch = embedding_function([documents[i] for i in indices])
+                    if batch and len(batch) == len(indices):
+                        return batch
+                    logger.error(f"Embedding batch of {len(indices)} chunks returned no or mismatched results")
+                except Exception as e:
+                    logger.exception(f"Failed to generate embeddings for a batch of {len(indices)} chunks: {e}")
+                return None
+
+            from concurrent.futures import ThreadPoolExecutor
+
+            with ThreadPoolExecutor(max_workers=max(1, min(len(batches), config.EMBEDDING_MAX_CONCURRENCY))) as executor:
+                for indices, batch in zip(batches, executor.map(_embed, batches)):
+                    if batch:
+                        for i, embedding in zip(indices, batch):
+                            embeddings[i] = embedding
+
+        # 缺少 embedding 的页面整页跳过（不删除旧分块），留给下次同步补上
+        failed = {owners[i] for i in range(len(documents)) if embeddings[i] is None}
+
+        from utils.db import delete_url_index_doc_ids
+
+        for plan in plans:
+            page = plan["page"]
+            page_key = page["page_key"]
+            if page_key in failed:
+                continue
+            ids, metadatas, added = plan["ids"], plan["metadatas"], plan["added"]
+            try:
+                if added:
+                    collection.upsert(
+                        documents=[plan["documents"][i] for i in added],
+                        metadatas=[metadatas[i] for i in added],
+                        ids=[ids[i] for i in added],
+                        embeddings=embeddings[plan["offset"]:plan["offset"] + len(added)]
+                    )
+
+                if plan["reused"]:
+                    collection.update_metadata(
+                        ids=[ids[i] for i in plan["reused"]],
+                        metadatas=[metadatas[i] for i in plan["reused"]]
+                    )
+
+                if plan["obsolete"]:
+                    collection.delete(ids=plan["obsolete"])
+            except Exception as e:
+                logger.exception(f"Error syncing page {page_key} to vectorstore: {e}")
+                continue
+
+            delete_url_index_doc_ids(plan["obsolete"])
+            if page.get("url") and ids:
+                try:
+                    _index_web_data_urls(
+                        ids,
+                        page["web_data_id"],
+                        page["url"],
+                        page.get("source", "web_crawler"),
+                        metadatas[0].get("session_id")
+                    )
+                except Exception as e:
+                    logger.warning(f"Failed to update URL index for page {page_key}: {e}")
+
+            logger.info(
+                f"Synced page {page_key}: {len(ids)} chunks, {len(added)} embedded, "
+                f"{len(plan['reused'])} reused, {len(plan['obsolete'])} deleted"
+            )
+            results[page_key] = {doc_id: meta["web_data_id"] for doc_id, meta in zip(ids, metadatas)}
+
+        return results
+
+    except Exception as e:
+        logger.exception(f"Error syncing pages to vectorstore: {e}")
+        return results
+
+
 def search_similar_content(
     query: str,
     limit: int = 5,
@@ -239,24 +1028,15 @@ def search_similar_content(
             logger.exception(f"Failed to generate query embedding: {e}")
             return []
         
-        # 执行查询（使用嵌入向量）
+        # 执行查询（使用嵌入向量，结果经过 MMR 重排与近重复抑制）
         collection = get_collection()
-        results = collection.query(
-            query_embeddings=[query_embedding],
-            n_results=limit,
+        formatted_results = _query_collection(
+            collection,
+            query_embedding,
+            limit,
             where=filter_metadata
         )
-        
-        # 格式化结果
-        formatted_results = []
-        if results and results['documents']:
-            for i in range(len(results['documents'][0])):
-                formatted_results.append({
-                    "content": results['documents'][0][i],
-                    "metadata": results['metadatas'][0][i] if results['metadatas'] else {},
-                    "distance": results['distances'][0][i] if results['distances'] else None
-                })
-        
+
         logger.info(f"Found {len(formatted_results)} similar results for query")
         return formatted_results
         
@@ -265,6 +1045,63 @@ def search_similar_content(
         return []
 
 
+def search_similar_content_many(
+    queries: List[str],
+    limit: int = 5,
+    filter_metadata: Dict[str, Any] = None
+) -> List[List[Dict[str, Any]]]:
+    """
+    批量搜索相似内容：一次批量 embedding 调用 + 一次 ChromaDB 查询
+    
+    Args:
+        queries: 查询文本列表
+        limit: 每个查询返回结果数量
+        filter_metadata: 元数据过滤条件
+    
+    Returns:
+        与 queries 一一对应的结果列表，每个结果额外包含 query_index 和 query
+    """
+    empty = [[] for _ in queries]
+    try:
+        if not config.ENABLE_VECTOR_STORAGE:
+            logger.info("Vector storage is disabled")
+            return empty
+        
+        # 跳过空查询，保留原始下标用于结果归属
+        valid = [(i, q) for i, q in enumerate(queries) if q and q.strip()]
+        if not valid:
+            return empty
+        
+        from utils.llm import generate_embeddings
+        query_embeddings = generate_embeddings([q for _, q in valid])
+        
+        if not query_embeddings or len(query_embeddings) != len(valid):
+            logger.error("Failed to generate query embeddings. Cannot search without embedding model.")
+            return empty
+        
+        collection = get_collection()
+        per_query = _query_collection_many(
+            collection,
+            query_embeddings,
+            limit,
+            where=filter_metadata
+        )
+        
+        results = empty
+        for (query_index, query_text), query_results in zip(valid, per_query):
+            for item in query_results:
+                item["query_index"] = query_index
+                item["query"] = query_text
+            results[query_index] = query_results
+        
+        logger.info(f"Found {sum(len(r) for r in results)} similar results for {len(valid)} queries (batched)")
+        return results
+        
+    except Exception as e:
+        logger.exception(f"Error searching similar content (batched): {e}")
+        return empty
+
+
 def delete_web_data_from_vectorstore(web_data_id: int) -> bool:
     """
     从向量数据库删除网页数据
@@ -290,6 +1127,9 @@ def delete_web_data_from_vectorstore(web_data_id: int) -> bool:
             collection.delete(ids=results['ids'])
             logger.info(f"Deleted {len(results['ids'])} chunks for web_data_id={web_data_id}")
         
+        from utils.db import delete_url_index_by_web_data
+        delete_url_index_by_web_data(web_data_id)
+        
         return True
         
     except Exception as e:
@@ -297,6 +1137,88 @@ def delete_web_data_from_vectorstore(web_data_id: int) -> bool:
         return False
 
 
+def _search_page_by_url(
+    page_url: str,
+    query: str,
+    limit: int,
+    session_id: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    通过 SQLite URL 索引检索指定页面的内容
+
+    检索顺序：
+    - 有 session_id：当前会话的 chat_context（规范 URL）-> 抓取内容（规范 URL）-> 抓取内容（忽略查询参数）
+    - 无 session_id：任意来源（规范 URL）
+
+    Args:
+        page_url: 页面 URL
+        query: 查询文本（为空时按写入时间返回）
+        limit: 返回结果数量
+        session_id: 会话ID
+
+    Returns:
+        页面内容结果列表（context_type 为 page）
+    """
+    from utils.db import get_url_index_doc_ids
+    from utils.url_blacklist import is_url_blacklisted
+    from utils.url_utils import normalize_url
+
+    normalized = normalize_url(page_url)
+    if not normalized["canonical"] or is_url_blacklisted(page_url):
+        return []
+
+    crawler_sources = ["web_crawler", "web-crawler-initial", "web-crawler-incremental"]
+    if session_id:
+        attempts = [
+            ("canonical", ["chat_context"], session_id),
+            ("canonical", crawler_sources, None),
+            ("base", crawler_sources, None)
+        ]
+    else:
+        attempts = [("canonical", None, None)]
+
+    collection = get_collection()
+    query_embedding = None
+    embedding_attempted = False
+
+    for match, sources, match_session in attempts:
+        doc_ids = get_url_index_doc_ids(
+            normalized[match],
+            match=match,
+            sources=sources,
+            session_id=match_session
+        )
+        if not doc_ids:
+            continue
+
+        # 只有在索引命中时才生成查询向量
+        if query and not embedding_attempted:
+            from utils.llm import generate_embedding
+            query_embedding = generate_embedding(query)
+            embedding_attempted = True
+
+        if query_embedding:
+            page_results = _query_collection(collection, query_embedding, limit, ids=doc_ids)
+        else:
+            fetched = collection.get(ids=doc_ids[:limit])
+            page_results = [
+                {
+                    "content": fetched['documents'][i] if fetched.get('documents') else "",
+                    "metadata": fetched['metadatas'][i] if fetched.get('metadatas') else {},
+                    "distance": 0.0
+                }
+                for i in range(len(fetched.get('ids') or []))
+            ]
+
+        if page_results:
+            for item in page_results:
+                item["context_type"] = "page"
+            logger.info(f"Found {len(page_results)} page chunks via URL index ({match}, sources={sources or 'all'}) for URL: {normalized[match]}")
+            return page_results
+
+    return []
+
+
 def search_user_context(
     query: str,
     context_type: str = "all",
@@ -476,219 +1398,17 @@ def search_user_context(
         # 使用语义搜索
         where_filter = where_filters[0] if where_filters else None
         
-        # 如果指定了当前页面URL，先尝试直接查询
+        # 如果指定了当前页面URL，先通过 URL 索引定位文档 ID，再在这些文档内做语义检索
         if current_page_url and include_page_content:
-            normalized_url = current_page_url.rstrip('/')
-            
-            # 提取基础URL（去除查询参数），用于更灵活的匹配
-            try:
-                from urllib.parse import urlparse, urlunparse
-                parsed = urlparse(normalized_url)
-                base_url = urlunparse((parsed.scheme, parsed.netloc, parsed.path, '', '', '')).rstrip('/')
-            except:
-                base_url = normalized_url
-            
             try:
-                collection = get_collection()
-                
-                # 构建查询条件：优先检索当前会话的内容
-                if session_id:
-                    # 策略1: 先尝试检索当前会话的页面内容（chat_context）
-                    current_session_query = {
-                        "$and": [
-                            {"url": normalized_url},  # 精确匹配
-                            {"source": "chat_context"},
-                            {"session_id": session_id}
-                        ]
-                    }
-                    
-                    current_session_results = collection.get(
-                        where=current_session_query,
-                        limit=limit
-                    )
-                    
-                    if current_session_results and current_session_results.get('ids'):
-                        # 如果找到当前会话的内容，优先使用
-                        from utils.llm import generate_embedding
-                        query_embedding = generate_embedding(search_query) if search_query else None
-                        
-                        if query_embedding:
-                            semantic_results = collection.query(
-                                query_embeddings=[query_embedding],
-                                n_results=limit,
-                                where=current_session_query
-                            )
-                            
-                            if semantic_results and semantic_results.get('documents'):
-                                for i in range(len(semantic_results['documents'][0])):
-                                    results.append({
-                                        "content": semantic_results['documents'][0][i],
-                                        "metadata": semantic_results['metadatas'][0][i] if semantic_results.get('metadatas') else {},
-                                        "distance": semantic_results['distances'][0][i] if semantic_results.get('distances') else 1.0,
-                                        "context_type": "page"
-                                    })
-                                logger.info(f"Found {len(results)} pages from current session (chat_context) for URL: {normalized_url}")
-                                found_current_page = True
-                            else:
-                                found_current_page = False
-                        else:
-                            # 即使没有查询文本，也返回找到的结果
-                            for i in range(len(current_session_results['ids'])):
-                                results.append({
-                                    "content": current_session_results['documents'][i] if current_session_results.get('documents') else "",
-                                    "metadata": current_session_results['metadatas'][i] if current_session_results.get('metadatas') else {},
-                                    "distance": 0.0,
-                                    "context_type": "page"
-                                })
-                            logger.info(f"Found {len(results)} pages from current session (chat_context) for URL: {normalized_url} (no query text)")
-                            found_current_page = True
-                    else:
-                        found_current_page = False
-                    
-                    # 策略2: 如果当前会话没有内容，再检索其他来源（web_crawler等）
-                    if not found_current_page:
-                        # 先尝试精确匹配URL
-                        other_sources_query_exact = {
-                            "$and": [
-                                {"url": normalized_url},
-                                {
-                                    "$or": [
-                                        {"source": "web_crawler"},
-                                        {"source": "web-crawler-initial"},
-                                        {"source": "web-crawler-incremental"}
-                                    ]
-                                }
-                            ]
-                        }
-                        
-                        # 如果精确匹配失败，尝试基础URL匹配（忽略查询参数）
-                        other_sources_query_base = {
-                            "$and": [
-                                {
-                                    "$or": [
-                                        {"url": base_url},  # 基础URL匹配
-                                        {"url": {"$regex": f"^{base_url}(\\?|$)"}}  # 正则匹配：基础URL开头
-                                    ]
-                                },
-                                {
-                                    "$or": [
-                                        {"source": "web_crawler"},
-                                        {"source": "web-crawler-initial"},
-                                        {"source": "web-crawler-incremental"}
-                                    ]
-                                }
-                            ]
-                        }
-                        
-                        from utils.llm import generate_embedding
-                        query_embedding = generate_embedding(search_query) if search_query else None
-                        
-                        # 先尝试精确匹配
-                        if query_embedding:
-                            semantic_results = collection.query(
-                                query_embeddings=[query_embedding],
-                                n_results=limit,
-                                where=other_sources_query_exact
-                            )
-                            
-                            if semantic_results and semantic_results.get('documents'):
-                                for i in range(len(semantic_results['documents'][0])):
-                                    results.append({
-                                        "content": semantic_results['documents'][0][i],
-                                        "metadata": semantic_results['metadatas'][0][i] if semantic_results.get('metadatas') else {},
-                                        "distance": semantic_results['distances'][0][i] if semantic_results.get('distances') else 1.0,
-                                        "context_type": "page"
-                                    })
-                                logger.info(f"Found {len([r for r in results if r.get('context_type') == 'page'])} pages from other sources (exact URL match) for URL: {normalized_url}")
-                            else:
-                                # 精确匹配失败，尝试基础URL匹配
-                                semantic_results = collection.query(
-                                    query_embeddings=[query_embedding],
-                                    n_results=limit,
-                                    where=other_sources_query_base
-                                )
-                                
-                                if semantic_results and semantic_results.get('documents'):
-                                    for i in range(len(semantic_results['documents'][0])):
-                                        results.append({
-                                            "content": semantic_results['documents'][0][i],
-                                            "metadata": semantic_results['metadatas'][0][i] if semantic_results.get('metadatas') else {},
-                                            "distance": semantic_results['distances'][0][i] if semantic_results.get('distances') else 1.0,
-                                            "context_type": "page"
-                                        })
-                                    logger.info(f"Found {len([r for r in results if r.get('context_type') == 'page'])} pages from other sources (base URL match) for URL: {base_url}")
-                        else:
-                            # 没有查询文本，直接查询
-                            direct_results = collection.get(
-                                where=other_sources_query_exact,
-                                limit=limit
-                            )
-                            
-                            if direct_results and direct_results.get('ids'):
-                                for i in range(len(direct_results['ids'])):
-                                    results.append({
-                                        "content": direct_results['documents'][i] if direct_results.get('documents') else "",
-                                        "metadata": direct_results['metadatas'][i] if direct_results.get('metadatas') else {},
-                                        "distance": 0.0,
-                                        "context_type": "page"
-                                    })
-                                logger.info(f"Found {len([r for r in results if r.get('context_type') == 'page'])} pages from other sources (exact URL, no query) for URL: {normalized_url}")
-                            else:
-                                # 精确匹配失败，尝试基础URL匹配
-                                direct_results = collection.get(
-                                    where=other_sources_query_base,
-                                    limit=limit
-                                )
-                                
-                                if direct_results and direct_results.get('ids'):
-                                    for i in range(len(direct_results['ids'])):
-                                        results.append({
-                                            "content": direct_results['documents'][i] if direct_results.get('documents') else "",
-                                            "metadata": direct_results['metadatas'][i] if direct_results.get('metadatas') else {},
-                                            "distance": 0.0,
-                                            "context_type": "page"
-                                        })
-                                    logger.info(f"Found {len([r for r in results if r.get('context_type') == 'page'])} pages from other sources (base URL, no query) for URL: {base_url}")
-                else:
-                    # 没有 session_id，检索所有来源
-                    query_where = {"url": normalized_url}
-                    
-                    from utils.llm import generate_embedding
-                    query_embedding = generate_embedding(search_query) if search_query else None
-                    
-                    if query_embedding:
-                        semantic_results = collection.query(
-                            query_embeddings=[query_embedding],
-                            n_results=limit,
-                            where=query_where
-                        )
-                        
-                        if semantic_results and semantic_results.get('documents'):
-                            for i in range(len(semantic_results['documents'][0])):
-                                results.append({
-                                    "content": semantic_results['documents'][0][i],
-                                    "metadata": semantic_results['metadatas'][0][i] if semantic_results.get('metadatas') else {},
-                                    "distance": semantic_results['distances'][0][i] if semantic_results.get('distances') else 1.0,
-                                    "context_type": "page"
-                                })
-                    else:
-                        # 没有查询文本，直接查询
-                        direct_results = collection.get(
-                            where=query_where,
-                            limit=limit
-                        )
-                        
-                        if direct_results and direct_results.get('ids'):
-                            for i in range(len(direct_results['ids'])):
-                                results.append({
-                                    "content": direct_results['documents'][i] if direct_results.get('documents') else "",
-                                    "metadata": direct_results['metadatas'][i] if direct_results.get('metadatas') else {},
-                                    "distance": 0.0,
-                                    "context_type": "page"
-                                })
-                        
+                results.extend(_search_page_by_url(
+                    current_page_url,
+                    search_query,
+                    limit,
+                    session_id=session_id
+                ))
             except Exception as e:
-                logger.debug(f"Direct URL query failed, falling back to semantic search: {e}")
+                logger.debug(f"URL index lookup failed, falling back to semantic search: {e}")
         
         # 如果还没有结果，使用通用语义搜索
         if not results:
@@ -719,9 +1439,10 @@ def search_user_context(
                 
                 # 如果指定了当前页面URL，只返回匹配的页面内容
                 if current_page_url and ctx_type in ["page", "conversation"]:
+                    from utils.url_utils import normalize_url
                     url = metadata.get("url", "")
-                    normalized_current = current_page_url.rstrip('/')
-                    normalized_result = url.rstrip('/') if url else ""
+                    normalized_current = normalize_url(current_page_url)["canonical"]
+                    normalized_result = normalize_url(url)["canonical"] if url else ""
                     # 对话记录没有URL，所以不跳过
                     if ctx_type == "page" and normalized_result != normalized_current:
                         continue
@@ -779,9 +1500,22 @@ def add_session_memory_to_vectorstore(
             logger.warning("Empty content, skipping")
             return False
         
+        content = content.strip()
+        
+        from utils.db import get_session_memory_by_hash, touch_session_memory, add_session_memory_record
+        from utils.session_memory import memory_content_hash, memory_doc_id, enforce_session_cap
+        
+        # 会话中已有相同内容：只刷新最近出现时间，不重新 embedding
+        content_hash = memory_content_hash(content)
+        existing = get_session_memory_by_hash(session_id, content_hash)
+        if existing:
+            touch_session_memory(existing['memory_id'])
+            logger.debug(f"Session memory already exists, skipped: session_id={session_id}, id={existing['memory_id']}")
+            return True
+        
         # 生成embedding
         from utils.llm import generate_embedding
-        embedding = generate_embedding(content.strip())
+        embedding = generate_embedding(content)
         
         if not embedding:
             logger.error("Failed to generate embedding for session memory")
@@ -799,19 +1533,21 @@ def add_session_memory_to_vectorstore(
                 if isinstance(value, (str, int, float, bool)):
                     memory_metadata[key] = value
         
-        # 生成唯一ID
-        import uuid
-        memory_id = f"memory_{session_id}_{uuid.uuid4().hex[:8]}"
+        # 由内容哈希生成ID（并发重复写入时覆盖同一文档）
+        memory_id = memory_doc_id(session_id, content_hash)
         
         # 存储到ChromaDB
         collection = get_collection()
-        collection.add(
-            documents=[content.strip()],
+        collection.upsert(
+            documents=[content],
             metadatas=[memory_metadata],
             ids=[memory_id],
             embeddings=[embedding]
         )
         
+        add_session_memory_record(memory_id, session_id, content_hash, content_type)
+        enforce_session_cap(session_id)
+        
         logger.info(f"Added session memory to vectorstore: session_id={session_id}, content_type={content_type}, id={memory_id}")
         return True
         
@@ -881,23 +1617,17 @@ def search_session_memory(
             logger.error("Failed to generate query embedding for session memory search")
             return []
         
-        results = collection.query(
-            query_embeddings=[query_embedding],
-            n_results=limit,
+        formatted_results = _query_collection(
+            collection,
+            query_embedding,
+            limit,
             where=filter_metadata
         )
         
-        formatted_results = []
-        if results and results.get('documents'):
-            for i in range(len(results['documents'][0])):
-                metadata = results['metadatas'][0][i] if results.get('metadatas') else {}
-                formatted_results.append({
-                    "content": results['documents'][0][i],
-                    "metadata": metadata,
-                    "distance": results['distances'][0][i] if results.get('distances') else 1.0,
-                    "context_type": metadata.get("content_type", "general"),
-                    "timestamp": metadata.get("timestamp", "")
-                })
+        for item in formatted_results:
+            metadata = item["metadata"]
+            item["context_type"] = metadata.get("content_type", "general")
+            item["timestamp"] = metadata.get("timestamp", "")
         
         logger.info(f"Found {len(formatted_results)} session memory results for session {session_id}")
         return formatted_results
@@ -907,6 +1637,17 @@ def search_session_memory(
         return []
 
 
+def _reset_sync_state() -> None:
+    """清除 SQLite 中的向量同步状态、URL 索引与会话记忆登记（向量库被清空后调用）"""
+    try:
+        from utils.db import clear_vector_sync_state, clear_url_index, clear_session_memory_records
+        clear_vector_sync_state()
+        clear_url_index()
+        clear_session_memory_records()
+    except Exception as e:
+        logger.warning(f"Failed to reset vector sync state: {e}")
+
+
 def clear_vectorstore() -> bool:
     """
     清空向量数据库中的所有文档（保留集合）
@@ -931,6 +1672,9 @@ def clear_vectorstore() -> bool:
         else:
             logger.info("Vectorstore is already empty")
         
+        # 向量库已清空，重置同步状态和 URL 索引
+        _reset_sync_state()
+        
         return True
         
     except Exception as e:
@@ -950,24 +1694,15 @@ def reset_vectorstore() -> bool:
             logger.info("Vector storage is disabled")
             return True
         
-        client = get_chroma_client()
-        collection_name = config.CHROMA_COLLECTION_NAME
-        
-        # 删除现有集合
-        try:
-            client.delete_collection(name=collection_name)
-            logger.info(f"Deleted collection: {collection_name}")
-        except Exception as e:
-            logger.warning(f"Collection may not exist: {e}")
-        
-        # 重置全局集合变量，强制重新创建
-        global _collection
-        _collection = None
-        
-        # 重新创建集合
         collection = get_collection()
+        collection_name = collection.name
+        
+        # 删除现有集合并重建
+        collection.reset()
         logger.info(f"Reset vectorstore: collection '{collection_name}' recreated")
         
+        _reset_sync_state()
+        
         return True
         
     except Exception as e:
@@ -1003,18 +1738,15 @@ def add_todo_to_vectorstore(
         if not config.ENABLE_VECTOR_STORAGE:
             return True
         
-        # 构建待办事项的文本内容
-        content_parts = [f"待办事项: {title}"]
-        if description:
-            content_parts.append(f"描述: {description}")
-        if start_time:
-            content_parts.append(f"开始时间: {start_time}")
-        if end_time:
-            content_parts.append(f"结束时间: {end_time}")
-        if priority:
-            content_parts.append(f"优先级: {priority}")
-        
-        content = "\n".join(content_parts)
+        todo_doc_id, content, metadata = build_todo_document(
+            todo_id=todo_id,
+            title=title,
+            description=description,
+            priority=priority,
+            start_time=start_time,
+            end_time=end_time,
+            status=status
+        )
         
         # 生成embedding
         from utils.llm import generate_embedding
@@ -1024,24 +1756,6 @@ def add_todo_to_vectorstore(
             logger.error(f"Failed to generate embedding for todo {todo_id}")
             return False
         
-        # 准备元数据
-        metadata = {
-            "todo_id": todo_id,
-            "title": title,
-            "description": description or "",
-            "priority": priority,
-            "status": status,
-            "source": "todo"
-        }
-        
-        if start_time:
-            metadata["start_time"] = start_time
-        if end_time:
-            metadata["end_time"] = end_time
-        
-        # 生成唯一ID
-        todo_doc_id = f"todo_{todo_id}"
-        
         # 存储到ChromaDB
         collection = get_collection()
         
@@ -1060,6 +1774,9 @@ def add_todo_to_vectorstore(
         )
         
         logger.info(f"Added todo to vectorstore: todo_id={todo_id}, title={title}")
+        
+        from utils.vector_sync import record_vector_sync
+        record_vector_sync("todos", todo_id)
         return True
         
     except Exception as e:
@@ -1091,8 +1808,13 @@ def add_tip_to_vectorstore(
         if not config.ENABLE_VECTOR_STORAGE:
             return True
         
-        # 构建提示的文本内容
-        tip_content = f"提示: {title}\n{content}"
+        tip_doc_id, tip_content, metadata = build_tip_document(
+            tip_id=tip_id,
+            title=title,
+            content=content,
+            tip_type=tip_type,
+            source_urls=source_urls
+        )
         
         # 生成embedding
         from utils.llm import generate_embedding
@@ -1102,21 +1824,6 @@ def add_tip_to_vectorstore(
             logger.error(f"Failed to generate embedding for tip {tip_id}")
             return False
         
-        # 准备元数据
-        metadata = {
-            "tip_id": tip_id,
-            "title": title,
-            "tip_type": tip_type,
-            "source": "tip"
-        }
-        
-        if source_urls:
-            import json
-            metadata["source_urls"] = json.dumps(source_urls, ensure_ascii=False)
-        
-        # 生成唯一ID
-        tip_doc_id = f"tip_{tip_id}"
-        
         # 存储到ChromaDB
         collection = get_collection()
         
@@ -1135,6 +1842,9 @@ def add_tip_to_vectorstore(
         )
         
         logger.info(f"Added tip to vectorstore: tip_id={tip_id}, title={title}")
+        
+        from utils.vector_sync import record_vector_sync
+        record_vector_sync("tips", tip_id)
         return True
         
     except Exception as e:
@@ -13,7 +13,6 @@ if str(_backend_dir) not in sys.path:
 import json
 from utils.vectorstore import get_collection, get_chroma_client
 from utils.helpers import get_logger
-import config
 
 logger = get_logger(__name__)
 
@@ -34,7 +33,7 @@ def view_vectorstore(limit: int = None, show_content: bool = True):
         print(f"\n{'='*60}")
         print(f"向量数据库统计信息")
         print(f"{'='*60}")
-        print(f"集合名称: {config.CHROMA_COLLECTION_NAME}")
+        print(f"集合名称: {collection.name}")
         print(f"总文档数: {count}")
         print(f"{'='*60}\n")
         